@@ -19,23 +19,67 @@ Using the contextmanager to do the same thing:
 >>> with HaloXML(r'c:\\test.annotations') as hx:
 >>>     hx.matchnegative()
 >>>     hx.to_geojson(r'c:\\test.geojson')
+
+Compressed files (.gz, .xz or .zst) are read and written transparently:
+
+>>> hx = HaloXML()
+>>> hx.load(r'c:\\test.annotations.gz')
+>>> hx.save(r'c:\\test.annotations.xz')
 """
 
-import io
+import json
 import logging
+import mmap
 import os
 from contextlib import AbstractContextManager
+from copy import deepcopy
 from pathlib import Path
 from types import TracebackType
-from typing import Any, BinaryIO, Optional, Type, Union
+from typing import TYPE_CHECKING, Any, BinaryIO, Optional, Type, Union
 
-import geojson as gs
 from lxml import etree
 from lxml.etree import _ElementTree  # noqa
 
+from .fileio import (
+    compression_from_suffix,
+    detect_compression,
+    open_compressed,
+    suffix_from_compression,
+)
+from .index import AnnotationsIndex, open_content, read_index
 from .Layer import Layer
 from .Region import Region
 
+if TYPE_CHECKING:
+    import geojson as gs
+    from numpy.typing import ArrayLike, NDArray
+
+    from .clip import ROI
+    from .density import DensityGrid
+    from .mesh import Mesh
+    from .overlap import OverlapMatrix
+    from .pack import PackedHaloXML, SharedHaloXML, _UnpackedElements
+    from .pyramid import GeometryPyramid
+    from .validate import ValidationReport
+
+_BUFFER_PARSING = etree.LXML_VERSION >= (6,)  # older lxml only parses bytes and str
+_CHUNK = 1 << 24  # bytes fed to the parser at once when it cannot parse a buffer
+
+
+def _layer_index(
+    pth: Path,
+    sidecar: bool,
+    buffer: Union[bytes, mmap.mmap],
+    layers: Optional[list[str]],
+) -> AnnotationsIndex:  # numpydoc ignore=GL08
+    # the index of the layers, with a warning for the layers that are not there
+    index = read_index(pth, sidecar, buffer)
+    if layers is not None:
+        missing = set(layers) - set(x.name for x in index.layers)
+        if missing:
+            logging.warning(f"Layers not found in {pth.name}: {sorted(missing)}")
+    return index
+
 
 class HaloXMLFile(AbstractContextManager[Any]):
     """
@@ -44,7 +88,7 @@ class HaloXMLFile(AbstractContextManager[Any]):
     Parameters
     ----------
     pth : str | os.PathLike[Any]
-        Path to the .annotations file.
+        Path to the .annotations file. It can be compressed with gzip, xz or zstd.
     mode : str
         'r' = read (default).
         'w' = write.
@@ -64,8 +108,7 @@ class HaloXMLFile(AbstractContextManager[Any]):
     def __enter__(self) -> "HaloXML":  # numpydoc ignore=GL08
         self.hx = HaloXML()
         if self.mode == "r":
-            self.file = io.FileIO(self.pth, "r")
-            self.hx.loadstream(self.file)
+            self.hx.load(self.pth)
         return self.hx
 
     def __exit__(
@@ -76,8 +119,6 @@ class HaloXMLFile(AbstractContextManager[Any]):
     ) -> None:  # numpydoc ignore=GL08
         if self.mode == "w":
             self.hx.save(self.pth)
-        else:
-            self.file.close()
 
 
 class HaloXML:
@@ -99,14 +140,91 @@ class HaloXML:
     """
 
     def __init__(self) -> None:  # numpydoc ignore=GL08
-        self.tree = etree.Element("root")  # type:_ElementTree | Any
+        self._tree = etree.Element("root")  # type: _ElementTree | Any
+        self._unpacked: Optional[_UnpackedElements] = None
         self.layers = []  # type: list[Layer]
         self.valid = False  # type: bool
         self.log = logging.getLogger(__name__)
+        self._pyramids = {}  # type: dict[tuple[Any, ...], GeometryPyramid]
 
     def __bool__(self) -> bool:  # numpydoc ignore=GL08
         return self.valid
 
+    @property
+    def tree(self) -> "_ElementTree | Any":
+        """
+        The raw xml data.
+
+        The tree of unpacked annotations is only made when it is used.
+
+        Returns
+        -------
+        _ElementTree
+            The tree the layers were loaded from.
+        """
+        if self._unpacked is not None:
+            self._tree = self._unpacked.tree()
+            self._unpacked = None
+        return self._tree
+
+    @tree.setter
+    def tree(self, tree: "_ElementTree | Any") -> None:  # numpydoc ignore=GL08
+        self._tree = tree
+        self._unpacked = None
+
+    def __reduce__(self) -> tuple[Any, ...]:  # numpydoc ignore=GL08
+        from .pack import _unpack_haloxml
+
+        return _unpack_haloxml, (self.pack(),)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> "HaloXML":  # numpydoc ignore=GL08
+        # copy the tree and the elements of the regions, not the packed form
+        hx = HaloXML.__new__(HaloXML)
+        memo[id(self)] = hx
+        state = dict(self.__dict__, _tree=self.tree, _unpacked=None)
+        hx.__dict__.update(deepcopy(state, memo))
+        return hx
+
+    def pack(self) -> "PackedHaloXML":
+        """
+        Store the annotations in a compact form that is cheap to pickle.
+
+        A HaloXML is pickled in this form as well, so it can be passed to a
+        ProcessPoolExecutor directly. The layers and the holes that are already
+        matched are kept.
+
+        Returns
+        -------
+        PackedHaloXML
+            A header and flat arrays with the vertices of all regions.
+
+        See Also
+        --------
+        share : Pass the annotations to many processes via shared memory.
+        """
+        from .pack import pack_layers
+
+        return pack_layers(self.layers, self.valid)
+
+    def share(self) -> "SharedHaloXML":
+        """
+        Store the annotations in shared memory.
+
+        Pickling the result only sends the name of the memory block, the workers
+        call tohaloxml on it to get their own copy of the annotations. Close it
+        when all workers are done, e.g. with a with statement.
+
+        Returns
+        -------
+        SharedHaloXML
+            The packed annotations in a block of shared memory.
+
+        See Also
+        --------
+        pack : The compact form without shared memory.
+        """
+        return self.pack().share()
+
     def loadstream(self, fp: BinaryIO) -> None:
         """
         Load the annotation from a BinaryIO stream.
@@ -116,7 +234,31 @@ class HaloXML:
         fp : BinaryIO
             Pointer to a BinaryIO.
         """
-        self.tree = etree.parse(fp)
+        self._loadtree(etree.parse(fp))
+
+    def loadbuffer(self, buffer: Union[bytes, mmap.mmap]) -> None:
+        """
+        Load the annotation from bytes or another object with the buffer protocol.
+
+        Before lxml 6 only bytes can be parsed, another buffer is then fed to the
+        parser in chunks, so it is not copied as a whole.
+
+        Parameters
+        ----------
+        buffer : bytes | mmap.mmap
+            The content of an uncompressed .annotations file.
+        """
+        if _BUFFER_PARSING or isinstance(buffer, bytes):
+            root = etree.fromstring(buffer)  # type: ignore[arg-type]  # any buffer works
+        else:
+            parser = etree.XMLParser()
+            for i in range(0, len(buffer), _CHUNK):
+                parser.feed(bytes(buffer[i : i + _CHUNK]))
+            root = parser.close()
+        self._loadtree(etree.ElementTree(root))
+
+    def _loadtree(self, tree: _ElementTree) -> None:  # numpydoc ignore=GL08
+        self.tree = tree
         for (
             annotation
         ) in self.tree.getroot().iterchildren():  # go over each layer in the file
@@ -128,6 +270,50 @@ class HaloXML:
                 layer.addregion(Region(region))
             self.layers.append(layer)
         self.valid = True
+        self._pyramids.clear()
+
+    def merge(self, *others: "HaloXML") -> None:
+        """
+        Merge the layers and regions of other HaloXML objects into this one.
+
+        Layers with the same name and line color are combined into a single layer.
+        A region is only added if the combined layer does not already contain a
+        region with the same geometry hash, so overlapping exports from several
+        files end up only once in the result. The added regions are copies, so
+        changing this object later does not change the others.
+
+        Parameters
+        ----------
+        *others : HaloXML
+            The HaloXML objects to merge into this one.
+
+        See Also
+        --------
+        Region.geometry_hash : The hash used to detect duplicate regions.
+        """
+        layers = {}  # type: dict[tuple[str, str], Layer]
+        seen = {}  # type: dict[tuple[str, str], set[bytes]]
+        for layer in self.layers:
+            key = (layer.name, layer.linecolor.getlinecolor())
+            layers.setdefault(key, layer)
+            seen.setdefault(key, set()).update(x.geometry_hash() for x in layer.regions)
+        for other in others:
+            for otherlayer in other.layers:
+                key = (otherlayer.name, otherlayer.linecolor.getlinecolor())
+                if key not in layers:
+                    layer = Layer()
+                    layer.fromdict(otherlayer.todict())
+                    self.layers.append(layer)
+                    layers[key] = layer
+                    seen[key] = set()
+                hashes = seen[key]
+                for region in otherlayer.regions:
+                    h = region.geometry_hash()
+                    if h not in hashes:
+                        hashes.add(h)
+                        layers[key].addregion(deepcopy(region))
+            self.valid |= other.valid
+        self._pyramids.clear()
 
     def matchnegative(self) -> None:
         """
@@ -136,23 +322,349 @@ class HaloXML:
         for layer in self.layers:
             layer.match_negative()
 
-    def load(self, pth: Union[str, os.PathLike[Any]]) -> None:
+    def clip(self, roi: "ROI", matchnegative: bool = True) -> "HaloXML":
+        """
+        Return the annotations inside a region of interest, clipped to its boundary.
+
+        Regions that are completely inside are shared with this HaloXML, so the
+        result is cheap to make, but changing them (e.g. with transform) changes
+        them in both. Only the regions that cross the boundary are clipped (with
+        shapely). Holes are kept. Use save or to_geojson on the result to export
+        the subset, or deepcopy it to change it on its own.
+
+        Parameters
+        ----------
+        roi : tuple[float, float, float, float] | list[tuple[float, float]] | shapely.Geometry
+            The region of interest. A rectangle (xmin, ymin, xmax, ymax), the vertices of
+            a polygon or a shapely geometry.
+        matchnegative : bool
+            True (default) - First matches negative regions, so holes are clipped with
+            their region.
+            False - Will not match negative regions.
+
+        Returns
+        -------
+        HaloXML
+            A new HaloXML with the same layers, containing the clipped regions.
+
+        See Also
+        --------
+        pyhaloxml.clip.clip_layers : How the regions are clipped.
+        """
+        from .clip import clip_layers
+
+        if matchnegative:
+            self.matchnegative()
+        hx = HaloXML()
+        hx.layers = clip_layers(self.layers, roi)
+        hx.valid = self.valid
+        return hx
+
+    def transform(self, matrix: "ArrayLike", round_vertices: bool = True) -> None:
+        """
+        Apply an affine transformation to all regions in all layers.
+
+        Use it to rescale to another pyramid level, translate to a crop or flip and
+        rotate to match a rescanned slide. Rectangles and ellipses become polygons
+        if the transformation rotates or shears them.
+
+        Parameters
+        ----------
+        matrix : ArrayLike
+            A 2x3 or 3x3 affine matrix, e.g. [[0.25, 0, 0], [0, 0.25, 0]] to go to
+            a pyramid level that is downsampled four times.
+        round_vertices : bool
+            True (default) - Round to whole pixels, like the files written by Halo.
+            False - Keep the exact coordinates.
+
+        See Also
+        --------
+        pyhaloxml.transform.transform_regions : How the regions are transformed.
+        """
+        from .transform import transform_regions
+
+        transform_regions(
+            [x for layer in self.layers for x in layer.regions], matrix, round_vertices
+        )
+        self._pyramids.clear()
+
+    def validate(self, repair: bool = False) -> "ValidationReport":
+        """
+        Check the geometry of all regions in one pass.
+
+        Finds unclosed polygons, duplicate consecutive vertices, self intersections,
+        regions or holes without area and negative regions without a positive region.
+
+        Parameters
+        ----------
+        repair : bool
+            False (default) - Only report the problems.
+            True - Close polygons, remove duplicate vertices and delete regions
+            without area and unmatched negative regions.
+
+        Returns
+        -------
+        ValidationReport
+            The problems that were found. It evaluates to True if there are none.
+
+        See Also
+        --------
+        pyhaloxml.validate.validate_layers : Details of the checks and repairs.
+        """
+        from .validate import validate_layers
+
+        if repair:
+            self._pyramids.clear()
+        return validate_layers(self.layers, repair)
+
+    def metrics(self, matchnegative: bool = True) -> dict[str, "NDArray[Any]"]:
+        """
+        Area, perimeter, centroid, bounding box and counts of all regions in all layers.
+
+        Parameters
+        ----------
+        matchnegative : bool
+            True (default) - First matches negative regions, so the area of the holes is subtracted.
+            False - Will not match negative regions.
+
+        Returns
+        -------
+        dict[str, NDArray[Any]]
+            A column based table with an array per metric and an element per region.
+            The layer column holds the name of the layer of each region.
+
+        See Also
+        --------
+        pyhaloxml.metrics.region_metrics : Description of the columns.
+        pyhaloxml.metrics.metrics_to_dataframe : Convert the result to a DataFrame.
+        """
+        from .flat import flatten_layers
+        from .metrics import region_metrics
+
+        if matchnegative:
+            self.matchnegative()
+        return region_metrics(flatten_layers(self.layers))
+
+    def density_grid(
+        self,
+        cell_size: float,
+        origin: Optional[tuple[float, float]] = None,
+        shape: Optional[tuple[int, int]] = None,
+        matchnegative: bool = True,
+    ) -> "DensityGrid":
+        """
+        Covered area fraction and counts of regions and pins per cell of a grid, for each layer.
+
+        Parameters
+        ----------
+        cell_size : float
+            The width and height of a cell in pixels.
+        origin : tuple[float, float] | None
+            The coordinates of the top left corner of the grid, by default the top left corner of the regions.
+        shape : tuple[int, int] | None
+            The number of rows and columns, by default up to the bottom right corner of the regions.
+        matchnegative : bool
+            True (default) - First matches negative regions, so the area of the holes is subtracted.
+            False - Will not match negative regions.
+
+        Returns
+        -------
+        DensityGrid
+            An array per statistic with shape (layers, rows, columns).
+
+        See Also
+        --------
+        pyhaloxml.density.density_grid : Details of the computation.
+        """
+        from .density import density_grid
+        from .flat import flatten_layers
+
+        if matchnegative:
+            self.matchnegative()
+        return density_grid(flatten_layers(self.layers), cell_size, origin, shape)
+
+    def mesh(self, matchnegative: bool = True) -> "Mesh":
+        """
+        Triangulate the regions of all layers into one mesh for rendering on the GPU.
+
+        All layers share the vertex and index buffers, so a whole slide is uploaded
+        at once and every layer is drawn from its own range with its own color.
+
+        Parameters
+        ----------
+        matchnegative : bool
+            True (default) - First matches negative regions, so they become holes in the mesh.
+            False - Will not match negative regions, they are left out of the mesh.
+
+        Returns
+        -------
+        Mesh
+            The vertex and index buffers and the color of each layer.
+
+        See Also
+        --------
+        pyhaloxml.mesh.triangulate : How the regions are triangulated.
+        """
+        from .flat import flatten_layers
+        from .mesh import triangulate
+
+        if matchnegative:
+            self.matchnegative()
+        return triangulate(flatten_layers(self.layers))
+
+    def overlap_matrix(
+        self, per_region: bool = False, workers: int = 1, matchnegative: bool = True
+    ) -> "OverlapMatrix":
+        """
+        Intersection area and intersection over union of every pair of layers.
+
+        Requires shapely.
+
+        Parameters
+        ----------
+        per_region : bool
+            True - Also give the overlap of every pair of regions of different layers that overlap.
+            False (default) - Only compare the layers.
+        workers : int
+            Number of threads that compute the unions and intersections.
+        matchnegative : bool
+            True (default) - First matches negative regions, so the holes are not counted.
+            False - Will not match negative regions.
+
+        Returns
+        -------
+        OverlapMatrix
+            The area of each layer and arrays of shape (layers, layers) with the intersection and iou.
+
+        See Also
+        --------
+        pyhaloxml.overlap.overlap_matrix : Details of the computation.
+        """
+        from .overlap import overlap_matrix
+
+        if matchnegative:
+            self.matchnegative()
+        return overlap_matrix(self.layers, per_region, workers)
+
+    def pyramid(
+        self,
+        tile_size: int = 512,
+        tolerance: float = 0.5,
+        min_size: float = 2.0,
+        levels: Optional[int] = None,
+        refresh: bool = False,
+    ) -> "GeometryPyramid":
+        """
+        Level of detail pyramid of all regions, for a viewer that zooms.
+
+        The negative regions are matched first. The pyramid is cached for each set of
+        options and dropped when the annotations are loaded, merged, transformed or
+        repaired. Use refresh after changing the regions in another way.
+
+        Parameters
+        ----------
+        tile_size : int
+            The width and height of a tile in screen pixels.
+        tolerance : float
+            The maximal simplification error in screen pixels.
+        min_size : float
+            Regions and holes with a smaller width and height in screen pixels become points.
+        levels : int | None
+            The number of levels, by default until all regions fit in about one tile.
+        refresh : bool
+            True - Build the pyramid again, even if it is cached.
+            False (default) - Use the cached pyramid if there is one.
+
+        Returns
+        -------
+        GeometryPyramid
+            The simplified regions of each level, with an index of the tiles.
+
+        See Also
+        --------
+        pyhaloxml.pyramid.build_pyramid : How the levels are built.
+        """
+        from .flat import flatten_layers
+        from .pyramid import build_pyramid
+
+        key = (tile_size, tolerance, min_size, levels)
+        if refresh or key not in self._pyramids:
+            self.matchnegative()
+            flat = flatten_layers(self.layers)
+            self._pyramids[key] = build_pyramid(flat, *key)
+        return self._pyramids[key]
+
+    def load(
+        self,
+        pth: Union[str, os.PathLike[Any]],
+        layers: Optional[list[str]] = None,
+        sidecar: bool = False,
+        workers: int = 1,
+    ) -> None:
         """
         Load .annotations file from a path.
 
+        Files compressed with gzip, xz or zstd are decompressed while parsing.
+        Uncompressed files are memory mapped and parsed from the mapped buffer.
+
         Parameters
         ----------
         pth : str | os.PathLike[Any]
             Path to the .annotations file to load.
+        layers : list[str] | None
+            Names of the layers to load. The other layers are skipped using an index
+            of their byte offsets, without building their tree. All layers if None.
+        sidecar : bool
+            True - Keep the index of the layers in <pth>.index.json, so the next
+            load with layers does not have to scan the file.
+            False (default) - Build the index in memory when it is needed.
+        workers : int
+            The number of threads. With more than one the regions of each layer are cut
+            into chunks that are parsed in parallel. The tree then only holds the
+            Annotations element, each region keeps the element of its own chunk.
+
+        See Also
+        --------
+        pyhaloxml.index.list_layers : The layers in a file, without loading them.
+        pyhaloxml.parallel.pack_parallel : Parse a file on a pool of processes.
         """
         pth = Path(pth)
         if not pth.exists() or not pth.is_file():
             raise FileNotFoundError(pth)
-        with open(pth, "rb") as fp:
-            self.loadstream(fp)
+        compression = detect_compression(pth)
+        if workers > 1:
+            from .parallel import parse_regions
+
+            with open_content(pth) as buffer:
+                index = _layer_index(pth, sidecar, buffer, layers)
+                if layers is not None:
+                    index.layers = [x for x in index.layers if x.name in layers]
+                root = etree.fromstring(index.select(buffer, []))
+                self.tree = etree.ElementTree(root)
+                self.layers.extend(parse_regions(buffer, index, workers))
+            self.valid = True
+            self._pyramids.clear()
+        elif layers is not None:
+            with open_content(pth) as buffer:
+                index = _layer_index(pth, sidecar, buffer, layers)
+                self.loadbuffer(index.select(buffer, layers))
+        elif compression is not None:
+            with open_compressed(pth, "rb", compression) as fp:
+                self.loadstream(fp)
+        elif pth.stat().st_size == 0:
+            with open(pth, "rb") as fp:
+                self.loadstream(fp)  # an empty file cannot be mapped
+        else:
+            with (
+                open(pth, "rb") as fp,
+                mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buffer,
+            ):
+                self.loadbuffer(buffer)
         logging.info(f"Finished loading {pth.stem}")
 
-    def save(self, pth: Union[str, os.PathLike[Any]]) -> None:
+    def save(
+        self, pth: Union[str, os.PathLike[Any]], compression: Optional[str] = None
+    ) -> None:
         """
         Save the data as .annotation file.
 
@@ -160,12 +672,23 @@ class HaloXML:
         ----------
         pth : str | os.PathLike[Any]
             Path to the .annotations file to save.
+        compression : str | None
+            None (default) - Compress if the suffix is .gz, .xz or .zst.
+            'gzip', 'xz' or 'zstd' - Compress and add the suffix if it is missing.
         """
         pth = Path(pth)
         if not pth.suffix:
             pth = Path(pth.parent, pth.name + ".annotations")
-        with open(pth, "wb") as f:
-            f.write(self.as_raw())
+        if compression is None:
+            compression = compression_from_suffix(pth)
+        elif compression_from_suffix(pth) != compression:
+            pth = Path(pth.parent, pth.name + suffix_from_compression(compression))
+        if compression is None:
+            with open(pth, "wb") as f:
+                f.write(self.as_raw())
+        else:
+            with open_compressed(pth, "wb", compression) as f:
+                f.write(self.as_raw())
 
     def as_raw(self) -> bytes:
         """
@@ -188,7 +711,7 @@ class HaloXML:
             new_root.append(anno)
         return bytes(etree.tostring(new_root))
 
-    def as_geojson(self) -> gs.FeatureCollection:
+    def as_geojson(self) -> "gs.FeatureCollection":
         """
         Return the annotations as geojson.FeatureCollection.
 
@@ -197,6 +720,8 @@ class HaloXML:
         FeatureCollection
             A GeoJSON FeatureCollection containing the information of the .annotations file.
         """
+        import geojson as gs
+
         features = []  # type: list[gs.Feature]
         for layer in self.layers:
             fts = layer.as_geojson()
@@ -205,7 +730,33 @@ class HaloXML:
 
         return gs.FeatureCollection(features)
 
-    def to_geojson(self, pth: Union[str, os.PathLike[Any]]) -> None:
+    def as_geojson_dict(self, deterministic: bool = True) -> dict[str, Any]:
+        """
+        Return the annotations as a GeoJSON FeatureCollection of plain dictonaries.
+
+        A faster alternative to as_geojson with the same content, which can be
+        passed to json.dumps directly.
+
+        Parameters
+        ----------
+        deterministic : bool
+            True (default) - The ids of the features are derived from the layer name and the
+            geometry, so the output is the same on every run.
+            False - Random ids, like as_geojson.
+
+        Returns
+        -------
+        dict[str, Any]
+            A GeoJSON FeatureCollection.
+        """
+        features = []  # type: list[dict[str, Any]]
+        for layer in self.layers:
+            features.extend(layer.as_geojson_dicts(deterministic=deterministic))
+        return {"type": "FeatureCollection", "features": features}
+
+    def to_geojson(
+        self, pth: Union[str, os.PathLike[Any]], deterministic: bool = True
+    ) -> None:
         """
         Save regions as geojson. This file can be loaded in QuPath.
 
@@ -213,9 +764,92 @@ class HaloXML:
         ----------
         pth : str | os.PathLike[Any]
             Path to the .GeoJSON file to save.
+        deterministic : bool
+            True (default) - The ids of the features are derived from the layer name and the
+            geometry, so saving the same annotations gives the same file.
+            False - Random ids.
         """
         pth = Path(pth)
         if not pth.suffix:
             pth = Path(pth.parent, pth.name + ".geojson")
         with open(pth, "wt") as f:
-            f.write(gs.dumps(self.as_geojson(), sort_keys=True))
+            json.dump(self.as_geojson_dict(deterministic), f, sort_keys=True)
+
+    def to_wkb(
+        self, pth: Union[str, os.PathLike[Any]], matchnegative: bool = True
+    ) -> None:
+        """
+        Save regions as WKB geometries with their layer, color, type and comments.
+
+        With the .parquet suffix a GeoParquet file is written, which requires pyarrow.
+        With the .wkb suffix the simple binary format of pyhaloxml.wkb is written.
+        Without a suffix .parquet is used if pyarrow is installed, otherwise .wkb.
+
+        Parameters
+        ----------
+        pth : str | os.PathLike[Any]
+            Path to the .parquet or .wkb file to save.
+        matchnegative : bool
+            True (default) - First matches negative regions, so they become holes.
+            False - Will not match negative regions.
+
+        See Also
+        --------
+        pyhaloxml.wkb.read_wkb : Read the simple binary format.
+        """
+        import importlib.util
+
+        from .flat import flatten_layers
+        from .wkb import write_parquet, write_wkb
+
+        pth = Path(pth)
+        if not pth.suffix:
+            if importlib.util.find_spec("pyarrow") is not None:
+                pth = Path(pth.parent, pth.name + ".parquet")
+            else:
+                pth = Path(pth.parent, pth.name + ".wkb")
+        if matchnegative:
+            self.matchnegative()
+        flat = flatten_layers(self.layers)
+        if pth.suffix.lower() == ".parquet":
+            write_parquet(flat, pth)
+        else:
+            write_wkb(flat, pth)
+
+    def to_sqlite(
+        self,
+        pth: Union[str, os.PathLike[Any]],
+        name: str,
+        matchnegative: bool = True,
+    ) -> None:
+        """
+        Add the regions to a SQLite database with a spatial index.
+
+        The database has the tables slides, layers, regions and comments and an
+        rtree index regions_rtree on the bounding boxes of the regions. A slide with
+        the same name that is already in the database is replaced.
+
+        Parameters
+        ----------
+        pth : str | os.PathLike[Any]
+            Path to the SQLite database. It is created if it does not exist.
+        name : str
+            Name of the slide in the database.
+        matchnegative : bool
+            True (default) - First matches negative regions, so they become holes.
+            False - Will not match negative regions.
+
+        See Also
+        --------
+        pyhaloxml.sqlite.files_to_sqlite : Add many files to a database.
+        pyhaloxml.sqlite.regions_in_bbox : Query the database.
+        """
+        from .sqlite import connect, insert_slide
+
+        if matchnegative:
+            self.matchnegative()
+        con = connect(pth)
+        try:
+            insert_slide(con, name, self.layers)
+        finally:
+            con.close()
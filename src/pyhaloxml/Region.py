@@ -2,13 +2,40 @@
 
 import logging
 import math
+import struct
+from array import array
+from copy import copy, deepcopy
+from hashlib import blake2b
+from itertools import chain
 from numbers import Real
+from typing import TYPE_CHECKING, Any, Optional
 
-import geojson as gs
 from lxml.etree import Element, _Element
 
 from .ellipse import ellipse2polygon
-from .misc import Comment, RegionType, closepolygon, getvertex, getvertices
+from .misc import (
+    Comment,
+    RegionType,
+    closepolygon,
+    getvertex,
+    getvertices,
+    setvertices,
+)
+
+if TYPE_CHECKING:
+    import geojson as gs
+
+    from .pack import _UnpackedElements  # noqa: F401
+
+TYPES = {
+    "Polygon": RegionType.Polygon,
+    "Rectangle": RegionType.Rectangle,
+    "Ruler": RegionType.Ruler,
+    "Ellipse": RegionType.Ellipse,
+    "Pin": RegionType.Pin,
+}  # type: dict[str | bytes, RegionType]
+
+log = logging.getLogger("HaloXML:Region")
 
 
 class Region:
@@ -47,30 +74,61 @@ class Region:
         self.holes = []  # type: list[Region]
         self.comments = []  # type: list[Comment]
         self.vertices = [(math.nan, math.nan)]  # type: list[tuple[float, float]]
-        self.type = RegionType.Unknown  # type: RegionType
-        if region.attrib["Type"] == "Polygon":
-            self.type = RegionType.Polygon
-        elif region.attrib["Type"] == "Rectangle":
-            self.type = RegionType.Rectangle
-        elif region.attrib["Type"] == "Ruler":
-            self.type = RegionType.Ruler
-        elif region.attrib["Type"] == "Ellipse":
-            self.type = RegionType.Ellipse
-        elif region.attrib["Type"] == "Pin":
-            self.type = RegionType.Pin
-        self.isnegative = region.attrib["NegativeROA"] == "1"  # type: bool
-        self.hasendcaps = region.attrib["HasEndcaps"] == "1"  # type: bool
-        for e in region.iterchildren():
-            if e.tag == "Comments":
+        attrib = region.attrib
+        self.type = TYPES.get(attrib["Type"], RegionType.Unknown)  # type: RegionType
+        self.isnegative = attrib["NegativeROA"] == "1"  # type: bool
+        self.hasendcaps = attrib["HasEndcaps"] == "1"  # type: bool
+        if len(region) != 1 or region[0].tag != "Vertices":  # not just vertices
+            for e in region.iterchildren("Comments"):
                 for c in e.iterchildren():
                     newcomment = Comment()
                     newcomment.setcomment(c)
                     self.comments.append(newcomment)
-        self.log = logging.getLogger("HaloXML:Region")  # type: logging.Logger
+        self.log = log  # type: logging.Logger
+
+    @property
+    def region(self) -> _Element:
+        """
+        Raw xml data of the region.
+
+        The elements of unpacked regions are only made when one of them is used.
+
+        Returns
+        -------
+        _Element
+            The Region element.
+        """
+        if self._unpacked is not None:
+            self._unpacked.build()
+        return self._region
+
+    @region.setter
+    def region(self, region: _Element) -> None:  # numpydoc ignore=GL08
+        self._region = region  # type: _Element
+        self._unpacked = None  # type: Optional[_UnpackedElements]
 
     def __str__(self) -> str:  # numpydoc ignore=GL08
         return str(self.region.attrib)
 
+    def __reduce__(self) -> tuple[Any, ...]:  # numpydoc ignore=GL08
+        from .Layer import Layer
+        from .pack import _unpack_region, pack_layers
+
+        layer = Layer()
+        layer.addregion(self)
+        return _unpack_region, (pack_layers([layer]),)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> "Region":  # numpydoc ignore=GL08
+        # copy the element, much faster than the packed form of __reduce__
+        region = Region.__new__(Region)
+        memo[id(self)] = region
+        region.__dict__.update(self.__dict__)
+        region.region = deepcopy(self.region, memo)
+        region.holes = [deepcopy(x, memo) for x in self.holes]
+        region.comments = [copy(x) for x in self.comments]
+        region.vertices = list(self.vertices)
+        return region
+
     def add_hole(self, hole: "Region") -> None:
         """
         Add a hole to this Region.
@@ -95,6 +153,75 @@ class Region:
             return True
         return False
 
+    def geometry_hash(self) -> bytes:
+        """
+        Hash of the type and the vertices of the region and its holes.
+
+        The raw vertices from the xml are used, so ellipses are not converted
+        to polygons first. Regions with the same hash have the same geometry.
+
+        Returns
+        -------
+        bytes
+            A 16 byte blake2b digest.
+        """
+        h = blake2b(struct.pack("<b?", self.type, self.isnegative), digest_size=16)
+        h.update(array("d", chain.from_iterable(getvertices(self.region))).tobytes())
+        for hole in sorted(x.geometry_hash() for x in self.holes):
+            h.update(hole)
+        return h.digest()
+
+    def fingerprint(self) -> bytes:
+        """
+        Hash of the geometry, the flags and the comments of the region.
+
+        Regions with the same fingerprint are identical for all practical purposes.
+        Only the author and body of the comments are used, not their timestamps.
+
+        Returns
+        -------
+        bytes
+            A 16 byte blake2b digest.
+
+        See Also
+        --------
+        geometry_hash : Hash of only the geometry.
+        """
+        h = blake2b(self.geometry_hash(), digest_size=16)
+        h.update(struct.pack("<?", self.hasendcaps))
+        for c in self.comments:
+            h.update(repr((c.getauthor(), str(c))).encode())
+        return h.digest()
+
+    def bounds(self) -> tuple[float, float, float, float]:
+        """
+        The bounding box of the raw vertices of the region.
+
+        Returns
+        -------
+        tuple[float, float, float, float]
+            Minimum x, minimum y, maximum x and maximum y.
+        """
+        vertices = getvertices(self.region)
+        if not vertices:
+            return math.nan, math.nan, math.nan, math.nan
+        xs, ys = zip(*vertices)
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def topolygon(self) -> None:
+        """
+        Convert a rectangle or ellipse to a polygon with the same vertices.
+
+        The xml of the region is changed as well. Other types of regions are not changed.
+        """
+        if self.type not in [RegionType.Rectangle, RegionType.Ellipse]:
+            return
+        vertices = [(float(x), float(y)) for x, y in self.getvertices()]
+        setvertices(self.region, vertices)
+        self.region.attrib["Type"] = "Polygon"
+        self.type = RegionType.Polygon
+        self.vertices = vertices
+
     def getvertices(self) -> list[tuple[float, float]]:
         """
         Get the vertices of the region.
@@ -160,7 +287,7 @@ class Region:
             pointinregion = getvertex(self.region)
         return pointinregion
 
-    def as_geojson(self) -> gs.Polygon | gs.LineString | gs.Point:
+    def as_geojson(self) -> "gs.Polygon | gs.LineString | gs.Point":
         """
         Return the region as a geojson object depending on the type of region.
 
@@ -169,6 +296,8 @@ class Region:
         geojson.Polygon | geojson.LineString | geojson.Point
             The region as geojson object in the region.
         """
+        import geojson as gs
+
         vertices = self.getvertices()
         if self.type == RegionType.Pin:
             geoj = gs.Point(vertices[0])
@@ -189,6 +318,40 @@ class Region:
             self.log.error(f"Cannot convert type {self.type} to polygon.")
         return geoj
 
+    def as_geojson_dict(self) -> Optional[dict[str, Any]]:
+        """
+        Return the geometry of the region as a plain GeoJSON dictonary.
+
+        The same geometry as as_geojson, without creating and validating geojson
+        objects. The coordinates are tuples, rounded to 6 decimals like geojson does.
+
+        Returns
+        -------
+        dict[str, Any] | None
+            A Point, LineString or Polygon geometry, None if the type is unknown.
+        """
+        vertices = _round(self.getvertices())
+        if self.type == RegionType.Pin:
+            return {"type": "Point", "coordinates": vertices[0]}
+        if self.type == RegionType.Ruler:
+            return {"type": "LineString", "coordinates": vertices}
+        if self.has_area():
+            polygon = [closepolygon(vertices)]
+            for v in self.holes:
+                polygon.append(closepolygon(_round(v.getvertices())))
+            return {"type": "Polygon", "coordinates": polygon}
+        self.log.error(f"Cannot convert type {self.type} to polygon.")
+        return None
+
+
+def _round(
+    vertices: list[tuple[float, float]],
+) -> list[tuple[float, float]]:  # numpydoc ignore=GL08
+    # the precision of geojson, only ellipses have vertices that are not whole numbers
+    if all(x % 1 == 0 and y % 1 == 0 for x, y in vertices):
+        return vertices
+    return [(round(x, 6), round(y, 6)) for x, y in vertices]
+
 
 def region_from_coordinates(
     coords: list[list[tuple[Real, Real]]], comments: list[Comment] = []
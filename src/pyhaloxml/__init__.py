@@ -1,7 +1,31 @@
+from typing import TYPE_CHECKING, Any
+
 from .HaloXML import HaloXML, HaloXMLFile
+from .index import list_layers
 from .Layer import Layer
 from .misc import RegionType
 from .Region import Region
 from .version import __version__
 
-__all__ = ["HaloXML", "HaloXMLFile", "Region", "Layer", "RegionType", "__version__"]
+if TYPE_CHECKING:
+    from .dataset import HaloXMLDataset
+
+__all__ = [
+    "HaloXML",
+    "HaloXMLFile",
+    "HaloXMLDataset",
+    "Region",
+    "Layer",
+    "RegionType",
+    "list_layers",
+    "__version__",
+]
+
+
+def __getattr__(name: str) -> Any:  # numpydoc ignore=GL08
+    # the dataset pulls in threads and caching, only import it when it is used
+    if name == "HaloXMLDataset":
+        from .dataset import HaloXMLDataset
+
+        return HaloXMLDataset
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,227 @@
+"""Parsed .annotations files in a least recently used cache with a memory budget."""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Generic, Optional, TypeVar, Union
+
+if TYPE_CHECKING:
+    from .HaloXML import HaloXML
+
+# estimates of the memory of a parsed file, measured as the growth of the resident
+# memory when loading files with few large and many small regions
+BYTES_PER_VERTEX = 600  # a V element in the lxml tree
+BYTES_PER_POINT = 130  # a vertex that was read into Region.vertices
+BYTES_PER_REGION = 1600  # the Region object and the other elements of a region
+
+T = TypeVar("T")
+
+
+def estimate_nbytes(hx: "HaloXML") -> int:
+    """
+    Estimate of the memory used by loaded annotations.
+
+    Most of it is the parsed tree, which grows with the number of V elements, and
+    the lists of vertices of the regions that were read from it, e.g. by
+    matchnegative. Both are counted for all regions and holes.
+
+    Parameters
+    ----------
+    hx : HaloXML
+        The loaded annotations.
+
+    Returns
+    -------
+    int
+        The estimated number of bytes.
+    """
+    size = 0
+    for layer in hx.layers:
+        for region in layer.regions:
+            for x in [region, *region.holes]:
+                vertices = x.region.find("Vertices")
+                if vertices is not None:
+                    size += len(vertices) * BYTES_PER_VERTEX
+                size += len(x.vertices) * BYTES_PER_POINT + BYTES_PER_REGION
+    return size
+
+
+def _nbytes(entry: Any) -> int:  # numpydoc ignore=GL08
+    return int(entry.nbytes)
+
+
+class AnnotationCache(Generic[T]):
+    """
+    Parsed files in a least recently used cache with a bound on their size.
+
+    A file is known by its resolved path and its modification time, so a changed
+    file is parsed again and the old version is dropped. When several threads ask
+    for a file that is not in the cache, it is parsed once and the others wait for
+    it.
+
+    Parameters
+    ----------
+    loader : Callable[[Path], T]
+        Parses a file.
+    max_bytes : int
+        The estimated memory of the cached files is kept below this. The most
+        recent file is always kept.
+    sizeof : Callable[[T], int] | None
+        Estimate of the memory of a parsed file, by default its nbytes attribute.
+        It is called often, so it should be fast.
+
+    Attributes
+    ----------
+    hits : int
+        Number of requests for a file that was parsed already.
+    misses : int
+        Number of files that were parsed.
+    evictions : int
+        Number of files that were dropped to stay below max_bytes.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Path], T],
+        max_bytes: int = 1 << 30,
+        sizeof: Optional[Callable[[T], int]] = None,
+    ) -> None:  # numpydoc ignore=GL08
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or _nbytes  # type: Callable[[T], int]
+        self.hits = 0  # type: int
+        self.misses = 0  # type: int
+        self.evictions = 0  # type: int
+        self._entries = OrderedDict()  # type: OrderedDict[tuple[Path, int], T]
+        self._pending = {}  # type: dict[tuple[Path, int], Future[T]]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:  # numpydoc ignore=GL08
+        return len(self._entries)
+
+    def __contains__(
+        self, pth: Union[str, os.PathLike[Any]]
+    ) -> bool:  # numpydoc ignore=GL08
+        return self.peek(pth) is not None
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Estimate of the memory used by the cached files.
+
+        Returns
+        -------
+        int
+            The estimated number of bytes.
+        """
+        with self._lock:
+            return self._total()
+
+    def _total(self) -> int:  # numpydoc ignore=GL08
+        # measured every time, entries can grow while they are cached
+        return sum(self.sizeof(x) for x in self._entries.values())
+
+    def peek(self, pth: Union[str, os.PathLike[Any]]) -> Optional[T]:
+        """
+        Get a parsed file only if it is in the cache and was not changed.
+
+        Parameters
+        ----------
+        pth : str | os.PathLike[Any]
+            Path to the .annotations file.
+
+        Returns
+        -------
+        T | None
+            The parsed file, or None. It does not count as a hit.
+        """
+        pth = Path(pth).resolve()
+        with self._lock:
+            for (path, mtime), entry in self._entries.items():
+                if path == pth:
+                    return entry if pth.stat().st_mtime_ns == mtime else None
+        return None
+
+    def get(self, pth: Union[str, os.PathLike[Any]]) -> T:
+        """
+        Get a parsed file, parse it if it is not in the cache or was changed.
+
+        Parameters
+        ----------
+        pth : str | os.PathLike[Any]
+            Path to the .annotations file.
+
+        Returns
+        -------
+        T
+            The parsed file.
+        """
+        pth = Path(pth).resolve()
+        key = (pth, pth.stat().st_mtime_ns)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            pending = self._pending.get(key)
+            if pending is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                future = Future()  # type: Future[T]
+                self._pending[key] = future
+        if pending is not None:
+            return pending.result()
+        try:
+            entry = self.loader(pth)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+        try:
+            with self._lock:
+                del self._pending[key]
+                for old in [x for x in self._entries if x[0] == pth]:
+                    del self._entries[old]
+                self._entries[key] = entry
+                self._evict()
+        finally:
+            # the threads that wait for this file get it, also if sizeof fails
+            future.set_result(entry)
+        return entry
+
+    def _evict(self) -> None:  # numpydoc ignore=GL08
+        total = self._total()
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            total -= self.sizeof(entry)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all parsed files."""
+        with self._lock:
+            self._entries.clear()
+
+    def todict(self) -> dict[str, Any]:
+        """
+        Create a dictonary with the statistics of the cache.
+
+        Returns
+        -------
+        dict[str, Any]
+            The hits, misses, hit_rate, evictions, number of entries and their size.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else None,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "nbytes": self._total(),
+                "max_bytes": self.max_bytes,
+            }
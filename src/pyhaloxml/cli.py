@@ -0,0 +1,125 @@
+"""Command line interface of pyhaloxml."""
+
+import argparse
+import logging
+import sys
+from typing import Optional
+
+from .diff import diff
+from .HaloXML import HaloXML
+from .watch import FORMATS, Watcher
+
+
+def _diff(args: argparse.Namespace) -> int:  # numpydoc ignore=GL08
+    old = HaloXML()
+    old.load(args.old)
+    new = HaloXML()
+    new.load(args.new)
+    result = diff(old, new, min_overlap=args.min_overlap)
+    print(result.tojson() if args.json else result)
+    return 1 if result else 0
+
+
+def _watch(args: argparse.Namespace) -> int:  # numpydoc ignore=GL08
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    watcher = Watcher(
+        args.directory, args.output, args.format, args.state, settle=args.settle
+    )
+    try:
+        watcher.run(args.interval, args.workers, rounds=1 if args.once else None)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _serve(args: argparse.Namespace) -> int:  # numpydoc ignore=GL08
+    from .serve import serve
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    serve(args.directory, args.host, args.port, int(args.cache_size * 1e6))
+    return 0
+
+
+def parser() -> argparse.ArgumentParser:
+    """
+    Create the argument parser of the command line interface.
+
+    Returns
+    -------
+    argparse.ArgumentParser
+        The parser with a subparser for each command.
+    """
+    p = argparse.ArgumentParser(
+        prog="pyhaloxml", description="Tools for .annotations files from Halo."
+    )
+    commands = p.add_subparsers(dest="command", required=True)
+    d = commands.add_parser("diff", help="Show the differences between two files.")
+    d.add_argument("old", help="The old .annotations file.")
+    d.add_argument("new", help="The new .annotations file.")
+    d.add_argument("--json", action="store_true", help="Output json.")
+    d.add_argument(
+        "--min-overlap",
+        type=float,
+        default=0.5,
+        help="Bounding box overlap for a moved region to count as modified.",
+    )
+    d.set_defaults(func=_diff)
+    w = commands.add_parser(
+        "watch", help="Convert new and changed files in a directory as they appear."
+    )
+    w.add_argument("directory", help="The directory to watch, with subdirectories.")
+    w.add_argument("output", help="The directory for the converted files.")
+    w.add_argument(
+        "--format", choices=list(FORMATS), default="geojson", help="Output format."
+    )
+    w.add_argument(
+        "--interval", type=float, default=60.0, help="Seconds between two polls."
+    )
+    w.add_argument("--workers", type=int, help="Number of worker processes.")
+    w.add_argument("--state", help="State file, by default in the output directory.")
+    w.add_argument(
+        "--settle",
+        type=float,
+        default=2.0,
+        help="Seconds since the last change before a file is converted.",
+    )
+    w.add_argument("--once", action="store_true", help="Poll once and exit.")
+    w.set_defaults(func=_watch)
+    s = commands.add_parser(
+        "serve", help="Answer queries about the files in a directory over http."
+    )
+    s.add_argument(
+        "directory", nargs="?", default=".", help="The directory with the files."
+    )
+    s.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    s.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    s.add_argument(
+        "--cache-size",
+        type=float,
+        default=1000.0,
+        help="Estimated memory of the parsed files to keep, in MB.",
+    )
+    s.set_defaults(func=_serve)
+    return p
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Run the command line interface.
+
+    Parameters
+    ----------
+    argv : list[str] | None
+        The arguments, sys.argv is used if None.
+
+    Returns
+    -------
+    int
+        The exit code.
+    """
+    args = parser().parse_args(argv)
+    return int(args.func(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Clip regions to a region of interest."""
+
+from copy import deepcopy
+from typing import Any, Union
+
+import numpy as np
+from lxml.etree import Element
+
+from .flat import flatten_layers
+from .Layer import Layer
+from .misc import RegionType, setvertices
+from .Region import Region
+from .shapely import import_shapely, region_to_shapely, regions_from_shapely
+
+ROI = Union[tuple[float, float, float, float], list[tuple[float, float]], Any]
+
+
+def clip_layers(layers: list[Layer], roi: ROI) -> list[Layer]:
+    """
+    Clip the regions in the layers to a region of interest.
+
+    The bounding boxes of all regions are compared to the region of interest at
+    once. Regions outside are skipped and the regions inside are kept as they are,
+    without copying their xml, so they are shared with the layers. Only regions
+    that cross the boundary are converted to shapely and clipped, which keeps their
+    holes. Clipped polygons can fall apart in several regions.
+
+    Parameters
+    ----------
+    layers : list[Layer]
+        The layers to clip. Negative regions should be matched first.
+    roi : tuple[float, float, float, float] | list[tuple[float, float]] | shapely.Geometry
+        The region of interest. A rectangle (xmin, ymin, xmax, ymax), the vertices of
+        a polygon or a shapely geometry.
+
+    Returns
+    -------
+    list[Layer]
+        New layers with the same properties, containing the clipped regions.
+    """
+    rectangle = _isrectangle(roi)
+    if rectangle:
+        roibounds = np.array(roi, dtype=np.float64)
+    elif hasattr(roi, "geom_type"):
+        shape = roi  # type: Any
+        roibounds = np.array(shape.bounds, dtype=np.float64)
+    else:
+        vertices = np.array(roi, dtype=np.float64)
+        roibounds = np.hstack([vertices.min(axis=0), vertices.max(axis=0)])
+    flat = flatten_layers(layers)
+    bounds = flat.bounds()
+    outside = (
+        (bounds[:, 0] > roibounds[2])
+        | (bounds[:, 2] < roibounds[0])
+        | (bounds[:, 1] > roibounds[3])
+        | (bounds[:, 3] < roibounds[1])
+    )
+    if rectangle:
+        inside = (
+            (bounds[:, 0] >= roibounds[0])
+            & (bounds[:, 2] <= roibounds[2])
+            & (bounds[:, 1] >= roibounds[1])
+            & (bounds[:, 3] <= roibounds[3])
+        )
+    else:  # a polygon can not be tested on the bounds alone
+        inside = np.zeros(len(bounds), dtype=np.bool_)
+    result = []
+    for layer in layers:
+        newlayer = Layer()
+        newlayer.fromdict(layer.todict())
+        result.append(newlayer)
+    candidates = np.flatnonzero(~outside)
+    shapely = None  # type: Any
+    if not np.all(inside[candidates]):
+        shapely = import_shapely("clip regions to a region of interest")
+        if rectangle:
+            geom = shapely.box(*roibounds)
+        elif hasattr(roi, "geom_type"):
+            geom = roi
+        else:
+            geom = shapely.Polygon(roi)
+        shapely.prepare(geom)
+    for i in candidates.tolist():
+        region = flat.regions[i]
+        newlayer = result[flat.layer_index[i]]
+        if inside[i]:
+            newlayer.addregion(region)
+            continue
+        geometry = region_to_shapely(region, make_valid=True)
+        if geom.contains(geometry):
+            newlayer.addregion(region)
+        elif geom.intersects(geometry):
+            for newregion in _fromshapely(shapely, region, geom.intersection(geometry)):
+                newlayer.addregion(newregion)
+    return result
+
+
+def _isrectangle(roi: ROI) -> bool:  # numpydoc ignore=GL08
+    return (
+        isinstance(roi, (tuple, list))
+        and len(roi) == 4
+        and all(isinstance(x, (int, float, np.number)) for x in roi)
+    )
+
+
+def _fromshapely(
+    shapely: Any, region: Region, geometry: Any
+) -> list[Region]:  # numpydoc ignore=GL08
+    if region.has_area():
+        regions = regions_from_shapely(geometry, region.comments)
+        if region.isnegative:
+            for x in regions:
+                x.region.attrib["NegativeROA"] = "1"
+                x.isnegative = True
+        return regions
+    regions = []
+    for part in shapely.get_parts(geometry).tolist():
+        if region.type == RegionType.Pin and part.geom_type == "Point":
+            regions.append(region)  # a pin on the boundary
+        elif region.type == RegionType.Ruler and part.geom_type == "LineString":
+            element = Element(
+                "Region", {str(k): str(v) for k, v in region.region.items()}
+            )
+            setvertices(element, [(x, y) for x, y in part.coords])
+            for e in region.region.iterchildren():
+                if e.tag == "Comments":
+                    element.append(deepcopy(e))
+            regions.append(Region(element))
+    return regions
@@ -0,0 +1,236 @@
+"""A cohort of .annotations files that are loaded when they are needed."""
+
+import csv
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor  # noqa: F401
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Callable, Iterable, Iterator, Optional, Type, TypeVar, Union
+
+from .cache import AnnotationCache, estimate_nbytes
+from .fileio import find_annotations
+from .HaloXML import HaloXML
+from .Layer import Layer
+from .Region import Region
+
+T = TypeVar("T")
+
+
+def read_manifest(pth: Union[str, os.PathLike[Any]]) -> list[Path]:
+    """
+    The files listed in a manifest.
+
+    A .csv manifest needs a column named path. Any other manifest has one path per
+    line, empty lines and lines that start with # are skipped. Relative paths are
+    relative to the directory of the manifest.
+
+    Parameters
+    ----------
+    pth : str | os.PathLike[Any]
+        Path to the manifest.
+
+    Returns
+    -------
+    list[Path]
+        The paths in the order of the manifest.
+    """
+    pth = Path(pth)
+    with open(pth, newline="") as f:
+        if pth.suffix.lower() == ".csv":
+            names = [row["path"] for row in csv.DictReader(f)]
+        else:
+            names = [x.strip() for x in f]
+            names = [x for x in names if x and not x.startswith("#")]
+    return [Path(pth.parent, x) for x in names]
+
+
+class HaloXMLDataset:
+    """
+    A cohort of .annotations files that are loaded on demand.
+
+    Loaded files are kept in a least recently used cache with a memory budget, so
+    files that are used again are not parsed again and memory stays bounded. Files
+    are loaded on a pool of threads ahead of when they are needed. Iterating over a
+    layer of all files only loads that layer and does not cache it, so a whole
+    cohort can be streamed.
+
+    Parameters
+    ----------
+    files : str | os.PathLike[Any] | Iterable[str | os.PathLike[Any]]
+        A directory that is searched for .annotations files, a manifest or a list
+        of paths.
+    max_bytes : int
+        The budget for the estimated memory of the cached files. The most recent
+        file is always kept.
+    workers : int
+        The number of threads that load files ahead.
+    layers : list[str] | None
+        Names of the layers to load, all if None.
+    matchnegative : bool
+        True (default) - Match the negative regions of every file after loading.
+        False - Keep the negative regions.
+
+    Attributes
+    ----------
+    paths : list[Path]
+        The files of the cohort.
+    cache : AnnotationCache[tuple[HaloXML, int]]
+        The loaded files with their estimated size.
+
+    See Also
+    --------
+    find_annotations : The files that are found in a directory.
+    read_manifest : The format of a manifest.
+    """
+
+    def __init__(
+        self,
+        files: Union[str, os.PathLike[Any], Iterable[Union[str, os.PathLike[Any]]]],
+        max_bytes: int = 2 << 30,
+        workers: int = 4,
+        layers: Optional[list[str]] = None,
+        matchnegative: bool = True,
+    ) -> None:  # numpydoc ignore=GL08
+        if isinstance(files, (str, os.PathLike)):
+            if Path(files).is_dir():
+                self.paths = find_annotations(files)  # type: list[Path]
+            else:
+                self.paths = read_manifest(files)
+        else:
+            self.paths = [Path(x) for x in files]
+        self.workers = workers
+        self.layers = layers
+        self.matchnegative = matchnegative
+        self.cache = AnnotationCache(self._load, max_bytes, sizeof=lambda x: x[1])  # type: AnnotationCache[tuple[HaloXML, int]]
+        self._pool = None  # type: Optional[ThreadPoolExecutor]
+
+    def __len__(self) -> int:  # numpydoc ignore=GL08
+        return len(self.paths)
+
+    def __getitem__(self, index: int) -> HaloXML:  # numpydoc ignore=GL08
+        return self.cache.get(self.paths[index])[0]
+
+    def __iter__(self) -> Iterator[HaloXML]:  # numpydoc ignore=GL08
+        for hx, _ in self._stream(self.cache.get, self.paths):
+            yield hx
+
+    def __enter__(self) -> "HaloXMLDataset":  # numpydoc ignore=GL08
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:  # numpydoc ignore=GL08
+        self.close()
+
+    def _read(
+        self, pth: Path, layers: Optional[list[str]]
+    ) -> HaloXML:  # numpydoc ignore=GL08
+        hx = HaloXML()
+        hx.load(pth, layers=layers)
+        if self.matchnegative:
+            hx.matchnegative()
+        return hx
+
+    def _load(self, pth: Path) -> tuple[HaloXML, int]:  # numpydoc ignore=GL08
+        hx = self._read(pth, self.layers)
+        return hx, estimate_nbytes(hx)
+
+    def _executor(self) -> ThreadPoolExecutor:  # numpydoc ignore=GL08
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=max(self.workers, 1))
+        return self._pool
+
+    def _stream(
+        self, func: Callable[[Path], T], paths: list[Path]
+    ) -> Iterator[T]:  # numpydoc ignore=GL08
+        # results in order, with at most workers files loading ahead
+        if self.workers <= 1:
+            yield from map(func, paths)
+            return
+        pool = self._executor()
+        pending = deque()  # type: deque[Future[T]]
+        try:
+            for pth in paths:
+                pending.append(pool.submit(func, pth))
+                if len(pending) > self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def prefetch(self, indices: Iterable[int]) -> None:
+        """
+        Load files into the cache in the background.
+
+        Parameters
+        ----------
+        indices : Iterable[int]
+            Index in paths of the files, e.g. those of the next batch.
+        """
+        pool = self._executor()
+        for i in indices:
+            pool.submit(self.cache.get, self.paths[i])
+
+    def iter_layers(self, name: str) -> Iterator[tuple[Path, Layer]]:
+        """
+        Stream a layer of every file.
+
+        A file that is in the cache is used as it is. Of the other files only the
+        layer is loaded, using an index of the byte offsets of the layers, and it
+        is dropped when the iteration moves on to the next file.
+
+        Parameters
+        ----------
+        name : str
+            Name of the layer, e.g. "Tumor".
+
+        Yields
+        ------
+        tuple[Path, Layer]
+            The path of the file and the layer, for every file that has it.
+        """
+
+        def load(pth: Path) -> list[Layer]:  # numpydoc ignore=GL08
+            cached = None
+            if self.layers is None or name in self.layers:
+                cached = self.cache.peek(pth)
+            hx = cached[0] if cached is not None else self._read(pth, [name])
+            return [x for x in hx.layers if x.name == name]
+
+        for pth, layers in zip(self.paths, self._stream(load, self.paths)):
+            for layer in layers:
+                yield pth, layer
+
+    def regions(self, name: str) -> Iterator[tuple[Path, Region]]:
+        """
+        Stream the regions of a layer of every file.
+
+        Parameters
+        ----------
+        name : str
+            Name of the layer, e.g. "Tumor".
+
+        Yields
+        ------
+        tuple[Path, Region]
+            The path of the file and a region of the layer.
+
+        See Also
+        --------
+        iter_layers : How the files are loaded.
+        """
+        for pth, layer in self.iter_layers(name):
+            for region in layer.regions:
+                yield pth, region
+
+    def close(self) -> None:
+        """Wait for the prefetched files and stop the threads, the cache is kept."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,324 @@
+"""Compare two versions of an annotation file."""
+
+import json
+import math
+from collections import defaultdict
+from statistics import median
+from typing import TYPE_CHECKING, Any, Optional
+
+from .Layer import Layer
+from .Region import Region
+
+if TYPE_CHECKING:
+    from .HaloXML import HaloXML
+
+MAX_CELLS = 64  # larger boxes are compared to all boxes instead of put in the grid
+
+
+class AnnotationDiff:
+    """
+    The differences between an old and a new version of a HaloXML.
+
+    Regions are identified by the name of their layer in the new version (or the
+    old version if the layer was removed) and their index in the regions of that
+    layer. Layers with the same name are compared as one layer, the index of a
+    region is then in the regions of all those layers, in the order of the file.
+
+    Attributes
+    ----------
+    layers_added : list[str]
+        Names of the layers that are only in the new version.
+    layers_removed : list[str]
+        Names of the layers that are only in the old version.
+    layers_renamed : list[tuple[str, str]]
+        Old and new name of layers that were renamed.
+    layers_recolored : list[tuple[str, str, str]]
+        Name, old and new LineColor of layers that changed color.
+    regions_added : list[tuple[str, int]]
+        Layer and index in the new version of added regions.
+    regions_removed : list[tuple[str, int]]
+        Layer and index in the old version of removed regions.
+    regions_modified : list[tuple[str, int, int]]
+        Layer and index in the old and new version of regions that were edited.
+    regions_unchanged : int
+        The number of regions that are the same in both versions.
+    """
+
+    def __init__(self) -> None:  # numpydoc ignore=GL08
+        self.layers_added = []  # type: list[str]
+        self.layers_removed = []  # type: list[str]
+        self.layers_renamed = []  # type: list[tuple[str, str]]
+        self.layers_recolored = []  # type: list[tuple[str, str, str]]
+        self.regions_added = []  # type: list[tuple[str, int]]
+        self.regions_removed = []  # type: list[tuple[str, int]]
+        self.regions_modified = []  # type: list[tuple[str, int, int]]
+        self.regions_unchanged = 0  # type: int
+
+    def __bool__(self) -> bool:  # numpydoc ignore=GL08
+        return any(
+            [
+                self.layers_added,
+                self.layers_removed,
+                self.layers_renamed,
+                self.layers_recolored,
+                self.regions_added,
+                self.regions_removed,
+                self.regions_modified,
+            ]
+        )
+
+    def __str__(self) -> str:  # numpydoc ignore=GL08
+        lines = [f"+ layer {x}" for x in self.layers_added]
+        lines += [f"- layer {x}" for x in self.layers_removed]
+        lines += [f"~ layer {x} renamed to {y}" for x, y in self.layers_renamed]
+        lines += [
+            f"~ layer {x} color {c1} -> {c2}" for x, c1, c2 in self.layers_recolored
+        ]
+        lines += [f"+ region {i} in {x}" for x, i in self.regions_added]
+        lines += [f"- region {i} in {x}" for x, i in self.regions_removed]
+        lines += [f"~ region {i} -> {j} in {x}" for x, i, j in self.regions_modified]
+        lines.append(f"{self.regions_unchanged} regions unchanged")
+        return "\n".join(lines)
+
+    def todict(self) -> dict[str, Any]:
+        """
+        Create a dictonary with the differences.
+
+        Returns
+        -------
+        dict[str, Any]
+            A dictonary with an entry for each attribute.
+        """
+        return dict(vars(self))
+
+    def tojson(self) -> str:
+        """
+        JSON representation of the differences.
+
+        Returns
+        -------
+        str
+            A jsonstring representation of the differences.
+        """
+        return json.dumps(self.todict(), sort_keys=True)
+
+
+def diff(old: "HaloXML", new: "HaloXML", min_overlap: float = 0.5) -> AnnotationDiff:
+    """
+    Find the differences between two versions of a HaloXML.
+
+    Layers are matched by name, layers with the same name are combined. Layers
+    that only exist in one version are matched when most of their regions are the
+    same, and reported as renamed. Regions are
+    matched by their fingerprint, then by their geometry hash (the comments or
+    flags changed), and the remaining regions by the overlap of their bounding
+    boxes (the region was moved or edited). All matching is done with hash tables
+    and a grid index, so the time scales about linearly with the number of regions.
+
+    Parameters
+    ----------
+    old : HaloXML
+        The old version.
+    new : HaloXML
+        The new version.
+    min_overlap : float
+        Minimal intersection over union of the bounding boxes for a region that
+        was not matched by hash to be reported as modified instead of removed and added.
+
+    Returns
+    -------
+    AnnotationDiff
+        The differences.
+
+    See Also
+    --------
+    Region.fingerprint : The hash that identifies unchanged regions.
+    """
+    result = AnnotationDiff()
+    oldlayers = _combine(old.layers)
+    newlayers = _combine(new.layers)
+    oldcolors = _colors(old.layers)
+    newcolors = _colors(new.layers)
+    pairs = [(oldlayers[x], newlayers[x]) for x in oldlayers if x in newlayers]
+    removed = [oldlayers[x] for x in oldlayers if x not in newlayers]
+    added = [newlayers[x] for x in newlayers if x not in oldlayers]
+    for oldlayer, newlayer in _match_renamed(removed, added):
+        result.layers_renamed.append((oldlayer.name, newlayer.name))
+        pairs.append((oldlayer, newlayer))
+        removed.remove(oldlayer)
+        added.remove(newlayer)
+    result.layers_removed = [x.name for x in removed]
+    result.layers_added = [x.name for x in added]
+    for layer in removed:
+        result.regions_removed += [(layer.name, i) for i in range(len(layer.regions))]
+    for layer in added:
+        result.regions_added += [(layer.name, i) for i in range(len(layer.regions))]
+    for oldlayer, newlayer in pairs:
+        # layers with the same name are compared in order if none was removed
+        colors = oldcolors[oldlayer.name], newcolors[newlayer.name]
+        if len(colors[0]) == len(colors[1]):
+            for c1, c2 in zip(*colors):
+                if c1 != c2:
+                    result.layers_recolored.append((newlayer.name, c1, c2))
+        _diff_regions(oldlayer, newlayer, min_overlap, result)
+    return result
+
+
+def _combine(layers: list[Layer]) -> dict[str, Layer]:  # numpydoc ignore=GL08
+    # one layer per name with the regions of all layers with that name
+    combined = {}  # type: dict[str, Layer]
+    for layer in layers:
+        if layer.name not in combined:
+            combined[layer.name] = Layer()
+            combined[layer.name].fromdict(layer.todict())
+        combined[layer.name].regions.extend(layer.regions)
+    return combined
+
+
+def _colors(layers: list[Layer]) -> dict[str, list[str]]:  # numpydoc ignore=GL08
+    colors = defaultdict(list)  # type: defaultdict[str, list[str]]
+    for layer in layers:
+        colors[layer.name].append(layer.linecolor.getlinecolor())
+    return colors
+
+
+def _match_renamed(
+    removed: list[Layer], added: list[Layer]
+) -> list[tuple[Layer, Layer]]:  # numpydoc ignore=GL08
+    if not removed or not added:
+        return []
+    owner = {}  # type: dict[bytes, int]
+    for j, layer in enumerate(added):
+        for region in layer.regions:
+            owner.setdefault(region.geometry_hash(), j)
+    matches = []
+    used = set()  # type: set[int]
+    for layer in removed:
+        counts = defaultdict(int)  # type: defaultdict[int, int]
+        for region in layer.regions:
+            owned = owner.get(region.geometry_hash())
+            if owned is not None and owned not in used:
+                counts[owned] += 1
+        if not counts:
+            continue
+        j = max(counts, key=lambda k: counts[k])
+        if 2 * counts[j] > max(len(layer.regions), len(added[j].regions)):
+            used.add(j)
+            matches.append((layer, added[j]))
+    return matches
+
+
+def _diff_regions(
+    oldlayer: Layer, newlayer: Layer, min_overlap: float, result: AnnotationDiff
+) -> None:  # numpydoc ignore=GL08
+    # exact matches on the fingerprint
+    new_fp = defaultdict(list)  # type: defaultdict[bytes, list[int]]
+    for j, region in enumerate(newlayer.regions):
+        new_fp[region.fingerprint()].append(j)
+    unmatched_old = []
+    for i, region in enumerate(oldlayer.regions):
+        candidates = new_fp.get(region.fingerprint())
+        if candidates:
+            candidates.pop()
+            result.regions_unchanged += 1
+        else:
+            unmatched_old.append(i)
+    unmatched_new = sorted(j for js in new_fp.values() for j in js)
+    # same geometry, different comments or flags
+    new_geom = defaultdict(list)  # type: defaultdict[bytes, list[int]]
+    for j in unmatched_new:
+        new_geom[newlayer.regions[j].geometry_hash()].append(j)
+    remaining_old = []
+    for i in unmatched_old:
+        candidates = new_geom.get(oldlayer.regions[i].geometry_hash())
+        if candidates:
+            result.regions_modified.append((newlayer.name, i, candidates.pop()))
+        else:
+            remaining_old.append(i)
+    remaining_new = sorted(j for js in new_geom.values() for j in js)
+    # moved or edited shapes, matched on the overlap of their bounding boxes
+    matched = _match_spatial(
+        [oldlayer.regions[i] for i in remaining_old],
+        [newlayer.regions[j] for j in remaining_new],
+        min_overlap,
+    )
+    used = set()
+    for a, b in matched:
+        result.regions_modified.append(
+            (newlayer.name, remaining_old[a], remaining_new[b])
+        )
+        used.add(b)
+    matched_old = {a for a, _ in matched}
+    result.regions_removed += [
+        (newlayer.name, i) for a, i in enumerate(remaining_old) if a not in matched_old
+    ]
+    result.regions_added += [
+        (newlayer.name, j) for b, j in enumerate(remaining_new) if b not in used
+    ]
+
+
+def _match_spatial(
+    old: list[Region], new: list[Region], min_overlap: float
+) -> list[tuple[int, int]]:  # numpydoc ignore=GL08
+    if not old or not new:
+        return []
+    oldboxes = [x.bounds() for x in old]
+    newboxes = [x.bounds() for x in new]
+    cellsize = max(median(max(b[2] - b[0], b[3] - b[1]) for b in newboxes), 1.0)
+    if math.isnan(cellsize):
+        cellsize = 1.0
+    grid = defaultdict(list)  # type: defaultdict[tuple[int, int], list[int]]
+    large = []  # type: list[int]
+    for j, box in enumerate(newboxes):
+        cells = _cells(box, cellsize)
+        if cells is None:
+            large.append(j)
+        for cell in cells or []:
+            grid[cell].append(j)
+    matches = []
+    used = set()  # type: set[int]
+    for i, box in enumerate(oldboxes):
+        cells = _cells(box, cellsize)
+        if cells is None:
+            candidates = set(range(len(new)))
+        else:
+            candidates = {j for cell in cells for j in grid.get(cell, [])}
+            candidates.update(large)
+        best, bestoverlap = -1, min_overlap
+        for j in sorted(candidates):
+            if j in used or old[i].type != new[j].type:
+                continue
+            overlap = _iou(box, newboxes[j])
+            if overlap >= bestoverlap:
+                best, bestoverlap = j, overlap
+        if best >= 0:
+            used.add(best)
+            matches.append((i, best))
+    return matches
+
+
+def _cells(
+    box: tuple[float, float, float, float], cellsize: float
+) -> Optional[list[tuple[int, int]]]:  # numpydoc ignore=GL08
+    # the cells of the grid under a box, None if there are more than MAX_CELLS
+    if any(math.isnan(x) for x in box):
+        return []
+    x0, y0 = math.floor(box[0] / cellsize), math.floor(box[1] / cellsize)
+    x1, y1 = math.floor(box[2] / cellsize), math.floor(box[3] / cellsize)
+    if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_CELLS:
+        return None
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def _iou(
+    a: tuple[float, float, float, float], b: tuple[float, float, float, float]
+) -> float:  # numpydoc ignore=GL08
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w < 0 or h < 0:
+        return 0.0
+    intersection = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    if union <= 0:
+        return 1.0 if a == b else 0.0  # points or straight lines
+    return intersection / union
@@ -0,0 +1,99 @@
+"""Merge overlapping and touching regions."""
+
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .Region import Region
+from .shapely import import_shapely, region_to_shapely, regions_from_shapely
+
+
+def dissolve_regions(regions: list[Region], workers: int = 1) -> list[Region]:
+    """
+    Merge the regions with an area that overlap or touch into as few regions as possible.
+
+    The bounding boxes of all regions go into a spatial index to find the pairs
+    that may interact. Only the regions in such a pair are converted to shapely to
+    test if they really intersect. The groups of connected regions are found on the
+    resulting graph and each group is merged with a single union. Regions that do
+    not interact with any other region are kept as they are, without copying their
+    xml. A merged region gets the comments of all regions in its group.
+
+    Parameters
+    ----------
+    regions : list[Region]
+        The regions to dissolve. Negative regions should be matched first.
+    workers : int
+        Number of threads to merge the groups with. Shapely releases the GIL,
+        so the groups are merged in parallel.
+
+    Returns
+    -------
+    list[Region]
+        The dissolved regions, followed by the regions without an area and the
+        negative regions that were not matched.
+    """
+    area = [x for x in regions if x.has_area() and not x.isnegative]
+    rest = [x for x in regions if not x.has_area() or x.isnegative]
+    if len(area) < 2:
+        return area + rest
+    shapely = import_shapely("dissolve regions")
+    vertices = [x.getvertices() for x in area]
+    coords = np.array([v for x in vertices for v in x], dtype=np.float64)
+    starts = np.cumsum([0] + [len(x) for x in vertices[:-1]])
+    bounds = np.hstack(
+        [
+            np.minimum.reduceat(coords, starts, axis=0),
+            np.maximum.reduceat(coords, starts, axis=0),
+        ]
+    )
+    boxes = shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+    a, b = shapely.STRtree(boxes).query(boxes, predicate="intersects")
+    a, b = a[a < b], b[a < b]
+    geometries = np.empty(len(area), dtype=object)
+    for i in np.unique(np.concatenate([a, b])).tolist():
+        geometries[i] = region_to_shapely(area[i], make_valid=True)
+    touching = shapely.intersects(geometries[a], geometries[b])
+    labels = _components(len(area), a[touching], b[touching])
+    order = np.argsort(labels, kind="stable")
+    groups = np.split(order, np.flatnonzero(np.diff(labels[order])) + 1)
+    groups.sort(key=lambda x: int(x[0]))  # keep the order of the first region
+    merge = [x for x in groups if len(x) > 1]
+
+    def union(group: NDArray[np.int64]) -> Any:  # numpydoc ignore=GL08
+        return shapely.union_all(geometries[group])
+
+    if workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            merged = list(pool.map(union, merge))
+    else:
+        merged = [union(x) for x in merge]
+    unions = dict(zip([int(x[0]) for x in merge], merged))
+    result = []
+    for group in groups:
+        first = int(group[0])
+        if len(group) == 1:
+            result.append(area[first])
+            continue
+        comments = [c for i in group.tolist() for c in area[i].comments]
+        result.extend(regions_from_shapely(unions[first], comments))
+    return result + rest
+
+
+def _components(
+    n: int, a: NDArray[np.int64], b: NDArray[np.int64]
+) -> NDArray[np.int64]:  # numpydoc ignore=GL08
+    # label propagation with pointer jumping, gives each node the smallest index
+    # of its connected component
+    labels = np.arange(n, dtype=np.int64)
+    while True:
+        old = labels.copy()
+        np.minimum.at(labels, a, labels[b])
+        np.minimum.at(labels, b, labels[a])
+        labels = labels[labels]
+        if np.array_equal(labels, old):
+            return labels
+
@@ -0,0 +1,184 @@
+"""Signed distance from points to the boundaries of regions."""
+
+import math
+from typing import Optional
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from pyhaloxmlc import nearestsegments
+
+from .flat import FlatRegions
+
+
+class SegmentIndex:
+    """
+    The edges of the outlines and holes of regions in a uniform grid.
+
+    Every edge is stored in each cell its bounding box overlaps. The edges are
+    oriented so the inside of their region is on the left, whatever the orientation
+    of the rings in the file.
+
+    Parameters
+    ----------
+    flat : FlatRegions
+        The regions, with the holes matched. Regions without an area are left out.
+    cell_size : float | None
+        Width and height of a cell, by default from the length of the edges and
+        their extent.
+
+    Attributes
+    ----------
+    segments : NDArray[np.float64]
+        Array of shape (n, 4) with x0, y0, x1 and y1 of each edge.
+    region : NDArray[np.int64]
+        Index in flat of the region of each edge.
+    origin : tuple[float, float]
+        Coordinates of the top left corner of the grid.
+    cell_size : float
+        Width and height of a cell.
+    shape : tuple[int, int]
+        Number of rows and columns of the grid.
+    cell_offsets : NDArray[np.int64]
+        Index in cell_segments of the first edge of each cell, row by row, followed
+        by the number of entries.
+    cell_segments : NDArray[np.int64]
+        The edges of each cell.
+    """
+
+    def __init__(
+        self, flat: FlatRegions, cell_size: Optional[float] = None
+    ) -> None:  # numpydoc ignore=GL08
+        x = flat.vertices[:, 0]
+        y = flat.vertices[:, 1]
+        starts = flat.ring_offsets[:-1]
+        ring_region = flat.ring_region()
+        closed = flat.hasarea()[ring_region]
+        # the next vertex along the ring, wrapping around at the end of each ring
+        nxt = np.arange(1, len(x) + 1)
+        nxt[flat.ring_offsets[1:] - 1] = starts
+        if len(x):
+            cross = np.add.reduceat(x * y[nxt] - x[nxt] * y, starts)
+        else:
+            cross = np.empty(0, dtype=np.float64)
+        outline = np.zeros(len(starts), dtype=np.bool_)
+        outline[flat.region_offsets[:-1]] = True
+        # outlines counter clockwise and holes clockwise, so the inside is on the left
+        reverse = (cross < 0) == outline
+        vertex_ring = np.repeat(np.arange(len(starts)), np.diff(flat.ring_offsets))
+        a = np.column_stack([x, y])
+        b = np.column_stack([x[nxt], y[nxt]])
+        flip = reverse[vertex_ring]
+        a[flip], b[flip] = b[flip], a[flip]
+        keep = closed[vertex_ring] & np.any(a != b, axis=1)
+        self.segments = np.ascontiguousarray(np.hstack([a, b])[keep])  # type: NDArray[np.float64]
+        self.region = ring_region[vertex_ring][keep]  # type: NDArray[np.int64]
+        self.origin = (0.0, 0.0)  # type: tuple[float, float]
+        self.cell_size = 1.0  # type: float
+        self.shape = (0, 0)  # type: tuple[int, int]
+        self.cell_offsets = np.zeros(1, dtype=np.int64)  # type: NDArray[np.int64]
+        self.cell_segments = np.empty(0, dtype=np.int64)  # type: NDArray[np.int64]
+        if len(self.segments) == 0:
+            return
+        low = np.minimum(self.segments[:, :2], self.segments[:, 2:])
+        high = np.maximum(self.segments[:, :2], self.segments[:, 2:])
+        xmin, ymin = np.min(low, axis=0)
+        xmax, ymax = np.max(high, axis=0)
+        if cell_size is None:
+            length = float(np.mean(np.max(high - low, axis=1)))
+            extent = (xmax - xmin + 1) * (ymax - ymin + 1)
+            cell_size = max(2 * length, math.sqrt(extent / len(self.segments)), 1.0)
+        self.cell_size = float(cell_size)
+        self.origin = (float(xmin), float(ymin))
+        first = np.floor((low - self.origin) / self.cell_size).astype(np.int64)
+        last = np.floor((high - self.origin) / self.cell_size).astype(np.int64)
+        self.shape = (int(np.max(last[:, 1])) + 1, int(np.max(last[:, 0])) + 1)
+        columns = last[:, 0] - first[:, 0] + 1
+        count = columns * (last[:, 1] - first[:, 1] + 1)
+        segment = np.repeat(np.arange(len(count), dtype=np.int64), count)
+        local = np.arange(len(segment)) - np.repeat(np.cumsum(count) - count, count)
+        column = first[segment, 0] + local % columns[segment]
+        row = first[segment, 1] + local // columns[segment]
+        cell = row * self.shape[1] + column
+        order = np.argsort(cell, kind="stable")
+        self.cell_segments = segment[order]
+        ncells = self.shape[0] * self.shape[1]
+        self.cell_offsets = np.zeros(ncells + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell, minlength=ncells), out=self.cell_offsets[1:])
+
+    def __len__(self) -> int:  # numpydoc ignore=GL08
+        return len(self.segments)
+
+    def query(
+        self, points: ArrayLike, max_distance: float = math.inf
+    ) -> tuple[NDArray[np.float64], NDArray[np.int64]]:
+        """
+        Signed distance from each point to the nearest edge.
+
+        Parameters
+        ----------
+        points : ArrayLike
+            Array of shape (n, 2) with the x and y coordinates of the points.
+        max_distance : float
+            Edges farther away are not searched.
+
+        Returns
+        -------
+        tuple[NDArray[np.float64], NDArray[np.int64]]
+            The distance of each point, negative inside a region, and the index of
+            the nearest edge. Points without an edge within max_distance get -inf
+            inside a region and inf outside, and edge -1.
+        """
+        points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 2)
+        distance = np.empty(len(points), dtype=np.float64)
+        nearest = np.empty(len(points), dtype=np.int64)
+        params = np.array(
+            [*self.origin, self.cell_size, self.shape[1], self.shape[0], max_distance],
+            dtype=np.float64,
+        )
+        nearestsegments(
+            points,
+            self.segments,
+            self.cell_offsets,
+            self.cell_segments,
+            params,
+            distance,
+            nearest,
+        )
+        return distance, nearest
+
+
+def region_distance(
+    flat: FlatRegions, points: ArrayLike, max_distance: float = math.inf
+) -> tuple[NDArray[np.float64], NDArray[np.int64]]:
+    """
+    Signed distance from points to the nearest boundary of the regions.
+
+    The outlines and holes are split into edges that go into a grid index. For
+    each point the native kernel searches the cells around it, nearest first, and
+    stops as soon as no closer edge can exist. The side of the nearest edge gives
+    the sign. Points inside a hole are outside the region. Regions of the same
+    layer should not overlap, otherwise an edge inside another region counts as a
+    boundary too. Rulers and pins are left out.
+
+    Parameters
+    ----------
+    flat : FlatRegions
+        The regions, with the holes matched.
+    points : ArrayLike
+        Array of shape (n, 2) with the x and y coordinates of the points.
+    max_distance : float
+        Edges farther away are not searched, which bounds the time per point.
+
+    Returns
+    -------
+    tuple[NDArray[np.float64], NDArray[np.int64]]
+        The distance of each point, negative inside and positive outside, and the
+        index in flat of the region of the nearest boundary. Points without a
+        boundary within max_distance get -inf or inf and region -1.
+    """
+    index = SegmentIndex(flat)
+    distance, nearest = index.query(points, max_distance)
+    region = np.full(len(nearest), -1, dtype=np.int64)
+    region[nearest >= 0] = index.region[nearest[nearest >= 0]]
+    return distance, region
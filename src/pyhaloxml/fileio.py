@@ -0,0 +1,134 @@
+"""Open plain and compressed .annotations files."""
+
+import gzip
+import lzma
+import os
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, Union, cast
+
+SUFFIXES = {".gz": "gzip", ".xz": "xz", ".zst": "zstd"}
+MAGIC = {b"\x1f\x8b": "gzip", b"\xfd7zXZ\x00": "xz", b"(\xb5/\xfd": "zstd"}
+
+
+def detect_compression(pth: Union[str, os.PathLike[Any]]) -> Optional[str]:
+    """
+    Detect the compression of a file from its first bytes.
+
+    Parameters
+    ----------
+    pth : str | os.PathLike[Any]
+        Path to the file.
+
+    Returns
+    -------
+    str | None
+        'gzip', 'xz', 'zstd' or None if the file is not compressed.
+    """
+    with open(Path(pth), "rb") as fp:
+        start = fp.read(6)
+    for magic, compression in MAGIC.items():
+        if start.startswith(magic):
+            return compression
+    return None
+
+
+def compression_from_suffix(pth: Union[str, os.PathLike[Any]]) -> Optional[str]:
+    """
+    The compression that belongs to the suffix of a path.
+
+    Parameters
+    ----------
+    pth : str | os.PathLike[Any]
+        Path to the file.
+
+    Returns
+    -------
+    str | None
+        'gzip' for .gz, 'xz' for .xz, 'zstd' for .zst and None otherwise.
+    """
+    return SUFFIXES.get(Path(pth).suffix.lower())
+
+
+def suffix_from_compression(compression: str) -> str:
+    """
+    The file suffix that belongs to a compression.
+
+    Parameters
+    ----------
+    compression : str
+        'gzip', 'xz' or 'zstd'.
+
+    Returns
+    -------
+    str
+        The suffix, including the dot.
+    """
+    for suffix, name in SUFFIXES.items():
+        if name == compression:
+            return suffix
+    raise KeyError(f"Invalid compression: {compression}")
+
+
+def open_compressed(
+    pth: Union[str, os.PathLike[Any]], mode: str, compression: str
+) -> BinaryIO:
+    """
+    Open a compressed file as a binary stream that (de)compresses on the fly.
+
+    Zstandard uses compression.zstd from the standard library on python 3.14 and
+    newer, and the zstandard package on older versions.
+
+    Parameters
+    ----------
+    pth : str | os.PathLike[Any]
+        Path to the file.
+    mode : str
+        'rb' = read.
+        'wb' = write.
+    compression : str
+        'gzip', 'xz' or 'zstd'.
+
+    Returns
+    -------
+    BinaryIO
+        The opened stream.
+    """
+    if mode not in ["rb", "wb"]:
+        raise KeyError(f"Invalid mode: {mode}")
+    pth = Path(pth)
+    if compression == "gzip":
+        return cast(BinaryIO, gzip.open(pth, mode))
+    if compression == "xz":
+        return cast(BinaryIO, lzma.open(pth, mode))
+    if compression == "zstd":
+        try:
+            from compression import zstd
+        except ImportError:
+            try:
+                import zstandard as zstd
+            except ImportError:
+                raise ImportError("Zstandard is not installed. Cannot open .zst files.")
+        return cast(BinaryIO, zstd.open(pth, mode))
+    raise KeyError(f"Invalid compression: {compression}")
+
+
+def find_annotations(directory: Union[str, os.PathLike[Any]]) -> list[Path]:
+    """
+    The .annotations files in a directory and its subdirectories.
+
+    Parameters
+    ----------
+    directory : str | os.PathLike[Any]
+        The directory to search.
+
+    Returns
+    -------
+    list[Path]
+        The sorted paths, including compressed files.
+    """
+    paths = []
+    for pth in Path(directory).rglob("*.annotations*"):
+        suffix = pth.suffix if pth.suffix != ".annotations" else ""
+        if pth.is_file() and (not suffix or suffix in SUFFIXES):
+            paths.append(pth)
+    return sorted(paths)
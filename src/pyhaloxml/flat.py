@@ -0,0 +1,194 @@
+"""Flat array representation of the regions in a list of layers."""
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .misc import RegionType
+
+if TYPE_CHECKING:
+    from .Layer import Layer
+    from .Region import Region  # noqa: F401
+
+AREA_TYPES = (RegionType.Rectangle, RegionType.Ellipse, RegionType.Polygon)
+
+
+class FlatRegions:
+    """
+    The vertices of many regions stored in a few contiguous arrays.
+
+    Each region consists of one or more rings. The first ring of a region is the
+    outline, the other rings are its holes. This layout allows computations over
+    all regions in one vectorised pass instead of a python loop per region.
+
+    Attributes
+    ----------
+    vertices : NDArray[np.float64]
+        Array of shape (n, 2) with the x and y coordinates of all vertices.
+    ring_offsets : NDArray[np.int64]
+        Index of the first vertex of each ring, followed by the number of vertices.
+    region_offsets : NDArray[np.int64]
+        Index of the first ring of each region, followed by the number of rings.
+    types : NDArray[np.int8]
+        The RegionType of each region.
+    layer_index : NDArray[np.int32]
+        Index in layers of the layer of each region.
+    regions : list[Region]
+        The regions in the order of the arrays.
+    layers : list[Layer]
+        The layers the regions came from.
+    """
+
+    def __init__(self) -> None:  # numpydoc ignore=GL08
+        self.vertices = np.empty((0, 2), dtype=np.float64)  # type: NDArray[np.float64]
+        self.ring_offsets = np.zeros(1, dtype=np.int64)  # type: NDArray[np.int64]
+        self.region_offsets = np.zeros(1, dtype=np.int64)  # type: NDArray[np.int64]
+        self.types = np.empty(0, dtype=np.int8)  # type: NDArray[np.int8]
+        self.layer_index = np.empty(0, dtype=np.int32)  # type: NDArray[np.int32]
+        self.regions = []  # type: list[Region]
+        self.layers = []  # type: list[Layer]
+
+    def __len__(self) -> int:  # numpydoc ignore=GL08
+        return len(self.types)
+
+    def ring_region(self) -> NDArray[np.int64]:
+        """
+        Index of the region each ring belongs to.
+
+        Returns
+        -------
+        NDArray[np.int64]
+            Region index for each ring.
+        """
+        return np.repeat(
+            np.arange(len(self.types), dtype=np.int64), np.diff(self.region_offsets)
+        )
+
+    def vertex_region(self) -> NDArray[np.int64]:
+        """
+        Index of the region each vertex belongs to.
+
+        Returns
+        -------
+        NDArray[np.int64]
+            Region index for each vertex.
+        """
+        return np.repeat(
+            np.arange(len(self.types), dtype=np.int64), self.region_vertexcount()
+        )
+
+    def region_vertexcount(self) -> NDArray[np.int64]:
+        """
+        Number of vertices of each region, including the vertices of its holes.
+
+        Returns
+        -------
+        NDArray[np.int64]
+            Vertex count for each region.
+        """
+        return np.diff(self.ring_offsets[self.region_offsets])
+
+    def bounds(self) -> NDArray[np.float64]:
+        """
+        Bounding box of each region.
+
+        Returns
+        -------
+        NDArray[np.float64]
+            Array of shape (n, 4) with minimum x, minimum y, maximum x and maximum y.
+        """
+        if len(self.vertices) == 0:
+            return np.empty((0, 4), dtype=np.float64)
+        starts = self.ring_offsets[self.region_offsets[:-1]]
+        return np.hstack(
+            [
+                np.minimum.reduceat(self.vertices, starts, axis=0),
+                np.maximum.reduceat(self.vertices, starts, axis=0),
+            ]
+        )
+
+    def hasarea(self) -> NDArray[np.bool_]:
+        """
+        True for the regions that have an area.
+
+        Returns
+        -------
+        NDArray[np.bool_]
+            Boolean mask over the regions.
+
+        See Also
+        --------
+        Region.has_area : The same check for a single region.
+        """
+        return np.isin(self.types, AREA_TYPES)
+
+
+def gather_index(
+    offsets: NDArray[np.int64], selection: NDArray[np.int64]
+) -> tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """
+    Index of the items of selected groups in an array with group offsets.
+
+    Parameters
+    ----------
+    offsets : NDArray[np.int64]
+        Index of the first item of each group, followed by the number of items.
+    selection : NDArray[np.int64]
+        The groups to select, in the order of the result.
+
+    Returns
+    -------
+    tuple[NDArray[np.int64], NDArray[np.int64]]
+        The index of the items of the selected groups and their new offsets.
+    """
+    counts = np.diff(offsets)[selection]
+    newoffsets = np.zeros(len(selection) + 1, dtype=np.int64)
+    np.cumsum(counts, out=newoffsets[1:])
+    index = np.repeat(offsets[:-1][selection] - newoffsets[:-1], counts)
+    return index + np.arange(len(index)), newoffsets
+
+
+def flatten_layers(layers: "list[Layer]") -> FlatRegions:
+    """
+    Gather the vertices of all regions in the layers into a FlatRegions.
+
+    Matched holes are stored as extra rings of their region. Unmatched negative
+    regions are stored as regions of their own.
+
+    Parameters
+    ----------
+    layers : list[Layer]
+        The layers to flatten.
+
+    Returns
+    -------
+    FlatRegions
+        The flat representation of all regions in the layers.
+    """
+    flat = FlatRegions()
+    flat.layers = list(layers)
+    coords = []  # type: list[tuple[float, float]]
+    ringsizes = []  # type: list[int]
+    ringcounts = []  # type: list[int]
+    types = []  # type: list[int]
+    layer_index = []  # type: list[int]
+    for i, layer in enumerate(flat.layers):
+        for region in layer.regions:
+            flat.regions.append(region)
+            types.append(region.type)
+            layer_index.append(i)
+            ringcounts.append(1 + len(region.holes))
+            rings = [region.getvertices()] + [x.getvertices() for x in region.holes]
+            for ring in rings:
+                coords.extend(ring)
+                ringsizes.append(len(ring))
+    if coords:
+        flat.vertices = np.array(coords, dtype=np.float64).reshape(-1, 2)
+    flat.ring_offsets = np.zeros(len(ringsizes) + 1, dtype=np.int64)
+    np.cumsum(ringsizes, out=flat.ring_offsets[1:])
+    flat.region_offsets = np.zeros(len(ringcounts) + 1, dtype=np.int64)
+    np.cumsum(ringcounts, out=flat.region_offsets[1:])
+    flat.types = np.array(types, dtype=np.int8)
+    flat.layer_index = np.array(layer_index, dtype=np.int32)
+    return flat
@@ -0,0 +1,323 @@
+"""Byte offset index of the layers in an .annotations file."""
+
+import json
+import mmap
+import os
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
+
+from lxml import etree
+
+from .fileio import detect_compression, open_compressed
+
+SIDECAR = ".index.json"
+
+_ROOT = re.compile(rb"<Annotations\b(?:[^>\"']|\"[^\"]*\"|'[^']*')*>")
+_ANNOTATION = re.compile(rb"<Annotation\b(?:[^>\"']|\"[^\"]*\"|'[^']*')*>")
+_END = re.compile(rb"</Annotation\s*>")
+_REGION = re.compile(rb"<Region[\s/>]")
+
+
+class LayerInfo:
+    """
+    Where a layer is in a file, and what is known about it without parsing it.
+
+    Attributes
+    ----------
+    attrib : dict[str, str]
+        The attributes of the Annotation element.
+    regions : int
+        The number of regions, including the negative regions.
+    start : int
+        Byte offset of the Annotation element in the uncompressed file.
+    end : int
+        Byte offset just after the end of the Annotation element.
+    """
+
+    def __init__(self) -> None:  # numpydoc ignore=GL08
+        self.attrib = {}  # type: dict[str, str]
+        self.regions = 0  # type: int
+        self.start = 0  # type: int
+        self.end = 0  # type: int
+
+    def __str__(self) -> str:  # numpydoc ignore=GL08
+        return f"{self.name}: {self.regions} regions"
+
+    @property
+    def name(self) -> str:
+        """
+        The name of the layer.
+
+        Returns
+        -------
+        str
+            The Name attribute, or an empty string if it has none.
+        """
+        return self.attrib.get("Name", "")
+
+    def todict(self) -> dict[str, Any]:
+        """
+        Create a dictonary with the attributes.
+
+        Returns
+        -------
+        dict[str, Any]
+            A dictonary with an entry for each attribute.
+        """
+        return {
+            "attrib": self.attrib,
+            "regions": self.regions,
+            "start": self.start,
+            "end": self.end,
+        }
+
+
+class AnnotationsIndex:
+    """
+    The byte offsets of the layers of an .annotations file.
+
+    Offsets are in the uncompressed content, so for a compressed file they only
+    save the construction of the tree, not the decompression.
+
+    Attributes
+    ----------
+    layers : list[LayerInfo]
+        The layers in the order of the file.
+    header : int
+        Byte offset just after the start tag of the Annotations element.
+    size : int
+        Size of the file on disk when the index was made.
+    mtime_ns : int
+        Modification time of the file when the index was made.
+    """
+
+    def __init__(self) -> None:  # numpydoc ignore=GL08
+        self.layers = []  # type: list[LayerInfo]
+        self.header = 0  # type: int
+        self.size = 0  # type: int
+        self.mtime_ns = 0  # type: int
+
+    def __len__(self) -> int:  # numpydoc ignore=GL08
+        return len(self.layers)
+
+    def todict(self) -> dict[str, Any]:
+        """
+        Create a dictonary with the attributes.
+
+        Returns
+        -------
+        dict[str, Any]
+            A dictonary with an entry for each attribute.
+        """
+        return {
+            "header": self.header,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "layers": [x.todict() for x in self.layers],
+        }
+
+    def fromdict(self, dinfo: dict[str, Any]) -> None:
+        """
+        Set the attributes from a dictonary made by todict.
+
+        Parameters
+        ----------
+        dinfo : dict[str, Any]
+            A dictonary with an entry for each attribute.
+        """
+        self.header = dinfo["header"]
+        self.size = dinfo["size"]
+        self.mtime_ns = dinfo["mtime_ns"]
+        self.layers = []
+        for entry in dinfo["layers"]:
+            info = LayerInfo()
+            info.attrib = dict(entry["attrib"])
+            info.regions = entry["regions"]
+            info.start = entry["start"]
+            info.end = entry["end"]
+            self.layers.append(info)
+
+    def matches(self, pth: Union[str, os.PathLike[Any]]) -> bool:
+        """
+        Check if the index still belongs to the file.
+
+        Parameters
+        ----------
+        pth : str | os.PathLike[Any]
+            Path to the .annotations file.
+
+        Returns
+        -------
+        bool
+            True if the size and modification time did not change.
+        """
+        stat = Path(pth).stat()
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def select(self, buffer: Union[bytes, mmap.mmap], layers: list[str]) -> bytes:
+        """
+        Cut the layers with the given names out of the content of the file.
+
+        Parameters
+        ----------
+        buffer : bytes | mmap.mmap
+            The uncompressed content of the file.
+        layers : list[str]
+            Names of the layers to keep.
+
+        Returns
+        -------
+        bytes
+            An .annotations document with only those layers, in the order of the file.
+        """
+        parts = [buffer[: self.header]]
+        parts += [buffer[x.start : x.end] for x in self.layers if x.name in layers]
+        parts.append(b"</Annotations>")
+        return b"".join(parts)
+
+
+def build_index(buffer: Union[bytes, mmap.mmap]) -> AnnotationsIndex:
+    """
+    Find the layers in the content of an .annotations file without parsing it.
+
+    Only the start tags of the layers are parsed, for their attributes. The
+    regions are counted by their start tags.
+
+    Parameters
+    ----------
+    buffer : bytes | mmap.mmap
+        The uncompressed content of the file.
+
+    Returns
+    -------
+    AnnotationsIndex
+        The index, without the size and modification time of the file.
+    """
+    index = AnnotationsIndex()
+    root = _ROOT.search(buffer)
+    if root is None:
+        raise ValueError("No Annotations element found")
+    if root.group().endswith(b"/>"):
+        raise ValueError("The file contains no layers")
+    index.header = root.end()
+    pos = root.end()
+    while True:
+        tag = _ANNOTATION.search(buffer, pos)
+        if tag is None:
+            break
+        info = LayerInfo()
+        info.start = tag.start()
+        if tag.group().endswith(b"/>"):
+            info.end = tag.end()
+            element = etree.fromstring(tag.group())
+        else:
+            end = _END.search(buffer, tag.end())
+            if end is None:
+                raise ValueError(f"Annotation at byte {tag.start()} is not closed")
+            info.end = end.end()
+            info.regions = sum(
+                1 for _ in _REGION.finditer(buffer, tag.end(), end.start())
+            )
+            element = etree.fromstring(tag.group()[:-1] + b"/>")
+        info.attrib = {str(k): str(v) for k, v in element.attrib.items()}
+        index.layers.append(info)
+        pos = info.end
+    return index
+
+
+@contextmanager
+def open_content(
+    pth: Union[str, os.PathLike[Any]],
+) -> Iterator[Union[bytes, mmap.mmap]]:  # numpydoc ignore=GL08
+    # the uncompressed content, memory mapped if the file is not compressed
+    compression = detect_compression(pth)
+    if compression is not None:
+        with open_compressed(pth, "rb", compression) as fp:
+            yield fp.read()
+    elif Path(pth).stat().st_size == 0:
+        yield b""
+    else:
+        with (
+            open(Path(pth), "rb") as fp,
+            mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buffer,
+        ):
+            yield buffer
+
+
+def read_index(
+    pth: Union[str, os.PathLike[Any]],
+    sidecar: bool = False,
+    buffer: Optional[Union[bytes, mmap.mmap]] = None,
+) -> AnnotationsIndex:
+    """
+    Get the index of the layers of an .annotations file.
+
+    Parameters
+    ----------
+    pth : str | os.PathLike[Any]
+        Path to the .annotations file, it can be compressed.
+    sidecar : bool
+        True - Use the index in <pth>.index.json if it still belongs to the file,
+        otherwise build it and write it there for the next time.
+        False (default) - Build the index in memory.
+    buffer : bytes | mmap.mmap | None
+        The uncompressed content of the file, if it is already open.
+
+    Returns
+    -------
+    AnnotationsIndex
+        The index of the file.
+    """
+    pth = Path(pth)
+    side = Path(pth.parent, pth.name + SIDECAR)
+    if sidecar and side.is_file():
+        index = AnnotationsIndex()
+        try:
+            with open(side, "rt") as f:
+                index.fromdict(json.load(f))
+        except (ValueError, KeyError):
+            pass  # a damaged sidecar is replaced
+        else:
+            if index.matches(pth):
+                return index
+    if buffer is None:
+        with open_content(pth) as content:
+            index = build_index(content)
+    else:
+        index = build_index(buffer)
+    stat = pth.stat()
+    index.size = stat.st_size
+    index.mtime_ns = stat.st_mtime_ns
+    if sidecar:
+        tmp = Path(side.parent, side.name + ".tmp")
+        with open(tmp, "wt") as f:
+            json.dump(index.todict(), f)
+        os.replace(tmp, side)
+    return index
+
+
+def list_layers(
+    pth: Union[str, os.PathLike[Any]], sidecar: bool = False
+) -> list[LayerInfo]:
+    """
+    List the layers of an .annotations file without loading their regions.
+
+    Parameters
+    ----------
+    pth : str | os.PathLike[Any]
+        Path to the .annotations file, it can be compressed.
+    sidecar : bool
+        True - Keep the index in <pth>.index.json for the next time.
+        False (default) - Build the index in memory.
+
+    Returns
+    -------
+    list[LayerInfo]
+        The attributes and number of regions of each layer.
+    """
+    pth = Path(pth)
+    if not pth.is_file():
+        raise FileNotFoundError(pth)
+    return read_index(pth, sidecar).layers
@@ -0,0 +1,172 @@
+"""Triangulated meshes of the regions, for viewers that render with the GPU."""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Union
+
+import numpy as np
+from numpy.typing import NDArray
+
+from pyhaloxmlc import earcutrings
+
+from .flat import FlatRegions, gather_index
+
+
+class Mesh:
+    """
+    Triangles of the regions of all layers, in flat buffers for upload to the GPU.
+
+    The triangles and the vertices are sorted by layer, so each layer can be drawn
+    with its own color from a range of the index buffer.
+
+    Attributes
+    ----------
+    layers : list[str]
+        The name of each layer.
+    colors : NDArray[np.uint8]
+        Array of shape (layers, 3) with the red, green and blue of each layer.
+    vertices : NDArray[np.float32]
+        Array of shape (n, 2) with the x and y coordinates of the vertices.
+    indices : NDArray[np.uint32]
+        Array of shape (m, 3) with the vertices of each triangle.
+    layer_offsets : NDArray[np.int64]
+        Index of the first triangle of each layer, followed by the number of triangles.
+    vertex_offsets : NDArray[np.int64]
+        Index of the first vertex of each layer, followed by the number of vertices.
+    region_offsets : NDArray[np.int64]
+        Index of the first triangle of each region, followed by the number of triangles.
+    regions : NDArray[np.int64]
+        The index in the FlatRegions of each triangulated region.
+    """
+
+    def __init__(self) -> None:  # numpydoc ignore=GL08
+        self.layers = []  # type: list[str]
+        self.colors = np.empty((0, 3), dtype=np.uint8)  # type: NDArray[np.uint8]
+        self.vertices = np.empty((0, 2), dtype=np.float32)  # type: NDArray[np.float32]
+        self.indices = np.empty((0, 3), dtype=np.uint32)  # type: NDArray[np.uint32]
+        self.layer_offsets = np.zeros(1, dtype=np.int64)  # type: NDArray[np.int64]
+        self.vertex_offsets = np.zeros(1, dtype=np.int64)  # type: NDArray[np.int64]
+        self.region_offsets = np.zeros(1, dtype=np.int64)  # type: NDArray[np.int64]
+        self.regions = np.empty(0, dtype=np.int64)  # type: NDArray[np.int64]
+
+    def __len__(self) -> int:  # numpydoc ignore=GL08
+        return len(self.indices)
+
+    def vertex_colors(self) -> NDArray[np.uint8]:
+        """
+        The color of the layer of each vertex.
+
+        Returns
+        -------
+        NDArray[np.uint8]
+            Array of shape (n, 3) with the red, green and blue of each vertex.
+        """
+        return np.repeat(self.colors, np.diff(self.vertex_offsets), axis=0)
+
+    def tobuffers(self) -> dict[str, bytes]:
+        """
+        The vertex, index and color buffers as little endian bytes.
+
+        Returns
+        -------
+        dict[str, bytes]
+            The float32 vertices, uint32 indices and uint8 colors of the layers.
+        """
+        return {
+            "vertices": self.vertices.astype("<f4").tobytes(),
+            "indices": self.indices.astype("<u4").tobytes(),
+            "colors": self.colors.tobytes(),
+        }
+
+    def save(self, directory: Union[str, os.PathLike[Any]]) -> None:
+        """
+        Write the buffers to <directory>/<name>.bin and a description to mesh.json.
+
+        Parameters
+        ----------
+        directory : str | os.PathLike[Any]
+            The directory to write the buffers to.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, data in self.tobuffers().items():
+            with open(Path(directory, name + ".bin"), "wb") as f:
+                f.write(data)
+        description = {
+            "vertices": {"dtype": "float32", "shape": list(self.vertices.shape)},
+            "indices": {"dtype": "uint32", "shape": list(self.indices.shape)},
+            "colors": {"dtype": "uint8", "shape": list(self.colors.shape)},
+            "layers": [
+                {
+                    "name": name,
+                    "color": self.colors[i].tolist(),
+                    "triangles": self.layer_offsets[i : i + 2].tolist(),
+                    "vertices": self.vertex_offsets[i : i + 2].tolist(),
+                }
+                for i, name in enumerate(self.layers)
+            ],
+        }
+        with open(Path(directory, "mesh.json"), "wt") as f:
+            json.dump(description, f)
+
+
+def triangulate(flat: FlatRegions) -> Mesh:
+    """
+    Triangulate all regions with an area, including their holes.
+
+    The rings are triangulated by ear clipping in native code. The holes are first
+    joined to the outline by a bridge to a vertex they can see, and points on a
+    z-order curve limit the search for vertices inside a candidate ear. Regions
+    that intersect themselves are cut up as well as possible. Unmatched negative
+    regions, rulers and pins are left out.
+
+    Parameters
+    ----------
+    flat : FlatRegions
+        The regions, with the holes matched.
+
+    Returns
+    -------
+    Mesh
+        The triangles, with only the vertices that they use.
+    """
+    mesh = Mesh()
+    mesh.layers = [x.name for x in flat.layers]
+    mesh.colors = np.array(
+        [x.linecolor.getrgb() for x in flat.layers], dtype=np.uint8
+    ).reshape(-1, 3)
+    negative = np.array([x.isnegative for x in flat.regions], dtype=np.bool_)
+    mesh.regions = np.flatnonzero(flat.hasarea() & ~negative)
+    rings, region_offsets = gather_index(flat.region_offsets, mesh.regions)
+    index, ring_offsets = gather_index(flat.ring_offsets, rings)
+    vertices = np.ascontiguousarray(flat.vertices[index])
+
+    # a region with v vertices and h holes has at most v + 2h - 2 triangles
+    nvertices = ring_offsets[region_offsets[1:]] - ring_offsets[region_offsets[:-1]]
+    slots = np.zeros(len(mesh.regions) + 1, dtype=np.int64)
+    np.cumsum(nvertices + 2 * np.diff(region_offsets), out=slots[1:])
+    triangles = np.empty((int(slots[-1]), 3), dtype=np.int64)
+    counts = np.zeros(len(mesh.regions), dtype=np.int64)
+    earcutrings(vertices, ring_offsets, region_offsets, slots, triangles, counts)
+    mesh.region_offsets = np.zeros(len(mesh.regions) + 1, dtype=np.int64)
+    np.cumsum(counts, out=mesh.region_offsets[1:])
+    keep = np.repeat(slots[:-1] - mesh.region_offsets[:-1], counts)
+    triangles = triangles[keep + np.arange(len(keep))]
+
+    # only the vertices that are used, which keeps them sorted by layer
+    used, inverse = np.unique(triangles, return_inverse=True)
+    mesh.vertices = vertices[used].astype(np.float32)
+    mesh.indices = inverse.reshape(-1, 3).astype(np.uint32)
+    layer = flat.layer_index[mesh.regions].astype(np.int64)
+    vertex_region = np.repeat(np.arange(len(mesh.regions)), nvertices)
+    nlayers = len(flat.layers)
+    mesh.layer_offsets = np.zeros(nlayers + 1, dtype=np.int64)
+    triangle_layer = np.repeat(layer, counts)
+    np.cumsum(
+        np.bincount(triangle_layer, minlength=nlayers), out=mesh.layer_offsets[1:]
+    )
+    mesh.vertex_offsets = np.zeros(nlayers + 1, dtype=np.int64)
+    vertex_layer = layer[vertex_region[used]]
+    np.cumsum(np.bincount(vertex_layer, minlength=nlayers), out=mesh.vertex_offsets[1:])
+    return mesh
@@ -0,0 +1,134 @@
+"""Vectorised geometric metrics of regions."""
+
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .flat import FlatRegions
+
+
+def region_metrics(flat: FlatRegions) -> dict[str, NDArray[Any]]:
+    """
+    Compute area, perimeter, centroid, bounding box and counts for all regions.
+
+    The area of a region is the area of its outline minus the area of its holes.
+    Rulers and pins have no area, their centroid is the middle of the line or the
+    point itself.
+
+    Parameters
+    ----------
+    flat : FlatRegions
+        The regions to compute the metrics of.
+
+    Returns
+    -------
+    dict[str, NDArray[Any]]
+        One array per column: layer, type, area, perimeter, centroid_x, centroid_y,
+        xmin, ymin, xmax, ymax, n_vertices, n_holes and n_comments.
+    """
+    nregions = len(flat)
+    layernames = np.array([x.name for x in flat.layers] + [""], dtype=object)
+    result = {
+        "layer": layernames[flat.layer_index],
+        "type": flat.types.copy(),
+        "n_vertices": flat.region_vertexcount(),
+        "n_holes": np.diff(flat.region_offsets) - 1,
+        "n_comments": np.fromiter(
+            (len(x.comments) for x in flat.regions), dtype=np.int64, count=nregions
+        ),
+    }  # type: dict[str, NDArray[Any]]
+    names = ["area", "perimeter", "centroid_x", "centroid_y"]
+    names += ["xmin", "ymin", "xmax", "ymax"]
+    if len(flat.vertices) == 0:
+        for name in names:
+            result[name] = np.empty(0, dtype=np.float64)
+        return result
+
+    x = flat.vertices[:, 0]
+    y = flat.vertices[:, 1]
+    starts = flat.ring_offsets[:-1]
+    ends = flat.ring_offsets[1:]
+    ring_region = flat.ring_region()
+    ring_closed = flat.hasarea()[ring_region]
+    # the next vertex along the ring, wrapping around at the end of each ring
+    nxt = np.arange(1, len(x) + 1)
+    nxt[ends - 1] = starts
+    xn = x[nxt]
+    yn = y[nxt]
+    # the closing segment does not count for rulers and pins
+    segment = np.ones(len(x), dtype=np.float64)
+    segment[ends - 1] = ring_closed
+    cross = x * yn - xn * y
+    seglen = np.hypot(xn - x, yn - y) * segment
+
+    ring_area = np.add.reduceat(cross, starts) / 2 * ring_closed
+    ring_mx = np.add.reduceat((x + xn) * cross, starts) / 6 * ring_closed
+    ring_my = np.add.reduceat((y + yn) * cross, starts) / 6 * ring_closed
+    # outlines add, holes subtract, independent of the orientation of the ring
+    sign = -np.ones(len(starts), dtype=np.float64)
+    sign[flat.region_offsets[:-1]] = 1
+    orientation = np.sign(ring_area)
+    area = np.bincount(ring_region, sign * np.abs(ring_area), nregions)
+    mx = np.bincount(ring_region, sign * orientation * ring_mx, nregions)
+    my = np.bincount(ring_region, sign * orientation * ring_my, nregions)
+
+    vertex_region = flat.vertex_region()
+    perimeter = np.bincount(vertex_region, seglen, nregions)
+    # fallbacks for regions without area: the middle of the line, or the mean vertex
+    lx = np.bincount(vertex_region, (x + xn) / 2 * seglen, nregions)
+    ly = np.bincount(vertex_region, (y + yn) / 2 * seglen, nregions)
+    count = result["n_vertices"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cx = np.where(
+            area != 0,
+            mx / area,
+            np.where(
+                perimeter != 0,
+                lx / perimeter,
+                np.bincount(vertex_region, x, nregions) / count,
+            ),
+        )
+        cy = np.where(
+            area != 0,
+            my / area,
+            np.where(
+                perimeter != 0,
+                ly / perimeter,
+                np.bincount(vertex_region, y, nregions) / count,
+            ),
+        )
+
+    region_starts = flat.ring_offsets[flat.region_offsets[:-1]]
+    result["area"] = area
+    result["perimeter"] = perimeter
+    result["centroid_x"] = cx
+    result["centroid_y"] = cy
+    result["xmin"] = np.minimum.reduceat(x, region_starts)
+    result["ymin"] = np.minimum.reduceat(y, region_starts)
+    result["xmax"] = np.maximum.reduceat(x, region_starts)
+    result["ymax"] = np.maximum.reduceat(y, region_starts)
+    return result
+
+
+def metrics_to_dataframe(metrics: dict[str, NDArray[Any]]) -> Any:
+    """
+    Convert the metrics to a pandas DataFrame.
+
+    Parameters
+    ----------
+    metrics : dict[str, NDArray[Any]]
+        The metrics as returned by region_metrics.
+
+    Returns
+    -------
+    pandas.DataFrame
+        A DataFrame with a column for each metric and a row for each region.
+    """
+    try:
+        import pandas as pd
+    except ImportError:
+        raise ImportError(
+            "Pandas is not installed. Cannot convert the metrics to a DataFrame."
+        )
+    return pd.DataFrame(metrics)
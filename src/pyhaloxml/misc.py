@@ -5,22 +5,24 @@ import logging
 import math
 from datetime import datetime
 
-import dateutil.parser
 from lxml.etree import Element, _Element
 
-from pyhaloxmlc import pointinpoly
+from pyhaloxmlc import pointsinrings
 
 
 def points_in_polygons(
     points: list[tuple[float, float]], polygons: list[list[tuple[float, float]]]
 ) -> list[int]:
-    result = [-1] * len(points)
-    for i, point in enumerate(points):
-        for j, polygon in enumerate(polygons):
-            if pointinpoly(point, polygon):
-                result[i] = j
-                continue
-    return result
+    import numpy as np
+
+    result = np.full(len(points), -1, dtype=np.int64)
+    if not points or not polygons:
+        return result.tolist()
+    offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in polygons], out=offsets[1:])
+    vertices = np.array([v for x in polygons for v in x], dtype=np.float64)
+    pointsinrings(np.array(points, dtype=np.float64), vertices, offsets, result)
+    return [int(x) for x in result]
 
 
 class Comment:
@@ -34,11 +36,16 @@ class Comment:
         return self._body
 
     def setcomment(self, e: _Element) -> None:
+        import dateutil.parser
+
         self._author = str(e.attrib["Author"])
         self._body = str(e.attrib["Body"])
         self._createdtime = dateutil.parser.isoparse(e.attrib["CreatedTime"])
         self._modifiedtime = dateutil.parser.isoparse(e.attrib["ModifiedTime"])
 
+    def getauthor(self) -> str:
+        return self._author
+
     def setbody(self, body: str) -> None:
         self._body = body
         self._modifiedtime = datetime.now()
@@ -118,6 +125,31 @@ def getvertices(element: _Element) -> list[tuple[float, float]]:
     return vertices
 
 
+def getvertexelements(element: _Element) -> list[_Element]:
+    elements = []  # type: list[_Element]
+    for e in element.iterchildren():
+        if e.tag == "Vertices":
+            elements.extend(e.iterchildren())
+    return elements
+
+
+def setvertices(element: _Element, vertices: list[tuple[float, float]]) -> None:
+    for e in element.iterchildren():
+        if e.tag == "Vertices":
+            element.remove(e)
+    e = Element("Vertices")
+    for x, y in vertices:
+        e.append(Element("V", {"X": formatcoordinate(x), "Y": formatcoordinate(y)}))
+    element.insert(0, e)
+
+
+def formatcoordinate(value: float) -> str:
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
 def getvertex(element: _Element) -> tuple[float, float]:
     for e in element.iterchildren():
         if e.tag == "Vertices":
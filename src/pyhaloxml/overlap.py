@@ -0,0 +1,181 @@
+"""Overlap between the regions of different layers."""
+
+from typing import Any, Callable, Iterable
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .Layer import Layer
+from .shapely import import_shapely, region_to_shapely
+
+
+class OverlapMatrix:
+    """
+    Intersection and intersection over union of every pair of layers.
+
+    The area of a layer is the area of the union of its regions, so regions of a
+    layer that overlap each other are not counted twice.
+
+    Attributes
+    ----------
+    layers : list[str]
+        The name of each layer, in the order of the rows and columns.
+    area : NDArray[np.float64]
+        The area of each layer.
+    intersection : NDArray[np.float64]
+        Array of shape (layers, layers) with the area covered by both layers.
+    iou : NDArray[np.float64]
+        Array of shape (layers, layers) with the intersection over union, nan if
+        both layers have no area.
+    pairs : dict[str, NDArray[Any]] | None
+        The pairs of regions of different layers that overlap, if they were asked
+        for. Columns layer_a, region_a, layer_b, region_b, intersection and iou,
+        with the index of the layers and of the regions within their layer.
+    """
+
+    def __init__(self) -> None:  # numpydoc ignore=GL08
+        self.layers = []  # type: list[str]
+        self.area = np.empty(0, dtype=np.float64)  # type: NDArray[np.float64]
+        self.intersection = np.empty((0, 0), dtype=np.float64)  # type: NDArray[np.float64]
+        self.iou = np.empty((0, 0), dtype=np.float64)  # type: NDArray[np.float64]
+        self.pairs = None  # type: dict[str, NDArray[Any]] | None
+
+    def fraction(self) -> NDArray[np.float64]:
+        """
+        The part of each layer that is covered by each other layer.
+
+        Returns
+        -------
+        NDArray[np.float64]
+            Array of shape (layers, layers), element (i, j) is the part of the area
+            of layer i that is inside layer j, e.g. necrosis inside tumor. It is nan
+            for layers without area.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.asarray(self.intersection / self.area[:, None], dtype=np.float64)
+
+    def todict(self) -> dict[str, Any]:
+        """
+        Create a dictonary with the results.
+
+        Returns
+        -------
+        dict[str, Any]
+            A dictonary with lists for the layers, area, intersection and iou.
+        """
+        result = {
+            "layers": self.layers,
+            "area": self.area.tolist(),
+            "intersection": self.intersection.tolist(),
+            "iou": self.iou.tolist(),
+        }  # type: dict[str, Any]
+        if self.pairs is not None:
+            result["pairs"] = {k: v.tolist() for k, v in self.pairs.items()}
+        return result
+
+
+def overlap_matrix(
+    layers: list[Layer], per_region: bool = False, workers: int = 1
+) -> OverlapMatrix:
+    """
+    Compute the overlap between all pairs of layers.
+
+    All regions with an area go into one spatial index of their bounding boxes.
+    A single query finds the pairs of regions of different layers that intersect,
+    and only those are intersected. For each pair of layers the regions in such a
+    pair are merged per layer and intersected once, so overlapping regions within
+    a layer are not counted twice.
+
+    Parameters
+    ----------
+    layers : list[Layer]
+        The layers, with the negative regions matched.
+    per_region : bool
+        True - Also give the intersection and iou of every pair of regions of
+        different layers that overlap.
+        False (default) - Only compare the layers.
+    workers : int
+        Number of threads for the unions and intersections. Shapely releases the
+        GIL, so they run in parallel.
+
+    Returns
+    -------
+    OverlapMatrix
+        The areas, intersections and intersection over union.
+    """
+    shapely = import_shapely("compute the overlap")
+    result = OverlapMatrix()
+    result.layers = [x.name for x in layers]
+    nlayers = len(layers)
+    regions = [(i, j, x) for i, y in enumerate(layers) for j, x in enumerate(y.regions)]
+    regions = [x for x in regions if x[2].has_area() and not x[2].isnegative]
+    layer_index = np.array([x[0] for x in regions], dtype=np.int64)
+    region_index = np.array([x[1] for x in regions], dtype=np.int64)
+    geometries = np.array(
+        [region_to_shapely(x[2], make_valid=True) for x in regions], dtype=object
+    )
+    areas = shapely.area(geometries) if len(geometries) else np.empty(0)
+    a, b = shapely.STRtree(geometries).query(geometries, predicate="intersects")
+    crossing = (a < b) & (layer_index[a] != layer_index[b])
+    a, b = a[crossing], b[crossing]
+
+    def run(
+        func: Callable[..., Any], tasks: Iterable[Any]
+    ) -> list[Any]:  # numpydoc ignore=GL08
+        if workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(func, tasks))
+        return [func(x) for x in tasks]
+
+    def union(members: NDArray[np.int64]) -> Any:  # numpydoc ignore=GL08
+        return shapely.union_all(geometries[members])
+
+    members = [np.flatnonzero(layer_index == i) for i in range(nlayers)]
+    result.area = np.array(
+        [float(shapely.area(x)) for x in run(union, members)], dtype=np.float64
+    )
+
+    # the regions of each pair of layers that take part in an overlap
+    la, lb = layer_index[a], layer_index[b]
+    first, second = np.minimum(la, lb), np.maximum(la, lb)
+    keys = sorted(set(zip(first.tolist(), second.tolist())))
+
+    def intersect(key: tuple[int, int]) -> float:  # numpydoc ignore=GL08
+        i, j = key
+        inpair = (first == i) & (second == j)
+        candidates = np.unique(np.concatenate([a[inpair], b[inpair]]))
+        one = union(candidates[layer_index[candidates] == i])
+        other = union(candidates[layer_index[candidates] == j])
+        return float(shapely.area(shapely.intersection(one, other)))
+
+    result.intersection = np.diag(result.area)
+    for (i, j), value in zip(keys, run(intersect, keys)):
+        result.intersection[i, j] = result.intersection[j, i] = value
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = result.area[:, None] + result.area[None, :] - result.intersection
+        result.iou = result.intersection / total
+
+    if per_region:
+        chunks = np.array_split(np.arange(len(a)), max(workers, 1))
+
+        def pairareas(chunk: NDArray[np.int64]) -> Any:  # numpydoc ignore=GL08
+            return shapely.area(
+                shapely.intersection(geometries[a[chunk]], geometries[b[chunk]])
+            )
+
+        overlap = np.concatenate(
+            [np.empty(0, dtype=np.float64)] + run(pairareas, chunks)
+        )
+        keep = overlap > 0
+        a, b, overlap = a[keep], b[keep], overlap[keep]
+        result.pairs = {
+            "layer_a": layer_index[a],
+            "region_a": region_index[a],
+            "layer_b": layer_index[b],
+            "region_b": region_index[b],
+            "intersection": overlap,
+            "iou": overlap / (areas[a] + areas[b] - overlap),
+        }
+    return result
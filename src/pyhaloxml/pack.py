@@ -0,0 +1,664 @@
+"""Compact, picklable representation of annotations for transfer to other processes."""
+
+import math
+import os
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterator, Optional, TypeVar, Union
+
+import numpy as np
+from lxml import etree
+from numpy.typing import NDArray
+
+from pyhaloxmlc import scanvertices
+
+from .fileio import compression_from_suffix, open_compressed, suffix_from_compression
+from .flat import gather_index
+from .Layer import Layer
+from .misc import Comment, RegionType, formatcoordinate
+from .Region import TYPES, Region, log
+
+if TYPE_CHECKING:
+    from lxml.etree import _Element
+
+    from .HaloXML import HaloXML
+
+NEGATIVE = 1
+ENDCAPS = 2
+COMMENTS = 4  # the region has a Comments element
+
+ARRAYS = ("vertices", "vertex_offsets", "layer_offsets", "types", "flags", "parents")
+S = TypeVar("S", bound="SharedHaloXML")
+
+
+class PackedHaloXML:
+    """
+    Annotations stored as a small header and a few contiguous arrays.
+
+    Every region and hole is an element, in the order in which they are saved.
+    The arrays hold the raw vertices from the xml, so rectangles and ellipses keep
+    their two corners. Only the layer properties, type names and comments are
+    python objects. Elements with other attributes or child elements than Halo
+    writes for every region are kept as xml text as well, so nothing is lost.
+    Pickling it costs little more than copying the arrays, and with pickle
+    protocol 5 the arrays can be passed out of band.
+
+    Attributes
+    ----------
+    header : dict[str, Any]
+        The layers (as in Layer.todict), the names of the region types, the comments
+        of each element that has them, the xml of the elements with other attributes
+        or children and if the HaloXML is valid.
+    vertices : NDArray[np.float64]
+        Array of shape (n, 2) with the raw vertices of all elements.
+    vertex_offsets : NDArray[np.int64]
+        Index of the first vertex of each element, followed by the number of vertices.
+    layer_offsets : NDArray[np.int64]
+        Index of the first element of each layer, followed by the number of elements.
+    types : NDArray[np.int8]
+        Index in header["types"] of the type of each element.
+    flags : NDArray[np.uint8]
+        Bit flags NEGATIVE, ENDCAPS and COMMENTS of each element.
+    parents : NDArray[np.int32]
+        Index of the region of which the element is a hole, or -1.
+    """
+
+    def __init__(self) -> None:  # numpydoc ignore=GL08
+        self.header = {
+            "layers": [],
+            "types": [],
+            "comments": [],
+            "elements": [],
+            "valid": False,
+        }  # type: dict[str, Any]
+        self.vertices = np.empty((0, 2), dtype=np.float64)  # type: NDArray[np.float64]
+        self.vertex_offsets = np.zeros(1, dtype=np.int64)  # type: NDArray[np.int64]
+        self.layer_offsets = np.zeros(1, dtype=np.int64)  # type: NDArray[np.int64]
+        self.types = np.empty(0, dtype=np.int8)  # type: NDArray[np.int8]
+        self.flags = np.empty(0, dtype=np.uint8)  # type: NDArray[np.uint8]
+        self.parents = np.empty(0, dtype=np.int32)  # type: NDArray[np.int32]
+
+    def __len__(self) -> int:  # numpydoc ignore=GL08
+        return len(self.types)
+
+    def __reduce__(self) -> tuple[Any, ...]:  # numpydoc ignore=GL08
+        return _frombuffers, (self.header, *[getattr(self, x) for x in ARRAYS])
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the arrays in bytes.
+
+        Returns
+        -------
+        int
+            The total number of bytes of the arrays.
+        """
+        return sum(getattr(self, x).nbytes for x in ARRAYS)
+
+    def tolayers(self) -> list[Layer]:
+        """
+        Rebuild the layers, with new xml elements for all regions.
+
+        The regions are made from the arrays. Their xml elements are only made
+        when the element of one of them is used, then the xml of all of them is
+        generated as text and parsed in one go, which is much faster than creating
+        the elements one by one. Holes are attached to their region like after
+        matching the negative regions.
+
+        Returns
+        -------
+        list[Layer]
+            The unpacked layers.
+        """
+        return self._unpack()[1]
+
+    def tohaloxml(self) -> "HaloXML":
+        """
+        Rebuild the HaloXML.
+
+        Returns
+        -------
+        HaloXML
+            The unpacked annotations.
+        """
+        from .HaloXML import HaloXML
+
+        hx = HaloXML()
+        hx._unpacked, hx.layers = self._unpack()
+        hx.valid = self.header["valid"]
+        return hx
+
+    def save(
+        self, pth: Union[str, os.PathLike[Any]], compression: Optional[str] = None
+    ) -> None:
+        """
+        Save as .annotations file without building the xml tree.
+
+        The xml is written region by region, so the memory use stays small for
+        annotations with millions of vertices.
+
+        Parameters
+        ----------
+        pth : str | os.PathLike[Any]
+            Path to the .annotations file to save.
+        compression : str | None
+            None (default) - Compress if the suffix is .gz, .xz or .zst.
+            'gzip', 'xz' or 'zstd' - Compress and add the suffix if it is missing.
+
+        See Also
+        --------
+        HaloXML.save : The same for a HaloXML.
+        """
+        pth = Path(pth)
+        if not pth.suffix:
+            pth = Path(pth.parent, pth.name + ".annotations")
+        if compression is None:
+            compression = compression_from_suffix(pth)
+        elif compression_from_suffix(pth) != compression:
+            pth = Path(pth.parent, pth.name + suffix_from_compression(compression))
+        if compression is None:
+            with open(pth, "wb") as f:
+                f.writelines(x.encode() for x in self._xml())
+        else:
+            with open_compressed(pth, "wb", compression) as f:
+                f.writelines(x.encode() for x in self._xml())
+
+    def _xml(self) -> Iterator[str]:  # numpydoc ignore=GL08
+        from xml.sax.saxutils import quoteattr
+
+        types = [quoteattr(x) for x in self.header["types"]]
+        comments = dict(self.header["comments"])
+        elements = dict(self.header.get("elements", []))
+        offsets = self.vertex_offsets.tolist()
+        layer_offsets = self.layer_offsets.tolist()
+        typeindex = self.types.tolist()
+        flags = self.flags.tolist()
+        yield "<Annotations>"
+        for i, layerinfo in enumerate(self.header["layers"]):
+            yield (
+                "<Annotation "
+                + " ".join(f"{k}={quoteattr(v)}" for k, v in layerinfo.items())
+                + "><Regions>"
+            )
+            first, last = layer_offsets[i], layer_offsets[i + 1]
+            start = offsets[first]
+            coords = self.vertices[start : offsets[last]].ravel()
+            if np.all(np.mod(coords, 1) == 0):
+                template = '<V X="%d" Y="%d"/>'
+                values = coords.astype(np.int64).tolist()  # type: list[Any]
+            else:
+                template = '<V X="%s" Y="%s"/>'
+                values = [formatcoordinate(x) for x in coords.tolist()]
+            for j in range(first, last):
+                if j in elements:
+                    yield elements[j]
+                    continue
+                parts = [
+                    f"<Region Type={types[typeindex[j]]}"
+                    f' HasEndcaps="{int(bool(flags[j] & ENDCAPS))}"'
+                    f' NegativeROA="{int(bool(flags[j] & NEGATIVE))}"><Vertices>'
+                ]
+                n = offsets[j + 1] - offsets[j]
+                a, b = 2 * (offsets[j] - start), 2 * (offsets[j + 1] - start)
+                parts.append(template * n % tuple(values[a:b]))
+                parts.append("</Vertices>")
+                if flags[j] & COMMENTS:
+                    parts.append("<Comments>")
+                    for attrib in comments.get(j, []):
+                        parts.append(
+                            "<Comment "
+                            + " ".join(f"{k}={quoteattr(v)}" for k, v in attrib)
+                            + "/>"
+                        )
+                    parts.append("</Comments>")
+                parts.append("</Region>")
+                yield "".join(parts)
+            yield "</Regions></Annotation>"
+        yield "</Annotations>"
+
+    def _unpack(self) -> tuple["_UnpackedElements", list[Layer]]:
+        # numpydoc ignore=GL08
+        elements = _UnpackedElements(self)
+        typenames = [TYPES.get(x, RegionType.Unknown) for x in self.header["types"]]
+        types = [typenames[x] for x in self.types.tolist()]
+        negative = (self.flags & NEGATIVE).astype(bool).tolist()
+        endcaps = (self.flags & ENDCAPS).astype(bool).tolist()
+        parents = self.parents.tolist()
+        layer_offsets = self.layer_offsets.tolist()
+        layers = []
+        regions = elements.regions
+        new = Region.__new__
+        nan = (math.nan, math.nan)
+        for i, layerinfo in enumerate(self.header["layers"]):
+            layer = Layer()
+            layer.fromdict(layerinfo)
+            for j in range(layer_offsets[i], layer_offsets[i + 1]):
+                # the attributes of Region.__init__, without the element
+                region = new(Region)
+                region._unpacked = elements
+                region.holes = []
+                region.comments = []
+                region.vertices = [nan]
+                region.type = types[j]
+                region.isnegative = negative[j]
+                region.hasendcaps = endcaps[j]
+                region.log = log
+                if parents[j] == -1:
+                    layer.addregion(region)
+                else:
+                    regions[parents[j]].add_hole(region)
+                regions.append(region)
+            layers.append(layer)
+        for j, attribs in self.header["comments"]:
+            for attrib in attribs:
+                comment = Comment()
+                comment.setcomment(etree.Element("Comment", dict(attrib)))
+                regions[j].comments.append(comment)
+        return elements, layers
+
+    def share(self) -> "SharedHaloXML":
+        """
+        Copy the arrays to a new block of shared memory.
+
+        Returns
+        -------
+        SharedHaloXML
+            The annotations in shared memory.
+        """
+        return SharedHaloXML(self)
+
+
+class SharedHaloXML:
+    """
+    Packed annotations in a block of shared memory.
+
+    Pickling it only sends the name of the block and the header, so it can be
+    passed to many worker processes at almost no cost. The process that created
+    it owns the block and should close it when the workers are done, e.g. by
+    using it as a context manager.
+
+    Parameters
+    ----------
+    packed : PackedHaloXML
+        The packed annotations to copy to shared memory.
+
+    Attributes
+    ----------
+    shm : SharedMemory
+        The block of shared memory.
+    header : dict[str, Any]
+        The header of the packed annotations.
+    layout : list[tuple[str, str, tuple[int, ...], int]]
+        Name, dtype, shape and byte offset of each array.
+    owner : bool
+        True in the process that created the block.
+    """
+
+    def __init__(
+        self, packed: Optional[PackedHaloXML] = None
+    ) -> None:  # numpydoc ignore=GL08
+        self.header = {}  # type: dict[str, Any]
+        self.layout = []  # type: list[tuple[str, str, tuple[int, ...], int]]
+        self.owner = packed is not None  # type: bool
+        if packed is None:
+            return
+        self.header = packed.header
+        size = 0
+        for name in ARRAYS:
+            a = getattr(packed, name)
+            self.layout.append((name, a.dtype.str, a.shape, size))
+            size += -(-a.nbytes // 8) * 8  # keep every array aligned
+        from multiprocessing import shared_memory
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, a in zip(ARRAYS, self._arrays()):
+            a[...] = getattr(packed, name)
+
+    def __reduce__(self) -> tuple[Any, ...]:  # numpydoc ignore=GL08
+        return _attach, (self.shm.name, self.header, self.layout)
+
+    def __enter__(self: S) -> S:  # numpydoc ignore=GL08
+        return self
+
+    def __exit__(self, *args: object) -> None:  # numpydoc ignore=GL08
+        self.close()
+
+    def _arrays(self) -> list[NDArray[Any]]:  # numpydoc ignore=GL08
+        return [
+            np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=offset)
+            for _, dtype, shape, offset in self.layout
+        ]
+
+    def packed(self) -> PackedHaloXML:
+        """
+        Copy the arrays out of shared memory.
+
+        Returns
+        -------
+        PackedHaloXML
+            The packed annotations, independent of the shared memory.
+        """
+        packed = PackedHaloXML()
+        packed.header = self.header
+        for (name, *_), a in zip(self.layout, self._arrays()):
+            setattr(packed, name, a.copy())
+        return packed
+
+    def tohaloxml(self) -> "HaloXML":
+        """
+        Rebuild the HaloXML from the shared memory.
+
+        Returns
+        -------
+        HaloXML
+            The unpacked annotations.
+        """
+        return self.packed().tohaloxml()
+
+    def close(self) -> None:
+        """
+        Close the shared memory, and remove it if this process created it.
+        """
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            self.owner = False
+
+
+class _UnpackedElements:
+    """
+    The xml elements of the regions unpacked from a PackedHaloXML.
+
+    They are made for all regions at once, when the first one is needed.
+
+    Parameters
+    ----------
+    packed : PackedHaloXML
+        The packed annotations the regions were made from.
+
+    Attributes
+    ----------
+    packed : PackedHaloXML | None
+        The packed annotations, until the elements are made.
+    regions : list[Region]
+        The regions and holes, in the order of the packed elements.
+    root : _Element | None
+        The Annotations element with the elements of all regions.
+    """
+
+    def __init__(self, packed: PackedHaloXML) -> None:  # numpydoc ignore=GL08
+        self.packed = packed  # type: Optional[PackedHaloXML]
+        self.regions = []  # type: list[Region]
+        self.root = None  # type: Any
+        self._index = None  # type: Optional[dict[int, int]]
+        self._comments = {}  # type: dict[int, Any]
+        self._elements = {}  # type: dict[int, str]
+
+    def build(self) -> None:
+        """
+        Make the elements and give every region its element.
+        """
+        if self.packed is None:
+            return
+        self.root = etree.fromstring("".join(self.packed._xml()))
+        elements = (x for annotation in self.root for x in annotation[0])
+        for region, element in zip(self.regions, elements):
+            region.region = element
+        self.packed = None
+        self.regions = []
+        self._index = None
+        self._comments = {}
+        self._elements = {}
+
+    def element(
+        self, region: Region
+    ) -> tuple[int, int, str, int, Any, Optional[str]]:
+        """
+        Where the element of a region is in the packed arrays.
+
+        Parameters
+        ----------
+        region : Region
+            One of the unpacked regions.
+
+        Returns
+        -------
+        tuple[int, int, str, int, Any, str | None]
+            The index of the element, the number of vertices, the name of the type,
+            the COMMENTS flag, the attributes of the comments and the xml of the
+            element if it has other attributes or children.
+        """
+        if self.packed is None:
+            raise ValueError("The elements are already made")
+        if self._index is None:
+            self._index = {id(x): i for i, x in enumerate(self.regions)}
+            self._comments = dict(self.packed.header["comments"])
+            self._elements = dict(self.packed.header.get("elements", []))
+        i = self._index[id(region)]
+        offsets = self.packed.vertex_offsets
+        return (
+            i,
+            int(offsets[i + 1] - offsets[i]),
+            self.packed.header["types"][self.packed.types[i]],
+            int(self.packed.flags[i]) & COMMENTS,
+            self._comments.get(i, []),
+            self._elements.get(i),
+        )
+
+    def tree(self) -> Any:
+        """
+        The tree with the elements of all regions.
+
+        Returns
+        -------
+        _ElementTree
+            The tree of the unpacked annotations.
+        """
+        self.build()
+        return etree.ElementTree(self.root)
+
+
+def pack_layers(layers: list[Layer], valid: bool = True) -> PackedHaloXML:
+    """
+    Pack the layers into a PackedHaloXML.
+
+    The vertices of regions that were unpacked and whose elements were not made
+    since are copied from their packed arrays, so packing them again is cheap.
+    Elements with other attributes or children than the packed arrays hold are
+    also stored as xml text.
+
+    Parameters
+    ----------
+    layers : list[Layer]
+        The layers to pack.
+    valid : bool
+        Stored as the valid flag of the unpacked HaloXML.
+
+    Returns
+    -------
+    PackedHaloXML
+        The packed layers.
+    """
+    packed = PackedHaloXML()
+    typenames = {}  # type: dict[str, int]
+    elements = []  # type: list[_Element]
+    fromxml = []  # type: list[int]
+    counts = []  # type: list[int]
+    layercounts = []  # type: list[int]
+    types = []  # type: list[int]
+    flags = []  # type: list[int]
+    parents = []  # type: list[int]
+    comments = []  # type: list[tuple[int, list[list[tuple[str, str]]]]]
+    other = []  # type: list[tuple[int, str]]
+    # the elements copied from the arrays they were unpacked from, and their index
+    # in those arrays
+    copied = {}  # type: dict[int, tuple[PackedHaloXML, list[int], list[int]]]
+    for layer in layers:
+        packed.header["layers"].append(layer.todict())
+        start = len(types)
+        for region in layer.regions:
+            parent = len(types)
+            for x in [region, *region.holes]:
+                flag = NEGATIVE * x.isnegative + ENDCAPS * x.hasendcaps
+                unpacked = x._unpacked
+                if unpacked is not None and unpacked.packed is not None:
+                    # the element was not made, so it still matches the arrays
+                    i, n, typename, comment, attribs, xml = unpacked.element(x)
+                    _, targets, sourceindex = copied.setdefault(
+                        id(unpacked), (unpacked.packed, [], [])
+                    )
+                    targets.append(len(types))
+                    sourceindex.append(i)
+                    counts.append(n)
+                    flag |= comment
+                    if xml is not None:
+                        other.append((len(types), xml))
+                else:
+                    # the vertices and comments are read from the text of all
+                    # elements at once
+                    element = x.region
+                    elements.append(element)
+                    fromxml.append(len(types))
+                    counts.append(0)
+                    typename = str(element.get("Type"))
+                    attribs = []
+                if attribs:
+                    comments.append((len(types), attribs))
+                types.append(typenames.setdefault(typename, len(typenames)))
+                flags.append(flag)
+                parents.append(-1 if x is region else parent)
+        layercounts.append(len(types) - start)
+    vertexcounts = np.array(counts, dtype=np.int64)
+    if elements:
+        coords, vertexcounts[fromxml], xmlflags = _readvertices(elements)
+        for j in np.flatnonzero(xmlflags).tolist():
+            if xmlflags[j] & 4:  # other attributes or children
+                xml = etree.tostring(elements[j], encoding="unicode", with_tail=False)
+                other.append((fromxml[j], xml))
+            if not xmlflags[j] & 1:
+                continue
+            flags[fromxml[j]] |= COMMENTS
+            if xmlflags[j] & 2:
+                attribs = [
+                    [(str(k), str(v)) for k, v in c.items()]
+                    for e in elements[j].iterchildren("Comments")
+                    for c in e
+                ]
+                if attribs:
+                    comments.append((fromxml[j], attribs))
+        comments.sort(key=lambda x: x[0])
+        other.sort(key=lambda x: x[0])
+    packed.header["types"] = list(typenames)
+    packed.header["comments"] = comments
+    packed.header["elements"] = other
+    packed.header["valid"] = valid
+    packed.vertex_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(vertexcounts, out=packed.vertex_offsets[1:])
+    packed.vertices = np.empty((packed.vertex_offsets[-1], 2), dtype=np.float64)
+    if elements:
+        index, _ = gather_index(packed.vertex_offsets, np.array(fromxml))
+        packed.vertices[index] = coords
+    for source, targets, sourceindex in copied.values():
+        index, _ = gather_index(packed.vertex_offsets, np.array(targets))
+        frompacked, _ = gather_index(source.vertex_offsets, np.array(sourceindex))
+        packed.vertices[index] = source.vertices[frompacked]
+    packed.layer_offsets = np.zeros(len(layercounts) + 1, dtype=np.int64)
+    np.cumsum(layercounts, out=packed.layer_offsets[1:])
+    packed.types = np.array(types, dtype=np.int8)
+    packed.flags = np.array(flags, dtype=np.uint8)
+    packed.parents = np.array(parents, dtype=np.int32)
+    return packed
+
+
+def _scan(
+    texts: list[bytes], level: int
+) -> tuple[NDArray[np.float64], NDArray[np.int64], NDArray[np.uint8]]:
+    # numpydoc ignore=GL08
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in texts], out=offsets[1:])
+    coords, counts, flags = scanvertices(b"".join(texts), offsets, level)
+    return (
+        np.frombuffer(coords, dtype=np.float64).reshape(-1, 2),
+        np.frombuffer(counts, dtype=np.int64),
+        np.frombuffer(flags, dtype=np.uint8),
+    )
+
+
+def _readvertices(
+    elements: "list[_Element]",
+) -> tuple[NDArray[np.float64], NDArray[np.int64], NDArray[np.uint8]]:
+    # numpydoc ignore=GL08
+    # Serializing an element costs more than reading its vertices when it is small,
+    # so the elements that make up most of their parent are read from the text of
+    # the parent, where each child element is a part. The rest are serialized alone.
+    groups = {}  # type: dict[Optional[_Element], list[int]]
+    for i, element in enumerate(elements):
+        groups.setdefault(element.getparent(), []).append(i)
+    partof = np.empty(len(elements), dtype=np.int64)
+    texts = []  # type: list[bytes]
+    single = []  # type: list[int]
+    nparts = 0
+    for parent, members in groups.items():
+        siblings = [] if parent is None else list(parent.iterchildren(etree.Element))
+        if 2 * len(members) < len(siblings) or parent is None:
+            single.extend(members)
+            continue
+        position = {e: k for k, e in enumerate(siblings)}
+        partof[members] = [nparts + position[elements[i]] for i in members]
+        nparts += len(siblings)
+        texts.append(etree.tostring(parent, with_tail=False))
+    partof[single] = np.arange(nparts, nparts + len(single))
+    coords, counts, flags = _scan(texts, 1)
+    alone = [etree.tostring(elements[i], with_tail=False) for i in single]
+    alonecoords, alonecounts, aloneflags = _scan(alone, 0)
+    partoffsets = np.zeros(nparts + len(single) + 1, dtype=np.int64)
+    np.cumsum(np.concatenate([counts, alonecounts]), out=partoffsets[1:])
+    index, _ = gather_index(partoffsets, partof)
+    return (
+        np.concatenate([coords, alonecoords])[index],
+        np.diff(partoffsets)[partof],
+        np.concatenate([flags, aloneflags])[partof],
+    )
+
+
+def _frombuffers(header: dict[str, Any], *arrays: NDArray[Any]) -> PackedHaloXML:
+    # numpydoc ignore=GL08
+    packed = PackedHaloXML()
+    packed.header = header
+    for name, a in zip(ARRAYS, arrays):
+        setattr(packed, name, a)
+    return packed
+
+
+def _attach(
+    name: str,
+    header: dict[str, Any],
+    layout: list[tuple[str, str, tuple[int, ...], int]],
+) -> SharedHaloXML:  # numpydoc ignore=GL08
+    from multiprocessing import shared_memory
+
+    shared = SharedHaloXML()
+    shared.header = header
+    shared.layout = layout
+    if sys.version_info >= (3, 13):
+        shared.shm = shared_memory.SharedMemory(name, track=False)
+    else:
+        from multiprocessing import resource_tracker
+
+        shared.shm = shared_memory.SharedMemory(name)
+        # only the creating process may remove the block when it exits
+        resource_tracker.unregister(shared.shm._name, "shared_memory")  # type: ignore[attr-defined]
+    return shared
+
+
+def _unpack_haloxml(packed: PackedHaloXML) -> "HaloXML":  # numpydoc ignore=GL08
+    return packed.tohaloxml()
+
+
+def _unpack_layer(packed: PackedHaloXML) -> Layer:  # numpydoc ignore=GL08
+    return packed.tolayers()[0]
+
+
+def _unpack_region(packed: PackedHaloXML) -> Region:  # numpydoc ignore=GL08
+    return packed.tolayers()[0].regions[0]
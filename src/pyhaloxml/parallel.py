@@ -0,0 +1,223 @@
+"""Parse a single large .annotations file in parallel chunks of regions."""
+
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Optional, Union
+
+import numpy as np
+from lxml import etree
+
+from .index import _REGION, AnnotationsIndex, open_content, read_index
+from .Layer import Layer
+from .pack import PackedHaloXML, pack_layers
+from .Region import Region
+
+MIN_CHUNK = 1 << 20  # bytes
+
+
+def split_regions(
+    buffer: Union[bytes, mmap.mmap],
+    index: AnnotationsIndex,
+    workers: int,
+    chunk_size: Optional[int] = None,
+) -> list[tuple[int, int, int]]:
+    """
+    Cut the regions of each layer into chunks of whole Region elements.
+
+    The boundaries are found by searching for the next start tag of a region
+    after every chunk_size bytes, so the regions are not parsed or counted.
+
+    Parameters
+    ----------
+    buffer : bytes | mmap.mmap
+        The uncompressed content of the file.
+    index : AnnotationsIndex
+        The byte offsets of the layers in buffer.
+    workers : int
+        The number of workers, by default there are about four chunks per worker.
+    chunk_size : int | None
+        The approximate size of a chunk in bytes.
+
+    Returns
+    -------
+    list[tuple[int, int, int]]
+        The index of the layer and the start and end byte offset of each chunk, in
+        the order of the file.
+    """
+    if chunk_size is None:
+        chunk_size = max(len(buffer) // (4 * max(workers, 1)), MIN_CHUNK)
+    chunks = []
+    for i, info in enumerate(index.layers):
+        first = _REGION.search(buffer, info.start, info.end)
+        if first is None:
+            continue
+        end = buffer.rfind(b"</Regions", first.start(), info.end)
+        if end < 0:
+            raise ValueError(
+                f"Regions of the layer at byte {info.start} are not closed"
+            )
+        start = first.start()
+        while start < end:
+            nxt = _REGION.search(buffer, min(start + chunk_size, end), end)
+            stop = end if nxt is None else nxt.start()
+            chunks.append((i, start, stop))
+            start = stop
+    return chunks
+
+
+def _parse_chunk(chunk: bytes) -> list[Region]:  # numpydoc ignore=GL08
+    return [Region(x) for x in etree.fromstring(b"<Regions>" + chunk + b"</Regions>")]
+
+
+def _pack_chunk(chunk: bytes) -> PackedHaloXML:  # numpydoc ignore=GL08
+    layer = Layer()
+    layer.regions = _parse_chunk(chunk)
+    return pack_layers([layer])
+
+
+def _layers(index: AnnotationsIndex) -> list[Layer]:  # numpydoc ignore=GL08
+    layers = []
+    for info in index.layers:
+        layer = Layer()
+        layer.fromdict(info.attrib)
+        layers.append(layer)
+    return layers
+
+
+def parse_regions(
+    buffer: Union[bytes, mmap.mmap],
+    index: AnnotationsIndex,
+    workers: int = 2,
+    chunk_size: Optional[int] = None,
+) -> list[Layer]:
+    """
+    Parse the layers of a file in chunks on a pool of threads.
+
+    lxml releases the GIL while it parses, so the chunks are parsed in parallel.
+    The Region objects are made by the same threads, which only overlaps with the
+    parsing of the other chunks on a regular build and fully runs in parallel on a
+    free-threaded build. The regions of every chunk are separate small documents,
+    so nothing has to be copied to rebuild them in this process.
+
+    Parameters
+    ----------
+    buffer : bytes | mmap.mmap
+        The uncompressed content of the file.
+    index : AnnotationsIndex
+        The byte offsets of the layers in buffer.
+    workers : int
+        The number of threads.
+    chunk_size : int | None
+        The approximate size of a chunk in bytes.
+
+    Returns
+    -------
+    list[Layer]
+        The layers with their regions in the order of the file, the negative regions
+        are not matched.
+    """
+    layers = _layers(index)
+    chunks = split_regions(buffer, index, workers, chunk_size)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parts = pool.map(_parse_chunk, (buffer[a:b] for _, a, b in chunks))
+        for (i, _, _), regions in zip(chunks, parts):
+            layers[i].regions.extend(regions)
+    return layers
+
+
+def pack_parallel(
+    pth: Union[str, os.PathLike[Any]],
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    sidecar: bool = False,
+) -> PackedHaloXML:
+    """
+    Parse a file in chunks on a pool of processes into packed arrays.
+
+    Every process parses its chunks and packs the regions into the compact arrays
+    of a PackedHaloXML, which are cheap to send back. The parts are joined in the
+    order of the file. Because no xml elements have to be sent, this scales with
+    the number of processes, and the result can be used directly by code that only
+    needs the vertices, e.g. after sharing it with other processes.
+
+    Parameters
+    ----------
+    pth : str | os.PathLike[Any]
+        Path to the .annotations file, it can be compressed.
+    workers : int | None
+        The number of processes, by default the number of CPUs.
+    chunk_size : int | None
+        The approximate size of a chunk in bytes.
+    sidecar : bool
+        True - Keep the index of the layers in <pth>.index.json for the next time.
+        False (default) - Build the index in memory.
+
+    Returns
+    -------
+    PackedHaloXML
+        All regions of the file, the negative regions are not matched. Use
+        tohaloxml to get a HaloXML.
+    """
+    workers = workers or os.cpu_count() or 1
+    with open_content(pth) as buffer:
+        index = read_index(pth, sidecar, buffer)
+        chunks = split_regions(buffer, index, workers, chunk_size)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_pack_chunk, (buffer[a:b] for _, a, b in chunks)))
+    return join_packed(_layers(index), [x[0] for x in chunks], parts)
+
+
+def join_packed(
+    layers: list[Layer], layer_index: list[int], parts: list[PackedHaloXML]
+) -> PackedHaloXML:
+    """
+    Join packed chunks of regions into the layers they belong to.
+
+    Parameters
+    ----------
+    layers : list[Layer]
+        The layers, only their properties are used.
+    layer_index : list[int]
+        The index in layers of each part. Parts of a layer must be in order.
+    parts : list[PackedHaloXML]
+        Packed regions, each with a single layer.
+
+    Returns
+    -------
+    PackedHaloXML
+        The regions of all parts, in the order of the layers and then of the parts.
+    """
+    order = sorted(range(len(parts)), key=lambda x: layer_index[x])
+    packed = PackedHaloXML()
+    packed.header["layers"] = [x.todict() for x in layers]
+    packed.header["valid"] = True
+    typenames = {}  # type: dict[str, int]
+    types = []
+    parents = []
+    counts = [np.diff(parts[i].vertex_offsets) for i in order]
+    start = 0
+    for i in order:
+        part = parts[i]
+        remap = [typenames.setdefault(x, len(typenames)) for x in part.header["types"]]
+        types.append(np.array(remap, dtype=np.int8)[part.types])
+        parents.append(np.where(part.parents >= 0, part.parents + start, -1))
+        packed.header["comments"] += [
+            (j + start, c) for j, c in part.header["comments"]
+        ]
+        start += len(part)
+    packed.header["types"] = list(typenames)
+    if parts:
+        packed.vertices = np.concatenate([parts[i].vertices for i in order])
+        packed.types = np.concatenate(types)
+        packed.flags = np.concatenate([parts[i].flags for i in order])
+        packed.parents = np.concatenate(parents).astype(np.int32)
+        packed.vertex_offsets = np.zeros(start + 1, dtype=np.int64)
+        np.cumsum(np.concatenate(counts), out=packed.vertex_offsets[1:])
+    layercounts = np.zeros(len(layers), dtype=np.int64)
+    np.add.at(
+        layercounts, np.array(layer_index, dtype=np.int64), [len(x) for x in parts]
+    )
+    packed.layer_offsets = np.zeros(len(layers) + 1, dtype=np.int64)
+    np.cumsum(layercounts, out=packed.layer_offsets[1:])
+    return packed
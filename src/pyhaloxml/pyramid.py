@@ -0,0 +1,434 @@
+"""Level of detail pyramid of the regions, for viewers that zoom."""
+
+import json
+import math
+import os
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .flat import FlatRegions, gather_index
+from .metrics import region_metrics
+from .misc import RegionType
+from .shapely import import_shapely
+from .vectorize import simplify_rings
+
+POLYGON = 0
+LINE = 1
+POINT = 2
+
+
+class PyramidLevel:
+    """
+    The regions simplified for one zoom level, with an index of the tiles they are in.
+
+    The regions are stored as in FlatRegions: each region has one or more rings,
+    the first ring is the outline and the others are holes. A region that became a
+    point has a single ring with one vertex.
+
+    Attributes
+    ----------
+    level : int
+        The level, 0 is the full resolution.
+    downsample : float
+        The number of slide pixels per screen pixel, 2 ** level.
+    tolerance : float
+        The maximal distance in slide pixels between the original and simplified outlines.
+    vertices : NDArray[np.float64]
+        Array of shape (n, 2) with the vertices of all rings.
+    ring_offsets : NDArray[np.int64]
+        Index of the first vertex of each ring, followed by the number of vertices.
+    region_offsets : NDArray[np.int64]
+        Index of the first ring of each region, followed by the number of rings.
+    regions : NDArray[np.int64]
+        Index of each region in the regions the pyramid was built from.
+    layer_index : NDArray[np.int32]
+        Index of the layer of each region.
+    kinds : NDArray[np.int8]
+        POLYGON, LINE or POINT for each region.
+    culled : NDArray[np.bool_]
+        True for the regions that were too small and became a point.
+    bounds : NDArray[np.float64]
+        Array of shape (n, 4) with the bounding box of each region.
+    tiles : dict[tuple[int, int], NDArray[np.int64]]
+        For each tile (column, row) that is not empty the regions that overlap it.
+    """
+
+    def __init__(self) -> None:  # numpydoc ignore=GL08
+        self.level = 0  # type: int
+        self.downsample = 1.0  # type: float
+        self.tolerance = 0.0  # type: float
+        self.vertices = np.empty((0, 2), dtype=np.float64)  # type: NDArray[np.float64]
+        self.ring_offsets = np.zeros(1, dtype=np.int64)  # type: NDArray[np.int64]
+        self.region_offsets = np.zeros(1, dtype=np.int64)  # type: NDArray[np.int64]
+        self.regions = np.empty(0, dtype=np.int64)  # type: NDArray[np.int64]
+        self.layer_index = np.empty(0, dtype=np.int32)  # type: NDArray[np.int32]
+        self.kinds = np.empty(0, dtype=np.int8)  # type: NDArray[np.int8]
+        self.culled = np.empty(0, dtype=np.bool_)  # type: NDArray[np.bool_]
+        self.bounds = np.empty((0, 4), dtype=np.float64)  # type: NDArray[np.float64]
+        self.tiles = {}  # type: dict[tuple[int, int], NDArray[np.int64]]
+
+    def __len__(self) -> int:  # numpydoc ignore=GL08
+        return len(self.regions)
+
+    @property
+    def nvertices(self) -> int:
+        """
+        The number of vertices in the level.
+
+        Returns
+        -------
+        int
+            The total number of vertices of all regions.
+        """
+        return len(self.vertices)
+
+    def rings(self, region: int) -> list[NDArray[np.float64]]:
+        """
+        The vertices of the outline and holes of a region.
+
+        Parameters
+        ----------
+        region : int
+            Index of the region in this level.
+
+        Returns
+        -------
+        list[NDArray[np.float64]]
+            An array of shape (n, 2) for each ring.
+        """
+        first, last = self.region_offsets[region], self.region_offsets[region + 1]
+        return [
+            self.vertices[self.ring_offsets[i] : self.ring_offsets[i + 1]]
+            for i in range(first, last)
+        ]
+
+
+class GeometryPyramid:
+    """
+    Regions simplified for a series of zoom levels and split into tiles.
+
+    Level n is meant to be shown at a downsample of 2 ** n, so its outlines are
+    simplified with a tolerance of tolerance * 2 ** n slide pixels. Regions and
+    holes smaller than min_size screen pixels are culled; a culled region is kept
+    as a point at its centroid. Each level is divided in square tiles of
+    tile_size screen pixels, which start at slide coordinate (0, 0).
+
+    Attributes
+    ----------
+    levels : list[PyramidLevel]
+        The levels, from full resolution to the coarsest.
+    tile_size : int
+        The width and height of a tile in screen pixels.
+    properties : list[dict[str, Any]]
+        The GeoJSON properties of the features of each layer.
+    """
+
+    def __init__(self) -> None:  # numpydoc ignore=GL08
+        self.levels = []  # type: list[PyramidLevel]
+        self.tile_size = 512  # type: int
+        self.properties = []  # type: list[dict[str, Any]]
+
+    def __len__(self) -> int:  # numpydoc ignore=GL08
+        return len(self.levels)
+
+    def level_for(self, downsample: float) -> PyramidLevel:
+        """
+        The level to show at a downsample.
+
+        Parameters
+        ----------
+        downsample : float
+            The number of slide pixels per screen pixel.
+
+        Returns
+        -------
+        PyramidLevel
+            The coarsest level that is not coarser than the downsample.
+        """
+        level = math.floor(math.log2(downsample)) if downsample > 1 else 0
+        return self.levels[min(level, len(self.levels) - 1)]
+
+    def tile(self, level: int, column: int, row: int) -> NDArray[np.int64]:
+        """
+        The regions of a level that overlap a tile.
+
+        Parameters
+        ----------
+        level : int
+            The level.
+        column : int
+            The column of the tile.
+        row : int
+            The row of the tile.
+
+        Returns
+        -------
+        NDArray[np.int64]
+            The index in the level of the regions.
+        """
+        empty = np.empty(0, dtype=np.int64)
+        return self.levels[level].tiles.get((column, row), empty)
+
+    def tile_geojson(
+        self, level: int, column: int, row: int, clip: bool = False
+    ) -> dict[str, Any]:
+        """
+        The regions of a level that overlap a tile, as a GeoJSON FeatureCollection.
+
+        Parameters
+        ----------
+        level : int
+            The level.
+        column : int
+            The column of the tile.
+        row : int
+            The row of the tile.
+        clip : bool
+            True - Clip the geometries to the tile with shapely, so large regions do
+            not send the vertices outside the tile.
+            False (default) - Send the whole geometry of every region that overlaps.
+
+        Returns
+        -------
+        dict[str, Any]
+            The FeatureCollection. Each feature has the properties of its layer, the
+            index of the region and if it was culled to a point.
+        """
+        current = self.levels[level]
+        span = self.tile_size * current.downsample
+        box = (column * span, row * span, (column + 1) * span, (row + 1) * span)
+        features = []
+        for i in self.tile(level, column, row).tolist():
+            geometry = _geometry(current, i)
+            if clip and current.kinds[i] != POINT:
+                shapely = import_shapely("clip to the tiles")
+                clipped = shapely.clip_by_rect(shapely.geometry.shape(geometry), *box)
+                if clipped.is_empty:
+                    continue
+                geometry = shapely.geometry.mapping(clipped)
+            properties = dict(self.properties[current.layer_index[i]])
+            properties["region"] = int(current.regions[i])
+            properties["culled"] = bool(current.culled[i])
+            features.append(
+                {"type": "Feature", "geometry": geometry, "properties": properties}
+            )
+        return {"type": "FeatureCollection", "features": features}
+
+    def save(self, directory: Union[str, os.PathLike[Any]], clip: bool = False) -> None:
+        """
+        Write every tile that is not empty to <directory>/<level>/<column>_<row>.geojson.
+
+        A pyramid.json in the directory describes the levels.
+
+        Parameters
+        ----------
+        directory : str | os.PathLike[Any]
+            The directory to write the tiles to.
+        clip : bool
+            True - Clip the geometries to the tiles, this needs shapely.
+            False (default) - Write the whole geometry of every region that overlaps.
+        """
+        directory = Path(directory)
+        description = {"tile_size": self.tile_size, "levels": []}  # type: dict[str, Any]
+        for current in self.levels:
+            folder = Path(directory, str(current.level))
+            folder.mkdir(parents=True, exist_ok=True)
+            for column, row in sorted(current.tiles):
+                collection = self.tile_geojson(current.level, column, row, clip)
+                with open(Path(folder, f"{column}_{row}.geojson"), "wt") as f:
+                    json.dump(collection, f)
+            description["levels"].append(
+                {
+                    "level": current.level,
+                    "downsample": current.downsample,
+                    "tolerance": current.tolerance,
+                    "regions": len(current),
+                    "vertices": current.nvertices,
+                    "tiles": sorted(current.tiles),
+                }
+            )
+        with open(Path(directory, "pyramid.json"), "wt") as f:
+            json.dump(description, f)
+
+
+def build_pyramid(
+    flat: FlatRegions,
+    tile_size: int = 512,
+    tolerance: float = 0.5,
+    min_size: float = 2.0,
+    levels: Optional[int] = None,
+) -> GeometryPyramid:
+    """
+    Build a level of detail pyramid of regions.
+
+    All levels are simplified from the full resolution outlines with the
+    Douglas-Peucker kernel, so errors do not add up over the levels.
+
+    Parameters
+    ----------
+    flat : FlatRegions
+        The regions, with the holes matched.
+    tile_size : int
+        The width and height of a tile in screen pixels.
+    tolerance : float
+        The maximal simplification error in screen pixels.
+    min_size : float
+        Regions and holes with a smaller width and height in screen pixels are culled.
+    levels : int | None
+        The number of levels, by default until all regions fit in about one tile.
+
+    Returns
+    -------
+    GeometryPyramid
+        The pyramid.
+    """
+    pyramid = GeometryPyramid()
+    pyramid.tile_size = tile_size
+    for layer in flat.layers:
+        pyramid.properties.append(
+            {
+                "objectType": "annotation",
+                "name": layer.name,
+                "classification": {
+                    "name": layer.name,
+                    "color": layer.linecolor.getrgb(),
+                },
+                "isLocked": False,
+            }
+        )
+    metrics = region_metrics(flat)
+    if levels is None:
+        levels = 1
+        if len(flat):
+            extent = max(
+                float(np.max(metrics["xmax"]) - np.min(metrics["xmin"])),
+                float(np.max(metrics["ymax"]) - np.min(metrics["ymin"])),
+            )
+            if extent > tile_size:
+                levels = math.ceil(math.log2(extent / tile_size)) + 1
+    for level in range(levels):
+        pyramid.levels.append(
+            _build_level(flat, metrics, level, tile_size, tolerance, min_size)
+        )
+    return pyramid
+
+
+def _build_level(
+    flat: FlatRegions,
+    metrics: dict[str, NDArray[Any]],
+    level: int,
+    tile_size: int,
+    tolerance: float,
+    min_size: float,
+) -> PyramidLevel:  # numpydoc ignore=GL08
+    current = PyramidLevel()
+    current.level = level
+    current.downsample = float(2**level)
+    current.tolerance = tolerance * current.downsample
+    smallest = min_size * current.downsample
+    nregions = len(flat)
+    hasarea = flat.hasarea()
+    width = metrics["xmax"] - metrics["xmin"]
+    height = metrics["ymax"] - metrics["ymin"]
+    pins = flat.types == RegionType.Pin
+    culled = ~pins & (np.maximum(width, height) < smallest)
+    points = pins | culled
+    kinds = np.where(points, POINT, np.where(hasarea, POLYGON, LINE))
+
+    # the outlines and holes that are large enough, simplified if they have an area
+    ring_region = flat.ring_region()
+    outline = np.zeros(len(ring_region), dtype=np.bool_)
+    outline[flat.region_offsets[:-1]] = True
+    if len(flat.vertices):
+        starts = flat.ring_offsets[:-1]
+        low = np.minimum.reduceat(flat.vertices, starts, axis=0)
+        high = np.maximum.reduceat(flat.vertices, starts, axis=0)
+        ringsize = np.max(high - low, axis=1)
+    else:
+        ringsize = np.empty(0, dtype=np.float64)
+    keep = ~points[ring_region] & (outline | (ringsize >= smallest))
+    rings = np.flatnonzero(keep)
+    index, ring_offsets = gather_index(flat.ring_offsets, rings)
+    vertices = flat.vertices[index]
+    if current.tolerance > 0 and len(rings):
+        vertices, ring_offsets = simplify_rings(
+            vertices, ring_offsets, current.tolerance
+        )
+
+    # the points go after the rings, then everything is put in the order of the regions
+    pointregions = np.flatnonzero(points)
+    centroids = np.column_stack(
+        [metrics["centroid_x"][pointregions], metrics["centroid_y"][pointregions]]
+    )
+    vertices = np.concatenate([vertices, centroids.reshape(-1, 2)])
+    ring_offsets = np.concatenate(
+        [ring_offsets, ring_offsets[-1] + np.arange(1, len(pointregions) + 1)]
+    )
+    owners = np.concatenate([ring_region[rings], pointregions])
+    order = np.argsort(owners, kind="stable")
+    index, current.ring_offsets = gather_index(ring_offsets, order)
+    current.vertices = vertices[index]
+    present = np.bincount(owners, minlength=nregions) > 0
+    current.regions = np.flatnonzero(present)
+    ringcounts = np.bincount(owners, minlength=nregions)[current.regions]
+    current.region_offsets = np.zeros(len(current.regions) + 1, dtype=np.int64)
+    np.cumsum(ringcounts, out=current.region_offsets[1:])
+    current.layer_index = flat.layer_index[current.regions]
+    current.kinds = kinds[current.regions].astype(np.int8)
+    current.culled = culled[current.regions]
+    if len(current.vertices):
+        starts = current.ring_offsets[current.region_offsets[:-1]]
+        current.bounds = np.hstack(
+            [
+                np.minimum.reduceat(current.vertices, starts, axis=0),
+                np.maximum.reduceat(current.vertices, starts, axis=0),
+            ]
+        )
+    current.tiles = _tiles(current.bounds, tile_size * current.downsample)
+    return current
+
+
+def _tiles(
+    bounds: NDArray[np.float64], span: float
+) -> dict[tuple[int, int], NDArray[np.int64]]:  # numpydoc ignore=GL08
+    # the regions in each tile, from the range of tiles their bounding box overlaps
+    if len(bounds) == 0:
+        return {}
+    first = np.floor(bounds[:, :2] / span).astype(np.int64)
+    last = np.floor(bounds[:, 2:] / span).astype(np.int64)
+    columns = last[:, 0] - first[:, 0] + 1
+    count = columns * (last[:, 1] - first[:, 1] + 1)
+    region = np.repeat(np.arange(len(bounds), dtype=np.int64), count)
+    local = np.arange(len(region)) - np.repeat(np.cumsum(count) - count, count)
+    column = first[region, 0] + local % columns[region]
+    row = first[region, 1] + local // columns[region]
+    order = np.lexsort((region, column, row))
+    column, row, region = column[order], row[order], region[order]
+    split = np.flatnonzero((np.diff(column) != 0) | (np.diff(row) != 0)) + 1
+    return {
+        (int(c[0]), int(r[0])): g
+        for c, r, g in zip(
+            np.split(column, split), np.split(row, split), np.split(region, split)
+        )
+    }
+
+
+def _geometry(
+    current: PyramidLevel, region: int
+) -> dict[str, Any]:  # numpydoc ignore=GL08
+    rings = current.rings(region)
+    kind = current.kinds[region]
+    if kind == POINT:
+        return {"type": "Point", "coordinates": rings[0][0].tolist()}
+    if kind == LINE:
+        return {"type": "LineString", "coordinates": rings[0].tolist()}
+    coordinates = []
+    for ring in rings:
+        coords = ring.tolist()
+        if coords[0] != coords[-1]:
+            coords.append(coords[0])
+        coordinates.append(coords)
+    return {"type": "Polygon", "coordinates": coordinates}
@@ -0,0 +1,579 @@
+"""A local http service that answers questions about .annotations files from a warm cache."""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Optional, Union  # noqa: F401
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from numpy.typing import NDArray
+
+from pyhaloxmlc import pointsinrings
+
+from .cache import AnnotationCache, estimate_nbytes
+from .distance import SegmentIndex
+from .flat import flatten_layers
+from .HaloXML import HaloXML
+
+SAMPLES = 1000  # latencies kept per endpoint for the percentiles
+
+log = logging.getLogger("HaloXML-Serve")
+
+
+class CachedSlide:
+    """
+    A parsed .annotations file with its spatial indexes.
+
+    The negative regions are matched. The GeoJSON and the index of the edges of
+    each layer are made when they are first needed and kept for the next request.
+
+    Parameters
+    ----------
+    pth : str | os.PathLike[Any]
+        Path to the .annotations file, it can be compressed.
+
+    Attributes
+    ----------
+    path : Path
+        Path to the file.
+    mtime : int
+        Modification time of the file in nanoseconds when it was read.
+    hx : HaloXML
+        The annotations.
+    bounds : NDArray[np.float64]
+        Array of shape (regions, 4) with the bounding box of every region of all
+        layers, in the order of the layers and their regions.
+    layer_offsets : NDArray[np.int64]
+        Index in bounds of the first region of each layer, followed by the number
+        of regions.
+    """
+
+    def __init__(
+        self, pth: Union[str, os.PathLike[Any]]
+    ) -> None:  # numpydoc ignore=GL08
+        self.path = Path(pth)
+        self.mtime = self.path.stat().st_mtime_ns  # type: int
+        self.hx = HaloXML()
+        self.hx.load(self.path)
+        self.hx.matchnegative()
+        self._flat = flatten_layers(self.hx.layers)
+        self.bounds = self._flat.bounds()  # type: NDArray[np.float64]
+        self.layer_offsets = np.zeros(len(self.hx.layers) + 1, dtype=np.int64)  # type: NDArray[np.int64]
+        np.cumsum([len(x.regions) for x in self.hx.layers], out=self.layer_offsets[1:])
+        self._size = estimate_nbytes(self.hx)  # the vertices are read by flatten
+        self._features = None  # type: Optional[list[dict[str, Any]]]
+        self._geojson = None  # type: Optional[bytes]
+        self._indexes = {}  # type: dict[int, SegmentIndex]
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Estimate of the memory used by this file.
+
+        Returns
+        -------
+        int
+            The estimated number of bytes.
+        """
+        flat = self._flat
+        size = self._size + self.bounds.nbytes + flat.vertices.nbytes
+        size += flat.ring_offsets.nbytes + flat.region_offsets.nbytes
+        with self._lock:
+            if self._geojson is not None:
+                size += 2 * len(self._geojson)
+            for index in self._indexes.values():
+                size += index.segments.nbytes + index.cell_segments.nbytes
+        return size
+
+    def features(self) -> list[dict[str, Any]]:
+        """
+        GeoJSON features of all regions, in the same order as bounds.
+
+        Returns
+        -------
+        list[dict[str, Any]]
+            A GeoJSON Feature for each region, with a deterministic id.
+        """
+        with self._lock:
+            if self._features is None:
+                features = []  # type: list[dict[str, Any]]
+                for layer in self.hx.layers:
+                    features.extend(layer.as_geojson_dicts(matchnegative=False))
+                self._features = features
+            return self._features
+
+    def geojson(self) -> bytes:
+        """
+        All annotations as an encoded GeoJSON FeatureCollection.
+
+        Returns
+        -------
+        bytes
+            The utf-8 encoded GeoJSON.
+        """
+        features = self.features()
+        with self._lock:
+            if self._geojson is None:
+                collection = {"type": "FeatureCollection", "features": features}
+                self._geojson = json.dumps(collection, sort_keys=True).encode()
+            return self._geojson
+
+    def index(self, layer: int) -> SegmentIndex:
+        """
+        The index of the edges of the regions of a layer.
+
+        Parameters
+        ----------
+        layer : int
+            Index of the layer.
+
+        Returns
+        -------
+        SegmentIndex
+            The edges in a grid.
+        """
+        with self._lock:
+            if layer not in self._indexes:
+                flat = flatten_layers([self.hx.layers[layer]])
+                self._indexes[layer] = SegmentIndex(flat)
+            return self._indexes[layer]
+
+    def distance(
+        self, points: NDArray[np.float64], layer: int, max_distance: float = math.inf
+    ) -> tuple[NDArray[np.float64], NDArray[np.int64]]:
+        """
+        Signed distance from points to the nearest boundary of the regions of a layer.
+
+        Parameters
+        ----------
+        points : NDArray[np.float64]
+            Array of shape (n, 2) with the x and y coordinates of the points.
+        layer : int
+            Index of the layer.
+        max_distance : float
+            Edges farther away are not searched.
+
+        Returns
+        -------
+        tuple[NDArray[np.float64], NDArray[np.int64]]
+            The distance of each point, negative inside and positive outside, and the
+            index in bounds of the region of the nearest boundary. Points without a
+            boundary within max_distance get -inf or inf and region -1.
+
+        See Also
+        --------
+        pyhaloxml.distance.region_distance : How the distances are found.
+        """
+        index = self.index(layer)
+        distance, nearest = index.query(points, max_distance)
+        region = np.full(len(nearest), -1, dtype=np.int64)
+        found = nearest >= 0
+        region[found] = index.region[nearest[found]] + self.layer_offsets[layer]
+        return distance, region
+
+    def regions_in(
+        self, box: tuple[float, float, float, float], layers: Optional[list[str]] = None
+    ) -> NDArray[np.int64]:
+        """
+        The regions whose bounding box intersects a box, e.g. a tile of a viewer.
+
+        Parameters
+        ----------
+        box : tuple[float, float, float, float]
+            Minimum x, minimum y, maximum x and maximum y of the box.
+        layers : list[str] | None
+            Only give the regions of the layers with these names, by default all.
+
+        Returns
+        -------
+        NDArray[np.int64]
+            Index in bounds of the regions.
+        """
+        x0, y0, x1, y1 = box
+        b = self.bounds
+        mask = (b[:, 0] <= x1) & (b[:, 2] >= x0) & (b[:, 1] <= y1) & (b[:, 3] >= y0)
+        if layers is not None:
+            names = np.array([x.name in layers for x in self.hx.layers], dtype=np.bool_)
+            mask &= np.repeat(names, np.diff(self.layer_offsets))
+        return np.flatnonzero(mask)
+
+    def contains(self, points: NDArray[np.float64]) -> list[list[tuple[int, int]]]:
+        """
+        The regions that contain each point.
+
+        All regions whose bounding box contains a point are tested, so a point can
+        be in several regions, also of the same layer when they overlap. A point in
+        a hole is not in the region.
+
+        Parameters
+        ----------
+        points : NDArray[np.float64]
+            Array of shape (n, 2) with the x and y coordinates of the points.
+
+        Returns
+        -------
+        list[list[tuple[int, int]]]
+            For each point the index of the layer and of the region in bounds.
+        """
+        points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 2)
+        flat = self._flat
+        candidates = [self.regions_in((x, y, x, y)) for x, y in points.tolist()]
+        pointindex = np.repeat(np.arange(len(points)), [len(x) for x in candidates])
+        regionindex = np.concatenate([np.empty(0, dtype=np.int64), *candidates])
+        keep = flat.hasarea()[regionindex]
+        pointindex, regionindex = pointindex[keep], regionindex[keep]
+        hits = [[] for _ in range(len(points))]  # type: list[list[tuple[int, int]]]
+        order = np.argsort(regionindex, kind="stable")
+        regions, starts = np.unique(regionindex[order], return_index=True)
+        for region, group in zip(regions, np.split(order, starts[1:])):
+            # the last ring that contains a point is the outline if it is not in a hole
+            first, last = flat.region_offsets[region], flat.region_offsets[region + 1]
+            ring = np.empty(len(group), dtype=np.int64)
+            pointsinrings(
+                points[pointindex[group]],
+                flat.vertices,
+                flat.ring_offsets[first : last + 1],
+                ring,
+            )
+            for j in pointindex[group[ring == 0]]:
+                hits[j].append((int(flat.layer_index[region]), int(region)))
+        for x in hits:
+            x.sort()
+        return hits
+
+
+class ServiceMetrics:
+    """
+    Number of requests, errors and latency of each endpoint.
+
+    Attributes
+    ----------
+    started : float
+        Time the service started, in seconds since the epoch.
+    """
+
+    def __init__(self) -> None:  # numpydoc ignore=GL08
+        self.started = time.time()  # type: float
+        self._counts = {}  # type: dict[str, list[int]]
+        self._latency = {}  # type: dict[str, deque[float]]
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, error: bool = False) -> None:
+        """
+        Add a request.
+
+        Parameters
+        ----------
+        endpoint : str
+            The path of the request.
+        seconds : float
+            Time it took to answer.
+        error : bool
+            True if the request failed.
+        """
+        with self._lock:
+            counts = self._counts.setdefault(endpoint, [0, 0])
+            counts[0] += 1
+            counts[1] += int(error)
+            self._latency.setdefault(endpoint, deque(maxlen=SAMPLES)).append(seconds)
+
+    def todict(self) -> dict[str, Any]:
+        """
+        Create a dictonary with the metrics.
+
+        Returns
+        -------
+        dict[str, Any]
+            The uptime and, for each endpoint, the number of requests and errors and
+            the mean, median, 95th and 99th percentile of the latency in milliseconds
+            over the last requests.
+        """
+        with self._lock:
+            endpoints = {}
+            for endpoint, (count, errors) in self._counts.items():
+                ms = np.array(self._latency[endpoint], dtype=np.float64) * 1e3
+                p50, p95, p99 = np.percentile(ms, [50, 95, 99]).tolist()
+                endpoints[endpoint] = {
+                    "requests": count,
+                    "errors": errors,
+                    "mean_ms": float(np.mean(ms)),
+                    "p50_ms": p50,
+                    "p95_ms": p95,
+                    "p99_ms": p99,
+                }
+        return {"uptime": time.time() - self.started, "endpoints": endpoints}
+
+
+class AnnotationServer(ThreadingHTTPServer):
+    """
+    Http server that answers every request on its own thread.
+
+    Parameters
+    ----------
+    address : tuple[str, int]
+        Host and port to listen on, port 0 picks a free port.
+    root : str | os.PathLike[Any]
+        Only files in this directory can be requested.
+    cache : AnnotationCache[CachedSlide]
+        The cache of parsed files.
+
+    Attributes
+    ----------
+    root : Path
+        The resolved root directory.
+    cache : AnnotationCache[CachedSlide]
+        The cache of parsed files.
+    metrics : ServiceMetrics
+        Latency of the requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        root: Union[str, os.PathLike[Any]],
+        cache: AnnotationCache[CachedSlide],
+    ) -> None:  # numpydoc ignore=GL08
+        super().__init__(address, _Handler)
+        self.root = Path(root).resolve()
+        self.cache = cache
+        self.metrics = ServiceMetrics()
+
+    def slide(self, query: dict[str, list[str]]) -> CachedSlide:
+        """
+        The parsed file of the path parameter of a request.
+
+        Parameters
+        ----------
+        query : dict[str, list[str]]
+            The parameters of the request.
+
+        Returns
+        -------
+        CachedSlide
+            The parsed file.
+        """
+        pth = Path(self.root, _param(query, "path")).resolve()
+        if not pth.is_relative_to(self.root):
+            raise PermissionError(f"{pth} is outside of the served directory")
+        if not pth.is_file():
+            raise FileNotFoundError(f"{pth} does not exist")
+        return self.cache.get(pth)
+
+
+def _param(query: dict[str, list[str]], name: str) -> str:  # numpydoc ignore=GL08
+    if name not in query:
+        raise ValueError(f"Missing parameter: {name}")
+    return query[name][0]
+
+
+def _numbers(text: str, size: int) -> NDArray[np.float64]:  # numpydoc ignore=GL08
+    values = np.array([float(x) for x in text.replace(";", ",").split(",")])
+    if len(values) == 0 or len(values) % size:
+        raise ValueError(f"Expected a multiple of {size} numbers: {text}")
+    return values.reshape(-1, size)
+
+
+def _collection(
+    slide: CachedSlide, regions: NDArray[np.int64]
+) -> dict[str, Any]:  # numpydoc ignore=GL08
+    features = slide.features()
+    return {"type": "FeatureCollection", "features": [features[i] for i in regions]}
+
+
+def _geojson(
+    server: AnnotationServer, query: dict[str, list[str]]
+) -> bytes:  # numpydoc ignore=GL08
+    return server.slide(query).geojson()
+
+
+def _regions(
+    server: AnnotationServer, query: dict[str, list[str]]
+) -> bytes:  # numpydoc ignore=GL08
+    slide = server.slide(query)
+    box = _numbers(_param(query, "bbox"), 4)[0]
+    layers = query.get("layer")
+    regions = slide.regions_in((box[0], box[1], box[2], box[3]), layers)
+    return json.dumps(_collection(slide, regions)).encode()
+
+
+def _contains(
+    server: AnnotationServer, query: dict[str, list[str]]
+) -> bytes:  # numpydoc ignore=GL08
+    slide = server.slide(query)
+    points = _numbers(_param(query, "points"), 2)
+    features = slide.features()
+    result = [
+        [
+            {
+                "layer": slide.hx.layers[layer].name,
+                "region": region,
+                "id": features[region]["id"],
+            }
+            for layer, region in hits
+        ]
+        for hits in slide.contains(points)
+    ]
+    return json.dumps({"points": points.tolist(), "regions": result}).encode()
+
+
+def _distance(
+    server: AnnotationServer, query: dict[str, list[str]]
+) -> bytes:  # numpydoc ignore=GL08
+    slide = server.slide(query)
+    name = _param(query, "layer")
+    names = [x.name for x in slide.hx.layers]
+    if name not in names:
+        raise LookupError(f"Unknown layer: {name}")
+    points = _numbers(_param(query, "points"), 2)
+    max_distance = float(query.get("max", ["inf"])[0])
+    distance, region = slide.distance(points, names.index(name), max_distance)
+    features = slide.features()
+    result = [
+        {"distance": d, "region": r, "id": features[r]["id"]}
+        if r >= 0
+        else {"distance": None, "region": None, "id": None}
+        for d, r in zip(distance.tolist(), region.tolist())
+    ]
+    return json.dumps({"points": points.tolist(), "nearest": result}).encode()
+
+
+def _metrics(
+    server: AnnotationServer, query: dict[str, list[str]]
+) -> bytes:  # numpydoc ignore=GL08
+    result = server.metrics.todict()
+    result["cache"] = server.cache.todict()
+    return json.dumps(result).encode()
+
+
+ENDPOINTS = {
+    "/geojson": _geojson,
+    "/regions": _regions,
+    "/contains": _contains,
+    "/distance": _distance,
+    "/metrics": _metrics,
+}  # type: dict[str, Callable[[AnnotationServer, dict[str, list[str]]], bytes]]
+
+
+class _Handler(BaseHTTPRequestHandler):  # numpydoc ignore=GL08
+    server: AnnotationServer
+
+    def do_GET(self) -> None:  # numpydoc ignore=GL08
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        status = 200
+        try:
+            if url.path not in ENDPOINTS:
+                raise LookupError(f"Unknown endpoint: {url.path}")
+            body = ENDPOINTS[url.path](self.server, query)
+        except Exception as e:
+            if isinstance(e, PermissionError):
+                status = 403
+            elif isinstance(e, (FileNotFoundError, LookupError)):
+                status = 404
+            elif isinstance(e, ValueError):
+                status = 400
+            else:
+                status = 500
+                log.exception(f"Failed to answer {self.path}")
+            body = json.dumps({"error": str(e)}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if url.path in ENDPOINTS:
+            self.server.metrics.record(
+                url.path, time.perf_counter() - start, status != 200
+            )
+
+    def log_message(self, format: str, *args: Any) -> None:  # numpydoc ignore=GL08
+        log.debug(format % args)
+
+
+def make_server(
+    root: Union[str, os.PathLike[Any]],
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    max_bytes: int = 1 << 30,
+) -> AnnotationServer:
+    """
+    Create the server, call serve_forever on it to answer requests.
+
+    All requests are GET requests with the parameters in the query string and
+    return json:
+
+    - /geojson?path=<file> - All annotations as a GeoJSON FeatureCollection.
+    - /regions?path=<file>&bbox=<x0,y0,x1,y1>[&layer=<name>] - The regions whose
+      bounding box intersects the box, as a GeoJSON FeatureCollection.
+    - /contains?path=<file>&points=<x,y;x,y;...> - For each point the layer,
+      index and feature id of the regions that contain it.
+    - /distance?path=<file>&layer=<name>&points=<x,y;x,y;...>[&max=<distance>] -
+      For each point the signed distance to the nearest boundary of the regions
+      of the layer, negative inside, with the index and feature id of its region.
+      Points without a boundary within max get null.
+    - /metrics - Number of requests and latency per endpoint and the hits,
+      misses and size of the cache.
+
+    The path of a file is relative to root. Files outside of root can not be
+    requested.
+
+    Parameters
+    ----------
+    root : str | os.PathLike[Any]
+        The directory with the .annotations files.
+    host : str
+        Address to listen on, by default only this machine.
+    port : int
+        Port to listen on, 0 picks a free port.
+    max_bytes : int
+        Bound on the estimated memory of the cached files.
+
+    Returns
+    -------
+    AnnotationServer
+        The server, it listens but does not answer yet.
+    """
+    return AnnotationServer((host, port), root, AnnotationCache(CachedSlide, max_bytes))
+
+
+def serve(
+    root: Union[str, os.PathLike[Any]],
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    max_bytes: int = 1 << 30,
+) -> None:
+    """
+    Answer requests about the files in a directory until interrupted.
+
+    Parameters
+    ----------
+    root : str | os.PathLike[Any]
+        The directory with the .annotations files.
+    host : str
+        Address to listen on, by default only this machine.
+    port : int
+        Port to listen on.
+    max_bytes : int
+        Bound on the estimated memory of the cached files.
+
+    See Also
+    --------
+    make_server : The endpoints.
+    """
+    with make_server(root, host, port, max_bytes) as server:
+        log.info(f"Serving {server.root} on http://{host}:{server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
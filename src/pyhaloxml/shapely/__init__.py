@@ -1,3 +1,13 @@
-from .to_shapely import layer_to_shapely, region_to_shapely
+from .to_shapely import (
+    import_shapely,
+    layer_to_shapely,
+    region_to_shapely,
+    regions_from_shapely,
+)
 
-__all__ = ["layer_to_shapely", "region_to_shapely"]
+__all__ = [
+    "import_shapely",
+    "layer_to_shapely",
+    "region_to_shapely",
+    "regions_from_shapely",
+]
@@ -1,40 +1,122 @@
+from typing import TYPE_CHECKING, Any, Optional
+
 from ..Layer import Layer
-from ..misc import RegionType
-from ..Region import Region
+from ..misc import Comment, RegionType
+from ..Region import Region, region_from_coordinates
 
-try:
+if TYPE_CHECKING:
     import shapely.geometry as sg
-except ImportError:
-    raise ImportError(
-        "Shapely is not installed. Cannot use the shapely converters of haloxml."
-    )
+
+
+def import_shapely(action: str = "use the shapely converters of haloxml") -> Any:
+    """
+    Import shapely, which is an optional dependency.
+
+    Parameters
+    ----------
+    action : str
+        What needs shapely, for the message when it is not installed.
+
+    Returns
+    -------
+    Any
+        The shapely module.
+
+    Raises
+    ------
+    ImportError
+        If shapely is not installed.
+    """
+    try:
+        import shapely
+    except ImportError:
+        raise ImportError(f"Shapely is not installed. Cannot {action}.")
+    return shapely
 
 
 def region_to_shapely(
-    region: Region,
-) -> sg.Polygon | sg.Point | sg.LineString:
-    """Return the region as a shapeply polygon :return:"""
+    region: Region, make_valid: bool = False
+) -> "sg.Polygon | sg.Point | sg.LineString":
+    """
+    Return the region as a shapely geometry.
+
+    A ruler becomes a LineString, a pin a Point and the other regions a Polygon
+    with their holes.
 
+    Parameters
+    ----------
+    region : Region
+        The region to convert.
+    make_valid : bool
+        How to handle an invalid polygon, like a self intersecting one. By default
+        it becomes the LineString of its outline, as it always did. Clipping,
+        dissolving and the overlap use the area, so they repair it with
+        shapely.make_valid instead.
+
+    Returns
+    -------
+    sg.Polygon | sg.Point | sg.LineString
+        The geometry of the region.
+    """
+    shapely = import_shapely()
     if region.type == RegionType.Ruler:
-        geometry = sg.LineString(region.getvertices())
+        geometry = shapely.LineString(region.getvertices())
     elif region.type == RegionType.Pin:
-        geometry = sg.Point(region.getvertices())
+        geometry = shapely.Point(region.getvertices())
     else:
-        geometry = sg.Polygon(
+        geometry = shapely.Polygon(
             region.getvertices(), [x.getvertices() for x in region.holes]
         )
         if not geometry.is_valid:
-            geometry = sg.LineString(region.getvertices())
+            if make_valid:
+                geometry = shapely.make_valid(geometry)
+            else:
+                geometry = shapely.LineString(region.getvertices())
     return geometry
 
 
-def layer_to_shapely(layer: Layer, fix_negative: bool = True) -> sg.MultiPolygon:
+def regions_from_shapely(
+    geometry: Any, comments: Optional[list[Comment]] = None
+) -> list[Region]:
+    """
+    Return the polygons with an area in a shapely geometry as regions.
+
+    Multi part geometries and collections are searched for polygons, the other
+    geometries are skipped.
+
+    Parameters
+    ----------
+    geometry : shapely.Geometry
+        The geometry to convert.
+    comments : list[Comment], optional
+        Comments to give each region.
+
+    Returns
+    -------
+    list[Region]
+        A region for each polygon, with its interiors as holes.
+    """
+    shapely = import_shapely()
+    comments = [] if comments is None else comments
+    regions = []
+    for part in shapely.get_parts(geometry).tolist():
+        if part.geom_type == "Polygon" and part.area > 0:
+            coords = [list(part.exterior.coords)]
+            coords += [list(x.coords) for x in part.interiors]
+            regions.append(region_from_coordinates(coords, comments))
+        elif part.geom_type in ["MultiPolygon", "GeometryCollection"]:
+            regions.extend(regions_from_shapely(part, comments))
+    return regions
+
+
+def layer_to_shapely(layer: Layer, fix_negative: bool = True) -> "sg.MultiPolygon":
     """Return the layer as shaply multipolygon :return: A shapely multipolygon
     contain all the regions in this layer."""
+    shapely = import_shapely()
     if layer.contains_negative() and fix_negative:
         layer.match_negative()
     geometries = []
     for x in layer.regions:
         geom = region_to_shapely(x)
         geometries.append(geom)
-    return sg.GeometryCollection(geometries)
+    return shapely.GeometryCollection(geometries)
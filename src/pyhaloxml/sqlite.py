@@ -0,0 +1,296 @@
+"""Export annotations to a SQLite database with a spatial index."""
+
+import logging
+import os
+import sqlite3
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from .flat import flatten_layers
+from .metrics import region_metrics
+from .misc import RegionType
+from .wkb import flat_to_wkb
+
+if TYPE_CHECKING:
+    from .Layer import Layer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS slides (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS layers (
+    id INTEGER PRIMARY KEY,
+    slide_id INTEGER NOT NULL REFERENCES slides(id),
+    name TEXT NOT NULL,
+    linecolor INTEGER NOT NULL,
+    visible TEXT
+);
+CREATE TABLE IF NOT EXISTS regions (
+    id INTEGER PRIMARY KEY,
+    slide_id INTEGER NOT NULL REFERENCES slides(id),
+    layer_id INTEGER NOT NULL REFERENCES layers(id),
+    type TEXT NOT NULL,
+    n_vertices INTEGER,
+    n_holes INTEGER,
+    area REAL,
+    perimeter REAL,
+    centroid_x REAL,
+    centroid_y REAL,
+    geometry BLOB
+);
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY,
+    region_id INTEGER NOT NULL REFERENCES regions(id),
+    author TEXT,
+    body TEXT,
+    created TEXT,
+    modified TEXT
+);
+CREATE INDEX IF NOT EXISTS layers_slide ON layers(slide_id);
+CREATE INDEX IF NOT EXISTS regions_slide ON regions(slide_id);
+CREATE INDEX IF NOT EXISTS regions_layer ON regions(layer_id);
+CREATE INDEX IF NOT EXISTS comments_region ON comments(region_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS regions_rtree USING rtree(id, xmin, xmax, ymin, ymax);
+"""
+
+log = logging.getLogger("HaloXML-SQLite")
+
+
+def connect(pth: Union[str, os.PathLike[Any]]) -> sqlite3.Connection:
+    """
+    Open a database and create the tables if they do not exist yet.
+
+    Parameters
+    ----------
+    pth : str | os.PathLike[Any]
+        Path to the SQLite database.
+
+    Returns
+    -------
+    sqlite3.Connection
+        Connection to the database.
+    """
+    con = sqlite3.connect(Path(pth))
+    con.executescript(SCHEMA)
+    return con
+
+
+def delete_slide(con: sqlite3.Connection, name: str) -> None:
+    """
+    Remove a slide and all its layers, regions and comments from the database.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection to the database.
+    name : str
+        Name of the slide.
+    """
+    regions = "SELECT id FROM regions WHERE slide_id IN (SELECT id FROM slides WHERE name = ?)"
+    con.execute(f"DELETE FROM regions_rtree WHERE id IN ({regions})", (name,))
+    con.execute(f"DELETE FROM comments WHERE region_id IN ({regions})", (name,))
+    for table in ["regions", "layers"]:
+        con.execute(
+            f"DELETE FROM {table} WHERE slide_id IN (SELECT id FROM slides WHERE name = ?)",
+            (name,),
+        )
+    con.execute("DELETE FROM slides WHERE name = ?", (name,))
+
+
+def insert_slide(
+    con: sqlite3.Connection,
+    name: str,
+    layers: "list[Layer]",
+    mtime: Optional[float] = None,
+) -> int:
+    """
+    Write the layers of one slide to the database in a single transaction.
+
+    A slide that is already in the database with the same name is replaced.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection to the database.
+    name : str
+        Name of the slide.
+    layers : list[Layer]
+        The layers of the slide.
+    mtime : float | None
+        Modification time of the source file, used to skip unchanged files.
+
+    Returns
+    -------
+    int
+        The id of the slide.
+    """
+    flat = flatten_layers(layers)
+    metrics = region_metrics(flat)
+    geometries = flat_to_wkb(flat)
+    with con:
+        delete_slide(con, name)
+        slide_id = con.execute(
+            "INSERT INTO slides (name, mtime) VALUES (?, ?)", (name, mtime)
+        ).lastrowid
+        assert slide_id is not None
+        (layer_start,) = con.execute(
+            "SELECT COALESCE(MAX(id), 0) + 1 FROM layers"
+        ).fetchone()
+        con.executemany(
+            "INSERT INTO layers (id, slide_id, name, linecolor, visible) VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    layer_start + i,
+                    slide_id,
+                    x.name,
+                    int(x.linecolor.getlinecolor()),
+                    x.visible,
+                )
+                for i, x in enumerate(flat.layers)
+            ),
+        )
+        (region_start,) = con.execute(
+            "SELECT COALESCE(MAX(id), 0) + 1 FROM regions"
+        ).fetchone()
+        ids = range(region_start, region_start + len(flat))
+        con.executemany(
+            "INSERT INTO regions (id, slide_id, layer_id, type, n_vertices, n_holes, area, perimeter, centroid_x, centroid_y, geometry) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            zip(
+                ids,
+                [slide_id] * len(flat),
+                (layer_start + x for x in flat.layer_index.tolist()),
+                (str(RegionType(x)) for x in flat.types.tolist()),
+                metrics["n_vertices"].tolist(),
+                metrics["n_holes"].tolist(),
+                metrics["area"].tolist(),
+                metrics["perimeter"].tolist(),
+                metrics["centroid_x"].tolist(),
+                metrics["centroid_y"].tolist(),
+                geometries,
+            ),
+        )
+        con.executemany(
+            "INSERT INTO regions_rtree (id, xmin, xmax, ymin, ymax) VALUES (?, ?, ?, ?, ?)",
+            zip(
+                ids,
+                metrics["xmin"].tolist(),
+                metrics["xmax"].tolist(),
+                metrics["ymin"].tolist(),
+                metrics["ymax"].tolist(),
+            ),
+        )
+        con.executemany(
+            "INSERT INTO comments (region_id, author, body, created, modified) VALUES (?, ?, ?, ?, ?)",
+            (
+                (i, c.getauthor(), str(c), c.getcreated(), c.getmodified())
+                for i, region in zip(ids, flat.regions)
+                for c in region.comments
+            ),
+        )
+    return slide_id
+
+
+def files_to_sqlite(
+    pths: Iterable[Union[str, os.PathLike[Any]]],
+    db: Union[str, os.PathLike[Any]],
+    matchnegative: bool = True,
+) -> int:
+    """
+    Add many .annotations files to a database, one transaction per file.
+
+    The slides are named after the absolute path of the file. Files that are
+    already in the database with the same modification time are skipped, so the
+    database can be updated incrementally.
+
+    Parameters
+    ----------
+    pths : Iterable[str | os.PathLike[Any]]
+        Paths to the .annotations files.
+    db : str | os.PathLike[Any]
+        Path to the SQLite database.
+    matchnegative : bool
+        True (default) - First matches negative regions, so they become holes.
+        False - Will not match negative regions.
+
+    Returns
+    -------
+    int
+        The number of files that were written to the database.
+    """
+    from .HaloXML import HaloXML
+
+    con = connect(db)
+    written = 0
+    try:
+        for pth in pths:
+            pth = Path(pth).resolve()
+            mtime = pth.stat().st_mtime
+            row = con.execute(
+                "SELECT mtime FROM slides WHERE name = ?", (str(pth),)
+            ).fetchone()
+            if row is not None and row[0] == mtime:
+                continue
+            hx = HaloXML()
+            hx.load(pth)
+            if matchnegative:
+                hx.matchnegative()
+            insert_slide(con, str(pth), hx.layers, mtime)
+            written += 1
+            log.info(f"Added {pth.stem} to {Path(db).stem}")
+    finally:
+        con.close()
+    return written
+
+
+def regions_in_bbox(
+    con: sqlite3.Connection,
+    xmin: float,
+    ymin: float,
+    xmax: float,
+    ymax: float,
+    layer: Optional[str] = None,
+    min_area: float = 0.0,
+) -> list[tuple[int, str, str, float, bytes]]:
+    """
+    Find the regions whose bounding box intersects a rectangle.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection to the database.
+    xmin : float
+        Left side of the rectangle.
+    ymin : float
+        Top side of the rectangle.
+    xmax : float
+        Right side of the rectangle.
+    ymax : float
+        Bottom side of the rectangle.
+    layer : str | None
+        Only return regions in layers with this name.
+    min_area : float
+        Only return regions with at least this area.
+
+    Returns
+    -------
+    list[tuple[int, str, str, float, bytes]]
+        Region id, slide name, layer name, area and WKB geometry of each region.
+    """
+    query = (
+        "SELECT regions.id, slides.name, layers.name, regions.area, regions.geometry "
+        "FROM regions_rtree "
+        "JOIN regions ON regions.id = regions_rtree.id "
+        "JOIN layers ON layers.id = regions.layer_id "
+        "JOIN slides ON slides.id = regions.slide_id "
+        "WHERE regions_rtree.xmax >= ? AND regions_rtree.xmin <= ? "
+        "AND regions_rtree.ymax >= ? AND regions_rtree.ymin <= ? "
+        "AND regions.area >= ?"
+    )
+    params = [xmin, xmax, ymin, ymax, min_area]  # type: list[Any]
+    if layer is not None:
+        query += " AND layers.name = ?"
+        params.append(layer)
+    return con.execute(query, params).fetchall()
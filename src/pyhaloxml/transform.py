@@ -0,0 +1,111 @@
+"""Affine transformations of regions."""
+
+import math
+from typing import TYPE_CHECKING, Any  # noqa: F401
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from .misc import formatcoordinate, getvertexelements
+
+if TYPE_CHECKING:
+    from .Region import Region
+
+
+def affine_matrix(matrix: ArrayLike) -> NDArray[np.float64]:
+    """
+    Convert a 2x3 or 3x3 affine matrix to a 3x3 array.
+
+    The matrix maps a point (x, y) to (a*x + b*y + c, d*x + e*y + f) for the matrix
+    [[a, b, c], [d, e, f]] or [[a, b, c], [d, e, f], [0, 0, 1]].
+
+    Parameters
+    ----------
+    matrix : ArrayLike
+        The affine matrix.
+
+    Returns
+    -------
+    NDArray[np.float64]
+        The 3x3 matrix.
+    """
+    m = np.asarray(matrix, dtype=np.float64)
+    if m.shape == (2, 3):
+        m = np.vstack([m, [0.0, 0.0, 1.0]])
+    if m.shape != (3, 3) or not np.array_equal(m[2], [0.0, 0.0, 1.0]):
+        raise ValueError(f"Not an affine matrix: {m.tolist()}")
+    return m
+
+
+def keeps_axes(matrix: NDArray[np.float64]) -> bool:
+    """
+    True if the matrix maps axis aligned rectangles to axis aligned rectangles.
+
+    This holds for scaling, translation, flips and rotations by multiples of 90 degrees.
+
+    Parameters
+    ----------
+    matrix : NDArray[np.float64]
+        A 3x3 affine matrix.
+
+    Returns
+    -------
+    bool
+        True if rectangles and ellipses can be transformed by their corners.
+    """
+    return bool(
+        (matrix[0, 1] == 0 and matrix[1, 0] == 0)
+        or (matrix[0, 0] == 0 and matrix[1, 1] == 0)
+    )
+
+
+def transform_regions(
+    regions: "list[Region]", matrix: ArrayLike, round_vertices: bool = True
+) -> None:
+    """
+    Apply an affine transformation to the regions and their holes.
+
+    All vertices are transformed in a single matrix multiplication and written back
+    to the xml of the regions, so the change is saved. Rectangles and ellipses are
+    converted to polygons when the transformation rotates or shears them.
+
+    Parameters
+    ----------
+    regions : list[Region]
+        The regions to transform.
+    matrix : ArrayLike
+        A 2x3 or 3x3 affine matrix.
+    round_vertices : bool
+        True (default) - Round to whole pixels, like the files written by Halo.
+        False - Keep the exact coordinates.
+
+    See Also
+    --------
+    affine_matrix : The format of the matrix.
+    """
+    m = affine_matrix(matrix)
+    allregions = []  # type: list[Region]
+    for region in regions:
+        allregions.append(region)
+        allregions.extend(region.holes)
+    if not keeps_axes(m):
+        for region in allregions:
+            region.topolygon()
+    elements = [v for x in allregions for v in getvertexelements(x.region)]
+    coords = np.array(
+        [(float(v.attrib["X"]), float(v.attrib["Y"])) for v in elements],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    coords = coords @ m[:2, :2].T + m[:2, 2]
+    strings = []  # type: list[Any]
+    if round_vertices:
+        strings = np.rint(coords).astype(np.int64).astype(str).tolist()
+    else:
+        strings = [
+            [formatcoordinate(x), formatcoordinate(y)] for x, y in coords.tolist()
+        ]
+    for v, (x, y) in zip(elements, strings):
+        v.attrib["X"] = x
+        v.attrib["Y"] = y
+    for region in allregions:
+        region.vertices = [(math.nan, math.nan)]  # recomputed from the xml
@@ -0,0 +1,200 @@
+"""Validation and repair of the geometry of regions."""
+
+import json
+import math
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+from pyhaloxmlc import selfintersecting
+
+from .flat import FlatRegions, flatten_layers
+from .Layer import Layer
+from .misc import RegionType, setvertices
+from .Region import Region  # noqa: F401
+
+
+class ValidationReport:
+    """
+    The problems found in the regions of a set of layers.
+
+    Regions are identified by the name of their layer and their index in the
+    regions of that layer at the time of validation. A problem in a hole is
+    reported for the region that contains the hole.
+
+    Attributes
+    ----------
+    unclosed : list[tuple[str, int]]
+        Polygons of which the last vertex is not equal to the first vertex.
+    duplicate_vertices : list[tuple[str, int]]
+        Regions with the same vertex twice in a row.
+    self_intersections : list[tuple[str, int]]
+        Regions with an outline or hole that intersects itself.
+    degenerate : list[tuple[str, int]]
+        Regions with an outline or hole without area.
+    unmatched_holes : list[tuple[str, int]]
+        Negative regions that are not inside a positive region of their layer.
+    repaired : bool
+        True if the problems that can be repaired were repaired.
+    """
+
+    def __init__(self) -> None:  # numpydoc ignore=GL08
+        self.unclosed = []  # type: list[tuple[str, int]]
+        self.duplicate_vertices = []  # type: list[tuple[str, int]]
+        self.self_intersections = []  # type: list[tuple[str, int]]
+        self.degenerate = []  # type: list[tuple[str, int]]
+        self.unmatched_holes = []  # type: list[tuple[str, int]]
+        self.repaired = False  # type: bool
+
+    def __bool__(self) -> bool:  # numpydoc ignore=GL08
+        return not any(
+            [
+                self.unclosed,
+                self.duplicate_vertices,
+                self.self_intersections,
+                self.degenerate,
+                self.unmatched_holes,
+            ]
+        )
+
+    def __str__(self) -> str:  # numpydoc ignore=GL08
+        lines = []
+        for name, found in self.todict().items():
+            if isinstance(found, list) and found:
+                lines.append(f"{name}: {len(found)}")
+                lines += [f"  region {i} in {layer}" for layer, i in found]
+        if not lines:
+            lines.append("no problems found")
+        elif self.repaired:
+            lines.append("repaired all but the self intersections")
+        return "\n".join(lines)
+
+    def todict(self) -> dict[str, Any]:
+        """
+        Create a dictonary with the problems.
+
+        Returns
+        -------
+        dict[str, Any]
+            A dictonary with an entry for each attribute.
+        """
+        return dict(vars(self))
+
+    def tojson(self) -> str:
+        """
+        JSON representation of the problems.
+
+        Returns
+        -------
+        str
+            A jsonstring representation of the problems.
+        """
+        return json.dumps(self.todict(), sort_keys=True)
+
+
+def validate_layers(layers: list[Layer], repair: bool = False) -> ValidationReport:
+    """
+    Check the geometry of all regions in the layers.
+
+    All rings (outlines and holes) are checked at once on the flat vertex arrays
+    for missing closing vertices, duplicate consecutive vertices, zero area and
+    self intersections. Self intersecting rings are not reported as without area.
+    Negative regions that have not been matched yet are checked for a positive
+    region to belong to.
+
+    With repair, polygons are closed, duplicate vertices are removed and regions
+    or holes without area and unmatched negative regions are deleted, also in the
+    xml. Self intersections are only reported.
+
+    Parameters
+    ----------
+    layers : list[Layer]
+        The layers to check.
+    repair : bool
+        False (default) - Only report the problems.
+        True - Also repair the problems.
+
+    Returns
+    -------
+    ValidationReport
+        The problems that were found.
+    """
+    report = ValidationReport()
+    unmatched = []  # type: list[Region]
+    for layer in layers:
+        for neg_idx, pos_idx in layer.negative_matches():
+            if pos_idx == -1:
+                report.unmatched_holes.append((layer.name, neg_idx))
+                unmatched.append(layer.regions[neg_idx])
+
+    flat = flatten_layers(layers)
+    nrings = len(flat.ring_offsets) - 1
+    ring_region = flat.ring_region()
+    ring_type = flat.types[ring_region]
+    starts = flat.ring_offsets[:-1]
+    ends = flat.ring_offsets[1:]
+    v = flat.vertices
+    vertex_ring = np.repeat(np.arange(nrings), ends - starts)
+
+    unclosed = (ring_type == RegionType.Polygon) & np.any(
+        v[starts] != v[ends - 1], axis=1
+    )
+    same = np.all(v[1:] == v[:-1], axis=1) & (vertex_ring[1:] == vertex_ring[:-1])
+    duplicates = np.bincount(vertex_ring[1:][same], minlength=nrings) > 0
+    hasarea = np.isin(
+        ring_type, [RegionType.Rectangle, RegionType.Ellipse, RegionType.Polygon]
+    )
+    intersecting = np.zeros(nrings, dtype=np.uint8)
+    selfintersecting(np.ascontiguousarray(v), flat.ring_offsets, intersecting)
+    intersecting = hasarea & (intersecting == 1)
+    # the lobes of a self intersecting ring can cancel out in the signed area
+    degenerate = hasarea & ~intersecting & (_ringareas(flat) == 0)
+
+    index_in_layer = np.arange(len(flat)) - np.searchsorted(
+        flat.layer_index, flat.layer_index
+    )
+    for name, found in [
+        ("unclosed", unclosed),
+        ("duplicate_vertices", duplicates),
+        ("self_intersections", intersecting),
+        ("degenerate", degenerate),
+    ]:
+        getattr(report, name).extend(
+            (flat.layers[flat.layer_index[i]].name, int(index_in_layer[i]))
+            for i in np.unique(ring_region[found]).tolist()
+        )
+
+    if repair:
+        rings = [r for x in flat.regions for r in [x, *x.holes]]
+        for r in np.flatnonzero((unclosed | duplicates) & ~degenerate).tolist():
+            if rings[r].type != RegionType.Polygon:
+                continue
+            ring = v[starts[r] : ends[r]]
+            keep = np.ones(len(ring), dtype=np.bool_)
+            keep[1:] = np.any(ring[1:] != ring[:-1], axis=1)
+            vertices = [(x, y) for x, y in ring[keep].tolist()]
+            if vertices[0] != vertices[-1]:
+                vertices.append(vertices[0])
+            setvertices(rings[r].region, vertices)
+            rings[r].vertices = [(math.nan, math.nan)]  # recomputed from the xml
+        remove = {id(rings[r]) for r in np.flatnonzero(degenerate).tolist()}
+        remove |= {id(x) for x in unmatched}
+        for layer in layers:
+            layer.regions = [x for x in layer.regions if id(x) not in remove]
+            for region in layer.regions:
+                region.holes = [x for x in region.holes if id(x) not in remove]
+        report.repaired = True
+    return report
+
+
+def _ringareas(flat: FlatRegions) -> NDArray[np.float64]:  # numpydoc ignore=GL08
+    if len(flat.vertices) == 0:
+        return np.empty(0, dtype=np.float64)
+    x = flat.vertices[:, 0]
+    y = flat.vertices[:, 1]
+    starts = flat.ring_offsets[:-1]
+    nxt = np.arange(1, len(x) + 1)
+    nxt[flat.ring_offsets[1:] - 1] = starts
+    result = np.add.reduceat(x * y[nxt] - x[nxt] * y, starts) / 2
+    return np.asarray(result, dtype=np.float64)
@@ -0,0 +1,372 @@
+"""Convert label masks to annotations."""
+
+import os
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from pyhaloxmlc import pointsinrings, simplifyrings, tracelabels
+
+from .flat import gather_index
+from .misc import Color
+from .pack import NEGATIVE, PackedHaloXML
+
+if TYPE_CHECKING:
+    from .HaloXML import HaloXML
+
+PALETTE = [
+    (255, 0, 0),
+    (0, 255, 0),
+    (0, 0, 255),
+    (255, 255, 0),
+    (0, 255, 255),
+    (255, 0, 255),
+    (255, 128, 0),
+    (128, 0, 255),
+    (0, 128, 255),
+    (128, 255, 0),
+]
+
+
+def trace_labels(
+    mask: ArrayLike, background: int = 0
+) -> tuple[
+    NDArray[np.float64], NDArray[np.int64], NDArray[np.int64], NDArray[np.int64]
+]:
+    """
+    Trace the outlines and holes of all labels in a mask.
+
+    The rings follow the pixel edges, so the vertices are the pixel corners where
+    the outline changes direction, in pixel coordinates of the mask. Pixels of a
+    label that only touch diagonally belong to different regions. Outlines have a
+    positive area and holes a negative area. Where the pixels around a hole only
+    touch diagonally, the ring passes the same vertex twice. It is split there, so
+    every ring is simple and holes may touch each other or the outline at a point.
+
+    Parameters
+    ----------
+    mask : ArrayLike
+        Two dimensional array of integer labels. A C contiguous array (also a memory
+        mapped file) is read without copying it.
+    background : int
+        The label that is not traced.
+
+    Returns
+    -------
+    tuple[NDArray[np.float64], NDArray[np.int64], NDArray[np.int64], NDArray[np.int64]]
+        The vertices of all rings with shape (n, 2), the index of the first vertex of
+        each ring followed by the number of vertices, the label of each ring and a
+        pixel of the label next to the first edge of each ring with shape (m, 2).
+    """
+    mask = np.ascontiguousarray(mask)
+    if mask.dtype.kind not in "biu":
+        raise ValueError(f"Expected integer labels, not {mask.dtype}")
+    vertices, offsets, labels, starts = tracelabels(mask, background)
+    return _splitpinches(
+        mask,
+        np.frombuffer(vertices, dtype=np.float64).reshape(-1, 2),
+        np.frombuffer(offsets, dtype=np.int64),
+        np.frombuffer(labels, dtype=np.int64),
+        np.frombuffer(starts, dtype=np.int64).reshape(-1, 2),
+    )
+
+
+def simplify_rings(
+    vertices: NDArray[np.float64], ring_offsets: NDArray[np.int64], tolerance: float
+) -> tuple[NDArray[np.float64], NDArray[np.int64]]:
+    """
+    Simplify closed rings with the Douglas-Peucker algorithm.
+
+    Rings that would keep fewer than three corners are not simplified. The result
+    can intersect itself where the original outlines were closer than the tolerance.
+
+    Parameters
+    ----------
+    vertices : NDArray[np.float64]
+        Array of shape (n, 2) with the vertices of all rings.
+    ring_offsets : NDArray[np.int64]
+        Index of the first vertex of each ring, followed by the number of vertices.
+    tolerance : float
+        Maximal distance between the original and the simplified ring.
+
+    Returns
+    -------
+    tuple[NDArray[np.float64], NDArray[np.int64]]
+        The remaining vertices and the new ring offsets.
+    """
+    vertices = np.ascontiguousarray(vertices, dtype=np.float64)
+    ring_offsets = np.ascontiguousarray(ring_offsets, dtype=np.int64)
+    keep = np.zeros(len(vertices), dtype=np.uint8)
+    simplifyrings(vertices, ring_offsets, float(tolerance), keep)
+    counts = np.add.reduceat(keep, ring_offsets[:-1]) if len(keep) else keep
+    offsets = np.zeros(len(ring_offsets), dtype=np.int64)
+    np.cumsum(counts[: len(ring_offsets) - 1], out=offsets[1:])
+    return vertices[keep == 1], offsets
+
+
+def mask_to_packed(
+    mask: ArrayLike,
+    origin: tuple[float, float] = (0.0, 0.0),
+    downsample: float = 1.0,
+    simplify: float = 0.0,
+    background: int = 0,
+    names: Optional[dict[int, str]] = None,
+    colors: Optional[dict[int, tuple[int, int, int]]] = None,
+    round_vertices: bool = True,
+) -> PackedHaloXML:
+    """
+    Convert a label mask to packed annotations with one layer per label.
+
+    Each connected area of a label becomes a polygon with its holes. The contours
+    are traced and simplified in native code and the xml is only generated when
+    the result is unpacked or saved.
+
+    Parameters
+    ----------
+    mask : ArrayLike
+        Two dimensional array of integer labels.
+    origin : tuple[float, float]
+        Slide coordinates of the top left corner of the mask.
+    downsample : float
+        Size of a pixel of the mask in pixels of the slide.
+    simplify : float
+        Tolerance in pixels of the mask for simplifying the outlines, 0 (default)
+        keeps the exact pixel outlines.
+    background : int
+        The label that is not converted.
+    names : dict[int, str] | None
+        Name of the layer of each label, "Label <label>" if it is not given.
+    colors : dict[int, tuple[int, int, int]] | None
+        RGB color of the layer of each label, a fixed palette if it is not given.
+    round_vertices : bool
+        True (default) - Round to whole pixels, like the files written by Halo.
+        False - Keep the exact coordinates.
+
+    Returns
+    -------
+    PackedHaloXML
+        The annotations, use tohaloxml or save to get them as xml.
+
+    See Also
+    --------
+    trace_labels : How the contours are traced.
+    """
+    vertices, offsets, labels, starts = trace_labels(mask, background)
+    if simplify > 0:
+        vertices, offsets = simplify_rings(vertices, offsets, simplify)
+    areas = _ringareas(vertices, offsets)
+    names = names or {}
+    colors = colors or {}
+    packed = PackedHaloXML()
+    packed.header["types"] = ["Polygon"]
+    packed.header["valid"] = True
+    rings = []  # type: list[NDArray[np.int64]]
+    parents = []  # type: list[NDArray[np.int64]]
+    layercounts = []  # type: list[int]
+    for n, label in enumerate(np.unique(labels).tolist()):
+        color = Color()
+        color.setrgb(*colors.get(label, PALETTE[n % len(PALETTE)]))
+        packed.header["layers"].append(
+            {
+                "LineColor": color.getlinecolor(),
+                "Name": names.get(label, f"Label {label}"),
+                "Visible": "True",
+            }
+        )
+        ordered, parent = _nest(vertices, offsets, areas, starts, labels == label)
+        rings.append(ordered)
+        parents.append(np.where(parent >= 0, parent + sum(layercounts), -1))
+        layercounts.append(len(ordered))
+    order = np.concatenate(rings) if rings else np.empty(0, dtype=np.int64)
+    index, packed.vertex_offsets = gather_index(offsets, order)
+    packed.vertices = vertices[index] * downsample + np.asarray(origin)
+    if round_vertices:
+        packed.vertices = np.rint(packed.vertices)
+    packed.layer_offsets = np.zeros(len(layercounts) + 1, dtype=np.int64)
+    np.cumsum(layercounts, out=packed.layer_offsets[1:])
+    packed.types = np.zeros(len(order), dtype=np.int8)
+    packed.parents = (
+        np.concatenate(parents).astype(np.int32)
+        if parents
+        else np.empty(0, dtype=np.int32)
+    )
+    packed.flags = np.where(packed.parents >= 0, NEGATIVE, 0).astype(np.uint8)
+    return packed
+
+
+def mask_to_haloxml(mask: ArrayLike, **kwargs: Any) -> "HaloXML":
+    """
+    Convert a label mask to a HaloXML with one layer per label.
+
+    Parameters
+    ----------
+    mask : ArrayLike
+        Two dimensional array of integer labels.
+    **kwargs : Any
+        The options of mask_to_packed.
+
+    Returns
+    -------
+    HaloXML
+        The annotations, with the holes matched to their region.
+
+    See Also
+    --------
+    mask_to_packed : Description of the options.
+    """
+    return mask_to_packed(mask, **kwargs).tohaloxml()
+
+
+def mask_to_annotations(
+    mask: ArrayLike,
+    pth: Union[str, os.PathLike[Any]],
+    compression: Optional[str] = None,
+    **kwargs: Any,
+) -> None:
+    """
+    Convert a label mask to an .annotations file.
+
+    The xml is written region by region without building it in memory, so this
+    also works for masks of whole slides, e.g. a numpy.memmap.
+
+    Parameters
+    ----------
+    mask : ArrayLike
+        Two dimensional array of integer labels.
+    pth : str | os.PathLike[Any]
+        Path to the .annotations file to save.
+    compression : str | None
+        None (default) - Compress if the suffix is .gz, .xz or .zst.
+        'gzip', 'xz' or 'zstd' - Compress and add the suffix if it is missing.
+    **kwargs : Any
+        The options of mask_to_packed.
+
+    See Also
+    --------
+    mask_to_packed : Description of the options.
+    """
+    mask_to_packed(mask, **kwargs).save(pth, compression)
+
+
+def _splitpinches(
+    mask: NDArray[Any],
+    vertices: NDArray[np.float64],
+    offsets: NDArray[np.int64],
+    labels: NDArray[np.int64],
+    starts: NDArray[np.int64],
+) -> tuple[
+    NDArray[np.float64], NDArray[np.int64], NDArray[np.int64], NDArray[np.int64]
+]:  # numpydoc ignore=GL08
+    # split the rings that pass a vertex more than once into simple rings, that
+    # can only happen at a corner where two pixels of the label touch diagonally:
+    # the path turns right there and the pixel ahead on the left has the label
+    step = np.sign(np.diff(vertices, axis=0)).astype(np.int64)  # leaving a vertex
+    before = np.concatenate([step[-1:], step])  # arriving at a vertex
+    before[offsets[:-1]] = step[offsets[1:] - 2]
+    turn = before[:-1, 0] * step[:, 1] - before[:-1, 1] * step[:, 0]
+    turn[offsets[1:-1] - 1] = 0  # the closing vertices
+    index = np.flatnonzero(turn > 0)
+    ring = np.searchsorted(offsets, index, side="right") - 1
+    dx, dy = before[index].T
+    px = vertices[index, 0].astype(np.int64) - (dx + dy < 0)
+    py = vertices[index, 1].astype(np.int64) - (dy - dx < 0)
+    valid = (px >= 0) & (py >= 0) & (px < mask.shape[1]) & (py < mask.shape[0])
+    ahead = np.zeros(len(index), dtype=bool)
+    ahead[valid] = mask[py[valid], px[valid]] == labels[ring[valid]]
+    corners, ring = vertices[index[ahead]], ring[ahead]
+    order = np.lexsort((corners[:, 1], corners[:, 0], ring))
+    corners, ring = corners[order], ring[order]
+    same = (ring[1:] == ring[:-1]) & (corners[1:] == corners[:-1]).all(axis=1)
+    pinched = np.unique(ring[1:][same])
+    if len(pinched) == 0:
+        return vertices, offsets, labels, starts
+    pieces = []  # type: list[NDArray[np.float64]]
+    piecering = []  # type: list[int]
+    for n in pinched.tolist():
+        path = []  # type: list[tuple[float, float]]
+        seen = {}  # type: dict[tuple[float, float], int]
+        for x, y in vertices[offsets[n] : offsets[n + 1] - 1].tolist():
+            if (x, y) in seen:
+                # the vertices since the last visit form a loop of their own
+                first = seen[(x, y)]
+                pieces.append(np.array(path[first:] + [(x, y)], dtype=np.float64))
+                piecering.append(n)
+                for xy in path[first + 1 :]:
+                    del seen[xy]
+                del path[first + 1 :]
+            else:
+                seen[(x, y)] = len(path)
+                path.append((x, y))
+        pieces.append(np.array(path + path[:1], dtype=np.float64))
+        piecering.append(n)
+    # the pixel on the right of the first edge, with y pointing down
+    begin = np.array([x[0] for x in pieces], dtype=np.int64)
+    dx, dy = np.sign(np.array([x[1] for x in pieces]) - begin).astype(np.int64).T
+    piecestarts = begin + np.stack(
+        [np.minimum(np.minimum(dx, -dy), 0), np.minimum(np.minimum(dx, dy), 0)], axis=1
+    )
+    # the pieces take the place of their ring
+    kept = np.setdiff1d(np.arange(len(labels)), pinched)
+    rings = np.concatenate([kept, piecering])
+    order = np.argsort(rings, kind="stable")
+    index, keptoffsets = gather_index(offsets, kept)
+    allvertices = np.concatenate([vertices[index]] + pieces)
+    allcounts = np.concatenate([np.diff(keptoffsets), [len(x) for x in pieces]])
+    alloffsets = np.zeros(len(allcounts) + 1, dtype=np.int64)
+    np.cumsum(allcounts, out=alloffsets[1:])
+    index, newoffsets = gather_index(alloffsets, order)
+    return (
+        allvertices[index],
+        newoffsets,
+        labels[rings[order]],
+        np.concatenate([starts[kept], piecestarts])[order],
+    )
+
+
+def _ringareas(
+    vertices: NDArray[np.float64], offsets: NDArray[np.int64]
+) -> NDArray[np.float64]:  # numpydoc ignore=GL08
+    if len(vertices) == 0:
+        return np.empty(0, dtype=np.float64)
+    x = vertices[:, 0]
+    y = vertices[:, 1]
+    # the rings are closed, so the products of the last vertex with the first
+    # vertex of the next ring are left out
+    cross = x[:-1] * y[1:] - x[1:] * y[:-1]
+    cross = np.append(cross, 0.0)
+    cross[offsets[1:] - 1] = 0.0
+    return np.asarray(np.add.reduceat(cross, offsets[:-1]) / 2, dtype=np.float64)
+
+
+def _nest(
+    vertices: NDArray[np.float64],
+    offsets: NDArray[np.int64],
+    areas: NDArray[np.float64],
+    starts: NDArray[np.int64],
+    selected: NDArray[np.bool_],
+) -> tuple[NDArray[np.int64], NDArray[np.int64]]:  # numpydoc ignore=GL08
+    # order the rings of one label as outline followed by its holes, and give the
+    # position in that order of the outline of each hole, or -1 for an outline
+    rings = np.flatnonzero(selected)
+    outer = rings[areas[rings] > 0]
+    holes = rings[areas[rings] < 0]
+    owner = np.full(len(holes), -1, dtype=np.int64)
+    if len(holes) and len(outer):
+        bysize = outer[np.argsort(-areas[outer], kind="stable")]
+        index, ring_offsets = gather_index(offsets, bysize)
+        # the center of the pixel of the label next to the first edge of the hole,
+        # the last (smallest) outline that contains it is the one with the hole
+        points = np.ascontiguousarray(starts[holes] + 0.5, dtype=np.float64)
+        pointsinrings(
+            points, np.ascontiguousarray(vertices[index]), ring_offsets, owner
+        )
+        owner = np.where(owner >= 0, bysize[owner], -1)
+    matched = owner >= 0
+    members = np.concatenate([outer, holes[matched]])
+    key = np.concatenate([outer, owner[matched]])
+    ishole = np.concatenate([np.zeros(len(outer)), np.ones(int(np.sum(matched)))])
+    order = np.lexsort((ishole, key))
+    first = np.searchsorted(key[order], key[order], side="left")
+    parent = np.where(ishole[order] == 1, first, -1)
+    return members[order], parent.astype(np.int64)
@@ -0,0 +1,308 @@
+"""Watch a directory and convert new or changed .annotations files."""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import (
+    BrokenExecutor,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+)
+from hashlib import blake2b
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from .fileio import SUFFIXES, find_annotations
+
+FORMATS = {"geojson": ".geojson", "parquet": ".parquet", "wkb": ".wkb"}
+STATE = ".pyhaloxml-watch.json"
+# failures that say nothing about the file, it is tried again at the next poll
+TRANSIENT = (BrokenExecutor, MemoryError, OSError)
+
+log = logging.getLogger("HaloXML-Watch")
+
+
+def file_hash(pth: Union[str, os.PathLike[Any]]) -> str:
+    """
+    Hash of the content of a file.
+
+    Parameters
+    ----------
+    pth : str | os.PathLike[Any]
+        Path to the file.
+
+    Returns
+    -------
+    str
+        The hexadecimal blake2b digest.
+    """
+    h = blake2b(digest_size=16)
+    with open(Path(pth), "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def convert(
+    src: Union[str, os.PathLike[Any]],
+    dst: Union[str, os.PathLike[Any]],
+    fmt: str = "geojson",
+    matchnegative: bool = True,
+) -> None:
+    """
+    Convert an .annotations file.
+
+    The result is written to a temporary file that is renamed when it is complete,
+    so readers never see a partial file.
+
+    Parameters
+    ----------
+    src : str | os.PathLike[Any]
+        Path to the .annotations file, it can be compressed.
+    dst : str | os.PathLike[Any]
+        Path of the result.
+    fmt : str
+        'geojson' (default), 'parquet' or 'wkb'.
+    matchnegative : bool
+        True (default) - First matches negative regions, so they become holes.
+        False - Will not match negative regions.
+    """
+    from .HaloXML import HaloXML
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(dst.parent, f".{dst.stem}.tmp{FORMATS[fmt]}")
+    hx = HaloXML()
+    hx.load(src)
+    if matchnegative:
+        hx.matchnegative()
+    if fmt == "geojson":
+        hx.to_geojson(tmp)
+    else:
+        hx.to_wkb(tmp, matchnegative=False)
+    os.replace(tmp, dst)
+
+
+class Watcher:
+    """
+    Convert the .annotations files in a directory tree that are new or changed.
+
+    A file counts as changed when its modification time or size differs from the
+    last conversion and the hash of its content differs as well, so files that
+    are only touched or copied again are not converted again. Files that changed
+    less than settle seconds ago may still be written and are left for the next
+    poll. The state is stored as json in the output directory, so a restarted
+    watcher continues where it stopped. A file that cannot be converted is not
+    tried again until it changes, unless the failure was transient: a broken
+    pool, a lack of memory or an error reading or writing a file.
+
+    Parameters
+    ----------
+    root : str | os.PathLike[Any]
+        The directory to watch, including its subdirectories.
+    outdir : str | os.PathLike[Any]
+        The directory for the converted files, with the same subdirectories.
+    fmt : str
+        'geojson' (default), 'parquet' or 'wkb'.
+    state : str | os.PathLike[Any] | None
+        Path to the state file, by default .pyhaloxml-watch.json in outdir.
+    settle : float
+        Seconds since the last modification before a file is converted.
+
+    Attributes
+    ----------
+    root : Path
+        The directory to watch.
+    outdir : Path
+        The directory for the converted files.
+    fmt : str
+        The output format.
+    statefile : Path
+        Path to the state file.
+    settle : float
+        Seconds since the last modification before a file is converted.
+    files : dict[str, dict[str, Any]]
+        Modification time, size, hash and error of each file, by relative path.
+    broken : bool
+        Whether the pool broke during the last poll.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, os.PathLike[Any]],
+        outdir: Union[str, os.PathLike[Any]],
+        fmt: str = "geojson",
+        state: Optional[Union[str, os.PathLike[Any]]] = None,
+        settle: float = 2.0,
+    ) -> None:  # numpydoc ignore=GL08
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt}")
+        self.root = Path(root)  # type: Path
+        self.outdir = Path(outdir)  # type: Path
+        self.fmt = fmt  # type: str
+        self.statefile = Path(state) if state else Path(self.outdir, STATE)
+        self.settle = settle  # type: float
+        self.files = {}  # type: dict[str, dict[str, Any]]
+        self.broken = False  # type: bool
+        if self.statefile.is_file():
+            with open(self.statefile, "rt") as f:
+                saved = json.load(f)
+            if saved.get("format") == fmt:  # otherwise convert everything again
+                self.files = saved["files"]
+
+    def output(self, rel: str) -> Path:
+        """
+        Path of the converted file for a file in the watched directory.
+
+        Parameters
+        ----------
+        rel : str
+            Path of the .annotations file relative to root.
+
+        Returns
+        -------
+        Path
+            The path in outdir.
+        """
+        pth = Path(rel)
+        name = pth.name
+        if Path(name).suffix in SUFFIXES:
+            name = Path(name).stem
+        return Path(self.outdir, pth.parent, Path(name).stem + FORMATS[self.fmt])
+
+    def scan(self) -> list[tuple[str, dict[str, Any]]]:
+        """
+        Find the files that have to be converted.
+
+        Files that are only touched get their new modification time in the state.
+        Files that disappeared are removed from the state, their output is kept.
+
+        Returns
+        -------
+        list[tuple[str, dict[str, Any]]]
+            The relative path and the new state of each file to convert.
+        """
+        found = {
+            x.relative_to(self.root).as_posix(): x for x in find_annotations(self.root)
+        }
+        for rel in set(self.files) - set(found):
+            del self.files[rel]
+        now = time.time()
+        todo = []
+        for rel, pth in sorted(found.items()):
+            stat = pth.stat()
+            if now - stat.st_mtime < self.settle:
+                continue
+            old = self.files.get(rel, {})
+            new = {"mtime": stat.st_mtime, "size": stat.st_size}  # type: dict[str, Any]
+            done = bool(old.get("error")) or self.output(rel).is_file()
+            if done and all(old.get(k) == v for k, v in new.items()):
+                continue
+            new["hash"] = file_hash(pth)
+            if done and old.get("hash") == new["hash"]:
+                self.files[rel] = {**old, **new}
+                continue
+            todo.append((rel, new))
+        return todo
+
+    def poll(self, pool: Optional[Executor] = None) -> tuple[int, int]:
+        """
+        Convert the new and changed files once and save the state.
+
+        Parameters
+        ----------
+        pool : Executor | None
+            The pool to convert the files in, they are converted one by one if None.
+            When the pool is broken the files fail and broken is set.
+
+        Returns
+        -------
+        tuple[int, int]
+            The number of converted files and the number of files that failed.
+        """
+        todo = self.scan()
+        futures = {}  # type: dict[str, Future[None]]
+        self.broken = False
+        if pool is not None:
+            for rel, _ in todo:
+                src = Path(self.root, rel)
+                try:
+                    futures[rel] = pool.submit(convert, src, self.output(rel), self.fmt)
+                except BrokenExecutor as e:
+                    futures[rel] = Future()
+                    futures[rel].set_exception(e)
+        converted, failed = 0, 0
+        for rel, new in todo:
+            try:
+                if rel in futures:
+                    futures[rel].result()
+                else:
+                    convert(Path(self.root, rel), self.output(rel), self.fmt)
+            except TRANSIENT as e:
+                log.error(f"Could not convert {rel}, trying again later: {e}")
+                self.broken |= isinstance(e, BrokenExecutor)
+                failed += 1
+                continue  # keep the old state, so the next scan finds it again
+            except Exception as e:
+                log.error(f"Could not convert {rel}: {e}")
+                new["error"] = str(e)
+                failed += 1
+            else:
+                log.info(f"Converted {rel}")
+                converted += 1
+            self.files[rel] = new
+        self.save()
+        return converted, failed
+
+    def save(self) -> None:
+        """
+        Write the state file, replacing the old one at once.
+        """
+        self.statefile.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(self.statefile.parent, self.statefile.name + ".tmp")
+        with open(tmp, "wt") as f:
+            json.dump({"format": self.fmt, "files": self.files}, f, indent=1)
+        os.replace(tmp, self.statefile)
+
+    def run(
+        self,
+        interval: float = 60.0,
+        workers: Optional[int] = None,
+        rounds: Optional[int] = None,
+    ) -> None:
+        """
+        Poll the directory until interrupted.
+
+        A pool that breaks, for example because a worker ran out of memory and was
+        killed, is replaced by a new one.
+
+        Parameters
+        ----------
+        interval : float
+            Seconds between the start of two polls.
+        workers : int | None
+            Number of worker processes, the number of processors if None.
+        rounds : int | None
+            Stop after this many polls, never stop if None.
+        """
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            done = 0
+            while rounds is None or done < rounds:
+                start = time.monotonic()
+                converted, failed = self.poll(pool)
+                if converted or failed:
+                    log.info(f"Converted {converted} files, {failed} failed")
+                if self.broken:
+                    log.warning("The pool is broken, starting a new one")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                done += 1
+                if rounds is None or done < rounds:
+                    time.sleep(max(0.0, interval - (time.monotonic() - start)))
+        finally:
+            pool.shutdown()
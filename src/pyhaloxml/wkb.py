@@ -0,0 +1,246 @@
+"""Export regions as Well-Known Binary (WKB) geometries in a columnar layout."""
+
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Any, Union
+
+import numpy as np
+
+from .flat import FlatRegions
+from .misc import RegionType
+
+MAGIC = b"PHXWKB\x00\x01"
+
+_POINT = struct.Struct("<BIdd")
+_HEADER = struct.Struct("<BII")
+_COUNT = struct.Struct("<I")
+
+
+def flat_to_wkb(flat: FlatRegions) -> list[bytes]:
+    """
+    Convert all regions to little endian WKB.
+
+    Pins become points, rulers become linestrings and all other regions become
+    polygons with their holes. Rings of polygons are closed if needed.
+
+    Parameters
+    ----------
+    flat : FlatRegions
+        The regions to convert.
+
+    Returns
+    -------
+    list[bytes]
+        A WKB geometry for each region.
+    """
+    vertices = flat.vertices.astype("<f8", copy=False)
+    data = vertices.tobytes()
+    ringoff = flat.ring_offsets.tolist()
+    regionoff = flat.region_offsets.tolist()
+    # rings that need their first vertex repeated at the end
+    starts = flat.ring_offsets[:-1]
+    ends = flat.ring_offsets[1:] - 1
+    unclosed = np.any(vertices[starts] != vertices[ends], axis=1).tolist()
+    geometries = []  # type: list[bytes]
+    for i, rtype in enumerate(flat.types.tolist()):
+        first, last = regionoff[i], regionoff[i + 1]
+        if rtype == RegionType.Pin or rtype == RegionType.Unknown:
+            x, y = vertices[ringoff[first]]
+            geometries.append(_POINT.pack(1, 1, x, y))
+        elif rtype == RegionType.Ruler:
+            a, b = ringoff[first], ringoff[first + 1]
+            geometries.append(_HEADER.pack(1, 2, b - a) + data[16 * a : 16 * b])
+        else:
+            parts = [_HEADER.pack(1, 3, last - first)]
+            for r in range(first, last):
+                a, b = ringoff[r], ringoff[r + 1]
+                if unclosed[r]:
+                    parts.append(_COUNT.pack(b - a + 1))
+                    parts.append(data[16 * a : 16 * b])
+                    parts.append(data[16 * a : 16 * a + 16])
+                else:
+                    parts.append(_COUNT.pack(b - a))
+                    parts.append(data[16 * a : 16 * b])
+            geometries.append(b"".join(parts))
+    return geometries
+
+
+def flat_to_columns(flat: FlatRegions) -> dict[str, list[Any]]:
+    """
+    The properties of all regions as columns.
+
+    Parameters
+    ----------
+    flat : FlatRegions
+        The regions to get the properties of.
+
+    Returns
+    -------
+    dict[str, list[Any]]
+        The columns layer, color, type and comments, with an element per region.
+        The color is the rgb color of the layer, comments is the list of comment
+        bodies of the region.
+    """
+    layernames = [x.name for x in flat.layers]
+    colors = [list(x.linecolor.getrgb()) for x in flat.layers]
+    layer_index = flat.layer_index.tolist()
+    return {
+        "layer": [layernames[i] for i in layer_index],
+        "color": [colors[i] for i in layer_index],
+        "type": [str(RegionType(x)) for x in flat.types.tolist()],
+        "comments": [[str(c) for c in x.comments] for x in flat.regions],
+    }
+
+
+def geoparquet_metadata(flat: FlatRegions) -> dict[str, Any]:
+    """
+    GeoParquet metadata describing the geometry column.
+
+    The coordinates are in pixels, so the coordinate reference system is undefined.
+
+    Parameters
+    ----------
+    flat : FlatRegions
+        The regions that are exported.
+
+    Returns
+    -------
+    dict[str, Any]
+        The content of the geo metadata key of the parquet file.
+    """
+    names = {
+        RegionType.Pin: "Point",
+        RegionType.Ruler: "LineString",
+        RegionType.Unknown: "Point",
+    }
+    types = {names.get(RegionType(x), "Polygon") for x in np.unique(flat.types)}
+    column = {
+        "encoding": "WKB",
+        "geometry_types": sorted(types),
+        "crs": None,
+    }  # type: dict[str, Any]
+    if len(flat.vertices):
+        column["bbox"] = [
+            *np.nanmin(flat.vertices, axis=0).tolist(),
+            *np.nanmax(flat.vertices, axis=0).tolist(),
+        ]
+    return {
+        "version": "1.1.0",
+        "primary_column": "geometry",
+        "columns": {"geometry": column},
+    }
+
+
+def flat_to_arrow(flat: FlatRegions) -> Any:
+    """
+    Create an arrow table with the WKB geometries and properties of all regions.
+
+    Parameters
+    ----------
+    flat : FlatRegions
+        The regions to convert.
+
+    Returns
+    -------
+    pyarrow.Table
+        Table with a geometry column and the columns from flat_to_columns.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("Pyarrow is not installed. Cannot create an arrow table.")
+    columns = flat_to_columns(flat)
+    table = pa.table(
+        {
+            "geometry": pa.array(flat_to_wkb(flat), type=pa.binary()),
+            "layer": pa.array(columns["layer"], type=pa.string()),
+            "color": pa.array(columns["color"], type=pa.list_(pa.uint8(), 3)),
+            "type": pa.array(columns["type"], type=pa.string()),
+            "comments": pa.array(columns["comments"], type=pa.list_(pa.string())),
+        }
+    )
+    geo = json.dumps(geoparquet_metadata(flat)).encode()
+    return table.replace_schema_metadata({b"geo": geo})
+
+
+def write_parquet(flat: FlatRegions, pth: Union[str, os.PathLike[Any]]) -> None:
+    """
+    Write the regions to a GeoParquet file.
+
+    Parameters
+    ----------
+    flat : FlatRegions
+        The regions to write.
+    pth : str | os.PathLike[Any]
+        Path to the .parquet file.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Pyarrow is not installed. Cannot write parquet files.")
+    pq.write_table(flat_to_arrow(flat), Path(pth))
+
+
+def write_wkb(flat: FlatRegions, pth: Union[str, os.PathLike[Any]]) -> None:
+    """
+    Write the regions to a simple binary file.
+
+    The file starts with the 8 byte MAGIC, followed by the length of a utf-8 json
+    header as unsigned 32 bit integer and the header itself. The header contains
+    the columns from flat_to_columns. Then for each region the length of its
+    geometry as unsigned 32 bit integer followed by the WKB. All integers are
+    little endian.
+
+    Parameters
+    ----------
+    flat : FlatRegions
+        The regions to write.
+    pth : str | os.PathLike[Any]
+        Path to the .wkb file.
+
+    See Also
+    --------
+    read_wkb : Read the file.
+    """
+    header = json.dumps(flat_to_columns(flat)).encode()
+    with open(Path(pth), "wb") as f:
+        f.write(MAGIC)
+        f.write(_COUNT.pack(len(header)))
+        f.write(header)
+        for geometry in flat_to_wkb(flat):
+            f.write(_COUNT.pack(len(geometry)))
+            f.write(geometry)
+
+
+def read_wkb(pth: Union[str, os.PathLike[Any]]) -> dict[str, list[Any]]:
+    """
+    Read a file written by write_wkb.
+
+    Parameters
+    ----------
+    pth : str | os.PathLike[Any]
+        Path to the .wkb file.
+
+    Returns
+    -------
+    dict[str, list[Any]]
+        The columns geometry, layer, color, type and comments.
+    """
+    with open(Path(pth), "rb") as f:
+        data = f.read()
+    if data[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"{pth} is not a pyhaloxml wkb file.")
+    pos = len(MAGIC)
+    (length,) = _COUNT.unpack_from(data, pos)
+    pos += _COUNT.size
+    columns = {"geometry": []}  # type: dict[str, list[Any]]
+    columns.update(json.loads(data[pos : pos + length]))
+    pos += length
+    while pos < len(data):
+        (length,) = _COUNT.unpack_from(data, pos)
+        pos += _COUNT.size
+        columns["geometry"].append(data[pos : pos + length])
+        pos += length
+    return columns
@@ -1,2 +1,52 @@
-def pointinpoly(point: tuple[float, float], polygon: list[tuple[float, float]]) -> str:
+from typing import Any
+
+def pointinpoly(point: tuple[float, float], polygon: list[tuple[float, float]]) -> bool:
+    pass
+
+def pointsinrings(points: Any, vertices: Any, ring_offsets: Any, result: Any) -> None:
+    pass
+
+def selfintersecting(vertices: Any, ring_offsets: Any, result: Any) -> None:
+    pass
+
+def tracelabels(mask: Any, background: int) -> tuple[bytes, bytes, bytes, bytes]:
+    pass
+
+def scanvertices(xml: bytes, offsets: Any, level: int) -> tuple[bytes, bytes, bytes]:
+    pass
+
+def simplifyrings(
+    vertices: Any, ring_offsets: Any, tolerance: float, keep: Any
+) -> None:
+    pass
+
+def ringcoverage(
+    vertices: Any,
+    ring_offsets: Any,
+    ring_weights: Any,
+    ring_layers: Any,
+    grid: Any,
+    result: Any,
+) -> None:
+    pass
+
+def nearestsegments(
+    points: Any,
+    segments: Any,
+    cell_offsets: Any,
+    cell_segments: Any,
+    grid: Any,
+    distance: Any,
+    nearest: Any,
+) -> None:
+    pass
+
+def earcutrings(
+    vertices: Any,
+    ring_offsets: Any,
+    region_offsets: Any,
+    triangle_offsets: Any,
+    triangles: Any,
+    counts: Any,
+) -> None:
     pass
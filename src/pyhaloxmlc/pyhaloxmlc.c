@@ -1,50 +1,602 @@
+#define PY_SSIZE_T_CLEAN
 #include <Python.h>
+#include <math.h>
 #include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
 #define MIN(a,b) (((a)<(b))?(a):(b))
 #define MAX(a,b) (((a)>(b))?(a):(b))
-bool pointinpoly_c(PyObject* point, PyObject* polygon);
+#ifndef Py_BEGIN_CRITICAL_SECTION  // before 3.13 the GIL protects the list
+#define Py_BEGIN_CRITICAL_SECTION(op) {
+#define Py_END_CRITICAL_SECTION() (void)0; }
+#endif
+int pointinpoly_c(PyObject* point, PyObject* polygon);
+typedef struct {
+    double minx;
+    int64_t index;
+} segment;
+bool ringselfintersects_c(const double* vertices, int64_t n, double* points, segment* segments);
+bool pointinring_c(double x, double y, const double* vertices, int64_t n);
+typedef struct {
+    const char* buf;
+    char kind;  // struct format character
+    Py_ssize_t itemsize;
+    int64_t height;
+    int64_t width;
+} labelimage;
+typedef struct {
+    char* data;
+    size_t size;  // bytes in use
+    size_t capacity;
+    bool failed;
+} growarray;
+void tracelabels_c(const labelimage* im, int64_t background, uint8_t* visited,
+    growarray* vertices, growarray* offsets, growarray* labels, growarray* starts);
+void simplifyring_c(const double* vertices, int64_t n, double tolerance, uint8_t* keep, int64_t* stack);
+int64_t scanvertices_c(const char* xml, const int64_t* offsets, int64_t n, int64_t level, growarray* counts, growarray* flags, growarray* vertices);
+typedef struct {
+    double x0;
+    double y0;
+    double size;
+    int64_t width;
+    int64_t height;
+} grid;
+void ringcoverage_c(const double* vertices, int64_t n, double weight, const grid* g, double* area, double* cover);
+typedef struct {
+    const double* segments;  // x0, y0, x1, y1 with the inside on the left
+    const int64_t* offsets;  // first entry of each cell of the grid
+    const int64_t* entries;  // segment index of each entry
+    grid g;
+} segmentindex;
+double nearestsegment_c(const segmentindex* index, double x, double y, double maxdistance, int64_t* nearest);
+typedef struct earnode {
+    int64_t i;  // index of the vertex
+    double x;
+    double y;
+    int32_t z;  // position on the z-order curve
+    bool steiner;
+    struct earnode* prev;
+    struct earnode* next;
+    struct earnode* prevz;
+    struct earnode* nextz;
+} earnode;
+typedef struct {
+    earnode* nodes;
+    int64_t used;
+    int64_t capacity;
+    int64_t* triangles;
+    int64_t ntriangles;
+    int64_t maxtriangles;
+    double minx;
+    double miny;
+    double invsize;  // 0 if the z-order curve is not used
+} earcut;
+void earcutregion_c(earcut* e, const double* vertices, const int64_t* ring_offsets, int64_t nrings, earnode** queue);
 
 
-static PyObject* pointinpoly(PyObject* self, PyObject *args)
+static bool checkargs(const char* name, Py_ssize_t nargs, Py_ssize_t expected)
 {
-    PyObject* point;
-    PyObject* polygon;
-    PyArg_ParseTuple(args, "OO", &point, &polygon);
-    PyList_Check(polygon);
-    // float pointx;
-    // float pointy;
-    // PyArg_ParseTuple(point, "ff", &pointx, &pointy);
-    // PyObject* polygonpoint;
-    // polygonpoint = PyList_GetItem(polygon, 0);
-    // float polygonpointx;
-    // float polygonpointy;
-    // PyArg_ParseTuple(polygonpoint, "ff", &polygonpointx, &polygonpointy);
-    // return Py_BuildValue("ff", polygonpointx, polygonpointy);
-    bool result = pointinpoly_c(point, polygon);
-    long output = result ? 1 : 0;
-
-    return PyBool_FromLong(output);
+    if (nargs != expected) {
+        PyErr_Format(PyExc_TypeError, "%s() takes exactly %zd arguments (%zd given)", name, expected, nargs);
+        return false;
+    }
+    return true;
+}
+
+static bool getbuffers(PyObject* const* args, Py_buffer* buffers, int n, int nwritable)
+{
+    // the last nwritable arguments are written to
+    for (int i = 0; i < n; ++i) {
+        int flags = i < n - nwritable ? PyBUF_C_CONTIGUOUS : PyBUF_C_CONTIGUOUS | PyBUF_WRITABLE;
+        if (PyObject_GetBuffer(args[i], &buffers[i], flags) < 0) {
+            for (int j = 0; j < i; ++j) {
+                PyBuffer_Release(&buffers[j]);
+            }
+            return false;
+        }
+    }
+    return true;
+}
+
+static void releasebuffers(Py_buffer* buffers, int n)
+{
+    for (int i = 0; i < n; ++i) {
+        PyBuffer_Release(&buffers[i]);
+    }
+}
+
+static bool validoffsets(const int64_t* off, int64_t nrings, Py_ssize_t nvertexbytes, int64_t* maxn)
+{
+    if (nrings < 0 || (nrings > 0 && (off[0] < 0 || off[nrings] * 2 * (Py_ssize_t)sizeof(double) > nvertexbytes))) {
+        return false;
+    }
+    *maxn = 0;
+    for (int64_t r = 0; r < nrings; ++r) {
+        if (off[r] > off[r + 1]) {
+            return false;
+        }
+        *maxn = MAX(*maxn, off[r + 1] - off[r]);
+    }
+    return true;
+}
+
+static PyObject* pointinpoly(PyObject* self, PyObject* const* args, Py_ssize_t nargs)
+{
+    if (!checkargs("pointinpoly", nargs, 2)) {
+        return NULL;
+    }
+    if (!PyList_Check(args[1])) {
+        PyErr_SetString(PyExc_TypeError, "polygon must be a list of (x, y) tuples");
+        return NULL;
+    }
+    int result = pointinpoly_c(args[0], args[1]);
+    if (result < 0) {
+        return NULL;
+    }
+    return PyBool_FromLong(result);
+}
+
+static PyObject* pointsinrings(PyObject* self, PyObject* const* args, Py_ssize_t nargs)
+{
+    Py_buffer buffers[4];
+    if (!checkargs("pointsinrings", nargs, 4) || !getbuffers(args, buffers, 4, 1)) {
+        return NULL;
+    }
+    const double* p = (const double*)buffers[0].buf;
+    const double* v = (const double*)buffers[1].buf;
+    const int64_t* off = (const int64_t*)buffers[2].buf;
+    int64_t* out = (int64_t*)buffers[3].buf;
+    int64_t npoints = buffers[0].len / (2 * (Py_ssize_t)sizeof(double));
+    int64_t nrings = buffers[2].len / (Py_ssize_t)sizeof(int64_t) - 1;
+    int64_t maxn = 0;
+    if (buffers[0].itemsize != sizeof(double) || buffers[1].itemsize != sizeof(double)
+        || buffers[2].itemsize != sizeof(int64_t) || buffers[3].itemsize != sizeof(int64_t)
+        || buffers[3].len < npoints * (Py_ssize_t)sizeof(int64_t)
+        || !validoffsets(off, nrings, buffers[1].len, &maxn)) {
+        releasebuffers(buffers, 4);
+        PyErr_SetString(PyExc_ValueError, "expected float64 points and vertices, int64 ring offsets and an int64 result per point");
+        return NULL;
+    }
+    double* bounds = malloc(sizeof(double) * 4 * (size_t)MAX(nrings, 1));
+    if (bounds == NULL) {
+        releasebuffers(buffers, 4);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (int64_t r = 0; r < nrings; ++r) {
+        double* b = bounds + 4 * r;
+        b[0] = b[1] = INFINITY;
+        b[2] = b[3] = -INFINITY;
+        for (int64_t i = off[r]; i < off[r + 1]; ++i) {
+            b[0] = MIN(b[0], v[2 * i]);
+            b[1] = MIN(b[1], v[2 * i + 1]);
+            b[2] = MAX(b[2], v[2 * i]);
+            b[3] = MAX(b[3], v[2 * i + 1]);
+        }
+    }
+    for (int64_t i = 0; i < npoints; ++i) {
+        double x = p[2 * i];
+        double y = p[2 * i + 1];
+        out[i] = -1;
+        for (int64_t r = nrings - 1; r >= 0; --r) {  // the last ring that contains the point
+            const double* b = bounds + 4 * r;
+            if (x >= b[0] && x <= b[2] && y >= b[1] && y <= b[3]
+                && pointinring_c(x, y, v + 2 * off[r], off[r + 1] - off[r])) {
+                out[i] = r;
+                break;
+            }
+        }
+    }
+    Py_END_ALLOW_THREADS
+    free(bounds);
+    releasebuffers(buffers, 4);
+    Py_RETURN_NONE;
+}
+
+static PyObject* selfintersecting(PyObject* self, PyObject* const* args, Py_ssize_t nargs)
+{
+    Py_buffer buffers[3];
+    if (!checkargs("selfintersecting", nargs, 3) || !getbuffers(args, buffers, 3, 1)) {
+        return NULL;
+    }
+    const double* v = (const double*)buffers[0].buf;
+    const int64_t* off = (const int64_t*)buffers[1].buf;
+    uint8_t* out = (uint8_t*)buffers[2].buf;
+    int64_t nrings = buffers[1].len / (Py_ssize_t)sizeof(int64_t) - 1;
+    int64_t maxn = 0;
+    if (buffers[0].itemsize != sizeof(double) || buffers[1].itemsize != sizeof(int64_t)
+        || buffers[2].itemsize != 1 || buffers[2].len < nrings
+        || !validoffsets(off, nrings, buffers[0].len, &maxn)) {
+        releasebuffers(buffers, 3);
+        PyErr_SetString(PyExc_ValueError, "expected float64 vertices, int64 ring offsets and a uint8 result per ring");
+        return NULL;
+    }
+    double* points = malloc(sizeof(double) * 2 * (size_t)(maxn + 1));
+    segment* segments = malloc(sizeof(segment) * (size_t)(maxn + 1));
+    if (points == NULL || segments == NULL) {
+        free(points);
+        free(segments);
+        releasebuffers(buffers, 3);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (int64_t r = 0; r < nrings; ++r) {
+        out[r] = ringselfintersects_c(v + 2 * off[r], off[r + 1] - off[r], points, segments) ? 1 : 0;
+    }
+    Py_END_ALLOW_THREADS
+    free(points);
+    free(segments);
+    releasebuffers(buffers, 3);
+    Py_RETURN_NONE;
+}
+
+static PyObject* tracelabels(PyObject* self, PyObject* const* args, Py_ssize_t nargs)
+{
+    Py_buffer mask;
+    if (!checkargs("tracelabels", nargs, 2)) {
+        return NULL;
+    }
+    long long background = PyLong_AsLongLong(args[1]);
+    if (background == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    if (PyObject_GetBuffer(args[0], &mask, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0) {
+        return NULL;
+    }
+    labelimage im;
+    im.buf = (const char*)mask.buf;
+    im.kind = mask.format == NULL ? 'B' : mask.format[strlen(mask.format) - 1];
+    im.itemsize = mask.itemsize;
+    if (mask.ndim != 2 || strchr("?bBhHiIlLqQ", im.kind) == NULL
+        || (im.itemsize != 1 && im.itemsize != 2 && im.itemsize != 4 && im.itemsize != 8)) {
+        PyBuffer_Release(&mask);
+        PyErr_SetString(PyExc_ValueError, "expected a two dimensional array of integer labels");
+        return NULL;
+    }
+    im.height = mask.shape[0];
+    im.width = mask.shape[1];
+    uint8_t* visited = calloc((size_t)(im.height * im.width) / 8 + 1, 1);
+    growarray arrays[4] = {{NULL, 0, 0, false}, {NULL, 0, 0, false}, {NULL, 0, 0, false}, {NULL, 0, 0, false}};
+    if (visited == NULL) {
+        PyBuffer_Release(&mask);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    tracelabels_c(&im, (int64_t)background, visited, &arrays[0], &arrays[1], &arrays[2], &arrays[3]);
+    Py_END_ALLOW_THREADS
+    free(visited);
+    PyBuffer_Release(&mask);
+    PyObject* result = NULL;
+    if (arrays[0].failed || arrays[1].failed || arrays[2].failed || arrays[3].failed) {
+        PyErr_NoMemory();
+    } else {
+        // an array that was never grown has no data, which y# turns into None
+        const char* data[4];
+        for (int i = 0; i < 4; ++i) {
+            data[i] = arrays[i].data != NULL ? arrays[i].data : "";
+        }
+        result = Py_BuildValue("y#y#y#y#", data[0], (Py_ssize_t)arrays[0].size,
+            data[1], (Py_ssize_t)arrays[1].size, data[2], (Py_ssize_t)arrays[2].size,
+            data[3], (Py_ssize_t)arrays[3].size);
+    }
+    for (int i = 0; i < 4; ++i) {
+        free(arrays[i].data);
+    }
+    return result;
+}
+
+static PyObject* scanvertices(PyObject* self, PyObject* const* args, Py_ssize_t nargs)
+{
+    Py_buffer offsetbuffer;
+    if (!checkargs("scanvertices", nargs, 3)) {
+        return NULL;
+    }
+    if (!PyBytes_Check(args[0])) {
+        PyErr_SetString(PyExc_TypeError, "expected the xml as bytes");
+        return NULL;
+    }
+    long long level = PyLong_AsLongLong(args[2]);
+    if (level == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    if (!getbuffers(&args[1], &offsetbuffer, 1, 0)) {
+        return NULL;
+    }
+    const int64_t* offsets = (const int64_t*)offsetbuffer.buf;
+    int64_t n = offsetbuffer.len / (Py_ssize_t)sizeof(int64_t) - 1;
+    bool valid = offsetbuffer.itemsize == sizeof(int64_t) && n >= 0 && level >= 0 && offsets[0] >= 0
+        && offsets[n] <= PyBytes_GET_SIZE(args[0]);
+    for (int64_t k = 0; valid && k < n; ++k) {
+        valid = offsets[k] <= offsets[k + 1];
+    }
+    if (!valid) {
+        PyBuffer_Release(&offsetbuffer);
+        PyErr_SetString(PyExc_ValueError, "expected increasing int64 offsets within the xml and a level of at least 0");
+        return NULL;
+    }
+    // the numbers are parsed by python, which does not depend on the locale
+    growarray arrays[3] = {{NULL, 0, 0, false}, {NULL, 0, 0, false}, {NULL, 0, 0, false}};
+    int64_t failed = scanvertices_c(PyBytes_AS_STRING(args[0]), offsets, n, (int64_t)level, &arrays[1], &arrays[2], &arrays[0]);
+    PyBuffer_Release(&offsetbuffer);
+    PyObject* result = NULL;
+    if (arrays[0].failed || arrays[1].failed || arrays[2].failed) {
+        PyErr_NoMemory();
+    } else if (failed >= 0) {
+        PyErr_Clear();
+        PyErr_Format(PyExc_ValueError, "could not read the vertices in text %lld", (long long)failed);
+    } else {
+        result = Py_BuildValue("y#y#y#", arrays[0].data != NULL ? arrays[0].data : "", (Py_ssize_t)arrays[0].size,
+            arrays[1].data != NULL ? arrays[1].data : "", (Py_ssize_t)arrays[1].size,
+            arrays[2].data != NULL ? arrays[2].data : "", (Py_ssize_t)arrays[2].size);
+    }
+    for (int k = 0; k < 3; ++k) {
+        free(arrays[k].data);
+    }
+    return result;
+}
+
+static PyObject* simplifyrings(PyObject* self, PyObject* const* args, Py_ssize_t nargs)
+{
+    Py_buffer buffers[4];
+    if (!checkargs("simplifyrings", nargs, 4)) {
+        return NULL;
+    }
+    double tolerance = PyFloat_AsDouble(args[2]);
+    if (tolerance == -1.0 && PyErr_Occurred()) {
+        return NULL;
+    }
+    PyObject* const bufargs[3] = {args[0], args[1], args[3]};
+    if (!getbuffers(bufargs, buffers, 3, 1)) {
+        return NULL;
+    }
+    const double* v = (const double*)buffers[0].buf;
+    const int64_t* off = (const int64_t*)buffers[1].buf;
+    uint8_t* keep = (uint8_t*)buffers[2].buf;
+    int64_t nrings = buffers[1].len / (Py_ssize_t)sizeof(int64_t) - 1;
+    int64_t maxn = 0;
+    if (buffers[0].itemsize != sizeof(double) || buffers[1].itemsize != sizeof(int64_t)
+        || buffers[2].itemsize != 1 || !validoffsets(off, nrings, buffers[0].len, &maxn)
+        || (nrings > 0 && buffers[2].len < off[nrings])) {
+        releasebuffers(buffers, 3);
+        PyErr_SetString(PyExc_ValueError, "expected float64 vertices, int64 ring offsets and a uint8 result per vertex");
+        return NULL;
+    }
+    int64_t* stack = malloc(sizeof(int64_t) * 2 * (size_t)(maxn + 1));
+    if (stack == NULL) {
+        releasebuffers(buffers, 3);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (int64_t r = 0; r < nrings; ++r) {
+        simplifyring_c(v + 2 * off[r], off[r + 1] - off[r], tolerance, keep + off[r], stack);
+    }
+    Py_END_ALLOW_THREADS
+    free(stack);
+    releasebuffers(buffers, 3);
+    Py_RETURN_NONE;
+}
+
+static PyObject* ringcoverage(PyObject* self, PyObject* const* args, Py_ssize_t nargs)
+{
+    Py_buffer buffers[6];
+    if (!checkargs("ringcoverage", nargs, 6) || !getbuffers(args, buffers, 6, 1)) {
+        return NULL;
+    }
+    const double* v = (const double*)buffers[0].buf;
+    const int64_t* off = (const int64_t*)buffers[1].buf;
+    const double* weights = (const double*)buffers[2].buf;
+    const int64_t* layers = (const int64_t*)buffers[3].buf;
+    const double* params = (const double*)buffers[4].buf;
+    double* out = (double*)buffers[5].buf;
+    int64_t nrings = buffers[1].len / (Py_ssize_t)sizeof(int64_t) - 1;
+    int64_t maxn = 0;
+    if (buffers[0].itemsize != sizeof(double) || buffers[1].itemsize != sizeof(int64_t)
+        || buffers[2].itemsize != sizeof(double) || buffers[2].len < nrings * (Py_ssize_t)sizeof(double)
+        || buffers[3].itemsize != sizeof(int64_t) || buffers[3].len < nrings * (Py_ssize_t)sizeof(int64_t)
+        || buffers[4].itemsize != sizeof(double) || buffers[4].len < 3 * (Py_ssize_t)sizeof(double)
+        || !(params[2] > 0) || buffers[5].itemsize != sizeof(double) || buffers[5].ndim != 3
+        || !validoffsets(off, nrings, buffers[0].len, &maxn)) {
+        releasebuffers(buffers, 6);
+        PyErr_SetString(PyExc_ValueError, "expected float64 vertices, int64 ring offsets, float64 weights, int64 layers, "
+            "the float64 grid origin and cell size and a float64 result of shape (layers, rows, columns)");
+        return NULL;
+    }
+    int64_t nlayers = buffers[5].shape[0];
+    grid g = {params[0], params[1], params[2], buffers[5].shape[2], buffers[5].shape[1]};
+    for (int64_t r = 0; r < nrings; ++r) {
+        if (layers[r] < 0 || layers[r] >= nlayers) {
+            releasebuffers(buffers, 6);
+            PyErr_SetString(PyExc_IndexError, "layer index out of range");
+            return NULL;
+        }
+    }
+    // the area under the segments within a cell and the full cells above them,
+    // with an extra row for the segments below the grid
+    double* area = calloc((size_t)(g.width * g.height), sizeof(double));
+    double* cover = calloc((size_t)(g.width * (g.height + 1)), sizeof(double));
+    if (area == NULL || cover == NULL) {
+        free(area);
+        free(cover);
+        releasebuffers(buffers, 6);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    int64_t r = 0;
+    while (r < nrings) {
+        int64_t layer = layers[r];
+        for (; r < nrings && layers[r] == layer; ++r) {
+            ringcoverage_c(v + 2 * off[r], off[r + 1] - off[r], weights[r], &g, area, cover);
+        }
+        double* result = out + layer * g.width * g.height;
+        for (int64_t i = 0; i < g.width; ++i) {
+            double above = cover[g.height * g.width + i];
+            cover[g.height * g.width + i] = 0.0;
+            for (int64_t j = g.height - 1; j >= 0; --j) {
+                result[j * g.width + i] += area[j * g.width + i] + above;
+                above += cover[j * g.width + i];
+                area[j * g.width + i] = 0.0;
+                cover[j * g.width + i] = 0.0;
+            }
+        }
+    }
+    Py_END_ALLOW_THREADS
+    free(area);
+    free(cover);
+    releasebuffers(buffers, 6);
+    Py_RETURN_NONE;
+}
+
+static PyObject* nearestsegments(PyObject* self, PyObject* const* args, Py_ssize_t nargs)
+{
+    Py_buffer buffers[7];
+    if (!checkargs("nearestsegments", nargs, 7) || !getbuffers(args, buffers, 7, 2)) {
+        return NULL;
+    }
+    const double* p = (const double*)buffers[0].buf;
+    const double* params = (const double*)buffers[4].buf;
+    double* distance = (double*)buffers[5].buf;
+    int64_t* nearest = (int64_t*)buffers[6].buf;
+    int64_t npoints = buffers[0].len / (2 * (Py_ssize_t)sizeof(double));
+    int64_t nsegments = buffers[1].len / (4 * (Py_ssize_t)sizeof(double));
+    int64_t nentries = buffers[3].len / (Py_ssize_t)sizeof(int64_t);
+    bool valid = buffers[0].itemsize == sizeof(double) && buffers[1].itemsize == sizeof(double)
+        && buffers[2].itemsize == sizeof(int64_t) && buffers[3].itemsize == sizeof(int64_t)
+        && buffers[4].itemsize == sizeof(double) && buffers[4].len >= 6 * (Py_ssize_t)sizeof(double)
+        && buffers[5].itemsize == sizeof(double) && buffers[5].len >= npoints * (Py_ssize_t)sizeof(double)
+        && buffers[6].itemsize == sizeof(int64_t) && buffers[6].len >= npoints * (Py_ssize_t)sizeof(int64_t)
+        && params[2] > 0 && params[3] >= 0 && params[4] >= 0;
+    segmentindex index = {(const double*)buffers[1].buf, (const int64_t*)buffers[2].buf, (const int64_t*)buffers[3].buf,
+        {params[0], params[1], params[2], (int64_t)params[3], (int64_t)params[4]}};
+    int64_t ncells = index.g.width * index.g.height;
+    if (valid && buffers[2].len < (ncells + 1) * (Py_ssize_t)sizeof(int64_t)) {
+        valid = false;
+    }
+    for (int64_t i = 0; valid && i < ncells; ++i) {
+        valid = index.offsets[i] >= 0 && index.offsets[i] <= index.offsets[i + 1];
+    }
+    valid = valid && index.offsets[ncells] <= nentries;
+    for (int64_t i = 0; valid && i < index.offsets[ncells]; ++i) {
+        valid = index.entries[i] >= 0 && index.entries[i] < nsegments;
+    }
+    if (!valid) {
+        releasebuffers(buffers, 7);
+        PyErr_SetString(PyExc_ValueError, "expected float64 points and segments, an int64 segment index, "
+            "the float64 grid origin, cell size, columns, rows and maximal distance and a float64 and int64 result per point");
+        return NULL;
+    }
+    double maxdistance = params[5];
+    Py_BEGIN_ALLOW_THREADS
+    for (int64_t i = 0; i < npoints; ++i) {
+        distance[i] = nearestsegment_c(&index, p[2 * i], p[2 * i + 1], maxdistance, nearest + i);
+    }
+    Py_END_ALLOW_THREADS
+    releasebuffers(buffers, 7);
+    Py_RETURN_NONE;
+}
+
+static PyObject* earcutrings(PyObject* self, PyObject* const* args, Py_ssize_t nargs)
+{
+    Py_buffer buffers[6];
+    if (!checkargs("earcutrings", nargs, 6) || !getbuffers(args, buffers, 6, 2)) {
+        return NULL;
+    }
+    const double* v = (const double*)buffers[0].buf;
+    const int64_t* off = (const int64_t*)buffers[1].buf;
+    const int64_t* regions = (const int64_t*)buffers[2].buf;
+    const int64_t* slots = (const int64_t*)buffers[3].buf;
+    int64_t* triangles = (int64_t*)buffers[4].buf;
+    int64_t* counts = (int64_t*)buffers[5].buf;
+    int64_t nrings = buffers[1].len / (Py_ssize_t)sizeof(int64_t) - 1;
+    int64_t nregions = buffers[2].len / (Py_ssize_t)sizeof(int64_t) - 1;
+    int64_t maxn = 0;
+    bool valid = buffers[0].itemsize == sizeof(double) && buffers[1].itemsize == sizeof(int64_t)
+        && buffers[2].itemsize == sizeof(int64_t) && buffers[3].itemsize == sizeof(int64_t)
+        && buffers[4].itemsize == sizeof(int64_t) && buffers[5].itemsize == sizeof(int64_t)
+        && nregions >= 0 && buffers[3].len >= (nregions + 1) * (Py_ssize_t)sizeof(int64_t)
+        && buffers[5].len >= nregions * (Py_ssize_t)sizeof(int64_t)
+        && validoffsets(off, nrings, buffers[0].len, &maxn);
+    int64_t maxnodes = 0;
+    int64_t maxrings = 0;
+    for (int64_t r = 0; valid && r < nregions; ++r) {
+        valid = regions[r] >= 0 && regions[r] <= regions[r + 1] && regions[r + 1] <= nrings
+            && slots[r] >= 0 && slots[r] <= slots[r + 1];
+        if (valid) {
+            // each hole bridge and each split adds two nodes
+            int64_t n = off[regions[r + 1]] - off[regions[r]] + 2 * (regions[r + 1] - regions[r]);
+            maxnodes = MAX(maxnodes, 3 * n + 8);
+            maxrings = MAX(maxrings, regions[r + 1] - regions[r]);
+        }
+    }
+    valid = valid && buffers[4].len >= 3 * slots[nregions] * (Py_ssize_t)sizeof(int64_t);
+    if (!valid) {
+        releasebuffers(buffers, 6);
+        PyErr_SetString(PyExc_ValueError, "expected float64 vertices, int64 ring and region offsets, "
+            "int64 triangle offsets per region and an int64 result of 3 indices per triangle and a count per region");
+        return NULL;
+    }
+    earnode* nodes = malloc(sizeof(earnode) * (size_t)MAX(maxnodes, 1));
+    earnode** queue = malloc(sizeof(earnode*) * (size_t)MAX(maxrings, 1));
+    if (nodes == NULL || queue == NULL) {
+        free(nodes);
+        free(queue);
+        releasebuffers(buffers, 6);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (int64_t r = 0; r < nregions; ++r) {
+        earcut e = {nodes, 0, maxnodes, triangles + 3 * slots[r], 0, slots[r + 1] - slots[r], 0.0, 0.0, 0.0};
+        earcutregion_c(&e, v, off + regions[r], regions[r + 1] - regions[r], queue);
+        counts[r] = e.ntriangles;
+    }
+    Py_END_ALLOW_THREADS
+    free(nodes);
+    free(queue);
+    releasebuffers(buffers, 6);
+    Py_RETURN_NONE;
 }
 
 static PyMethodDef methods[] = {
-    {"pointinpoly", (PyCFunction)pointinpoly, METH_VARARGS, "calculates if the point is in the polygon"},
+    {"pointinpoly", (PyCFunction)(void(*)(void))pointinpoly, METH_FASTCALL, "calculates if the point is in the polygon"},
+    {"pointsinrings", (PyCFunction)(void(*)(void))pointsinrings, METH_FASTCALL, "finds the last ring that contains each point"},
+    {"selfintersecting", (PyCFunction)(void(*)(void))selfintersecting, METH_FASTCALL, "marks the rings that intersect themselves"},
+    {"tracelabels", (PyCFunction)(void(*)(void))tracelabels, METH_FASTCALL, "traces the outlines and holes of all labels in a mask"},
+    {"scanvertices", (PyCFunction)(void(*)(void))scanvertices, METH_FASTCALL, "reads the coordinates of the V elements in the elements of xml text"},
+    {"simplifyrings", (PyCFunction)(void(*)(void))simplifyrings, METH_FASTCALL, "marks the vertices to keep after Douglas-Peucker simplification"},
+    {"ringcoverage", (PyCFunction)(void(*)(void))ringcoverage, METH_FASTCALL, "adds the exact area of the rings in each cell of a grid"},
+    {"nearestsegments", (PyCFunction)(void(*)(void))nearestsegments, METH_FASTCALL, "finds the signed distance to the nearest segment of each point"},
+    {"earcutrings", (PyCFunction)(void(*)(void))earcutrings, METH_FASTCALL, "triangulates polygons with holes by ear clipping"},
     {NULL, NULL, 0, NULL},
 };
 
+static PyModuleDef_Slot slots[] = {
+#ifdef Py_mod_multiple_interpreters
+    {Py_mod_multiple_interpreters, Py_MOD_PER_INTERPRETER_GIL_SUPPORTED},
+#endif
+#ifdef Py_mod_gil
+    {Py_mod_gil, Py_MOD_GIL_NOT_USED},
+#endif
+    {0, NULL},
+};
+
 static struct PyModuleDef module = {
     PyModuleDef_HEAD_INIT,
     "pyhaloxmlc",
-    NULL,
-    -1,
+    "Geometry kernels for pyhaloxml.",
+    0,  // no module state
     methods,
+    slots,
+    NULL,
+    NULL,
+    NULL,
 };
 
 PyMODINIT_FUNC PyInit_pyhaloxmlc(void)
 {
-    return PyModule_Create(&module);
+    return PyModuleDef_Init(&module);
 }
 
-bool pointinpoly_c(PyObject* point, PyObject* polygon) {
+int pointinpoly_c(PyObject* point, PyObject* polygon) {
     PyObject* p1;  // polygon coordinate
     PyObject* p2;  // polygon coordinate
     Py_ssize_t nvertices;
@@ -56,16 +608,28 @@ bool pointinpoly_c(PyObject* point, PyObject* polygon) {
     float p2y;
     float pointx;
     float pointy;
+    int result = -1;
 
     xints = 0.0;
     inside = false;
-    nvertices = PyList_Size(polygon);
-    PyArg_ParseTuple(point, "ff", &pointx, &pointy);
-    p1 = PyList_GetItem(polygon, 0);
-    PyArg_ParseTuple(p1, "ff", &p1x, &p1y);
-    for (int i = 1; i < nvertices; ++i){
-        p2 = PyList_GetItem(polygon, i);
-        PyArg_ParseTuple(p2, "ff", &p2x, &p2y);
+    if (!PyArg_ParseTuple(point, "ff", &pointx, &pointy)) {
+        return -1;
+    }
+    Py_BEGIN_CRITICAL_SECTION(polygon);
+    nvertices = PyList_GET_SIZE(polygon);
+    if (nvertices == 0) {
+        result = 0;
+        goto done;
+    }
+    p1 = PyList_GET_ITEM(polygon, 0);
+    if (!PyArg_ParseTuple(p1, "ff", &p1x, &p1y)) {
+        goto done;
+    }
+    for (Py_ssize_t i = 1; i < nvertices; ++i){
+        p2 = PyList_GET_ITEM(polygon, i);
+        if (!PyArg_ParseTuple(p2, "ff", &p2x, &p2y)) {
+            goto done;
+        }
         if (pointy > MIN(p1y, p2y)) {
             if (pointy <= MAX(p1y, p2y)) {
                 if (pointx <= MAX(p1x,p2x)){
@@ -81,5 +645,1134 @@ bool pointinpoly_c(PyObject* point, PyObject* polygon) {
         p1x = p2x;
         p1y = p2y;
     }
+    result = inside ? 1 : 0;
+done:
+    Py_END_CRITICAL_SECTION();
+    return result;
+}
+
+bool pointinring_c(double x, double y, const double* vertices, int64_t n) {
+    // the same crossing test as pointinpoly_c
+    bool inside = false;
+    double xints = 0.0;
+    for (int64_t i = 1; i < n; ++i) {
+        const double* p1 = vertices + 2 * (i - 1);
+        const double* p2 = vertices + 2 * i;
+        if (y > MIN(p1[1], p2[1]) && y <= MAX(p1[1], p2[1]) && x <= MAX(p1[0], p2[0])) {
+            if (p1[1] != p2[1]) {
+                xints = (y - p1[1]) * (p2[0] - p1[0]) / (p2[1] - p1[1]) + p1[0];
+            }
+            if (p1[0] == p2[0] || x <= xints) {
+                inside = !inside;
+            }
+        }
+    }
     return inside;
-}
\ No newline at end of file
+}
+
+static int compare_minx(const void* a, const void* b) {
+    double ka = ((const segment*)a)->minx;
+    double kb = ((const segment*)b)->minx;
+    return (ka > kb) - (ka < kb);
+}
+
+static int orientation(const double* a, const double* b, const double* c) {
+    double cross = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0]);
+    return (cross > 0) - (cross < 0);
+}
+
+static bool onsegment(const double* a, const double* b, const double* p) {
+    return MIN(a[0], b[0]) <= p[0] && p[0] <= MAX(a[0], b[0])
+        && MIN(a[1], b[1]) <= p[1] && p[1] <= MAX(a[1], b[1]);
+}
+
+static bool segmentsintersect(const double* a, const double* b, const double* c, const double* d) {
+    int o1 = orientation(a, b, c);
+    int o2 = orientation(a, b, d);
+    int o3 = orientation(c, d, a);
+    int o4 = orientation(c, d, b);
+    if (o1 != o2 && o3 != o4) {
+        return true;
+    }
+    return (o1 == 0 && onsegment(a, b, c)) || (o2 == 0 && onsegment(a, b, d))
+        || (o3 == 0 && onsegment(c, d, a)) || (o4 == 0 && onsegment(c, d, b));
+}
+
+bool ringselfintersects_c(const double* vertices, int64_t n, double* points, segment* segments) {
+    // copy the ring without consecutive duplicates and close it
+    int64_t m = 0;
+    for (int64_t i = 0; i < n; ++i) {
+        if (m == 0 || vertices[2 * i] != points[2 * (m - 1)] || vertices[2 * i + 1] != points[2 * (m - 1) + 1]) {
+            points[2 * m] = vertices[2 * i];
+            points[2 * m + 1] = vertices[2 * i + 1];
+            m++;
+        }
+    }
+    if (m > 1 && points[0] == points[2 * (m - 1)] && points[1] == points[2 * (m - 1) + 1]) {
+        m--;
+    }
+    if (m < 4) {
+        return false;  // a triangle can not intersect itself
+    }
+    points[2 * m] = points[0];
+    points[2 * m + 1] = points[1];
+    // sweep over the segments sorted by their left side
+    for (int64_t i = 0; i < m; ++i) {
+        segments[i].index = i;
+        segments[i].minx = MIN(points[2 * i], points[2 * i + 2]);
+    }
+    qsort(segments, (size_t)m, sizeof(segment), compare_minx);
+    for (int64_t i = 0; i < m; ++i) {
+        int64_t s = segments[i].index;
+        const double* a = points + 2 * s;
+        const double* b = points + 2 * s + 2;
+        double maxx = MAX(a[0], b[0]);
+        for (int64_t j = i + 1; j < m && segments[j].minx <= maxx; ++j) {
+            int64_t t = segments[j].index;
+            int64_t gap = s > t ? s - t : t - s;
+            if (gap == 1 || gap == m - 1) {
+                continue;  // neighbouring segments share a vertex
+            }
+            const double* c = points + 2 * t;
+            const double* d = points + 2 * t + 2;
+            if (MAX(MIN(a[1], b[1]), MIN(c[1], d[1])) <= MIN(MAX(a[1], b[1]), MAX(c[1], d[1]))
+                && segmentsintersect(a, b, c, d)) {
+                return true;
+            }
+        }
+    }
+    return false;
+}
+
+static bool growarray_append(growarray* a, const void* item, size_t n) {
+    if (a->failed) {
+        return false;
+    }
+    if (a->size + n > a->capacity) {
+        size_t capacity = MAX(a->capacity * 2, MAX(a->size + n, (size_t)4096));
+        char* data = realloc(a->data, capacity);
+        if (data == NULL) {
+            a->failed = true;
+            return false;
+        }
+        a->data = data;
+        a->capacity = capacity;
+    }
+    memcpy(a->data + a->size, item, n);
+    a->size += n;
+    return true;
+}
+
+static int64_t getlabel(const labelimage* im, int64_t index) {
+    bool issigned = im->kind == 'b' || im->kind == 'h' || im->kind == 'i' || im->kind == 'l' || im->kind == 'q';
+    switch (im->itemsize) {
+        case 1:
+            return issigned ? (int64_t)((const int8_t*)im->buf)[index] : (int64_t)((const uint8_t*)im->buf)[index];
+        case 2:
+            return issigned ? (int64_t)((const int16_t*)im->buf)[index] : (int64_t)((const uint16_t*)im->buf)[index];
+        case 4:
+            return issigned ? (int64_t)((const int32_t*)im->buf)[index] : (int64_t)((const uint32_t*)im->buf)[index];
+        default:
+            return ((const int64_t*)im->buf)[index];
+    }
+}
+
+// directions east, south, west and north, with y pointing down
+static const int64_t DX[4] = {1, 0, -1, 0};
+static const int64_t DY[4] = {0, 1, 0, -1};
+
+static bool haslabel(const labelimage* im, int64_t x, int64_t y, int64_t label) {
+    return x >= 0 && y >= 0 && x < im->width && y < im->height && getlabel(im, y * im->width + x) == label;
+}
+
+static bool quadrant(const labelimage* im, int64_t x, int64_t y, int a, int b, int64_t label) {
+    // the pixel with corner (x, y) that lies in the directions a and b
+    return haslabel(im, x + (DX[a] + DX[b] < 0 ? -1 : 0), y + (DY[a] + DY[b] < 0 ? -1 : 0), label);
+}
+
+void tracelabels_c(const labelimage* im, int64_t background, uint8_t* visited,
+    growarray* vertices, growarray* offsets, growarray* labels, growarray* starts) {
+    // Follow the pixel edges with the label on the right. Outlines run clockwise
+    // and holes counterclockwise (with y pointing down). At a vertex where two
+    // pixels only touch diagonally the path turns right, so regions are four
+    // connected. Every ring has an edge along the top of a pixel, heading east;
+    // those edges are marked in visited to start each ring once.
+    int64_t nvertices = 0;
+    growarray_append(offsets, &nvertices, sizeof(int64_t));
+    for (int64_t r = 0; r < im->height; ++r) {
+        for (int64_t c = 0; c < im->width; ++c) {
+            int64_t i = r * im->width + c;
+            int64_t label = getlabel(im, i);
+            if (label == background || (visited[i >> 3] & (1 << (i & 7))) || haslabel(im, c, r - 1, label)) {
+                continue;
+            }
+            int64_t x = c + 1;
+            int64_t y = r;
+            int d = 0;
+            visited[i >> 3] |= (uint8_t)(1 << (i & 7));
+            int64_t first = nvertices;
+            for (;;) {
+                int right = (d + 1) & 3;
+                int left = (d + 3) & 3;
+                int next = left;
+                if (!quadrant(im, x, y, d, right, label)) {
+                    next = right;
+                } else if (!quadrant(im, x, y, d, left, label)) {
+                    next = d;
+                }
+                if (next != d) {
+                    double xy[2] = {(double)x, (double)y};
+                    growarray_append(vertices, xy, sizeof(xy));
+                    nvertices++;
+                }
+                if (x == c && y == r && next == 0) {
+                    break;
+                }
+                if (next == 0) {
+                    int64_t j = y * im->width + x;  // the pixel below the edge
+                    visited[j >> 3] |= (uint8_t)(1 << (j & 7));
+                }
+                x += DX[next];
+                y += DY[next];
+                d = next;
+            }
+            double closing[2];
+            memcpy(closing, vertices->data + (size_t)first * sizeof(closing), sizeof(closing));
+            growarray_append(vertices, closing, sizeof(closing));
+            nvertices++;
+            int64_t start[2] = {c, r};
+            growarray_append(offsets, &nvertices, sizeof(int64_t));
+            growarray_append(labels, &label, sizeof(int64_t));
+            growarray_append(starts, start, sizeof(start));
+            if (vertices->failed || offsets->failed || labels->failed || starts->failed) {
+                return;
+            }
+        }
+    }
+}
+
+static bool isspace_c(char c) {
+    return c == ' ' || c == '\t' || c == '\n' || c == '\r';
+}
+
+static const char* skippast(const char* p, const char* end, const char* text) {
+    // the position after the next occurrence of text, or NULL
+    size_t n = strlen(text);
+    for (; p + n <= end; ++p) {
+        if (memcmp(p, text, n) == 0) {
+            return p + n;
+        }
+    }
+    return NULL;
+}
+
+static bool isname(const char* name, size_t n, const char* text) {
+    return strlen(text) == n && memcmp(name, text, n) == 0;
+}
+
+static bool inlist(const char* name, size_t n, const char* const* list) {
+    for (; *list != NULL; ++list) {
+        if (isname(name, n, *list)) {
+            return true;
+        }
+    }
+    return false;
+}
+
+static const char* scanattributes(const char* p, const char* end, double* xy, bool* found, const char* const* allowed, bool* other) {
+    // reads the attributes of a start tag up to the / or > at its end, p is just
+    // after the name, the X and Y attributes are parsed if xy is not NULL, other is
+    // set if there is an attribute that is not in the allowed names (if not NULL)
+    for (;;) {
+        while (p < end && isspace_c(*p)) {
+            ++p;
+        }
+        if (p >= end) {
+            return NULL;
+        }
+        if (*p == '/' || *p == '>') {
+            return p;
+        }
+        const char* name = p;
+        while (p < end && *p != '=' && !isspace_c(*p)) {
+            ++p;
+        }
+        size_t namelength = (size_t)(p - name);
+        while (p < end && isspace_c(*p)) {
+            ++p;
+        }
+        if (p >= end || *p != '=') {
+            return NULL;
+        }
+        ++p;
+        while (p < end && isspace_c(*p)) {
+            ++p;
+        }
+        if (p >= end || (*p != '"' && *p != '\'')) {
+            return NULL;
+        }
+        const char* value = p + 1;
+        const char* quote = memchr(value, *p, (size_t)(end - value));
+        if (quote == NULL) {
+            return NULL;
+        }
+        p = quote + 1;
+        if (allowed != NULL && !inlist(name, namelength, allowed)) {
+            *other = true;
+        }
+        int axis = isname(name, namelength, "X") ? 0 : isname(name, namelength, "Y") ? 1 : -1;
+        if (xy == NULL || axis < 0) {
+            continue;
+        }
+        while (value < quote && isspace_c(*value)) {
+            ++value;
+        }
+        char* last;
+        xy[axis] = PyOS_string_to_double(value, &last, NULL);
+        if (last == value || PyErr_Occurred()) {
+            return NULL;
+        }
+        while (last < quote && isspace_c(*last)) {
+            ++last;
+        }
+        if (last != quote) {
+            return NULL;
+        }
+        found[axis] = true;
+    }
+}
+
+int64_t scanvertices_c(const char* xml, const int64_t* offsets, int64_t n, int64_t level, growarray* counts, growarray* flags, growarray* vertices) {
+    // Each text is a serialized Region element, or has them at the given level
+    // below its root. Reads the X and Y attributes of the V elements in the
+    // Vertices of each region and counts them per region. The flags of a region
+    // are 1 if it has a Comments child, 2 if that has children and 4 if it has
+    // other attributes or elements than Type, HasEndcaps, NegativeROA, Vertices
+    // with V elements with X and Y, and Comments with Comment elements. Returns
+    // the text that could not be read, or -1.
+    static const char* const regionattributes[] = {"Type", "HasEndcaps", "NegativeROA", NULL};
+    static const char* const vertexattributes[] = {"X", "Y", NULL};
+    static const char* const none[] = {NULL};
+    enum { OTHER, VERTICES, COMMENTS };
+    for (int64_t k = 0; k < n; ++k) {
+        const char* p = xml + offsets[k];
+        const char* end = xml + offsets[k + 1];
+        int64_t depth = 0;
+        int64_t* count = NULL;
+        uint8_t* flag = NULL;
+        int child = OTHER;  // the kind of child of the region that p is in
+        while (p != NULL && (p = memchr(p, '<', (size_t)(end - p))) != NULL) {
+            ++p;
+            if (end - p >= 3 && memcmp(p, "!--", 3) == 0) {
+                p = skippast(p, end, "-->");
+            } else if (end - p >= 8 && memcmp(p, "![CDATA[", 8) == 0) {
+                p = skippast(p, end, "]]>");
+            } else if (p < end && (*p == '?' || *p == '!')) {
+                p = skippast(p, end, ">");
+            } else if (p < end && *p == '/') {
+                depth--;
+                p = skippast(p, end, ">");
+            } else {
+                const char* name = p;
+                while (p < end && !isspace_c(*p) && *p != '/' && *p != '>') {
+                    ++p;
+                }
+                size_t namelength = (size_t)(p - name);
+                const char* const* allowed = NULL;
+                bool other = false;
+                bool isvertex = false;
+                if (depth == level) {
+                    int64_t zero = 0;
+                    if (!growarray_append(counts, &zero, sizeof(zero))) {
+                        return -1;
+                    }
+                    uint8_t nothing = 0;
+                    if (!growarray_append(flags, &nothing, sizeof(nothing))) {
+                        return -1;
+                    }
+                    count = (int64_t*)(counts->data + counts->size) - 1;
+                    flag = (uint8_t*)(flags->data + flags->size) - 1;
+                    allowed = regionattributes;
+                } else if (depth == level + 1 && flag != NULL) {
+                    child = isname(name, namelength, "Vertices") ? VERTICES
+                        : isname(name, namelength, "Comments") ? COMMENTS : OTHER;
+                    *flag |= child == COMMENTS;
+                    other = child == OTHER;
+                    allowed = none;
+                } else if (depth == level + 2 && flag != NULL) {
+                    if (child == VERTICES) {
+                        isvertex = isname(name, namelength, "V");
+                        allowed = vertexattributes;
+                    } else if (child == COMMENTS) {
+                        *flag |= 2;
+                    }
+                    other = !isvertex && !(child == COMMENTS && isname(name, namelength, "Comment"));
+                } else if (depth > level && flag != NULL) {
+                    other = true;
+                }
+                double xy[2];
+                bool found[2] = {false, false};
+                p = scanattributes(p, end, isvertex ? xy : NULL, found, allowed, &other);
+                if (p == NULL || (isvertex && !(found[0] && found[1]))) {
+                    return k;
+                }
+                if (other) {
+                    *flag |= 4;
+                }
+                if (isvertex) {
+                    if (!growarray_append(vertices, xy, sizeof(xy))) {
+                        return -1;
+                    }
+                    (*count)++;
+                }
+                if (*p == '>') {
+                    depth++;
+                }
+            }
+        }
+    }
+    return -1;
+}
+
+static double segmentdistance(const double* p, const double* a, const double* b) {
+    double dx = b[0] - a[0];
+    double dy = b[1] - a[1];
+    double length = dx * dx + dy * dy;
+    double t = length > 0 ? ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length : 0.0;
+    t = MAX(0.0, MIN(1.0, t));
+    double ex = a[0] + t * dx - p[0];
+    double ey = a[1] + t * dy - p[1];
+    return sqrt(ex * ex + ey * ey);
+}
+
+void simplifyring_c(const double* vertices, int64_t n, double tolerance, uint8_t* keep, int64_t* stack) {
+    // Douglas-Peucker on a closed ring, split at the first vertex and the vertex
+    // farthest from it. Rings that would keep less than three corners are kept.
+    if (n < 5) {
+        memset(keep, 1, (size_t)n);
+        return;
+    }
+    memset(keep, 0, (size_t)n);
+    int64_t far = 0;
+    double farthest = -1.0;
+    for (int64_t i = 1; i < n - 1; ++i) {
+        double d = segmentdistance(vertices + 2 * i, vertices, vertices);
+        if (d > farthest) {
+            farthest = d;
+            far = i;
+        }
+    }
+    keep[0] = keep[far] = keep[n - 1] = 1;
+    int64_t top = 0;
+    stack[top++] = 0;
+    stack[top++] = far;
+    stack[top++] = far;
+    stack[top++] = n - 1;
+    while (top > 0) {
+        int64_t end = stack[--top];
+        int64_t begin = stack[--top];
+        int64_t index = -1;
+        double maxd = tolerance;
+        for (int64_t i = begin + 1; i < end; ++i) {
+            double d = segmentdistance(vertices + 2 * i, vertices + 2 * begin, vertices + 2 * end);
+            if (d > maxd) {
+                maxd = d;
+                index = i;
+            }
+        }
+        if (index >= 0) {
+            keep[index] = 1;
+            stack[top++] = begin;
+            stack[top++] = index;
+            stack[top++] = index;
+            stack[top++] = end;
+        }
+    }
+    int64_t kept = 0;
+    for (int64_t i = 0; i < n; ++i) {
+        kept += keep[i];
+    }
+    if (kept < 4) {
+        memset(keep, 1, (size_t)n);
+    }
+}
+
+static void addpiece(const grid* g, double weight, double xa, double ya, double xb, double yb, double* area, double* cover) {
+    // the signed area between a piece of a segment within one column and the top of the grid
+    double xm = (xa + xb) / 2;
+    double ym = (ya + yb) / 2;
+    int64_t i = (int64_t)floor((xm - g->x0) / g->size);
+    double j = floor((ym - g->y0) / g->size);
+    if (i < 0 || i >= g->width || j < 0) {
+        return;
+    }
+    double dx = (xb - xa) * weight;
+    if (j >= (double)g->height) {
+        cover[g->height * g->width + i] += dx * g->size;
+        return;
+    }
+    int64_t row = (int64_t)j;
+    area[row * g->width + i] += dx * (ym - (g->y0 + j * g->size));
+    cover[row * g->width + i] += dx * g->size;
+}
+
+void ringcoverage_c(const double* vertices, int64_t n, double weight, const grid* g, double* area, double* cover) {
+    // Splits every segment of the closed ring at the grid lines. The area of each
+    // piece towards the top of the grid is added to its cell and the cells above
+    // it, so the sum over a closed ring leaves exactly the area inside the ring.
+    double right = g->x0 + (double)g->width * g->size;
+    for (int64_t k = 0; k < n; ++k) {
+        const double* a = vertices + 2 * k;
+        const double* b = vertices + 2 * ((k + 1) % n);
+        double dx = b[0] - a[0];
+        double dy = b[1] - a[1];
+        if (dx == 0 || MAX(a[0], b[0]) <= g->x0 || MIN(a[0], b[0]) >= right || MAX(a[1], b[1]) <= g->y0) {
+            continue;  // no area towards the top within the grid
+        }
+        // only the part of the segment within the columns of the grid
+        double t = MAX(0.0, MIN((g->x0 - a[0]) / dx, (right - a[0]) / dx));
+        double end = MIN(1.0, MAX((g->x0 - a[0]) / dx, (right - a[0]) / dx));
+        double xa = t > 0 ? a[0] + t * dx : a[0];
+        double ya = t > 0 ? a[1] + t * dy : a[1];
+        double fi = floor((xa - g->x0) / g->size);
+        double fj = floor((ya - g->y0) / g->size);
+        if (dx < 0 && xa == g->x0 + fi * g->size) {
+            fi -= 1;
+        }
+        if (dy < 0 && ya == g->y0 + fj * g->size) {
+            fj -= 1;
+        }
+        while (t < end) {
+            double tx = (g->x0 + (dx > 0 ? fi + 1 : fi) * g->size - a[0]) / dx;
+            double ty = dy == 0 ? INFINITY : (g->y0 + (dy > 0 ? fj + 1 : fj) * g->size - a[1]) / dy;
+            double tn = MIN(MIN(tx, ty), end);
+            double xb = tn >= 1.0 ? b[0] : a[0] + tn * dx;
+            double yb = tn >= 1.0 ? b[1] : a[1] + tn * dy;
+            addpiece(g, weight, xa, ya, xb, yb, area, cover);
+            if (tn == tx) {
+                fi += dx > 0 ? 1 : -1;
+            }
+            if (tn == ty) {
+                fj += dy > 0 ? 1 : -1;
+            }
+            t = tn;
+            xa = xb;
+            ya = yb;
+        }
+    }
+}
+
+static void visitcell(const segmentindex* index, int64_t c, int64_t r, double x, double y,
+    double* best, double* bestline, int64_t* nearest) {
+    // keeps the nearest segment, at a shared vertex the one the point is farthest
+    // from the line of, as that one tells the side of the point correctly
+    int64_t cell = r * index->g.width + c;
+    for (int64_t e = index->offsets[cell]; e < index->offsets[cell + 1]; ++e) {
+        const double* s = index->segments + 4 * index->entries[e];
+        double dx = s[2] - s[0];
+        double dy = s[3] - s[1];
+        double length = dx * dx + dy * dy;
+        double t = length > 0 ? ((x - s[0]) * dx + (y - s[1]) * dy) / length : 0.0;
+        t = MAX(0.0, MIN(1.0, t));
+        double ex = s[0] + t * dx - x;
+        double ey = s[1] + t * dy - y;
+        double d = sqrt(ex * ex + ey * ey);
+        double line = length > 0 ? (dx * (y - s[1]) - dy * (x - s[0])) / sqrt(length) : 0.0;
+        // the first segment within reach is always taken, the tolerance is
+        // nan while best is still infinite
+        if ((*nearest < 0 && d <= *best) || d < *best - 1e-12 * (1 + *best)
+            || (d <= *best + 1e-12 * (1 + *best) && fabs(line) > fabs(*bestline))) {
+            *best = MIN(d, *best);
+            *bestline = line;
+            *nearest = index->entries[e];
+        }
+    }
+}
+
+static bool inside_c(const segmentindex* index, double x, double y) {
+    // even-odd rule along a ray to the right, each crossing counted in the cell it is in
+    const grid* g = &index->g;
+    int64_t r = (int64_t)floor((y - g->y0) / g->size);
+    if (r < 0 || r >= g->height) {
+        return false;
+    }
+    bool inside = false;
+    int64_t first = (int64_t)MAX(0.0, floor((x - g->x0) / g->size));
+    for (int64_t c = first; c < g->width; ++c) {
+        int64_t cell = r * g->width + c;
+        for (int64_t e = index->offsets[cell]; e < index->offsets[cell + 1]; ++e) {
+            const double* s = index->segments + 4 * index->entries[e];
+            if ((s[1] > y) == (s[3] > y)) {
+                continue;
+            }
+            double xcross = s[0] + (y - s[1]) * (s[2] - s[0]) / (s[3] - s[1]);
+            int64_t crosscell = (int64_t)floor((xcross - g->x0) / g->size);
+            if (xcross > x && MAX(0, MIN(g->width - 1, crosscell)) == c) {
+                inside = !inside;
+            }
+        }
+    }
+    return inside;
+}
+
+double nearestsegment_c(const segmentindex* index, double x, double y, double maxdistance, int64_t* nearest) {
+    // Searches the cells in square rings around the cell of the point, until the
+    // next ring cannot hold a nearer segment. Negative inside, positive outside.
+    const grid* g = &index->g;
+    *nearest = -1;
+    if (!isfinite(x) || !isfinite(y)) {
+        return NAN;
+    }
+    if (g->width == 0 || g->height == 0) {
+        return INFINITY;
+    }
+    double best = maxdistance;
+    double bestline = 0.0;
+    double fc = floor((x - g->x0) / g->size);
+    double fr = floor((y - g->y0) / g->size);
+    // rings before the one that reaches the grid hold no cells
+    double start = MAX(MAX(-fc, fc - (double)(g->width - 1)), MAX(-fr, fr - (double)(g->height - 1)));
+    start = MAX(start, 0.0);
+    if ((start - 1) * g->size <= best) {
+        int64_t col = (int64_t)fc;
+        int64_t row = (int64_t)fr;
+        for (int64_t k = (int64_t)start; (double)(k - 1) * g->size <= best; ++k) {
+            if (k > start && col - k < 0 && col + k >= g->width && row - k < 0 && row + k >= g->height) {
+                break;
+            }
+            int64_t c0 = MAX(col - k, 0);
+            int64_t c1 = MIN(col + k, g->width - 1);
+            for (int64_t r = row - k; r <= row + k; r += MAX(2 * k, 1)) {
+                if (r >= 0 && r < g->height) {
+                    for (int64_t c = c0; c <= c1; ++c) {
+                        visitcell(index, c, r, x, y, &best, &bestline, nearest);
+                    }
+                }
+            }
+            int64_t r0 = MAX(row - k + 1, 0);
+            int64_t r1 = MIN(row + k - 1, g->height - 1);
+            for (int64_t c = col - k; k > 0 && c <= col + k; c += 2 * k) {
+                if (c >= 0 && c < g->width) {
+                    for (int64_t r = r0; r <= r1; ++r) {
+                        visitcell(index, c, r, x, y, &best, &bestline, nearest);
+                    }
+                }
+            }
+        }
+    }
+    if (*nearest < 0) {
+        return inside_c(index, x, y) ? -INFINITY : INFINITY;
+    }
+    return bestline > 0 ? -best : best;
+}
+
+// Ear clipping after earcut by Mapbox (https://github.com/mapbox/earcut): the holes
+// are bridged to the outline, and points on a z-order curve speed up the search for
+// ears. The earcut code is used under the following license.
+//
+// ISC License
+//
+// Copyright (c) 2016, Mapbox
+//
+// Permission to use, copy, modify, and/or distribute this software for any purpose
+// with or without fee is hereby granted, provided that the above copyright notice
+// and this permission notice appear in all copies.
+//
+// THE SOFTWARE IS PROVIDED "AS IS" AND ISC DISCLAIMS ALL WARRANTIES WITH REGARD TO
+// THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS.
+// IN NO EVENT SHALL ISC BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT, OR
+// CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA
+// OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+// ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+static earnode* earinsert(earcut* e, int64_t i, const double* vertices, earnode* last) {
+    if (e->used == e->capacity) {
+        return NULL;
+    }
+    earnode* p = e->nodes + e->used++;
+    *p = (earnode){i, vertices[2 * i], vertices[2 * i + 1], 0, false, p, p, NULL, NULL};
+    if (last != NULL) {
+        p->next = last->next;
+        p->prev = last;
+        last->next->prev = p;
+        last->next = p;
+    }
+    return p;
+}
+
+static void earremove(earnode* p) {
+    p->next->prev = p->prev;
+    p->prev->next = p->next;
+    if (p->prevz) {
+        p->prevz->nextz = p->nextz;
+    }
+    if (p->nextz) {
+        p->nextz->prevz = p->prevz;
+    }
+}
+
+static double eararea(const earnode* p, const earnode* q, const earnode* r) {
+    return (q->y - p->y) * (r->x - q->x) - (q->x - p->x) * (r->y - q->y);
+}
+
+static bool earequals(const earnode* a, const earnode* b) {
+    return a->x == b->x && a->y == b->y;
+}
+
+static int earsign(double v) {
+    return (v > 0) - (v < 0);
+}
+
+static bool earonsegment(const earnode* p, const earnode* q, const earnode* r) {
+    return q->x <= MAX(p->x, r->x) && q->x >= MIN(p->x, r->x) && q->y <= MAX(p->y, r->y) && q->y >= MIN(p->y, r->y);
+}
+
+static bool earintersects(const earnode* p1, const earnode* q1, const earnode* p2, const earnode* q2) {
+    int o1 = earsign(eararea(p1, q1, p2));
+    int o2 = earsign(eararea(p1, q1, q2));
+    int o3 = earsign(eararea(p2, q2, p1));
+    int o4 = earsign(eararea(p2, q2, q1));
+    return (o1 != o2 && o3 != o4) || (o1 == 0 && earonsegment(p1, p2, q1)) || (o2 == 0 && earonsegment(p1, q2, q1))
+        || (o3 == 0 && earonsegment(p2, p1, q2)) || (o4 == 0 && earonsegment(p2, q1, q2));
+}
+
+static bool intriangle(double ax, double ay, double bx, double by, double cx, double cy, double px, double py) {
+    return (cx - px) * (ay - py) >= (ax - px) * (cy - py) && (ax - px) * (by - py) >= (bx - px) * (ay - py)
+        && (bx - px) * (cy - py) >= (cx - px) * (by - py);
+}
+
+static bool locallyinside(const earnode* a, const earnode* b) {
+    return eararea(a->prev, a, a->next) < 0 ? eararea(a, b, a->next) >= 0 && eararea(a, a->prev, b) >= 0
+                                            : eararea(a, b, a->prev) < 0 || eararea(a, a->next, b) < 0;
+}
+
+static bool middleinside(const earnode* a, const earnode* b) {
+    const earnode* p = a;
+    bool inside = false;
+    double px = (a->x + b->x) / 2;
+    double py = (a->y + b->y) / 2;
+    do {
+        if ((p->y > py) != (p->next->y > py) && p->next->y != p->y
+            && px < (p->next->x - p->x) * (py - p->y) / (p->next->y - p->y) + p->x) {
+            inside = !inside;
+        }
+        p = p->next;
+    } while (p != a);
+    return inside;
+}
+
+static bool intersectspolygon(const earnode* a, const earnode* b) {
+    const earnode* p = a;
+    do {
+        if (p->i != a->i && p->next->i != a->i && p->i != b->i && p->next->i != b->i
+            && earintersects(p, p->next, a, b)) {
+            return true;
+        }
+        p = p->next;
+    } while (p != a);
+    return false;
+}
+
+static bool validdiagonal(const earnode* a, const earnode* b) {
+    return a->next->i != b->i && a->prev->i != b->i && !intersectspolygon(a, b)
+        && ((locallyinside(a, b) && locallyinside(b, a) && middleinside(a, b)
+                && (eararea(a->prev, a, b->prev) != 0 || eararea(a, b->prev, b) != 0))
+            || (earequals(a, b) && eararea(a->prev, a, a->next) > 0 && eararea(b->prev, b, b->next) > 0));
+}
+
+static earnode* earsplit(earcut* e, earnode* a, earnode* b) {
+    // links a and b with a bridge, which splits a ring in two or joins two rings
+    if (e->used + 2 > e->capacity) {
+        return NULL;
+    }
+    earnode* a2 = e->nodes + e->used++;
+    earnode* b2 = e->nodes + e->used++;
+    *a2 = (earnode){a->i, a->x, a->y, 0, false, NULL, NULL, NULL, NULL};
+    *b2 = (earnode){b->i, b->x, b->y, 0, false, NULL, NULL, NULL, NULL};
+    earnode* an = a->next;
+    earnode* bp = b->prev;
+    a->next = b;
+    b->prev = a;
+    a2->next = an;
+    an->prev = a2;
+    b2->next = a2;
+    a2->prev = b2;
+    bp->next = b2;
+    b2->prev = bp;
+    return b2;
+}
+
+static earnode* earfilter(earnode* start, earnode* end) {
+    // removes duplicate and collinear points
+    if (start == NULL) {
+        return NULL;
+    }
+    if (end == NULL) {
+        end = start;
+    }
+    earnode* p = start;
+    bool again;
+    do {
+        again = false;
+        if (!p->steiner && (earequals(p, p->next) || eararea(p->prev, p, p->next) == 0)) {
+            earremove(p);
+            p = end = p->prev;
+            if (p == p->next) {
+                break;
+            }
+            again = true;
+        } else {
+            p = p->next;
+        }
+    } while (again || p != end);
+    return end;
+}
+
+static earnode* earring(earcut* e, const double* vertices, int64_t start, int64_t end, bool clockwise) {
+    double sum = 0.0;
+    for (int64_t i = start, j = end - 1; i < end; j = i++) {
+        sum += (vertices[2 * j] - vertices[2 * i]) * (vertices[2 * i + 1] + vertices[2 * j + 1]);
+    }
+    earnode* last = NULL;
+    if (clockwise == (sum > 0)) {
+        for (int64_t i = start; i < end; ++i) {
+            if ((last = earinsert(e, i, vertices, last)) == NULL) {
+                return NULL;
+            }
+        }
+    } else {
+        for (int64_t i = end - 1; i >= start; --i) {
+            if ((last = earinsert(e, i, vertices, last)) == NULL) {
+                return NULL;
+            }
+        }
+    }
+    if (last != NULL && earequals(last, last->next)) {
+        earremove(last);
+        last = last->next;
+    }
+    return last;
+}
+
+static int32_t zorder(double x, double y, const earcut* e) {
+    // coordinates outside the bounding box of the outline are clamped to it
+    uint32_t ix = (uint32_t)MAX(0.0, MIN(32767.0, (x - e->minx) * e->invsize));
+    uint32_t iy = (uint32_t)MAX(0.0, MIN(32767.0, (y - e->miny) * e->invsize));
+    ix = (ix | (ix << 8)) & 0x00FF00FF;
+    ix = (ix | (ix << 4)) & 0x0F0F0F0F;
+    ix = (ix | (ix << 2)) & 0x33333333;
+    ix = (ix | (ix << 1)) & 0x55555555;
+    iy = (iy | (iy << 8)) & 0x00FF00FF;
+    iy = (iy | (iy << 4)) & 0x0F0F0F0F;
+    iy = (iy | (iy << 2)) & 0x33333333;
+    iy = (iy | (iy << 1)) & 0x55555555;
+    return (int32_t)(ix | (iy << 1));
+}
+
+static void indexcurve(earnode* start, const earcut* e) {
+    earnode* p = start;
+    do {
+        if (p->z == 0) {
+            p->z = zorder(p->x, p->y, e);
+        }
+        p->prevz = p->prev;
+        p->nextz = p->next;
+        p = p->next;
+    } while (p != start);
+    p->prevz->nextz = NULL;
+    p->prevz = NULL;
+    // merge sort of the linked list by z
+    earnode* list = p;
+    int64_t insize = 1;
+    int64_t nmerges;
+    do {
+        p = list;
+        list = NULL;
+        earnode* tail = NULL;
+        nmerges = 0;
+        while (p != NULL) {
+            nmerges++;
+            earnode* q = p;
+            int64_t psize = 0;
+            for (int64_t i = 0; i < insize && q != NULL; ++i) {
+                psize++;
+                q = q->nextz;
+            }
+            int64_t qsize = insize;
+            while (psize > 0 || (qsize > 0 && q != NULL)) {
+                earnode* n;
+                if (psize != 0 && (qsize == 0 || q == NULL || p->z <= q->z)) {
+                    n = p;
+                    p = p->nextz;
+                    psize--;
+                } else {
+                    n = q;
+                    q = q->nextz;
+                    qsize--;
+                }
+                if (tail != NULL) {
+                    tail->nextz = n;
+                } else {
+                    list = n;
+                }
+                n->prevz = tail;
+                tail = n;
+            }
+            p = q;
+        }
+        tail->nextz = NULL;
+        insize *= 2;
+    } while (nmerges > 1);
+}
+
+static bool blocksear(const earnode* p, const earnode* a, const earnode* b, const earnode* c,
+    double x0, double y0, double x1, double y1) {
+    return p != a && p != c && p->x >= x0 && p->x <= x1 && p->y >= y0 && p->y <= y1
+        && intriangle(a->x, a->y, b->x, b->y, c->x, c->y, p->x, p->y) && eararea(p->prev, p, p->next) >= 0;
+}
+
+static bool isear(const earnode* ear, const earcut* e) {
+    const earnode* a = ear->prev;
+    const earnode* b = ear;
+    const earnode* c = ear->next;
+    if (eararea(a, b, c) >= 0) {
+        return false;  // reflex
+    }
+    double x0 = MIN(a->x, MIN(b->x, c->x));
+    double y0 = MIN(a->y, MIN(b->y, c->y));
+    double x1 = MAX(a->x, MAX(b->x, c->x));
+    double y1 = MAX(a->y, MAX(b->y, c->y));
+    if (e->invsize == 0) {
+        for (const earnode* p = c->next; p != a; p = p->next) {
+            if (blocksear(p, a, b, c, x0, y0, x1, y1)) {
+                return false;
+            }
+        }
+        return true;
+    }
+    // only the points within the z range of the bounding box can be inside
+    int32_t minz = zorder(x0, y0, e);
+    int32_t maxz = zorder(x1, y1, e);
+    const earnode* p = ear->prevz;
+    const earnode* n = ear->nextz;
+    while (p != NULL && p->z >= minz && n != NULL && n->z <= maxz) {
+        if (blocksear(p, a, b, c, x0, y0, x1, y1) || blocksear(n, a, b, c, x0, y0, x1, y1)) {
+            return false;
+        }
+        p = p->prevz;
+        n = n->nextz;
+    }
+    for (; p != NULL && p->z >= minz; p = p->prevz) {
+        if (blocksear(p, a, b, c, x0, y0, x1, y1)) {
+            return false;
+        }
+    }
+    for (; n != NULL && n->z <= maxz; n = n->nextz) {
+        if (blocksear(n, a, b, c, x0, y0, x1, y1)) {
+            return false;
+        }
+    }
+    return true;
+}
+
+static bool addtriangle(earcut* e, const earnode* a, const earnode* b, const earnode* c) {
+    if (e->ntriangles == e->maxtriangles) {
+        return false;
+    }
+    int64_t* t = e->triangles + 3 * e->ntriangles++;
+    t[0] = a->i;
+    t[1] = b->i;
+    t[2] = c->i;
+    return true;
+}
+
+static earnode* cureintersections(earcut* e, earnode* start) {
+    // cuts off the triangles of small self-intersections
+    earnode* p = start;
+    do {
+        earnode* a = p->prev;
+        earnode* b = p->next->next;
+        if (!earequals(a, b) && earintersects(a, p, p->next, b) && locallyinside(a, b) && locallyinside(b, a)) {
+            if (!addtriangle(e, a, p, b)) {
+                return NULL;
+            }
+            earremove(p);
+            earremove(p->next);
+            p = start = b;
+        }
+        p = p->next;
+    } while (p != start);
+    return earfilter(p, NULL);
+}
+
+static void earcutlinked(earcut* e, earnode* ear, int pass);
+
+static void splitearcut(earcut* e, earnode* start) {
+    // splits the polygon along a valid diagonal and triangulates both halves
+    earnode* a = start;
+    do {
+        for (earnode* b = a->next->next; b != a->prev; b = b->next) {
+            if (a->i != b->i && validdiagonal(a, b)) {
+                earnode* c = earsplit(e, a, b);
+                if (c == NULL) {
+                    return;
+                }
+                a = earfilter(a, a->next);
+                c = earfilter(c, c->next);
+                earcutlinked(e, a, 0);
+                earcutlinked(e, c, 0);
+                return;
+            }
+        }
+        a = a->next;
+    } while (a != start);
+}
+
+static void earcutlinked(earcut* e, earnode* ear, int pass) {
+    if (ear == NULL) {
+        return;
+    }
+    if (pass == 0 && e->invsize != 0) {
+        indexcurve(ear, e);
+    }
+    earnode* stop = ear;
+    while (ear->prev != ear->next) {
+        earnode* prev = ear->prev;
+        earnode* next = ear->next;
+        if (isear(ear, e)) {
+            if (!addtriangle(e, prev, ear, next)) {
+                return;
+            }
+            earremove(ear);
+            // skipping the next vertex gives less slivers
+            ear = next->next;
+            stop = next->next;
+            continue;
+        }
+        ear = next;
+        if (ear == stop) {
+            // no ear left: remove collinear points, cure self-intersections and
+            // finally split the polygon in two
+            if (pass == 0) {
+                earcutlinked(e, earfilter(ear, NULL), 1);
+            } else if (pass == 1) {
+                earcutlinked(e, cureintersections(e, earfilter(ear, NULL)), 2);
+            } else {
+                splitearcut(e, ear);
+            }
+            break;
+        }
+    }
+}
+
+static earnode* holebridge(earnode* hole, earnode* outer) {
+    // David Eberly's algorithm to find a vertex of the outline that the leftmost
+    // vertex of the hole can see
+    earnode* p = outer;
+    double hx = hole->x;
+    double hy = hole->y;
+    double qx = -INFINITY;
+    earnode* m = NULL;
+    do {
+        if (hy <= p->y && hy >= p->next->y && p->next->y != p->y) {
+            double x = p->x + (hy - p->y) * (p->next->x - p->x) / (p->next->y - p->y);
+            if (x <= hx && x > qx) {
+                qx = x;
+                m = p->x < p->next->x ? p : p->next;
+                if (x == hx) {
+                    return m;  // the hole touches the outline
+                }
+            }
+        }
+        p = p->next;
+    } while (p != outer);
+    if (m == NULL) {
+        return NULL;
+    }
+    earnode* stop = m;
+    double mx = m->x;
+    double my = m->y;
+    double tanmin = INFINITY;
+    p = m;
+    do {
+        if (hx >= p->x && p->x >= mx && hx != p->x
+            && intriangle(hy < my ? hx : qx, hy, mx, my, hy < my ? qx : hx, hy, p->x, p->y)) {
+            double tan = fabs(hy - p->y) / (hx - p->x);
+            if (locallyinside(p, hole)
+                && (tan < tanmin || (tan == tanmin && (p->x > m->x || (p->x == m->x
+                    && eararea(m->prev, m, p->prev) < 0 && eararea(p->next, m, m->next) < 0))))) {
+                m = p;
+                tanmin = tan;
+            }
+        }
+        p = p->next;
+    } while (p != stop);
+    return m;
+}
+
+static int compareleft(const void* a, const void* b) {
+    const earnode* p = *(earnode* const*)a;
+    const earnode* q = *(earnode* const*)b;
+    return (p->x > q->x) - (p->x < q->x);
+}
+
+void earcutregion_c(earcut* e, const double* vertices, const int64_t* ring_offsets, int64_t nrings, earnode** queue) {
+    // triangulates the first ring with the other rings as holes
+    if (nrings == 0) {
+        return;
+    }
+    earnode* outer = earring(e, vertices, ring_offsets[0], ring_offsets[1], true);
+    if (outer == NULL || outer->next == outer->prev) {
+        return;
+    }
+    int64_t nholes = 0;
+    for (int64_t r = 1; r < nrings; ++r) {
+        earnode* list = earring(e, vertices, ring_offsets[r], ring_offsets[r + 1], false);
+        if (list == NULL) {
+            continue;
+        }
+        if (list == list->next) {
+            list->steiner = true;
+        }
+        earnode* left = list;
+        earnode* p = list;
+        do {
+            if (p->x < left->x || (p->x == left->x && p->y < left->y)) {
+                left = p;
+            }
+            p = p->next;
+        } while (p != list);
+        queue[nholes++] = left;
+    }
+    qsort(queue, (size_t)nholes, sizeof(earnode*), compareleft);
+    for (int64_t h = 0; h < nholes; ++h) {
+        earnode* bridge = holebridge(queue[h], outer);
+        if (bridge == NULL) {
+            continue;
+        }
+        earnode* reverse = earsplit(e, bridge, queue[h]);
+        if (reverse == NULL) {
+            return;
+        }
+        earfilter(reverse, reverse->next);
+        outer = earfilter(bridge, bridge->next);
+    }
+    int64_t n = ring_offsets[1] - ring_offsets[0];
+    e->invsize = 0.0;
+    if (ring_offsets[nrings] - ring_offsets[0] > 80) {
+        const double* v = vertices + 2 * ring_offsets[0];
+        double maxx = v[0];
+        double maxy = v[1];
+        e->minx = v[0];
+        e->miny = v[1];
+        for (int64_t i = 1; i < n; ++i) {
+            e->minx = MIN(e->minx, v[2 * i]);
+            e->miny = MIN(e->miny, v[2 * i + 1]);
+            maxx = MAX(maxx, v[2 * i]);
+            maxy = MAX(maxy, v[2 * i + 1]);
+        }
+        double size = MAX(maxx - e->minx, maxy - e->miny);
+        e->invsize = size != 0 ? 32767 / size : 0.0;
+    }
+    earcutlinked(e, outer, 0);
+}
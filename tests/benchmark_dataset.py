@@ -0,0 +1,63 @@
+"""
+Streaming the regions of a layer across a cohort of files.
+
+Writes a synthetic cohort and counts the regions of a layer, once by streaming
+them from a HaloXMLDataset and once by loading every file and keeping it. Each
+runs in a fresh process, so the peak memory of both can be compared.
+
+Usage: python benchmark_dataset.py [number of files] [regions per file]
+"""
+
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_threads import make_layer
+
+from pyhaloxml import HaloXML, HaloXMLDataset
+
+
+def stream(folder):
+    with HaloXMLDataset(folder) as dataset:
+        return sum(1 for _ in dataset.regions("benchmark"))
+
+
+def keep(folder):
+    slides = []
+    for pth in sorted(Path(folder).glob("*.annotations")):
+        hx = HaloXML()
+        hx.load(pth)
+        hx.matchnegative()
+        slides.append(hx)
+    return sum(len(x.regions) for hx in slides for x in hx.layers)
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] in ("stream", "keep"):
+        start = time.perf_counter()
+        count = {"stream": stream, "keep": keep}[sys.argv[1]](sys.argv[2])
+        seconds = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+        print(
+            f"{sys.argv[1]:6s}: {seconds * 1e3:7.0f} ms, {peak:5.0f} MB peak, {count} regions"
+        )
+        return
+    nfiles = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    nregions = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        hx = HaloXML()
+        layer = make_layer(nregions)
+        layer.name = "benchmark"
+        hx.layers = [layer]
+        for i in range(nfiles):
+            hx.save(Path(tmp, f"slide{i:04d}.annotations"))
+        del hx, layer
+        for mode in ["stream", "keep"]:
+            subprocess.run([sys.executable, __file__, mode, tmp], check=True)
+
+
+if __name__ == "__main__":
+    main()
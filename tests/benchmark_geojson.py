@@ -0,0 +1,44 @@
+"""
+Export to GeoJSON with geojson objects and with plain dictonaries.
+
+Both write the same features, the plain dictonaries with ids derived from the
+content.
+"""
+
+import json
+import statistics
+import sys
+import time
+
+import geojson as gs
+from benchmark_threads import make_layer
+
+from pyhaloxml import HaloXML
+
+
+def timeit(func, runs=5):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    nregions = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    hx = HaloXML()
+    hx.layers = [make_layer(nregions)]
+    hx.matchnegative()
+    for layer in hx.layers:  # cache the vertices, both paths need them
+        for region in layer.regions:
+            region.getvertices()
+    slow = timeit(lambda: gs.dumps(hx.as_geojson(), sort_keys=True))
+    fast = timeit(lambda: json.dumps(hx.as_geojson_dict(), sort_keys=True))
+    print(f"{nregions} regions with holes")
+    print(f"as_geojson + geojson.dumps:   {slow * 1e3:8.1f} ms")
+    print(f"as_geojson_dict + json.dumps: {fast * 1e3:8.1f} ms ({slow / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
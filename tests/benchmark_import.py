@@ -0,0 +1,62 @@
+"""
+Time to import pyhaloxml in a fresh interpreter.
+
+Short-lived jobs pay this on every run. The heavy optional parts (numpy,
+geojson, dateutil, shapely) are only imported when their features are used, so
+they should not show up here. Before any of them were deferred the import took
+about 46 ms, which still loaded geojson and dateutil. Exits with 1 if the median
+is over the budget.
+
+Usage: python benchmark_import.py [budget in ms]
+"""
+
+import statistics
+import subprocess
+import sys
+
+TIMED = (
+    "import time; start = time.perf_counter(); import pyhaloxml; "
+    "print((time.perf_counter() - start) * 1e6)"
+)
+
+
+def importtime() -> float:
+    # the time of the import in a fresh interpreter, in us
+    result = subprocess.run(
+        [sys.executable, "-c", TIMED], capture_output=True, text=True, check=True
+    )
+    return float(result.stdout)
+
+
+def owntimes() -> dict[str, int]:
+    # the own import time of each module, in us
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import pyhaloxml"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(own)
+    return times
+
+
+def main():
+    NUM_RUNS = 20
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 60.0
+    total = statistics.median(importtime() for _ in range(NUM_RUNS)) / 1e3
+    print(f"Importing pyhaloxml took {total:.1f} ms (median of {NUM_RUNS})")
+    slowest = sorted(owntimes().items(), key=lambda x: -x[1])[:5]
+    for name, time in slowest:
+        print(f"  {name}: {time / 1e3:.1f} ms")
+    if total > budget:
+        print(f"Over the budget of {budget:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Triangulation of all regions of a slide into a single mesh.
+
+Compares the native ear clipping of HaloXML.mesh with triangulating each region
+with shapely, which is what a viewer would otherwise do per region.
+
+Usage: python benchmark_mesh.py [number of regions]
+"""
+
+import sys
+import time
+
+from benchmark_threads import make_layer
+
+from pyhaloxml import HaloXML
+
+
+def main():
+    nregions = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    hx = HaloXML()
+    hx.layers = [make_layer(nregions)]
+    hx.matchnegative()
+    start = time.perf_counter()
+    mesh = hx.mesh()
+    native = time.perf_counter() - start
+    print(
+        f"mesh: {native * 1e3:7.0f} ms,"
+        f" {len(mesh)} triangles, {len(mesh.vertices)} vertices"
+    )
+    try:
+        import shapely
+
+        from pyhaloxml.shapely import region_to_shapely
+    except ImportError:
+        return
+    start = time.perf_counter()
+    geometries = [
+        region_to_shapely(x) for x in hx.layers[0].regions if not x.isnegative
+    ]
+    shapely.constrained_delaunay_triangles(geometries)
+    reference = time.perf_counter() - start
+    print(f"shapely: {reference * 1e3:7.0f} ms, {reference / native:.1f}x slower")
+
+
+if __name__ == "__main__":
+    main()
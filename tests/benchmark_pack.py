@@ -0,0 +1,49 @@
+"""
+Pickling a HaloXML compared to loading it.
+
+Writes a synthetic file, loads it, and sends it through a pickle round trip
+twice, as when it is passed to a worker process and back. The second round trip
+packs the unpacked regions straight from their arrays.
+
+Usage: python benchmark_pack.py [number of regions]
+"""
+
+import pickle
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_threads import make_layer
+
+from pyhaloxml import HaloXML
+
+
+def main():
+    nregions = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        file = Path(tmp, "big.annotations")
+        hx = HaloXML()
+        hx.layers = [make_layer(nregions)]
+        hx.save(file)
+        del hx
+        print(f"{file.stat().st_size / 1e6:.0f} MB, {2 * nregions} regions")
+        start = time.perf_counter()
+        hx = HaloXML()
+        hx.load(file)
+        loaded = time.perf_counter() - start
+        print(f"load           : {loaded * 1e3:7.0f} ms")
+        for name in ["round trip", "again"]:
+            start = time.perf_counter()
+            data = pickle.dumps(hx, protocol=5)
+            dumped = time.perf_counter() - start
+            hx = pickle.loads(data)
+            seconds = time.perf_counter() - start
+            print(
+                f"{name:15s}: {seconds * 1e3:7.0f} ms ({dumped * 1e3:.0f} ms dumps),"
+                f" {seconds / loaded:.2f} of load, {len(data) / 1e6:.0f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Parallel parsing of a single large .annotations file.
+
+Writes a synthetic file and loads it with an increasing number of threads, and
+packs it with an increasing number of processes. Only shows a speed-up on a
+machine with several cores.
+
+Usage: python benchmark_parallel.py [number of regions]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_threads import make_layer
+
+from pyhaloxml import HaloXML
+from pyhaloxml.parallel import pack_parallel
+
+
+def main():
+    nregions = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    ncpu = os.cpu_count() or 1
+    counts = [x for x in [1, 2, 4, 8, 16, 32] if x <= ncpu] or [1]
+    with tempfile.TemporaryDirectory() as tmp:
+        file = Path(tmp, "big.annotations")
+        hx = HaloXML()
+        hx.layers = [make_layer(nregions)]
+        hx.save(file)
+        del hx
+        print(f"{file.stat().st_size / 1e6:.0f} MB, {2 * nregions} regions")
+        for workers in counts:
+            start = time.perf_counter()
+            HaloXML().load(file, workers=workers)
+            loaded = time.perf_counter() - start
+            start = time.perf_counter()
+            pack_parallel(file, workers=workers)
+            packed = time.perf_counter() - start
+            print(
+                f"{workers:2d} workers: load {loaded * 1e3:7.0f} ms,"
+                f" pack_parallel {packed * 1e3:7.0f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Thread scaling of matching negative regions and containment queries.
+
+Run it on a free-threaded build (python3.13t or later) to see matching scale
+with the number of threads. The containment kernel releases the GIL, so it
+also scales on a regular build.
+"""
+
+import math
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pyhaloxml import HaloXML, Layer
+from pyhaloxml.Region import region_from_coordinates
+from pyhaloxmlc import pointsinrings
+
+
+def circle(x, y, r, n=64):
+    pts = [
+        (x + r * math.cos(2 * math.pi * i / n), y + r * math.sin(2 * math.pi * i / n))
+        for i in range(n)
+    ]
+    return pts + [pts[0]]
+
+
+def make_layer(nregions):
+    layer = Layer()
+    layer.fromdict({"LineColor": "255", "Name": "cells", "Visible": "True"})
+    side = math.ceil(math.sqrt(nregions))
+    for i in range(nregions):
+        x, y = 100.0 * (i % side), 100.0 * (i // side)
+        layer.addregion(region_from_coordinates([circle(x, y, 40)]))
+        hole = region_from_coordinates([circle(x, y, 10)])
+        hole.region.attrib["NegativeROA"] = "1"
+        hole.isnegative = True
+        layer.addregion(hole)
+    return layer
+
+
+def timeit(func, tasks, nthreads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=nthreads) as pool:
+        list(pool.map(func, tasks))
+    return time.perf_counter() - start
+
+
+def report(name, times):
+    print(name)
+    for nthreads, duration in times.items():
+        speedup = times[1] / duration
+        print(f"  {nthreads} threads: {duration * 1e3:8.1f} ms  x{speedup:.2f}")
+
+
+def main():
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}")
+    threadcounts = [x for x in [1, 2, 4, 8] if x <= (os.cpu_count() or 1)]
+    ntasks = 16
+
+    hx = HaloXML()
+    hx.layers = [make_layer(400)]
+    packed = pickle.dumps(hx)
+    times = {}
+    for nthreads in threadcounts:
+        copies = [pickle.loads(packed) for _ in range(ntasks)]
+        times[nthreads] = timeit(lambda x: x.matchnegative(), copies, nthreads)
+    report(f"match_negative, {ntasks} x 400 regions with a hole", times)
+
+    rng = np.random.default_rng(0)
+    polygons = [circle(x, y, 40) for x, y in rng.uniform(0, 5000, (2000, 2))]
+    offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in polygons], out=offsets[1:])
+    vertices = np.array([v for x in polygons for v in x], dtype=np.float64)
+    points = np.array_split(rng.uniform(0, 5000, (200_000, 2)), ntasks)
+
+    def query(pts):
+        result = np.empty(len(pts), dtype=np.int64)
+        pointsinrings(pts, vertices, offsets, result)
+
+    times = {x: timeit(query, points, x) for x in threadcounts}
+    report("containment, 200000 points in 2000 polygons", times)
+
+
+if __name__ == "__main__":
+    main()
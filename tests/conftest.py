@@ -0,0 +1,25 @@
+import pytest as pytest
+
+from pyhaloxml import Layer
+from pyhaloxml.Region import region_from_coordinates
+
+
+@pytest.fixture
+def square():
+    def square(x, y, size):
+        return [(x, y), (x + size, y), (x + size, y + size), (x, y + size), (x, y)]
+
+    return square
+
+
+@pytest.fixture
+def make_layer():
+    def make_layer(name, regions=()):
+        # each region is a list of rings, the outline followed by the holes
+        layer = Layer()
+        layer.fromdict({"LineColor": "255", "Name": name, "Visible": "True"})
+        for x in regions:
+            layer.addregion(region_from_coordinates(x))
+        return layer
+
+    return make_layer
@@ -0,0 +1,78 @@
+import io
+from copy import deepcopy
+from pathlib import Path
+
+import pytest as pytest
+
+from pyhaloxml import HaloXML
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_findholes.annotations")
+
+
+@pytest.fixture
+def typesfile():
+    return Path(Path.cwd(), "tests", "testdata", "test_types.annotations")
+
+
+def test_clip_all(file):
+    hx = HaloXML()
+    hx.load(file)
+    clipped = hx.clip((-1e6, -1e6, 1e6, 1e6))
+    # the regions inside are shared, not copied
+    for x, y in zip(clipped.layers[0].regions, hx.layers[0].regions, strict=True):
+        assert x is y
+    copy = deepcopy(clipped)
+    before = hx.layers[0].regions[0].getvertices()
+    copy.transform([[1, 0, 10], [0, 1, 10]])
+    assert hx.layers[0].regions[0].getvertices() == before
+    assert len(hx.clip((1e6, 1e6, 2e6, 2e6)).layers[0].regions) == 0
+
+
+def test_clip(file):
+    import shapely
+
+    from pyhaloxml.shapely import layer_to_shapely
+
+    hx = HaloXML()
+    hx.load(file)
+    roi = (-30000, 40000, -15000, 80000)
+    clipped = hx.clip(roi)
+    expected = layer_to_shapely(hx.layers[0]).intersection(shapely.box(*roi))
+    area = clipped.metrics()["area"].sum()
+    assert area == pytest.approx(expected.area, rel=1e-3)
+    hx2 = HaloXML()
+    hx2.loadstream(io.BytesIO(clipped.as_raw()))
+    hx2.matchnegative()
+    assert len(hx2.layers[0].regions) == len(clipped.layers[0].regions)
+
+
+def test_clip_polygon(typesfile):
+    hx = HaloXML()
+    hx.load(typesfile)
+    bounds = hx.metrics()
+    xmin, xmax = bounds["xmin"].min(), bounds["xmax"].max()
+    ymin, ymax = bounds["ymin"].min(), bounds["ymax"].max()
+    triangle = [(xmin, ymin), (xmax, ymin), (xmin, ymax)]
+    clipped = hx.clip(triangle)
+    assert 0 < len(clipped.layers[0].regions)
+    metrics = clipped.metrics()
+    assert all(metrics["xmin"] >= xmin)
+    assert all(metrics["ymin"] >= ymin)
+    assert all(metrics["ymax"] <= ymax)
+    assert clipped.as_geojson()["features"]
+
+
+def test_clip_pin_on_boundary(typesfile):
+    from pyhaloxml import RegionType
+
+    hx = HaloXML()
+    hx.load(typesfile)
+    # the pin is at (-1399, 53194), on the left edge of the polygon
+    square = [(-1399, 50000), (5000, 50000), (5000, 56000), (-1399, 56000)]
+    clipped = hx.clip(square)
+    pins = [x for x in clipped.layers[0].regions if x.type == RegionType.Pin]
+    assert [x.getvertices() for x in pins] == [[(-1399.0, 53194.0)]]
+    assert pins[0] in hx.layers[0].regions
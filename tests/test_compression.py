@@ -0,0 +1,53 @@
+from importlib import import_module
+from pathlib import Path
+
+import pytest as pytest
+
+from pyhaloxml import HaloXML, HaloXMLFile
+from pyhaloxml.fileio import detect_compression
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_layers.annotations")
+
+
+@pytest.mark.parametrize("method", ["gzip", "xz", "zstd"])
+def test_compression(file, tmp_path, method):
+    if method == "zstd":
+        try:
+            from compression import zstd  # noqa: F401
+        except ImportError:
+            pytest.importorskip("zstandard")
+    hx = HaloXML()
+    hx.load(file)
+    raw = hx.as_raw()
+    hx.save(Path(tmp_path, "layers"), compression=method)
+    saved = list(tmp_path.iterdir())
+    assert len(saved) == 1
+    assert detect_compression(saved[0]) == method
+    with HaloXMLFile(saved[0]) as hx2:
+        assert len(hx2.layers) == 3
+        assert hx2.as_raw() == raw
+
+
+def test_suffix(file, tmp_path):
+    hx = HaloXML()
+    hx.load(file)
+    hx.save(Path(tmp_path, "layers.annotations.gz"))
+    assert detect_compression(Path(tmp_path, "layers.annotations.gz")) == "gzip"
+    hx.save(Path(tmp_path, "layers.annotations"))
+    assert detect_compression(Path(tmp_path, "layers.annotations")) is None
+
+
+def test_buffer_in_chunks(file, monkeypatch):
+    # lxml before 6 cannot parse a memory map directly
+    hx = HaloXML()
+    hx.load(file)
+    module = import_module("pyhaloxml.HaloXML")  # the module, not the class
+    monkeypatch.setattr(module, "_BUFFER_PARSING", False)
+    monkeypatch.setattr(module, "_CHUNK", 100)
+    hx2 = HaloXML()
+    hx2.load(file)
+    assert hx2.as_raw() == hx.as_raw()
+    assert len(hx2.layers) == 3
@@ -0,0 +1,112 @@
+import gzip
+import shutil
+from pathlib import Path
+
+import pytest as pytest
+
+from pyhaloxml import HaloXML, HaloXMLDataset
+from pyhaloxml.cache import BYTES_PER_VERTEX, estimate_nbytes
+
+
+@pytest.fixture
+def folder(tmp_path):
+    testdata = Path(Path.cwd(), "tests", "testdata")
+    root = Path(tmp_path, "cohort")
+    Path(root, "sub").mkdir(parents=True)
+    shutil.copy(Path(testdata, "test_findholes.annotations"), root)
+    shutil.copy(Path(testdata, "test_layers.annotations"), root)
+    with gzip.open(Path(root, "sub", "test_types.annotations.gz"), "wb") as f:
+        f.write(Path(testdata, "test_types.annotations").read_bytes())
+    Path(root, "notes.txt").write_text("not an annotation")
+    return root
+
+
+def count_regions(pth, name):
+    hx = HaloXML()
+    hx.load(pth)
+    hx.matchnegative()
+    return sum(len(x.regions) for x in hx.layers if x.name == name)
+
+
+def test_files(folder):
+    dataset = HaloXMLDataset(folder)
+    assert dataset.paths == [
+        Path(folder, "sub", "test_types.annotations.gz"),
+        Path(folder, "test_findholes.annotations"),
+        Path(folder, "test_layers.annotations"),
+    ]
+    assert len(dataset) == 3
+    Path(folder, "manifest.txt").write_text(
+        "# two files\ntest_layers.annotations\n\nsub/test_types.annotations.gz\n"
+    )
+    dataset = HaloXMLDataset(Path(folder, "manifest.txt"))
+    assert dataset.paths == [
+        Path(folder, "test_layers.annotations"),
+        Path(folder, "sub", "test_types.annotations.gz"),
+    ]
+    Path(folder, "manifest.csv").write_text("slide,path\n1,test_layers.annotations\n")
+    dataset = HaloXMLDataset(Path(folder, "manifest.csv"))
+    assert dataset.paths == [Path(folder, "test_layers.annotations")]
+
+
+def test_cache(folder):
+    with HaloXMLDataset(folder, workers=2) as dataset:
+        hx = dataset[0]
+        assert dataset[0] is hx
+        assert dataset.cache.hits == 1 and dataset.cache.misses == 1
+        assert len(list(dataset)) == 3
+        assert len(dataset.cache) == 3
+    # a budget that only fits a single file
+    with HaloXMLDataset(folder, max_bytes=1, workers=1) as dataset:
+        for i, hx in enumerate(dataset):
+            assert dataset[i] is hx
+        assert len(dataset.cache) == 1
+        assert dataset.cache.evictions == 2
+
+
+def test_estimate(folder):
+    sizes = []
+    for pth in HaloXMLDataset(folder).paths:
+        hx = HaloXML()
+        hx.load(pth)
+        hx.matchnegative()
+        # the tree is counted, not only the vertices that were read
+        vertices = sum(len(x) for x in hx.tree.iter("Vertices"))
+        assert estimate_nbytes(hx) > vertices * BYTES_PER_VERTEX
+        sizes.append(estimate_nbytes(hx))
+    # a budget that fits the two largest files, but not all three
+    budget = sum(sorted(sizes)[-2:])
+    with HaloXMLDataset(folder, max_bytes=budget, workers=1) as dataset:
+        for hx in dataset:
+            assert dataset.cache.nbytes <= budget
+        assert len(dataset.cache) == 2
+        assert dataset.cache.evictions == 1
+
+
+def test_prefetch(folder):
+    with HaloXMLDataset(folder, workers=2) as dataset:
+        dataset.prefetch([1, 2])
+        dataset.close()
+        assert len(dataset.cache) == 2
+        assert dataset.paths[1] in dataset.cache
+        dataset[1]
+        assert dataset.cache.hits == 1
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_regions(folder, workers):
+    with HaloXMLDataset(folder, workers=workers) as dataset:
+        regions = list(dataset.regions("Layer 1"))
+        expected = [count_regions(x, "Layer 1") for x in dataset.paths]
+        assert len(regions) == sum(expected)
+        assert [x[0] for x in regions] == [
+            pth for pth, n in zip(dataset.paths, expected) for _ in range(n)
+        ]
+        # streaming does not fill the cache
+        assert len(dataset.cache) == 0
+        layers = [x for _, x in dataset.iter_layers("secondlayer")]
+        assert [x.name for x in layers] == ["secondlayer"]
+        # a cached file is not loaded again
+        hx = dataset[0]
+        first = next(dataset.iter_layers("Layer 1"))
+        assert first[1] in hx.layers
@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import numpy as np
+import pytest as pytest
+
+from pyhaloxml import HaloXML, RegionType
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_findholes.annotations")
+
+
+@pytest.fixture
+def layersfile():
+    return Path(Path.cwd(), "tests", "testdata", "test_layers.annotations")
+
+
+@pytest.fixture
+def typesfile():
+    return Path(Path.cwd(), "tests", "testdata", "test_types.annotations")
+
+
+def test_exact_coverage(file):
+    import shapely
+
+    from pyhaloxml.shapely import region_to_shapely
+
+    hx = HaloXML()
+    hx.load(file)
+    grid = hx.density_grid(2000)
+    geometry = shapely.union_all([region_to_shapely(x) for x in hx.layers[0].regions])
+    rows, columns = grid.shape
+    x0, y0 = grid.origin
+    for j in range(rows):
+        for i in range(columns):
+            x, y = x0 + i * 2000, y0 + j * 2000
+            cell = shapely.box(x, y, x + 2000, y + 2000)
+            expected = geometry.intersection(cell).area / 2000**2
+            assert grid.area_fraction[0, j, i] == pytest.approx(expected, abs=1e-9)
+
+
+def test_layers(layersfile):
+    hx = HaloXML()
+    hx.load(layersfile)
+    grid = hx.density_grid(1000)
+    metrics = hx.metrics()
+    assert grid.layers == [x.name for x in hx.layers]
+    assert grid.area_fraction.shape == (3, *grid.shape)
+    for i, name in enumerate(grid.layers):
+        area = np.sum(metrics["area"][metrics["layer"] == name])
+        assert np.sum(grid.area_fraction[i]) * 1000**2 == pytest.approx(area)
+        assert np.sum(grid.todict()[name]["region_count"]) == len(hx.layers[i].regions)
+
+
+def test_counts(typesfile):
+    hx = HaloXML()
+    hx.load(typesfile)
+    grid = hx.density_grid(5000)
+    types = [x.type for x in hx.layers[0].regions]
+    assert np.sum(grid.pin_count) == types.count(RegionType.Pin)
+    assert np.sum(grid.region_count) == sum(x.has_area() for x in hx.layers[0].regions)
+
+
+def test_window(file):
+    hx = HaloXML()
+    hx.load(file)
+    full = hx.density_grid(1000)
+    x0, y0 = full.origin
+    window = hx.density_grid(1000, origin=(x0 + 5000, y0 + 3000), shape=(10, 20))
+    assert window.shape == (10, 20)
+    expected = full.area_fraction[:, 3:13, 5:25]
+    assert np.allclose(window.area_fraction, expected, rtol=0, atol=1e-9)
+    assert np.array_equal(window.region_count, full.region_count[:, 3:13, 5:25])
+
+
+def test_cell_size(file):
+    hx = HaloXML()
+    hx.load(file)
+    with pytest.raises(ValueError):
+        hx.density_grid(0)
@@ -0,0 +1,103 @@
+import json
+from pathlib import Path
+
+import pytest as pytest
+
+from pyhaloxml import HaloXML, Region
+from pyhaloxml.cli import main
+from pyhaloxml.diff import diff
+from pyhaloxml.misc import Comment
+from pyhaloxml.Region import region_from_coordinates
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_findholes.annotations")
+
+
+def load(file):
+    hx = HaloXML()
+    hx.load(file)
+    return hx
+
+
+def test_diff_identical(file):
+    result = diff(load(file), load(file))
+    assert not result
+    assert result.regions_unchanged == 10
+
+
+def test_diff(file):
+    old = load(file)
+    new = load(file)
+    new.layers[0].linecolor.setrgb(1, 2, 3)
+    for v in new.layers[0].regions[0].region.iter("V"):
+        v.attrib["X"] = str(float(v.attrib["X"]) + 10)
+    comments = new.layers[0].regions[1].region.find("Comments")
+    if comments is None:
+        comments = new.layers[0].regions[1].region.makeelement("Comments", {})
+        new.layers[0].regions[1].region.append(comments)
+    comments.append(Comment("me", "check this").getcomment())
+    new.layers[0].regions = [Region(x.region) for x in new.layers[0].regions]
+    del new.layers[0].regions[2]
+    result = diff(old, new)
+    assert result.layers_recolored == [("Layer 1", "5634047", "197121")]
+    assert sorted(result.regions_modified) == [("Layer 1", 0, 0), ("Layer 1", 1, 1)]
+    assert result.regions_removed == [("Layer 1", 2)]
+    assert result.regions_added == []
+    assert result.regions_unchanged == 7
+
+
+def test_diff_renamed(file):
+    old = load(file)
+    new = load(file)
+    new.layers[0].name = "Tumor"
+    result = diff(old, new)
+    assert result.layers_renamed == [("Layer 1", "Tumor")]
+    assert result.layers_added == []
+    assert result.regions_unchanged == 10
+    # regions of a renamed layer are reported with the new name
+    new.layers[0].regions = new.layers[0].regions[1:]
+    result = diff(old, new)
+    assert result.layers_renamed == [("Layer 1", "Tumor")]
+    assert result.regions_removed == [("Tumor", 0)]
+    assert result.regions_unchanged == 9
+
+
+def test_diff_duplicate_names():
+    # the file has two layers named Caudate
+    file = Path(Path.cwd(), "exampledata", "qupath_test.annotations")
+    old = load(file)
+    new = load(file)
+    caudate = [i for i, x in enumerate(new.layers) if x.name == "Caudate"]
+    assert len(caudate) == 2
+    del new.layers[caudate[0]]
+    result = diff(old, new)
+    assert result
+    assert result.layers_removed == []
+    assert result.regions_removed == [("Caudate", 0), ("Caudate", 1)]
+    assert result.regions_unchanged == 17
+
+
+def test_diff_large_region(file):
+    # a region much larger than the others is not spread over the grid
+    old = load(file)
+    new = load(file)
+    for hx, dx in [(old, 0), (new, 10)]:
+        square = [(-1e7, -1e7), (1e7, -1e7), (1e7, 1e7), (-1e7, 1e7), (-1e7, -1e7)]
+        hx.layers[0].addregion(
+            region_from_coordinates([[(x + dx, y) for x, y in square]])
+        )
+    result = diff(old, new)
+    assert result.regions_modified == [("Layer 1", 10, 10)]
+    assert result.regions_unchanged == 10
+
+
+def test_cli(file, tmp_path, capsys):
+    assert main(["diff", str(file), str(file)]) == 0
+    hx = load(file)
+    del hx.layers[0].regions[0]
+    hx.save(Path(tmp_path, "edited.annotations"))
+    assert main(["diff", "--json", str(file), str(tmp_path / "edited.annotations")])
+    output = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert output["regions_removed"] == [["Layer 1", 0]]
@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import numpy as np
+import pytest as pytest
+
+from pyhaloxml import HaloXML, Layer, RegionType
+from pyhaloxml.misc import Comment
+from pyhaloxml.Region import region_from_coordinates
+
+
+@pytest.fixture
+def layer(square, make_layer):
+    layer = make_layer("Tumor")
+    layer.addregion(region_from_coordinates([square(0, 0, 10)], [Comment("a", "1")]))
+    layer.addregion(region_from_coordinates([square(5, 5, 10)], [Comment("b", "2")]))
+    layer.addregion(region_from_coordinates([square(100, 0, 10)]))
+    layer.addregion(region_from_coordinates([square(110, 0, 10)]))  # touching
+    layer.addregion(region_from_coordinates([square(200, 0, 30), square(210, 10, 10)]))
+    layer.addregion(region_from_coordinates([square(300, 0, 10)]))
+    return layer
+
+
+def test_dissolve(layer):
+    separate = layer.regions[5]
+    layer.dissolve()
+    assert len(layer.regions) == 4
+    areas = Layer.metrics(layer)["area"].tolist()
+    assert areas == pytest.approx([175, 200, 800, 100])
+    assert [str(x) for x in layer.regions[0].comments] == ["1", "2"]
+    assert len(layer.regions[2].holes) == 1
+    assert layer.regions[3] is separate
+
+
+def test_dissolve_hole_filled(layer, square):
+    layer.addregion(region_from_coordinates([square(205, 5, 20)]))
+    layer.dissolve(workers=2)
+    assert len(layer.regions) == 4
+    assert layer.regions[2].holes == []
+    assert Layer.metrics(layer)["area"][2] == pytest.approx(900)
+
+
+def test_dissolve_file():
+    file = Path(Path.cwd(), "tests", "testdata", "test_types.annotations")
+    hx = HaloXML()
+    hx.load(file)
+    before = [x.type for layer in hx.layers for x in layer.regions]
+    for layer in hx.layers:
+        layer.dissolve()
+    after = [x.type for layer in hx.layers for x in layer.regions]
+    for t in [RegionType.Ruler, RegionType.Pin]:
+        assert after.count(t) == before.count(t)
+    assert np.all(hx.metrics()["area"] >= 0)
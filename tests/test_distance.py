@@ -0,0 +1,86 @@
+from pathlib import Path
+
+import numpy as np
+import pytest as pytest
+
+from pyhaloxml import HaloXML, Layer
+from pyhaloxml.Region import region_from_coordinates
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_findholes.annotations")
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    return np.column_stack(
+        [rng.uniform(-35000, 30000, 5000), rng.uniform(44000, 92000, 5000)]
+    )
+
+
+def test_distance(file, points):
+    import shapely
+
+    from pyhaloxml.shapely import region_to_shapely
+
+    hx = HaloXML()
+    hx.load(file)
+    layer = hx.layers[0]
+    distance, nearest = layer.distance(points)
+    geometries = [region_to_shapely(x) for x in layer.regions]
+    union = shapely.union_all(geometries)
+    pts = shapely.points(points)
+    sign = np.where(shapely.contains(union, pts), -1, 1)
+    expected = shapely.distance(pts, union.boundary) * sign
+    assert np.allclose(distance, expected, rtol=0, atol=1e-6)
+    assert np.any(distance < 0) and np.any(distance > 0)
+    each = np.array([shapely.distance(pts, x.boundary) for x in geometries])
+    assert np.array_equal(nearest, np.argmin(each, axis=0))
+
+
+def test_max_distance(file, points):
+    hx = HaloXML()
+    hx.load(file)
+    full, _ = hx.layers[0].distance(points)
+    distance, nearest = hx.layers[0].distance(points, max_distance=1000)
+    near = np.abs(full) <= 1000
+    assert np.allclose(distance[near], full[near])
+    assert np.all(np.isinf(distance[~near]))
+    assert np.array_equal(np.sign(distance), np.sign(full))
+    assert np.all(nearest[~near] == -1)
+
+
+def test_hole():
+    outline = [(0, 0), (100, 0), (100, 100), (0, 100), (0, 0)]
+    hole = [(40, 40), (40, 60), (60, 60), (60, 40), (40, 40)]  # same orientation
+    layer = Layer()
+    layer.addregion(region_from_coordinates([outline, hole]))
+    points = [(50, 50), (30, 50), (50, -10), (100, 100), (110, 110)]
+    distance, nearest = layer.distance(points)
+    assert distance.tolist() == pytest.approx([10, -10, 10, 0, np.hypot(10, 10)])
+    assert nearest.tolist() == [0, 0, 0, 0, 0]
+    distance, nearest = Layer().distance(points)
+    assert np.all(distance == np.inf) and np.all(nearest == -1)
+
+
+def test_on_boundary():
+    hx = HaloXML()
+    hx.load(Path(Path.cwd(), "tests", "testdata", "test_layers.annotations"))
+    for layer in hx.layers:
+        regions = [x for x in layer.regions if x.has_area()]
+        vertices = np.concatenate([np.array(x.getvertices()) for x in regions])
+        distance, nearest = layer.distance(vertices)
+        assert np.all(distance == 0)
+        assert np.all(nearest >= 0)
+        # the middle of every edge
+        middle = []
+        for region in regions:
+            ring = np.array(region.getvertices())
+            middle.append((ring + np.roll(ring, -1, axis=0)) / 2)
+        distance, _ = layer.distance(np.concatenate(middle))
+        assert np.allclose(distance, 0, rtol=0, atol=1e-6)
+    layer = [x for x in hx.layers if x.name == "secondlayer"][0]
+    distance, _ = layer.distance([[-7117, 51685], [-7400, 51685]])
+    assert distance.tolist() == [0, 0]
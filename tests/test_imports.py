@@ -0,0 +1,65 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest as pytest
+
+from pyhaloxml import HaloXML
+
+
+def loaded_after(code):
+    result = subprocess.run(
+        [sys.executable, "-c", code + "; import sys; print(' '.join(sys.modules))"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(Path.cwd(), "src"),
+    )
+    return set(result.stdout.split())
+
+
+def test_lazy_imports(tmp_path):
+    modules = loaded_after("import pyhaloxml")
+    for name in [
+        "numpy",
+        "geojson",
+        "dateutil",
+        "shapely",
+        "xml.sax.saxutils",
+        "sqlite3",
+        "multiprocessing",
+        "concurrent.futures",
+        "csv",
+        "pyhaloxml.dataset",
+        "pyhaloxml.cache",
+    ]:
+        assert name not in modules
+    file = Path(Path.cwd(), "tests", "testdata", "test_comments.annotations")
+    code = f"import pyhaloxml; hx = pyhaloxml.HaloXML(); hx.load({str(file)!r})"
+    modules = loaded_after(code)
+    assert "dateutil" in modules and "geojson" not in modules
+    # reading and writing the xml does not need numpy
+    copy = Path(tmp_path, "copy.annotations")
+    modules = loaded_after(code + f"; hx.save({str(copy)!r})")
+    assert "numpy" not in modules
+    modules = loaded_after(code + "; hx.as_geojson()")
+    assert "geojson" in modules
+    # the shapely converters import shapely when they are used
+    assert "shapely" not in loaded_after("import pyhaloxml.shapely")
+
+
+def test_geojson_after_lazy_import():
+    file = Path(Path.cwd(), "tests", "testdata", "test_comments.annotations")
+    hx = HaloXML()
+    hx.load(file)
+    assert hx.as_geojson()["type"] == "FeatureCollection"
+
+
+def test_lazy_dataset():
+    modules = loaded_after("from pyhaloxml import HaloXMLDataset")
+    assert "pyhaloxml.dataset" in modules
+    import pyhaloxml
+
+    assert "HaloXMLDataset" in pyhaloxml.__all__
+    with pytest.raises(AttributeError):
+        pyhaloxml.NotAnAttribute
@@ -0,0 +1,71 @@
+import os
+from pathlib import Path
+
+import pytest as pytest
+from lxml import etree
+
+from pyhaloxml import HaloXML, list_layers
+from pyhaloxml.index import read_index
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_layers.annotations")
+
+
+def canonical(element):
+    parser = etree.XMLParser(remove_blank_text=True)
+    return etree.tostring(etree.fromstring(etree.tostring(element), parser))
+
+
+def test_list_layers(file):
+    hx = HaloXML()
+    hx.load(file)
+    layers = list_layers(file)
+    assert [x.name for x in layers] == [x.name for x in hx.layers]
+    assert [x.regions for x in layers] == [len(x.regions) for x in hx.layers]
+    assert [x.attrib for x in layers] == [x.todict() for x in hx.layers]
+
+
+def test_load_layers(file):
+    hx = HaloXML()
+    hx.load(file)
+    names = [hx.layers[2].name, hx.layers[0].name]
+    part = HaloXML()
+    part.load(file, layers=names)
+    assert [x.name for x in part.layers] == [hx.layers[0].name, hx.layers[2].name]
+    for layer, expected in zip(part.layers, [hx.layers[0], hx.layers[2]]):
+        assert [canonical(x.region) for x in layer.regions] == [
+            canonical(x.region) for x in expected.regions
+        ]
+    none = HaloXML()
+    none.load(file, layers=["does not exist"])
+    assert none.valid
+    assert none.layers == []
+
+
+def test_compressed(file, tmp_path):
+    hx = HaloXML()
+    hx.load(file)
+    pth = Path(tmp_path, "test.annotations.gz")
+    hx.save(pth)
+    part = HaloXML()
+    part.load(pth, layers=[hx.layers[1].name])
+    assert [len(x.regions) for x in part.layers] == [len(hx.layers[1].regions)]
+
+
+def test_sidecar(file, tmp_path):
+    pth = Path(tmp_path, file.name)
+    pth.write_bytes(file.read_bytes())
+    side = Path(tmp_path, file.name + ".index.json")
+    layers = list_layers(pth, sidecar=True)
+    assert side.is_file()
+    index = read_index(pth, sidecar=True)
+    assert index.todict()["layers"] == [x.todict() for x in layers]
+    # a changed file gets a new index
+    pth.write_bytes(file.read_bytes().replace(b"myfirstlayer", b"renamed"))
+    os.utime(pth, ns=(index.mtime_ns + 10**9, index.mtime_ns + 10**9))
+    assert list_layers(pth, sidecar=True)[0].name == "renamed"
+    hx = HaloXML()
+    hx.load(pth, layers=["renamed"], sidecar=True)
+    assert [x.name for x in hx.layers] == ["renamed"]
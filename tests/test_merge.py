@@ -0,0 +1,80 @@
+import io
+from copy import deepcopy
+from pathlib import Path
+
+import pytest as pytest
+
+from pyhaloxml import HaloXML
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_findholes.annotations")
+
+
+@pytest.fixture
+def layersfile():
+    return Path(Path.cwd(), "tests", "testdata", "test_layers.annotations")
+
+
+def test_merge_duplicates(file):
+    hx = HaloXML()
+    hx.load(file)
+    hx2 = HaloXML()
+    hx2.load(file)
+    hx.merge(hx2)
+    assert len(hx.layers) == 1
+    assert len(hx.layers[0].regions) == 10
+    hx.matchnegative()
+    assert len(hx.layers[0].regions) == 4
+
+
+def test_merge_layers(file, layersfile):
+    hx = HaloXML()
+    hx1 = HaloXML()
+    hx1.load(file)
+    hx2 = HaloXML()
+    hx2.load(layersfile)
+    hx.merge(hx1, hx2, hx1)
+    assert hx
+    assert [x.name for x in hx.layers] == [
+        "Layer 1",
+        "myfirstlayer",
+        "secondlayer",
+        "thishasafour",
+    ]
+    assert [len(x.regions) for x in hx.layers] == [10, 1, 2, 1]
+    raw = hx.as_raw()
+    hx3 = HaloXML()
+    hx3.loadstream(io.BytesIO(raw))
+    assert [len(x.regions) for x in hx3.layers] == [10, 1, 2, 1]
+
+
+def test_merge_copies(file):
+    hx = HaloXML()
+    other = HaloXML()
+    other.load(file)
+    before = [x.getvertices() for x in other.layers[0].regions]
+    hx.merge(other)
+    assert not any(
+        x is y for x, y in zip(hx.layers[0].regions, other.layers[0].regions)
+    )
+    hx.transform([[2, 0, 100], [0, 2, 100]])
+    hx.matchnegative()
+    assert [x.getvertices() for x in other.layers[0].regions] == before
+    assert all(len(x.holes) == 0 for x in other.layers[0].regions)
+
+
+@pytest.mark.parametrize("name", ["test_comments", "test_findholes"])
+def test_copy_region(name):
+    hx = HaloXML()
+    hx.load(Path(Path.cwd(), "tests", "testdata", f"{name}.annotations"))
+    hx.matchnegative()
+    for region in hx.layers[0].regions:
+        copy = deepcopy(region)
+        assert copy.fingerprint() == region.fingerprint()
+        assert copy.region is not region.region
+        assert copy.region.getparent() is None
+        assert len(copy.holes) == len(region.holes)
+        assert all(x.region is not y.region for x, y in zip(copy.holes, region.holes))
+        assert [str(x) for x in copy.comments] == [str(x) for x in region.comments]
@@ -0,0 +1,86 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest as pytest
+
+from pyhaloxml import HaloXML, Layer
+from pyhaloxml.Region import region_from_coordinates
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_findholes.annotations")
+
+
+def triangle_areas(mesh):
+    a, b, c = (mesh.vertices[mesh.indices[:, i]].astype(np.float64) for i in range(3))
+    ab, ac = b - a, c - a
+    return np.abs(ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0]) / 2
+
+
+def test_square_with_hole():
+    layer = Layer()
+    layer.regions.append(
+        region_from_coordinates(
+            [
+                [(0, 0), (10, 0), (10, 10), (0, 10)],
+                [(3, 3), (7, 3), (7, 7), (3, 7)],
+            ]
+        )
+    )
+    mesh = layer.mesh()
+    assert len(mesh) == 8
+    assert len(mesh.vertices) == 8
+    assert np.sum(triangle_areas(mesh)) == pytest.approx(100 - 16)
+    assert mesh.region_offsets.tolist() == [0, 8]
+
+
+def test_mesh_area(file):
+    import shapely
+
+    from pyhaloxml.shapely import region_to_shapely
+
+    hx = HaloXML()
+    hx.load(file)
+    mesh = hx.mesh()
+    areas = triangle_areas(mesh)
+    for i, layer in enumerate(hx.layers):
+        regions = [x for x in layer.regions if x.has_area() and not x.isnegative]
+        expected = sum(shapely.area(region_to_shapely(x)) for x in regions)
+        a, b = mesh.layer_offsets[i : i + 2]
+        assert np.sum(areas[a:b]) == pytest.approx(expected, rel=1e-6)
+
+
+def test_mesh_layers(file):
+    hx = HaloXML()
+    hx.load(file)
+    mesh = hx.mesh()
+    assert mesh.layers == [x.name for x in hx.layers]
+    for i, layer in enumerate(hx.layers):
+        assert tuple(mesh.colors[i]) == layer.linecolor.getrgb()
+        # the triangles of a layer only use the vertices of that layer
+        a, b = mesh.layer_offsets[i : i + 2]
+        if b > a:
+            assert mesh.indices[a:b].min() >= mesh.vertex_offsets[i]
+            assert mesh.indices[a:b].max() < mesh.vertex_offsets[i + 1]
+    assert mesh.layer_offsets[-1] == len(mesh.indices)
+    assert mesh.vertex_offsets[-1] == len(mesh.vertices)
+    assert len(mesh.vertex_colors()) == len(mesh.vertices)
+
+
+def test_save(file, tmp_path):
+    hx = HaloXML()
+    hx.load(file)
+    mesh = hx.mesh()
+    mesh.save(tmp_path)
+    vertices = np.fromfile(Path(tmp_path, "vertices.bin"), dtype="<f4")
+    indices = np.fromfile(Path(tmp_path, "indices.bin"), dtype="<u4")
+    colors = np.fromfile(Path(tmp_path, "colors.bin"), dtype=np.uint8)
+    assert np.array_equal(vertices.reshape(-1, 2), mesh.vertices)
+    assert np.array_equal(indices.reshape(-1, 3), mesh.indices)
+    assert np.array_equal(colors.reshape(-1, 3), mesh.colors)
+    with open(Path(tmp_path, "mesh.json")) as f:
+        description = json.load(f)
+    assert [x["name"] for x in description["layers"]] == mesh.layers
+    assert description["indices"]["shape"] == list(mesh.indices.shape)
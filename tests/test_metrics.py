@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import numpy as np
+import pytest as pytest
+
+from pyhaloxml import HaloXML, RegionType
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_findholes.annotations")
+
+
+@pytest.fixture
+def typesfile():
+    return Path(Path.cwd(), "tests", "testdata", "test_types.annotations")
+
+
+def test_metrics(file):
+    from pyhaloxml.shapely import region_to_shapely
+
+    hx = HaloXML()
+    hx.load(file)
+    metrics = hx.metrics()
+    assert len(metrics["area"]) == 4
+    assert sorted(metrics["n_holes"]) == [1, 1, 1, 3]
+    for i, region in enumerate(hx.layers[0].regions):
+        geometry = region_to_shapely(region)
+        assert metrics["area"][i] == pytest.approx(geometry.area)
+        assert metrics["perimeter"][i] == pytest.approx(geometry.length)
+        assert metrics["centroid_x"][i] == pytest.approx(geometry.centroid.x)
+        assert metrics["centroid_y"][i] == pytest.approx(geometry.centroid.y)
+        bbox = [metrics[x][i] for x in ["xmin", "ymin", "xmax", "ymax"]]
+        assert np.allclose(bbox, geometry.bounds)
+
+
+def test_metrics_types(typesfile):
+    hx = HaloXML()
+    hx.load(typesfile)
+    metrics = hx.layers[0].metrics()
+    assert all(metrics["layer"] == "Layer 1")
+    nonarea = np.isin(metrics["type"], [RegionType.Ruler, RegionType.Pin])
+    assert all(metrics["area"][nonarea] == 0)
+    assert all(metrics["area"][~nonarea] > 0)
+    pin = metrics["type"] == RegionType.Pin
+    assert metrics["perimeter"][pin] == 0
+    assert metrics["n_vertices"][pin] == 1
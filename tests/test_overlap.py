@@ -0,0 +1,68 @@
+from pathlib import Path
+
+import numpy as np
+import pytest as pytest
+import shapely
+
+from pyhaloxml import HaloXML
+from pyhaloxml.overlap import overlap_matrix
+
+
+@pytest.fixture
+def layers(square, make_layer):
+    tumor = make_layer("Tumor", [[square(0, 0, 10)], [square(5, 0, 10)]])
+    necrosis = make_layer("Necrosis", [[square(1, 1, 2)], [square(100, 0, 10)]])
+    ring = [square(-10, -10, 40), square(-5, -5, 20)]
+    stroma = make_layer("Stroma", [ring, [square(12, 0, 10)]])
+    return [tumor, necrosis, stroma]
+
+
+def test_overlap_matrix(layers):
+    result = overlap_matrix(layers)
+    assert result.layers == ["Tumor", "Necrosis", "Stroma"]
+    # overlapping regions of a layer count once, the hole of stroma not at all
+    assert result.area.tolist() == pytest.approx([150, 104, 1230])
+    expected = [150, 4, 30, 4, 104, 0, 30, 0, 1230]
+    assert result.intersection.ravel().tolist() == pytest.approx(expected)
+    assert result.iou[0, 2] == pytest.approx(30 / 1350)
+    assert np.diag(result.iou).tolist() == pytest.approx([1, 1, 1])
+    assert result.fraction()[1, 0] == pytest.approx(4 / 104)
+    assert result.pairs is None
+
+
+def test_overlap_pairs(layers):
+    result = overlap_matrix(layers, per_region=True, workers=2)
+    assert result.pairs is not None
+    keys = zip(
+        result.pairs["layer_a"].tolist(),
+        result.pairs["region_a"].tolist(),
+        result.pairs["layer_b"].tolist(),
+        result.pairs["region_b"].tolist(),
+    )
+    pairs = dict(zip(keys, zip(result.pairs["intersection"], result.pairs["iou"])))
+    # the tumor touches the hole of the stroma, which is no overlap
+    assert set(pairs) == {(0, 0, 1, 0), (0, 1, 2, 1)}
+    assert pairs[(0, 0, 1, 0)] == pytest.approx((4, 0.04))
+    assert pairs[(0, 1, 2, 1)] == pytest.approx((30, 30 / 170))
+    assert len(result.todict()["pairs"]["iou"]) == 2
+
+
+def test_overlap_file():
+    file = Path(Path.cwd(), "tests", "testdata", "test_layers.annotations")
+    hx = HaloXML()
+    hx.load(file)
+    result = hx.overlap_matrix(workers=2)
+    geometries = []
+    for layer in hx.layers:
+        polygons = [
+            shapely.make_valid(
+                shapely.Polygon(x.getvertices(), [y.getvertices() for y in x.holes])
+            )
+            for x in layer.regions
+            if x.has_area()
+        ]
+        geometries.append(shapely.union_all(polygons))
+    for i, a in enumerate(geometries):
+        for j, b in enumerate(geometries):
+            expected = shapely.area(shapely.intersection(a, b))
+            assert result.intersection[i, j] == pytest.approx(expected)
@@ -0,0 +1,190 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from pathlib import Path
+
+import numpy as np
+import pytest as pytest
+from lxml import etree
+
+from pyhaloxml import HaloXML
+from pyhaloxml.misc import RegionType, setvertices
+from pyhaloxmlc import scanvertices
+
+
+@pytest.fixture
+def files():
+    return [
+        Path(Path.cwd(), "tests", "testdata", x)
+        for x in [
+            "test_comments.annotations",
+            "test_findholes.annotations",
+            "test_layers.annotations",
+            "test_types.annotations",
+        ]
+    ]
+
+
+def canonical(raw):
+    parser = etree.XMLParser(remove_blank_text=True)
+    return etree.tostring(etree.fromstring(raw, parser))
+
+
+def total_area(hx):
+    return float(np.sum(hx.metrics()["area"]))
+
+
+def test_pickle_haloxml(files):
+    for file in files:
+        hx = HaloXML()
+        hx.load(file)
+        hx2 = pickle.loads(pickle.dumps(hx, protocol=5))
+        assert hx2.valid
+        assert canonical(hx2.as_raw()) == canonical(hx.as_raw())
+        assert [x.todict() for x in hx2.layers] == [x.todict() for x in hx.layers]
+
+
+def test_pickle_twice(files):
+    for file in files:
+        hx = HaloXML()
+        hx.load(file)
+        hx2 = pickle.loads(pickle.dumps(hx))
+        # the regions of hx2 are packed again from the arrays they came from
+        hx3 = pickle.loads(pickle.dumps(hx2))
+        assert canonical(hx3.as_raw()) == canonical(hx.as_raw())
+        assert [str(c) for x in hx3.layers for r in x.regions for c in r.comments] == [
+            str(c) for x in hx.layers for r in x.regions for c in r.comments
+        ]
+
+
+def test_pickle_after_change(files):
+    hx = HaloXML()
+    hx.load(files[1])
+    hx2 = pickle.loads(pickle.dumps(hx))
+    region = next(r for r in hx2.layers[0].regions if r.type == RegionType.Polygon)
+    i = hx2.layers[0].regions.index(region)
+    setvertices(region.region, [(0, 0), (10, 0), (10, 10), (0, 0)])
+    region._getvertices()
+    hx3 = pickle.loads(pickle.dumps(hx2))
+    assert hx3.layers[0].regions[i].getvertices() == [(0, 0), (10, 0), (10, 10), (0, 0)]
+    assert canonical(hx3.as_raw()) == canonical(hx2.as_raw())
+
+
+def test_copy_other_xml(files):
+    hx = HaloXML()
+    hx.load(files[1])
+    hx.matchnegative()
+    region = hx.layers[0].regions[0]
+    region.region.set("Zoom", "0.5")
+    etree.SubElement(region.region, "Extra", {"A": "1"})
+    region.holes[0].region.set("Selected", "True")
+    expected = canonical(hx.as_raw())
+    assert b'Zoom="0.5"' in expected and b'Selected="True"' in expected
+    copies = [
+        pickle.loads(pickle.dumps(hx)),
+        pickle.loads(pickle.dumps(pickle.loads(pickle.dumps(hx)))),
+        deepcopy(hx),
+        deepcopy(pickle.loads(pickle.dumps(hx))),
+    ]
+    for hx2 in copies:
+        assert canonical(hx2.as_raw()) == expected
+    for layer in [deepcopy(hx.layers[0]), pickle.loads(pickle.dumps(hx.layers[0]))]:
+        hx2 = HaloXML()
+        hx2.layers = [layer, *hx.layers[1:]]
+        assert canonical(hx2.as_raw()) == expected
+    for region2 in [deepcopy(region), pickle.loads(pickle.dumps(region))]:
+        assert region2.region.get("Zoom") == "0.5"
+        assert region2.region.find("Extra").get("A") == "1"
+
+
+def test_scanvertices():
+    texts = [
+        (
+            b"<R><!-- <V X='9' Y='9'/> --><Vertices><V Y=' 2' X='1.5'/>"
+            b'<V X="-3e2" Y="4"/></Vertices><Comments><Comment/></Comments></R>'
+        ),
+        (
+            b"<Regions><R><Vertices><V X='5' Y='6'/></Vertices></R><R/>"
+            b"<R><Comments/></R><R Zoom='1'/><R><V X='7' Y='8'/></R>"
+            b"<R><Vertices><V X='1' Y='2' Z='3'/></Vertices></R></Regions>"
+        ),
+    ]
+    for level, text in enumerate(texts):
+        offsets = np.array([0, len(text)], dtype=np.int64)
+        coords, counts, flags = scanvertices(text, offsets, level)
+        if level == 0:
+            assert np.frombuffer(coords).tolist() == [1.5, 2, -300, 4]
+            assert np.frombuffer(counts, dtype=np.int64).tolist() == [2]
+            assert list(flags) == [3]
+        else:
+            # only the V elements in Vertices are vertices, the rest is other xml
+            assert np.frombuffer(coords).tolist() == [5, 6, 1, 2]
+            assert np.frombuffer(counts, dtype=np.int64).tolist() == [1, 0, 0, 0, 0, 1]
+            assert list(flags) == [0, 0, 1, 4, 4, 4]
+    for text in [
+        b"<R><Vertices><V X='1'/></Vertices></R>",
+        b"<R><Vertices><V X='1' Y='a'/></Vertices></R>",
+    ]:
+        with pytest.raises(ValueError):
+            scanvertices(text, np.array([0, len(text)], dtype=np.int64), 0)
+    with pytest.raises(ValueError):
+        scanvertices(b"<R/>", np.array([0, 5], dtype=np.int64), 0)
+
+
+def test_pickle_matched(files):
+    hx = HaloXML()
+    hx.load(files[1])
+    hx.matchnegative()
+    hx2 = pickle.loads(pickle.dumps(hx))
+    holes = [len(r.holes) for layer in hx.layers for r in layer.regions]
+    assert holes == [len(r.holes) for layer in hx2.layers for r in layer.regions]
+    assert sum(holes) > 0
+    assert not any(layer.contains_negative() for layer in hx2.layers)
+    assert total_area(hx2) == total_area(hx)
+
+
+def test_pickle_layer_and_region(files):
+    hx = HaloXML()
+    hx.load(files[0])
+    layer = pickle.loads(pickle.dumps(hx.layers[0]))
+    assert layer.todict() == hx.layers[0].todict()
+    region = hx.layers[0].regions[0]
+    region2 = pickle.loads(pickle.dumps(region))
+    assert region2.fingerprint() == region.fingerprint()
+    assert [str(x) for x in region2.comments] == [str(x) for x in region.comments]
+
+
+def test_packed_is_compact(files):
+    hx = HaloXML()
+    hx.load(files[1])
+    packed = hx.pack()
+    assert len(packed) == sum(
+        1 + len(r.holes) for layer in hx.layers for r in layer.regions
+    )
+    assert len(pickle.dumps(packed, protocol=5)) < len(hx.as_raw())
+
+
+def test_process_pool(files):
+    hxs = []
+    for file in files:
+        hx = HaloXML()
+        hx.load(file)
+        hxs.append(hx)
+    expected = [total_area(x) for x in hxs]
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        assert list(pool.map(total_area, hxs)) == expected
+
+
+def shared_area(shared):
+    return total_area(shared.tohaloxml())
+
+
+def test_shared_memory(files):
+    hx = HaloXML()
+    hx.load(files[1])
+    expected = total_area(hx)
+    with hx.share() as shared:
+        assert len(pickle.dumps(shared)) < len(pickle.dumps(hx))
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            assert list(pool.map(shared_area, [shared] * 4)) == [expected] * 4
+        assert canonical(shared.tohaloxml().as_raw()) == canonical(hx.as_raw())
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import numpy as np
+import pytest as pytest
+
+from pyhaloxml import HaloXML
+from pyhaloxml.index import open_content, read_index
+from pyhaloxml.pack import ARRAYS, pack_layers
+from pyhaloxml.parallel import pack_parallel, parse_regions, split_regions
+
+
+@pytest.fixture(params=["test_layers", "test_comments", "test_types"])
+def file(request):
+    return Path(Path.cwd(), "tests", "testdata", request.param + ".annotations")
+
+
+def assert_same(a, b):
+    assert a.header == b.header
+    for name in ARRAYS:
+        assert np.array_equal(getattr(a, name), getattr(b, name))
+
+
+def test_split_regions(file):
+    with open_content(file) as buffer:
+        index = read_index(file, buffer=buffer)
+        chunks = split_regions(buffer, index, workers=2, chunk_size=300)
+        assert len(chunks) > len(index.layers)
+        for i, start, end in chunks:
+            assert buffer[start : start + 8] == b"<Region "
+            assert index.layers[i].start < start < end < index.layers[i].end
+        expected = HaloXML()
+        expected.load(file)
+        layers = parse_regions(buffer, index, workers=3, chunk_size=300)
+    assert_same(pack_layers(layers), pack_layers(expected.layers))
+
+
+def test_load_workers(file):
+    expected = HaloXML()
+    expected.load(file)
+    hx = HaloXML()
+    hx.load(file, workers=2)
+    assert hx.valid
+    assert_same(pack_layers(hx.layers), pack_layers(expected.layers))
+    hx = HaloXML()
+    hx.load(file, layers=[expected.layers[-1].name], workers=2)
+    assert [x.name for x in hx.layers] == [expected.layers[-1].name]
+
+
+def test_pack_parallel(file):
+    expected = HaloXML()
+    expected.load(file)
+    packed = pack_parallel(file, workers=2, chunk_size=300)
+    assert_same(packed, pack_layers(expected.layers))
+    hx = packed.tohaloxml()
+    hx.matchnegative()
+    expected.matchnegative()
+    assert hx.metrics()["area"].tolist() == expected.metrics()["area"].tolist()
@@ -0,0 +1,88 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest as pytest
+
+from pyhaloxml import HaloXML
+from pyhaloxml.pyramid import POINT, POLYGON
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_findholes.annotations")
+
+
+@pytest.fixture
+def squares(square, make_layer):
+    hx = HaloXML()
+    regions = [[square(100, 100, 4)], [square(1000, 1000, 400)]]
+    hx.layers = [make_layer("squares", regions)]
+    return hx
+
+
+def test_levels(file):
+    hx = HaloXML()
+    hx.load(file)
+    pyramid = hx.pyramid(tile_size=256)
+    nvertices = [x.nvertices for x in pyramid.levels]
+    assert len(pyramid) > 3
+    assert nvertices == sorted(nvertices, reverse=True)
+    assert nvertices[-1] < nvertices[0]
+    exact = hx.pyramid(tile_size=256, tolerance=0, levels=1)
+    assert exact.levels[0].nvertices == int(np.sum(hx.metrics()["n_vertices"]))
+    assert pyramid.level_for(1).level == 0
+    assert pyramid.level_for(5).level == 2
+    assert pyramid.level_for(1e9).level == len(pyramid) - 1
+
+
+def test_culling(squares):
+    pyramid = squares.pyramid(tile_size=64, levels=4)
+    assert pyramid.levels[1].kinds.tolist() == [POLYGON, POLYGON]
+    assert pyramid.levels[2].kinds.tolist() == [POINT, POLYGON]
+    assert pyramid.levels[2].culled.tolist() == [True, False]
+    assert pyramid.levels[2].rings(0)[0].tolist() == [[102.0, 102.0]]
+
+
+def test_tiles(squares):
+    pyramid = squares.pyramid(tile_size=64, levels=4)
+    level = pyramid.levels[0]
+    expected = [(1, 1)] + [(c, r) for r in range(15, 22) for c in range(15, 22)]
+    assert sorted(level.tiles) == sorted(expected)
+    assert pyramid.tile(0, 1, 1).tolist() == [0]
+    assert pyramid.tile(0, 18, 18).tolist() == [1]
+    assert pyramid.tile(0, 5, 5).tolist() == []
+    assert sorted(pyramid.levels[3].tiles) == [(0, 0), (1, 1), (1, 2), (2, 1), (2, 2)]
+    fc = pyramid.tile_geojson(3, 0, 0)
+    assert [x["properties"]["region"] for x in fc["features"]] == [0]
+    assert fc["features"][0]["geometry"]["type"] == "Point"
+    assert fc["features"][0]["properties"]["culled"]
+
+
+def test_clip(squares):
+    pytest.importorskip("shapely")
+    pyramid = squares.pyramid(tile_size=64, levels=1)
+    fc = pyramid.tile_geojson(0, 15, 15, clip=True)
+    coords = np.array(fc["features"][0]["geometry"]["coordinates"][0])
+    assert coords.min() == 1000 and coords.max() == 1024
+
+
+def test_save(squares, tmp_path):
+    pyramid = squares.pyramid(tile_size=64, levels=4)
+    pyramid.save(tmp_path)
+    with open(Path(tmp_path, "pyramid.json")) as f:
+        description = json.load(f)
+    assert [x["level"] for x in description["levels"]] == [0, 1, 2, 3]
+    assert description["levels"][3]["tiles"] == [[0, 0], [1, 1], [1, 2], [2, 1], [2, 2]]
+    with open(Path(tmp_path, "3", "2_2.geojson")) as f:
+        fc = json.load(f)
+    assert fc["features"][0]["properties"]["region"] == 1
+
+
+def test_cache(squares):
+    pyramid = squares.pyramid()
+    assert squares.pyramid() is pyramid
+    assert squares.pyramid(refresh=True) is not pyramid
+    pyramid = squares.pyramid()
+    squares.transform([[2, 0, 0], [0, 2, 0]])
+    assert squares.pyramid() is not pyramid
@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import numpy as np
+import pytest as pytest
+
+from pyhaloxml import HaloXML
+from pyhaloxml.cache import AnnotationCache
+from pyhaloxml.serve import CachedSlide, make_server
+
+
+@pytest.fixture
+def folder(tmp_path):
+    testdata = Path(Path.cwd(), "tests", "testdata")
+    for name in ["test_findholes.annotations", "test_layers.annotations"]:
+        shutil.copy(Path(testdata, name), tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def server(folder):
+    server = make_server(folder, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, query):
+    url = f"http://127.0.0.1:{server.server_port}{query}"
+    with urlopen(url) as response:
+        return json.loads(response.read())
+
+
+def test_geojson(server, folder):
+    hx = HaloXML()
+    hx.load(Path(folder, "test_layers.annotations"))
+    result = get(server, "/geojson?path=test_layers.annotations")
+    assert result == json.loads(json.dumps(hx.as_geojson_dict()))
+    get(server, "/geojson?path=test_layers.annotations")
+    assert server.cache.misses == 1
+    assert server.cache.hits == 1
+
+
+def test_regions(server, folder):
+    slide = CachedSlide(Path(folder, "test_findholes.annotations"))
+    x0, y0, x1, y1 = slide.bounds[0]
+    query = f"/regions?path=test_findholes.annotations&bbox={x0},{y0},{x1},{y1}"
+    result = get(server, query)
+    ids = [x["id"] for x in result["features"]]
+    assert slide.features()[0]["id"] in ids
+    assert len(ids) == len(slide.regions_in((x0, y0, x1, y1)))
+    result = get(server, "/regions?path=test_findholes.annotations&bbox=0,0,1,1")
+    assert result["features"] == []
+    result = get(server, query + "&layer=nothing")
+    assert result["features"] == []
+
+
+def test_contains(server, folder):
+    slide = CachedSlide(Path(folder, "test_findholes.annotations"))
+    mesh = slide.hx.layers[0].mesh()
+    # the centroid of the first triangle is inside its region
+    x, y = mesh.vertices[mesh.indices[0]].mean(axis=0)
+    region = mesh.regions[np.searchsorted(mesh.region_offsets, 0, side="right") - 1]
+    query = f"/contains?path=test_findholes.annotations&points={x},{y};-1e9,-1e9"
+    result = get(server, query)
+    assert [x["region"] for x in result["regions"][0]] == [region]
+    assert result["regions"][0][0]["id"] == slide.features()[region]["id"]
+    assert result["regions"][1] == []
+
+
+def test_contains_overlap(tmp_path, square, make_layer):
+    regions = [[square(x, 0, 100), square(x + 10, 10, 10)] for x in [0, 50]]
+    hx = HaloXML()
+    hx.layers = [make_layer("overlap", regions)]
+    hx.save(Path(tmp_path, "overlap.annotations"))
+    slide = CachedSlide(Path(tmp_path, "overlap.annotations"))
+    points = np.array([[45, 60], [60, 60], [120, 60], [15, 15], [200, 60]])
+    assert slide.contains(points) == [
+        [(0, 0)],
+        [(0, 0), (0, 1)],
+        [(0, 1)],
+        [],  # in the hole of the first square
+        [],
+    ]
+
+
+def test_distance(server, folder):
+    slide = CachedSlide(Path(folder, "test_findholes.annotations"))
+    x0, y0, x1, y1 = slide.bounds[0]
+    points = [((x0 + x1) / 2, (y0 + y1) / 2), (x1 + 5, y1), (-1e9, -1e9)]
+    distance, region = slide.hx.layers[0].distance(points, max_distance=1e5)
+    text = ";".join(f"{x},{y}" for x, y in points)
+    query = f"/distance?path=test_findholes.annotations&layer=Layer 1&points={text}"
+    result = get(server, query.replace(" ", "%20") + "&max=1e5")
+    nearest = result["nearest"]
+    assert [x["distance"] for x in nearest[:2]] == pytest.approx(distance[:2])
+    assert [x["region"] for x in nearest[:2]] == region[:2].tolist()
+    assert nearest[0]["id"] == slide.features()[region[0]]["id"]
+    assert nearest[2] == {"distance": None, "region": None, "id": None}
+    # the index of the layer is made once and kept with the file
+    get(server, query.replace(" ", "%20"))
+    cached = server.cache.get(Path(folder, "test_findholes.annotations").resolve())
+    assert list(cached._indexes) == [0]
+
+
+def test_errors(server, folder):
+    for query, status in [
+        ("/geojson?path=missing.annotations", 404),
+        ("/geojson?path=../outside.annotations", 403),
+        ("/geojson", 400),
+        ("/regions?path=test_layers.annotations&bbox=1,2,3", 400),
+        ("/distance?path=test_layers.annotations&layer=nothing&points=1,2", 404),
+        ("/unknown", 404),
+    ]:
+        with pytest.raises(HTTPError) as e:
+            get(server, query)
+        assert e.value.code == status
+    metrics = get(server, "/metrics")
+    assert metrics["endpoints"]["/geojson"]["errors"] == 3
+    assert metrics["endpoints"]["/geojson"]["p95_ms"] >= 0
+    assert "/unknown" not in metrics["endpoints"]
+
+
+def test_cache(folder):
+    loads = []
+
+    def loader(pth):
+        loads.append(pth)
+        return CachedSlide(pth)
+
+    cache = AnnotationCache(loader, max_bytes=1)
+    findholes = Path(folder, "test_findholes.annotations")
+    layers = Path(folder, "test_layers.annotations")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        slides = list(pool.map(cache.get, [findholes] * 8))
+    # parsed once, even when asked for at the same time
+    assert len(loads) == 1
+    assert all(x is slides[0] for x in slides)
+    assert cache.hits == 7
+    # the cache is too small for two files, the oldest one is dropped
+    cache.get(layers)
+    assert len(cache) == 1 and layers in cache and findholes not in cache
+    assert cache.evictions == 1
+    # a changed file is parsed again
+    os.utime(layers, (1e9, 1e9))
+    assert cache.get(layers).mtime == 1e18
+    assert len(loads) == 3 and len(cache) == 1
+    assert cache.todict()["hit_rate"] == pytest.approx(7 / 10)
+
+
+def test_cache_sizeof_fails(folder):
+    # a thread that waits for a file is not left hanging when sizeof fails
+    started = threading.Event()
+    release = threading.Event()
+
+    def loader(pth):
+        started.set()
+        release.wait()
+        return pth
+
+    def sizeof(entry):
+        raise RuntimeError("sizeof failed")
+
+    cache = AnnotationCache(loader, max_bytes=1, sizeof=sizeof)
+    pth = Path(folder, "test_layers.annotations")
+    results = {}
+
+    def get(name):
+        try:
+            results[name] = cache.get(pth)
+        except RuntimeError as e:
+            results[name] = e
+
+    threads = [threading.Thread(target=get, args=(x,), daemon=True) for x in "ab"]
+    threads[0].start()
+    started.wait()
+    threads[1].start()
+    while cache.hits == 0:  # the second request waits for the first
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert isinstance(results["a"], RuntimeError)
+    assert results["b"] == pth.resolve()
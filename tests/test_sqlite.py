@@ -0,0 +1,35 @@
+import sqlite3
+from pathlib import Path
+
+import pytest as pytest
+
+from pyhaloxml import HaloXML
+from pyhaloxml.sqlite import files_to_sqlite, regions_in_bbox
+
+
+@pytest.fixture
+def files():
+    pth = Path(Path.cwd(), "tests", "testdata")
+    return [Path(pth, x + ".annotations") for x in ["test_findholes", "test_layers"]]
+
+
+def test_sqlite(files, tmp_path):
+    db = Path(tmp_path, "cohort.sqlite")
+    assert files_to_sqlite(files, db) == 2
+    assert files_to_sqlite(files, db) == 0  # unchanged files are skipped
+    hx = HaloXML()
+    hx.load(files[0])
+    hx.to_sqlite(db, "extra")
+    hx.to_sqlite(db, "extra")  # replaces the slide
+    con = sqlite3.connect(db)
+    assert con.execute("SELECT COUNT(*) FROM slides").fetchone() == (3,)
+    assert con.execute("SELECT COUNT(*) FROM regions").fetchone() == (12,)
+    assert con.execute("SELECT COUNT(*) FROM regions_rtree").fetchone() == (12,)
+    everything = regions_in_bbox(con, -1e9, -1e9, 1e9, 1e9)
+    assert len(everything) == 12
+    metrics = hx.metrics()
+    big = regions_in_bbox(con, -1e9, -1e9, 1e9, 1e9, "Layer 1", metrics["area"].max())
+    assert len(big) == 2
+    nothing = regions_in_bbox(con, 1e8, 1e8, 1e9, 1e9)
+    assert nothing == []
+    con.close()
@@ -0,0 +1,63 @@
+import io
+from pathlib import Path
+
+import numpy as np
+import pytest as pytest
+
+from pyhaloxml import HaloXML, RegionType
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_types.annotations")
+
+
+def reload(hx):
+    hx2 = HaloXML()
+    hx2.loadstream(io.BytesIO(hx.as_raw()))
+    return hx2
+
+
+def test_scale_translate(file):
+    hx = HaloXML()
+    hx.load(file)
+    before = hx.metrics()
+    hx.transform([[2, 0, 100], [0, 2, -50]], round_vertices=False)
+    after = hx.metrics()
+    assert np.allclose(after["area"], 4 * before["area"])
+    assert np.allclose(after["xmin"], 2 * before["xmin"] + 100)
+    assert np.allclose(after["ymax"], 2 * before["ymax"] - 50)
+    saved = reload(hx).metrics()
+    assert np.allclose(saved["area"], after["area"])
+
+
+def test_flip(file):
+    hx = HaloXML()
+    hx.load(file)
+    before = hx.metrics()
+    hx.layers[0].transform([[-1, 0, 0], [0, 1, 0]])
+    after = reload(hx).metrics()
+    assert np.allclose(after["area"], before["area"])
+    assert np.allclose(after["xmin"], -before["xmax"])
+    assert list(after["type"]) == list(before["type"])
+
+
+def test_rotate(file):
+    hx = HaloXML()
+    hx.load(file)
+    before = hx.metrics()
+    c, s = np.cos(np.pi / 4), np.sin(np.pi / 4)
+    hx.transform([[c, -s, 0], [s, c, 0], [0, 0, 1]], round_vertices=False)
+    after = reload(hx).metrics()
+    assert np.allclose(after["area"], before["area"])
+    assert np.allclose(after["perimeter"], before["perimeter"])
+    types = [x.type for x in hx.layers[0].regions]
+    assert RegionType.Rectangle not in types
+    assert RegionType.Ellipse not in types
+
+
+def test_invalid_matrix(file):
+    hx = HaloXML()
+    hx.load(file)
+    with pytest.raises(ValueError):
+        hx.transform([[1, 0], [0, 1]])
@@ -1,5 +1,7 @@
+import json
 from pathlib import Path
 
+import geojson as gs
 import pytest as pytest
 
 from pyhaloxml import HaloXML
@@ -50,6 +52,26 @@ def test_geojson(file):
     assert regiontypes == {"LineString": 2, "Point": 1, "Polygon": 7}
 
 
+def test_geojson_dict(file, tmp_path):
+    hx = HaloXML()
+    hx.load(file)
+    expected = json.loads(gs.dumps(hx.as_geojson()))
+    result = json.loads(json.dumps(hx.as_geojson_dict()))
+    ids = [x.pop("id") for x in result["features"]]
+    assert len(set(ids)) == len(ids)
+    for a in expected["features"]:
+        del a["id"]
+    # the same coordinates, also of the ellipses that geojson rounds to 6 decimals
+    assert result["features"] == expected["features"]
+    hx.to_geojson(Path(tmp_path, "a.geojson"))
+    hx = HaloXML()
+    hx.load(file)
+    hx.to_geojson(Path(tmp_path, "b.geojson"))
+    text = Path(tmp_path, "a.geojson").read_text()
+    assert text == Path(tmp_path, "b.geojson").read_text()
+    assert [x["id"] for x in json.loads(text)["features"]] == ids
+
+
 def test_shapely(file, jsonfile):
     from pyhaloxml.shapely import layer_to_shapely
 
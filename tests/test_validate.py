@@ -0,0 +1,74 @@
+import io
+from pathlib import Path
+
+import pytest as pytest
+
+from pyhaloxml import HaloXML, Region
+from pyhaloxml.misc import setvertices
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_findholes.annotations")
+
+
+@pytest.fixture
+def typesfile():
+    return Path(Path.cwd(), "tests", "testdata", "test_types.annotations")
+
+
+def test_valid(file):
+    hx = HaloXML()
+    hx.load(file)
+    assert hx.validate()
+    hx.matchnegative()
+    assert hx.validate()
+
+
+def test_selfintersections(typesfile):
+    hx = HaloXML()
+    hx.load(typesfile)
+    report = hx.validate()
+    assert not report
+    assert report.unclosed == [("Layer 1", 8), ("Layer 1", 9)]
+    assert report.self_intersections == [("Layer 1", 8), ("Layer 1", 9)]
+    hx.validate(repair=True)
+    report = hx.validate()
+    assert report.unclosed == []
+    assert report.self_intersections == [("Layer 1", 8), ("Layer 1", 9)]
+
+
+def test_repair(file):
+    hx = HaloXML()
+    hx.load(file)
+    polygon = hx.layers[0].regions[8]
+    vertices = polygon.getvertices()[:-1]  # unclosed
+    vertices.insert(2, vertices[2])  # duplicate
+    setvertices(polygon.region, vertices)
+    rectangle = hx.layers[0].regions[0]
+    setvertices(rectangle.region, [(0, 0), (0, 10)])  # no area, its hole is unmatched
+    hx.layers[0].regions = [Region(x.region) for x in hx.layers[0].regions]
+    report = hx.validate(repair=True)
+    n = len(hx.layers[0].regions)
+    assert report.unclosed == [("Layer 1", 8)]
+    assert report.duplicate_vertices == [("Layer 1", 0), ("Layer 1", 8)]
+    assert report.degenerate == [("Layer 1", 0)]
+    assert report.unmatched_holes == [("Layer 1", 1)]
+    assert hx.validate()
+    hx2 = HaloXML()
+    hx2.loadstream(io.BytesIO(hx.as_raw()))
+    assert len(hx2.layers[0].regions) == n
+    assert hx2.validate()
+
+
+def test_bowtie(file):
+    hx = HaloXML()
+    hx.load(file)
+    # the signed areas of the two lobes cancel out
+    bowtie = Region(hx.layers[0].regions[8].region)
+    setvertices(bowtie.region, [(0, 0), (10, 10), (10, 0), (0, 10), (0, 0)])
+    hx.layers[0].regions[8] = bowtie
+    report = hx.validate(repair=True)
+    assert report.self_intersections == [("Layer 1", 8)]
+    assert report.degenerate == []
+    assert bowtie in hx.layers[0].regions
@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import numpy as np
+import pytest as pytest
+
+from pyhaloxml import HaloXML
+from pyhaloxml.vectorize import (
+    mask_to_annotations,
+    mask_to_haloxml,
+    mask_to_packed,
+    trace_labels,
+)
+
+
+@pytest.fixture
+def mask():
+    mask = np.zeros((10, 10), dtype=np.uint8)
+    mask[1:8, 1:8] = 1
+    mask[3:5, 3:5] = 0
+    mask[4, 4] = 2
+    mask[8, 8] = 3
+    mask[9, 9] = 3
+    return mask
+
+
+@pytest.fixture
+def disk():
+    y, x = np.mgrid[:200, :200]
+    return ((x - 100) ** 2 + (y - 100) ** 2 < 80**2).astype(np.int32)
+
+
+def test_trace_labels(mask):
+    vertices, offsets, labels, starts = trace_labels(mask)
+    assert labels.tolist() == [1, 2, 1, 3, 3]
+    assert len(offsets) == len(labels) + 1
+    assert len(starts) == len(labels)
+    rings = np.split(vertices, offsets[1:-1])
+    assert all((x[0] == x[-1]).all() for x in rings)
+
+
+def test_layers_and_holes(mask):
+    hx = mask_to_haloxml(mask)
+    assert [x.name for x in hx.layers] == ["Label 1", "Label 2", "Label 3"]
+    assert [len(x.regions) for x in hx.layers] == [1, 1, 2]  # diagonal is separate
+    assert len(hx.layers[0].regions[0].holes) == 1
+    assert not any(x.contains_negative() for x in hx.layers)
+    assert hx.metrics()["area"].tolist() == [45.0, 1.0, 1.0, 1.0]
+
+
+def test_pinched_holes():
+    # the two holes only touch diagonally, so their ring passes a corner twice
+    pytest.importorskip("shapely")
+    from pyhaloxml.shapely import region_to_shapely
+
+    mask = np.array([[1, 1, 1, 1], [1, 0, 1, 1], [1, 1, 0, 1], [1, 1, 1, 1]])
+    vertices, offsets, labels, starts = trace_labels(mask)
+    assert labels.tolist() == [1, 1, 1]
+    rings = np.split(vertices, offsets[1:-1])
+    assert all(len(np.unique(x, axis=0)) == len(x) - 1 for x in rings)
+    hx = mask_to_haloxml(mask)
+    assert len(hx.layers[0].regions[0].holes) == 2
+    polygon = region_to_shapely(hx.layers[0].regions[0])
+    assert polygon.is_valid
+    assert polygon.area == 14.0
+
+
+def test_origin_downsample(mask):
+    hx = mask_to_haloxml(mask, origin=(100, 200), downsample=4, names={1: "Tumor"})
+    metrics = hx.metrics()
+    assert hx.layers[0].name == "Tumor"
+    assert metrics["area"][0] == 45.0 * 16
+    assert metrics["xmin"][0] == 104.0
+    assert metrics["ymin"][0] == 204.0
+
+
+def test_simplify(disk):
+    exact = mask_to_haloxml(disk).metrics()
+    simple = mask_to_haloxml(disk, simplify=1.0).metrics()
+    assert simple["n_vertices"][0] < exact["n_vertices"][0] / 2
+    assert simple["area"][0] == pytest.approx(exact["area"][0], rel=0.01)
+
+
+def test_mask_to_annotations(mask, tmp_path):
+    pth = Path(tmp_path, "mask.annotations")
+    mask_to_annotations(np.asfortranarray(mask), pth)
+    hx = HaloXML()
+    hx.load(pth)
+    hx.matchnegative()
+    assert hx.metrics()["area"].tolist() == [45.0, 1.0, 1.0, 1.0]
+
+
+def test_not_integer():
+    with pytest.raises(ValueError):
+        mask_to_haloxml(np.zeros((4, 4), dtype=np.float32))
+
+
+@pytest.mark.parametrize("shape", [(3, 3), (0, 0)])
+def test_empty_mask(shape):
+    mask = np.zeros(shape, dtype=np.uint8)
+    vertices, offsets, labels, starts = trace_labels(mask)
+    assert len(vertices) == 0 and offsets.tolist() == [0] and len(labels) == 0
+    assert mask_to_haloxml(mask).layers == []
+    assert len(mask_to_packed(mask)) == 0
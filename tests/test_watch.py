@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from pathlib import Path
+
+import pytest as pytest
+
+from pyhaloxml.cli import main
+from pyhaloxml.watch import Watcher
+
+
+@pytest.fixture
+def folder(tmp_path):
+    testdata = Path(Path.cwd(), "tests", "testdata")
+    root = Path(tmp_path, "scans")
+    Path(root, "sub").mkdir(parents=True)
+    shutil.copy(Path(testdata, "test_layers.annotations"), root)
+    shutil.copy(Path(testdata, "test_types.annotations"), Path(root, "sub"))
+    Path(root, "notes.txt").write_text("not an annotation")
+    return root
+
+
+def test_watch(folder, tmp_path):
+    out = Path(tmp_path, "out")
+    watcher = Watcher(folder, out, settle=0)
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        assert watcher.poll(pool) == (2, 0)
+    assert Path(out, "test_layers.geojson").is_file()
+    geojson = json.loads(Path(out, "sub", "test_types.geojson").read_text())
+    assert len(geojson["features"]) > 0
+    assert watcher.poll() == (0, 0)
+    # touching a file does not convert it again
+    pth = Path(folder, "test_layers.annotations")
+    os.utime(pth, (1e9, 1e9))
+    assert watcher.poll() == (0, 0)
+    assert watcher.files["test_layers.annotations"]["mtime"] == 1e9
+    # a restarted watcher continues from the state
+    pth.write_bytes(pth.read_bytes().replace(b"</Annotations>", b"</Annotations>\n"))
+    os.utime(pth, (1e9 + 1, 1e9 + 1))
+    watcher = Watcher(folder, out, settle=0)
+    assert watcher.poll() == (1, 0)
+    # a new format starts over
+    assert Watcher(folder, out, "wkb", settle=0).poll() == (2, 0)
+    assert Path(out, "sub", "test_types.wkb").is_file()
+
+
+def test_watch_broken_file(folder, tmp_path):
+    Path(folder, "broken.annotations").write_text("<Annotations>")
+    watcher = Watcher(folder, Path(tmp_path, "out"), settle=0)
+    assert watcher.poll() == (2, 1)
+    assert "error" in watcher.files["broken.annotations"]
+    assert watcher.poll() == (0, 0)  # not retried until the file changes
+
+
+def broken_pool():
+    pool = ProcessPoolExecutor(max_workers=1)
+    with pytest.raises(BrokenExecutor):
+        pool.submit(os._exit, 1).result()
+    return pool
+
+
+def test_watch_broken_pool(folder, tmp_path):
+    watcher = Watcher(folder, Path(tmp_path, "out"), settle=0)
+    pool = broken_pool()
+    assert watcher.poll(pool) == (0, 2)
+    assert watcher.broken
+    assert watcher.files == {}
+    assert watcher.poll(pool) == (0, 2)  # tried again
+    assert watcher.poll() == (2, 0)
+    assert not watcher.broken
+
+
+def test_watch_run_broken_pool(folder, tmp_path, monkeypatch):
+    calls = []
+
+    def executor(max_workers=None):
+        calls.append(max_workers)
+        if len(calls) == 1:
+            return broken_pool()
+        return ProcessPoolExecutor(max_workers=max_workers)
+
+    monkeypatch.setattr("pyhaloxml.watch.ProcessPoolExecutor", executor)
+    watcher = Watcher(folder, Path(tmp_path, "out"), settle=0)
+    watcher.run(interval=0, workers=1, rounds=2)
+    assert calls == [1, 1]
+    assert set(watcher.files) == {
+        "test_layers.annotations",
+        "sub/test_types.annotations",
+    }
+    assert not any("error" in x for x in watcher.files.values())
+
+
+def test_watch_settle(folder, tmp_path):
+    watcher = Watcher(folder, Path(tmp_path, "out"), settle=3600)
+    assert watcher.poll() == (0, 0)
+
+
+def test_watch_cli(folder, tmp_path):
+    out = Path(tmp_path, "out")
+    argv = ["watch", str(folder), str(out), "--once", "--settle", "0"]
+    assert main(argv + ["--workers", "1"]) == 0
+    assert Path(out, "sub", "test_types.geojson").is_file()
+    assert Path(out, ".pyhaloxml-watch.json").is_file()
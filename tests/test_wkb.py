@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import pytest as pytest
+
+from pyhaloxml import HaloXML
+from pyhaloxml.wkb import read_wkb
+
+
+@pytest.fixture
+def file():
+    return Path(Path.cwd(), "tests", "testdata", "test_types.annotations")
+
+
+@pytest.fixture
+def holesfile():
+    return Path(Path.cwd(), "tests", "testdata", "test_findholes.annotations")
+
+
+def test_wkb(file, tmp_path):
+    from shapely import from_wkb
+
+    hx = HaloXML()
+    hx.load(file)
+    hx.to_wkb(Path(tmp_path, "types.wkb"))
+    columns = read_wkb(Path(tmp_path, "types.wkb"))
+    assert columns["layer"] == ["Layer 1"] * 10
+    assert columns["color"][0] == list(hx.layers[0].linecolor.getrgb())
+    geomtypes = {}
+    for geometry in from_wkb(columns["geometry"]):
+        geomtypes[geometry.geom_type] = geomtypes.get(geometry.geom_type, 0) + 1
+    assert geomtypes == {"LineString": 2, "Point": 1, "Polygon": 7}
+
+
+def test_parquet(holesfile, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    from shapely import from_wkb
+
+    from pyhaloxml.shapely import region_to_shapely
+
+    hx = HaloXML()
+    hx.load(holesfile)
+    hx.to_wkb(Path(tmp_path, "holes.parquet"))
+    table = pq.read_table(Path(tmp_path, "holes.parquet"))
+    assert b"geo" in table.schema.metadata
+    geometries = from_wkb(table.column("geometry").to_pylist())
+    for geometry, region in zip(geometries, hx.layers[0].regions):
+        assert geometry.equals(region_to_shapely(region))